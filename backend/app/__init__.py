@@ -85,8 +85,10 @@ def create_app(config_class=Config):
 
     # Register blueprints
     from app.routes.auth import auth as auth_blueprint
+    from app.routes.metrics import metrics as metrics_blueprint
     
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
+    app.register_blueprint(metrics_blueprint)
 
     # Register Swagger documentation blueprint
     from app.swagger import register_swagger_routes
@@ -15,6 +15,8 @@ sys.path.insert(0, backend_dir)
 
 # Now we can import from app modules
 from app.common.utils import safely_check_interrupts
+from app.common.agent_streaming import run_agent_graph
+from app.common.metrics import agent_call
 from app.agents.dineout.prompts import RESTAURANT_AQL_GENERATION_PROMPT, SYSTEM_PROMPT
 from app.common.prompts import PUBLIC_AQL_GENERATION_PROMPT
 
@@ -100,6 +102,7 @@ class RestaurantAgent:
         )
 
         
+    @agent_call("Dineout_Restaurant_Agent")
     def call_llm(self, user_message: str, thread_id: Optional[str] = None) -> str:
         """
         Process a user message and return the agent's response.
@@ -121,11 +124,8 @@ class RestaurantAgent:
         else:
             inputs = {"messages": [HumanMessage(content=user_message)]}
         
-        # Get the final response
-        result = self.agent_graph.invoke(inputs, config)
-        final_message = result["messages"][-1]
-        
-        return final_message.content
+        # Get the final response, streaming it to the client if requested
+        return run_agent_graph(self.agent_graph, inputs, config)
 
 
     def run_interactive(self, thread_id: str, debug=False):
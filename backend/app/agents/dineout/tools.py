@@ -4,6 +4,7 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_community.graphs import ArangoGraph
 from app.common.arangodb import ArangoGraphQAChain
+from app.common.tools import built_on_first_use
 import os
 import sys
 
@@ -58,7 +59,7 @@ def book_dineout_factory(user_id: str):
 
 
 def private_db_query_factory(model, arango_graph, aql_generation_prompt):
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
@@ -67,14 +68,14 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         perform_qa=False,
         top_k=5,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
     
     @tool
     def private_db_query(query: str) -> str:
         """
         It have user likes and dislikes about restaurants.
         """
-        result = chain.invoke(query)
+        result = chain().invoke(query)
         return result
     
     return private_db_query
@@ -24,8 +24,11 @@ EMAIL_MESSAGE_ANALYSIS_EDGE_COLLECTION = "email_message__analysis"  # Edge linki
 class EmailAnalyzer(BaseGraphConsumer):
     """
     A Celery consumer that analyzes email messages for spam, urgency, importance, and categorization.
-    It reuses our graph nodes and adds extra analysis nodes.
+    It reuses our graph nodes and adds extra analysis nodes, skipping them if their
+    collections are missing.
     """
+    create_collections = False
+
     def __init__(
         self, 
         model_provider: str = "openai", 
@@ -40,11 +43,12 @@ class EmailAnalyzer(BaseGraphConsumer):
         Initialize the EmailAnalyzer.
         """
         super().__init__()
-        self.llm = LLMManager.get_model(
+        self.llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=AnalysisResult,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(AnalysisResult)
+        )
         
         self.spam_threshold = spam_threshold
         self.urgent_threshold = urgent_threshold
@@ -74,21 +78,17 @@ class EmailAnalyzer(BaseGraphConsumer):
         # Process with LLM
         return self.llm.invoke(prompt)
     
-    def _add_analysis(self, db, analysis_result: AnalysisResult) -> str:
+    def _analysis_doc(self, analysis_result: AnalysisResult) -> Dict[str, Any]:
         """
-        Add an analysis document to the database.
+        Build the analysis document.
         
         Args:
-            db: The database instance
             analysis_result: Analysis results to store
             
         Returns:
-            The analysis document ID
+            The analysis document
         """
-        collection = db.collection(ANALYSIS_COLLECTION)
-        
-        # Create analysis document
-        analysis_doc = {
+        return {
             "spam_score": analysis_result.spam_score,
             "urgency_score": analysis_result.urgency_score,
             "importance_score": analysis_result.importance_score,
@@ -99,41 +99,6 @@ class EmailAnalyzer(BaseGraphConsumer):
             "is_important": analysis_result.importance_score >= self.important_threshold,
             "created_at": datetime.datetime.utcnow().isoformat()
         }
-        
-        result = collection.insert(analysis_doc)
-        return f"{ANALYSIS_COLLECTION}/{result['_key']}"
-    
-    def _add_edge(self, db, from_id: str, to_id: str, collection_name: str, data: Dict[str, Any] = None) -> str:
-        """
-        Add an edge between two vertices.
-        
-        Args:
-            db: The database instance
-            from_id: The source vertex ID
-            to_id: The target vertex ID
-            collection_name: The edge collection name
-            data: Optional additional data for the edge
-            
-        Returns:
-            The edge document ID
-        """
-        collection = db.collection(collection_name)
-        
-        edge_doc = {
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": datetime.datetime.utcnow().isoformat()
-        }
-        
-        if data:
-            edge_doc.update(data)
-        
-        try:
-            result = collection.insert(edge_doc)
-            return f"{collection_name}/{result['_key']}"
-        except Exception as e:
-            print(f"Error adding edge: {str(e)}")
-            return None
     
     def summarize_email(self, email_content: str) -> str:
         """
@@ -166,7 +131,9 @@ class EmailAnalyzer(BaseGraphConsumer):
         user_id: str,
         email_data: Dict[str, Any],
         identifiers: List[str],
-        message_id: Optional[str] = None
+        message_id: Optional[str] = None,
+        analysis_result: Optional[AnalysisResult] = None,
+        summary: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Process an email message for analysis.
@@ -176,6 +143,8 @@ class EmailAnalyzer(BaseGraphConsumer):
             email_data: Email message data
             identifiers: List of identifiers extracted from the email
             message_id: Optional ID of the stored message document
+            analysis_result: Analysis from the fused analysis call, to skip the analysis call
+            summary: Summary from the fused analysis call, to skip the summarization call
             
         Returns:
             A dictionary with analysis results
@@ -191,17 +160,19 @@ class EmailAnalyzer(BaseGraphConsumer):
                 return {"status": "error", "message": "Could not extract email content"}
             
             # Analyze the email
-            analysis_result = self.analyze_message(email_content, identifiers)
+            if analysis_result is None:
+                analysis_result = self.analyze_message(email_content, identifiers)
             
             # Generate a summary
-            summary = self.summarize_email(email_content)
-            
-            # Store the analysis
-            analysis_id = self._add_analysis(db, analysis_result)
+            if summary is None:
+                summary = self.summarize_email(email_content)
             
-            # If we have a message_id, create an edge to the analysis
-            if message_id and analysis_id:
-                self._add_edge(db, message_id, analysis_id, EMAIL_MESSAGE_ANALYSIS_EDGE_COLLECTION)
+            # Store the analysis and, if we have a message_id, link it in one batch
+            with self.batch(db):
+                analysis_ref = self.add_node(ANALYSIS_COLLECTION, self._analysis_doc(analysis_result))
+                if message_id:
+                    self.add_edge(EMAIL_MESSAGE_ANALYSIS_EDGE_COLLECTION, message_id, analysis_ref)
+            analysis_id = analysis_ref.id
             
             # Apply additional categorization
             categories = categorize_email(
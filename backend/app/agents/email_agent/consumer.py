@@ -11,9 +11,13 @@ from app.db import get_system_db, get_user_db
 from app.agents.email_agent.consumer_agent import EmailConsumer
 from app.agents.email_agent.analyser_agent import EmailAnalyzer
 from app.agents.email_agent.analyser_agent import notify_message
+from app.agents.email_agent.schemas import AnalysisResult
+from app.common.message_insights import FUSED_MESSAGE_ANALYSIS
+from app.common.metrics import install_celery_metrics
 
 # Initialize Celery app
 celery_app = Celery('email_processing', broker=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+install_celery_metrics()
 
 @celery_app.task(name="email.process_message")
 def process_message(
@@ -22,7 +26,8 @@ def process_message(
     spam_threshold: float = 0.5,
     urgent_threshold: float = 0.7,
     important_threshold: float = 0.6,
-    notification_callback = notify_message
+    notification_callback = notify_message,
+    fused: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Process an email message from start to finish: extract identifiers and analyze.
@@ -34,17 +39,24 @@ def process_message(
         urgent_threshold: Threshold for urgency detection (0-1)
         important_threshold: Threshold for importance detection (0-1)
         notification_callback: Callback function for email notifications
+        fused: Extract identifiers, analysis and summary in one LLM call instead
+            of three (defaults to FUSED_MESSAGE_ANALYSIS)
         
     Returns:
         A dictionary with the combined results of processing and analysis
     """
     try:
-        # Step 1: Extract identifiers using the EmailConsumer
+        if fused is None:
+            fused = FUSED_MESSAGE_ANALYSIS
+        
+        # Step 1: Extract identifiers using the EmailConsumer; in fused mode one
+        # LLM call returns identifiers, analysis and summary
         consumer = EmailConsumer()
-        consumer_result = consumer.process_message(user_id, email_data)
+        consumer_result = consumer.process_message(user_id, email_data, fused=fused)
         
         if consumer_result.get("status") != "success":
             return consumer_result
+        insights = consumer_result.pop("insights", None)
         
         identifiers = consumer_result.get("identifiers", [])
         message_id = consumer_result.get("message_id")
@@ -61,7 +73,9 @@ def process_message(
             user_id, 
             email_data,
             identifiers,
-            message_id
+            message_id,
+            analysis_result=insights.to_analysis_result(AnalysisResult) if insights else None,
+            summary=insights.summary if insights else None
         )
         
         # Step 3: Combine results
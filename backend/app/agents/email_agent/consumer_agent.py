@@ -13,7 +13,8 @@ from app.db import get_system_db, get_user_db
 from app.agents.email_agent.schemas import Identifiers, AttachmentInfo
 from app.common.llm_manager import LLMManager
 from app.agents.email_agent.tools import extract_email_parts, extract_email_metadata, extract_thread_info
-from arango.database import StandardDatabase
+from app.common.base_consumer import BaseGraphConsumer, DocumentRef
+from app.common.message_insights import extract_message_insights
 
 # Initialize Celery app
 celery_app = Celery('email', broker=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
@@ -30,27 +31,36 @@ CONTACT_MESSAGE_EDGE_COLLECTION = "contact__email_message"
 FOLDER_MESSAGE_EDGE_COLLECTION = "folder__email_message"
 MESSAGE_ATTACHMENT_EDGE_COLLECTION = "email_message__attachment"
 
-class EmailConsumer:
+class EmailConsumer(BaseGraphConsumer):
     """
     A consumer that processes email messages:
     - Extracts identifiers using LLM
     - Stores email metadata, content, and attachments
     - Creates graph connections between entities
+
+    Collections are provisioned with the user's database; missing ones are skipped.
     """
+    create_collections = False
+
     def __init__(self, model_provider: str = "openai", model_name: str = "gpt-4o-mini", temperature: float = 0):
+        super().__init__()
+        self.model_provider = model_provider
+        self.model_name = model_name
         # Initialize the LLM with structured output to extract identifiers.
-        self.llm = LLMManager.get_model(
+        self.llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=Identifiers,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(Identifiers)
+        )
         
         # Initialize the LLM for attachment analysis
-        self.attachment_llm = LLMManager.get_model(
+        self.attachment_llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=AttachmentInfo,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(AttachmentInfo)
+        )
     
     def extract_identifiers(self, email_content: str) -> List[str]:
         """
@@ -113,108 +123,47 @@ class EmailConsumer:
             print(f"Error analyzing attachment: {str(e)}")
             return attachment_info
     
-    def _add_contact(self, db: StandardDatabase, email_address: str, name: Optional[str] = None) -> Optional[str]:
-        """
-        Add a contact to the database if it doesn't exist.
-        
-        Args:
-            db: The database instance
-            email_address: The email address of the contact
-            name: Optional name of the contact
-            
-        Returns:
-            The contact document ID
-        """
-        collection = db.collection(CONTACTS_COLLECTION)
-        
-        # Check if contact already exists
-        query = f"""
-        FOR c IN {CONTACTS_COLLECTION}
-        FILTER c.email_address == @email_address
-        RETURN c
-        """
-        cursor = db.aql.execute(query, bind_vars={"email_address": email_address})
-        
-        existing_contacts = [doc for doc in cursor]
-        if existing_contacts:
-            return existing_contacts[0]["_id"]
-        
-        # Create new contact
-        contact_doc = {
-            "email_address": email_address,
-            "name": name or "",
-            "created_at": datetime.datetime.utcnow().isoformat(),
-            "updated_at": datetime.datetime.utcnow().isoformat()
-        }
-        
-        result = collection.insert(contact_doc)
-        return f"{CONTACTS_COLLECTION}/{result['_key']}"
-    
-    def _add_folder(self, db: StandardDatabase, folder_name: str, folder_type: str = "CUSTOM") -> Optional[str]:
+    def _add_folder(self, folder_name: str, folder_type: str = "CUSTOM") -> DocumentRef:
         """
-        Add an email folder to the database if it doesn't exist.
+        Add an email folder to the current batch if it doesn't exist.
         
         Args:
-            db: The database instance
             folder_name: The name of the folder
             folder_type: The type of folder (INBOX, SENT, DRAFTS, etc.)
             
         Returns:
-            The folder document ID
+            The folder DocumentRef
         """
-        collection = db.collection(EMAIL_FOLDERS_COLLECTION)
-        
-        # Check if folder already exists
-        query = f"""
-        FOR f IN {EMAIL_FOLDERS_COLLECTION}
-        FILTER f.name == @folder_name
-        RETURN f
-        """
-        cursor = db.aql.execute(query, bind_vars={"folder_name": folder_name})
-        
-        existing_folders = [doc for doc in cursor]
-        if existing_folders:
-            return existing_folders[0]["_id"]
-        
-        # Create new folder
-        folder_doc = {
-            "name": folder_name,
-            "type": folder_type,
-            "created_at": datetime.datetime.utcnow().isoformat(),
-            "updated_at": datetime.datetime.utcnow().isoformat()
-        }
-        
-        result = collection.insert(folder_doc)
-        return f"{EMAIL_FOLDERS_COLLECTION}/{result['_key']}"
+        now = datetime.datetime.utcnow().isoformat()
+        return self.add_node(
+            EMAIL_FOLDERS_COLLECTION,
+            {"name": folder_name, "type": folder_type, "created_at": now, "updated_at": now},
+            unique_key="name", unique_value=folder_name, update=False
+        )
     
-    def _add_message(self, db: StandardDatabase, email_data: Dict[str, Any],
-                    sender_id: Optional[str] = None, folder_id: Optional[str] = None) -> Optional[str]:
+    def _message_doc(self, email_data: Dict[str, Any], sender: Optional[DocumentRef],
+                     folder: DocumentRef) -> Dict[str, Any]:
         """
-        Add an email message to the database.
+        Build the email message document.
         
         Args:
-            db: The database instance
             email_data: Email message data
-            sender_id: Optional ID of the sender contact
-            folder_id: Optional ID of the folder
+            sender: Ref of the sender contact, if any
+            folder: Ref of the folder
             
         Returns:
-            The message document ID
+            The message document, referring to the sender and folder by ref
         """
-        collection = db.collection(EMAIL_MESSAGES_COLLECTION)
-        
-        # Extract email parts and metadata
-        text_content, attachments = extract_email_parts(email_data)
+        text_content, _ = extract_email_parts(email_data)
         metadata = extract_email_metadata(email_data)
         thread_info = extract_thread_info(email_data)
         
-        # Create message document
-        message_doc = {
+        return {
             "subject": metadata.get("subject", ""),
             "body": text_content,
             "timestamp": metadata.get("date") or datetime.datetime.utcnow().isoformat(),
-            "sender_id": sender_id,
-            "folder_id": folder_id,
+            "sender_id": sender,
+            "folder_id": folder,
             "recipients": metadata.get("recipients", []),
             "cc": metadata.get("cc", []),
             "bcc": metadata.get("bcc", []),
@@ -225,29 +174,20 @@ class EmailConsumer:
             "thread_depth": thread_info.get("thread_depth", 0),
             "created_at": datetime.datetime.utcnow().isoformat()
         }
-        
-        result = collection.insert(message_doc)
-        return f"{EMAIL_MESSAGES_COLLECTION}/{result['_key']}"
     
-    def _add_attachment(self, db: StandardDatabase, attachment_data: Dict[str, Any], email_content: str) -> Optional[str]:
+    def _attachment_doc(self, attachment_data: Dict[str, Any], email_content: str) -> Dict[str, Any]:
         """
-        Add an email attachment to the database.
+        Analyze an email attachment and build its document.
         
         Args:
-            db: The database instance
             attachment_data: Attachment data
             email_content: Email content for context in analysis
             
         Returns:
-            The attachment document ID
+            The attachment document (without the binary data to save space)
         """
-        collection = db.collection(EMAIL_ATTACHMENTS_COLLECTION)
-        
-        # Analyze the attachment
         enhanced_attachment = self.analyze_attachment(attachment_data, email_content)
-        
-        # Create attachment document (excluding binary data to save space)
-        attachment_doc = {
+        return {
             "filename": enhanced_attachment.get("filename", ""),
             "content_type": enhanced_attachment.get("content_type", ""),
             "size": enhanced_attachment.get("size", 0),
@@ -255,93 +195,33 @@ class EmailConsumer:
             "file_type": enhanced_attachment.get("file_type", ""),
             "created_at": datetime.datetime.utcnow().isoformat()
         }
-        
-        result = collection.insert(attachment_doc)
-        return f"{EMAIL_ATTACHMENTS_COLLECTION}/{result['_key']}"
-    
-    def _add_identifier(self, db: StandardDatabase, identifier: str) -> Optional[str]:
-        """
-        Add an identifier to the database if it doesn't exist.
-        
-        Args:
-            db: The database instance
-            identifier: The identifier string
-            
-        Returns:
-            The identifier document ID
-        """
-        collection = db.collection(IDENTIFIERS_COLLECTION)
-        
-        # Check if identifier already exists
-        query = f"""
-        FOR i IN {IDENTIFIERS_COLLECTION}
-        FILTER i.value == @identifier
-        RETURN i
-        """
-        cursor = db.aql.execute(query, bind_vars={"identifier": identifier})
-        
-        existing_identifiers = [doc for doc in cursor]
-        if existing_identifiers:
-            return existing_identifiers[0]["_id"]
-        
-        # Create new identifier
-        identifier_doc = {
-            "value": identifier,
-            "created_at": datetime.datetime.utcnow().isoformat()
-        }
-        
-        result = collection.insert(identifier_doc)
-        return f"{IDENTIFIERS_COLLECTION}/{result['_key']}"
-    
-    def _add_edge(self, db: StandardDatabase, from_id: str, to_id: str, 
-                 collection_name: str, data: Dict[str, Any] = None) -> Optional[str]:
-        """
-        Add an edge between two vertices.
-        
-        Args:
-            db: The database instance
-            from_id: The source vertex ID
-            to_id: The target vertex ID
-            collection_name: The edge collection name
-            data: Optional additional data for the edge
-            
-        Returns:
-            The edge document ID
-        """
-        collection = db.collection(collection_name)
-        
-        edge_doc = {
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": datetime.datetime.utcnow().isoformat()
-        }
-        
-        if data:
-            edge_doc.update(data)
-        
-        try:
-            result = collection.insert(edge_doc)
-            return f"{collection_name}/{result['_key']}"
-        except Exception as e:
-            print(f"Error adding edge: {str(e)}")
-            return None
     
-    def process_message(self, user_id: str, email_data: Dict[str, Any]) -> Dict[str, Any]:
+    def process_message(self, user_id: str, email_data: Dict[str, Any],
+                        identifiers: Optional[List[str]] = None, fused: bool = False) -> Dict[str, Any]:
         """
         Process an email message from start to finish:
         - Store email metadata and content
         - Extract and store identifiers
         - Create graph connections
         
+        The LLM calls (identifiers, attachment analysis) run first, then all
+        documents and edges are written in one batch.
+        
         Args:
             user_id: The ID of the user
             email_data: Email message data
+            identifiers: Identifiers already extracted, to skip the extraction call
+            fused: Get identifiers, analysis and summary from one call with this
+                consumer's model (see app.common.message_insights); the result
+                then carries the MessageInsights under "insights"
             
         Returns:
             A dictionary with processing results
         """
         try:
             db = get_user_db(user_id)
+            if not db:
+                return {"status": "error", "message": "Failed to connect to database"}
             
             # Extract email content for identifier extraction
             email_content, attachments = extract_email_parts(email_data)
@@ -351,51 +231,65 @@ class EmailConsumer:
             # Extract metadata
             metadata = extract_email_metadata(email_data)
             
-            # Add sender to contacts
-            sender_id = None
-            if metadata.get("sender"):
-                sender_id = self._add_contact(db, metadata["sender"])
+            # Extract identifiers and analyze attachments before writing
+            insights = None
+            if identifiers is None and fused:
+                insights = extract_message_insights("email", email_content, self.model_provider, self.model_name)
+                identifiers = insights.normalized_identifiers
+            elif identifiers is None:
+                identifiers = self.extract_identifiers(email_content)
+            attachment_docs = [self._attachment_doc(attachment, email_content) for attachment in attachments]
+            now = datetime.datetime.utcnow().isoformat()
             
-            # Add email to appropriate folder (default to INBOX)
-            folder_name = email_data.get("folder", "INBOX")
-            folder_id = self._add_folder(db, folder_name)
+            with self.batch(db):
+                # Add sender to contacts
+                sender_ref = None
+                if metadata.get("sender"):
+                    sender_ref = self.add_node(
+                        CONTACTS_COLLECTION,
+                        {"email_address": metadata["sender"], "name": "", "created_at": now, "updated_at": now},
+                        unique_key="email_address", unique_value=metadata["sender"], update=False
+                    )
+                
+                # Add email to appropriate folder (default to INBOX)
+                folder_ref = self._add_folder(email_data.get("folder", "INBOX"))
+                
+                # Add the email message
+                message_ref = self.add_node(EMAIL_MESSAGES_COLLECTION, self._message_doc(email_data, sender_ref, folder_ref))
+                
+                # Connect sender and folder to message
+                if sender_ref is not None:
+                    self.add_edge(CONTACT_MESSAGE_EDGE_COLLECTION, sender_ref, message_ref)
+                self.add_edge(FOLDER_MESSAGE_EDGE_COLLECTION, folder_ref, message_ref)
+                
+                # Add identifiers and connect to message
+                for identifier in identifiers:
+                    identifier_ref = self.add_node(
+                        IDENTIFIERS_COLLECTION,
+                        {"value": identifier, "created_at": now},
+                        unique_key="value", unique_value=identifier, update=False
+                    )
+                    self.add_edge(IDENTIFIER_MESSAGE_EDGE_COLLECTION, identifier_ref, message_ref)
+                
+                # Add attachments and connect them to the message
+                attachment_refs = []
+                for attachment_doc in attachment_docs:
+                    attachment_ref = self.add_node(EMAIL_ATTACHMENTS_COLLECTION, attachment_doc)
+                    attachment_refs.append(attachment_ref)
+                    self.add_edge(MESSAGE_ATTACHMENT_EDGE_COLLECTION, message_ref, attachment_ref)
             
-            # Add the email message
-            message_id = self._add_message(db, email_data, sender_id, folder_id)
-            if not message_id:
+            if message_ref.id is None:
                 return {"status": "error", "message": "Failed to add email message"}
             
-            # Connect sender to message
-            if sender_id:
-                self._add_edge(db, sender_id, message_id, CONTACT_MESSAGE_EDGE_COLLECTION)
-            
-            # Connect folder to message
-            if folder_id:
-                self._add_edge(db, folder_id, message_id, FOLDER_MESSAGE_EDGE_COLLECTION)
-            
-            # Extract identifiers
-            identifiers = self.extract_identifiers(email_content)
-            
-            # Add identifiers and connect to message
-            for identifier in identifiers:
-                identifier_id = self._add_identifier(db, identifier)
-                if identifier_id:
-                    self._add_edge(db, identifier_id, message_id, IDENTIFIER_MESSAGE_EDGE_COLLECTION)
-            
-            # Process attachments
-            attachment_ids = []
-            for attachment_data in attachments:
-                attachment_id = self._add_attachment(db, attachment_data, email_content)
-                if attachment_id:
-                    attachment_ids.append(attachment_id)
-                    self._add_edge(db, message_id, attachment_id, MESSAGE_ATTACHMENT_EDGE_COLLECTION)
-            
-            return {
+            result = {
                 "status": "success",
-                "message_id": message_id,
+                "message_id": message_ref.id,
                 "identifiers": identifiers,
-                "attachments": attachment_ids
+                "attachments": [ref.id for ref in attachment_refs if ref.id]
             }
+            if insights is not None:
+                result["insights"] = insights
+            return result
             
         except Exception as e:
             print(f"Error processing email message: {str(e)}")
@@ -440,8 +334,11 @@ def process_email_folder_action(user_id: str, folder_data: Dict[str, Any]) -> Di
         action = folder_data.get("action", "create")
         
         if action == "create" or action == "update":
-            folder_id = consumer._add_folder(db, folder_name, folder_type)
-            return {"status": "success", "folder_id": folder_id}
+            with consumer.batch(db):
+                folder_ref = consumer._add_folder(folder_name, folder_type)
+            if folder_ref.id is None:
+                return {"status": "error", "message": "Failed to add folder"}
+            return {"status": "success", "folder_id": folder_ref.id}
         elif action == "delete":
             collection = db.collection(EMAIL_FOLDERS_COLLECTION)
             query = f"""
@@ -4,6 +4,7 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_community.graphs import ArangoGraph
 from app.common.arangodb import ArangoGraphQAChain
+from app.common.tools import built_on_first_use
 import os
 import sys
 
@@ -67,7 +68,7 @@ def place_order_factory(user_id: str):
 
 def public_dish_search_factory(user_id: str, model, arango_graph, aql_generation_prompt):
     """Factory function to create a tool for searching the public dish database"""
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
@@ -76,7 +77,7 @@ def public_dish_search_factory(user_id: str, model, arango_graph, aql_generation
         perform_qa=False,
         top_k=5,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
     
     @tool
     def public_dish_search(query: str) -> List[Dish]:
@@ -89,7 +90,7 @@ def public_dish_search_factory(user_id: str, model, arango_graph, aql_generation
         Returns:
             Information about matching dishes
         """
-        result = chain.invoke(query)
+        result = chain().invoke(query)
         print(f"TOOL EXECUTION - PUBLIC DISH SEARCH from user_id: {user_id}")
         return result
     
@@ -98,7 +99,7 @@ def public_dish_search_factory(user_id: str, model, arango_graph, aql_generation
 
 def private_db_query_factory(model, arango_graph, aql_generation_prompt):
     """Factory function to create a tool for querying the private user database"""
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
@@ -107,7 +108,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         perform_qa=False,
         top_k=5,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
     
     @tool
     def private_db_query(query: str) -> str:
@@ -115,7 +116,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         Query the private database for user preferences, order history, and past ratings.
         Use this to get information about the user's food preferences and order patterns.
         """
-        result = chain.invoke(query)
+        result = chain().invoke(query)
         return result
     
     return private_db_query 
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""Run the agents the gateway routed a message to concurrently and merge their replies."""
+
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Sequence
+
+from app.common.agent_streaming import AgentCancelled, cancellable
+from app.common.metrics import Counter, observe, registry
+
+# Seconds the gateway waits for all routed agents before replying without the stragglers
+GATEWAY_FANOUT_TIMEOUT = float(os.environ.get("GATEWAY_FANOUT_TIMEOUT", 90))
+# Separates the agents' replies; the agents' prompts use the same separator between sections
+RESPONSE_SEPARATOR = "\n\n---\n\n"
+
+GATEWAY_FANOUT_OUTCOMES = registry.register(Counter(
+    "dash_gateway_fanout_total", "Sub-agent runs started by the gateway, by outcome", ["agent", "outcome"]
+))
+
+logger = logging.getLogger(__name__)
+
+
+def agent_label(agent_name: str) -> str:
+    """Human-readable domain of an agent, e.g. "Online_Order_Restaurant_Agent" -> "online order restaurant"."""
+    name = agent_name[:-len("_Agent")] if agent_name.endswith("_Agent") else agent_name
+    return name.replace("_", " ").lower()
+
+
+class FanOutResult:
+    """Replies of the agents that finished, and the names of those that did not."""
+
+    def __init__(self, responses: Dict[str, str], timed_out: List[str], failed: List[str]):
+        self.responses = responses
+        self.timed_out = timed_out
+        self.failed = failed
+
+
+def fan_out(
+    calls: Dict[str, Callable[[], str]],
+    timeout: float = GATEWAY_FANOUT_TIMEOUT
+) -> FanOutResult:
+    """
+    Run agent calls concurrently with a shared deadline.
+
+    Each call runs in a copy of the caller's context, so metric labels, LLM
+    priority and streaming apply to it. Calls still running at the deadline are
+    cancelled (see `cancellable`): they stop at their next consistent step and
+    their replies are dropped.
+
+    Args:
+        calls: Function running each agent, by agent name, in routing order
+        timeout: Seconds to wait for all calls
+
+    Returns:
+        The replies of the calls that finished in time, in routing order
+    """
+    if len(calls) == 1:
+        # Nothing to overlap; run in the caller's thread without a deadline
+        name, call = next(iter(calls.items()))
+        try:
+            result = FanOutResult({name: call()}, [], [])
+            GATEWAY_FANOUT_OUTCOMES.inc(agent=name, outcome="ok")
+            return result
+        except Exception:
+            logger.exception(f"{name} failed")
+            GATEWAY_FANOUT_OUTCOMES.inc(agent=name, outcome="error")
+            return FanOutResult({}, [], [name])
+
+    cancel = threading.Event()
+
+    def run(call: Callable[[], str]) -> str:
+        with cancellable(cancel):
+            return call()
+
+    executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="gateway-fanout")
+    try:
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, run, call)
+            for name, call in calls.items()
+        }
+        wait(futures.values(), timeout=timeout)
+    finally:
+        # Stragglers stop at their next step; don't wait for them
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    responses, timed_out, failed = {}, [], []
+    for name, future in futures.items():
+        if not future.done() or future.cancelled() or isinstance(future.exception(), AgentCancelled):
+            timed_out.append(name)
+            outcome = "timeout"
+        elif future.exception() is not None:
+            logger.error(f"{name} failed: {future.exception()}")
+            failed.append(name)
+            outcome = "error"
+        else:
+            responses[name] = future.result()
+            outcome = "ok"
+        GATEWAY_FANOUT_OUTCOMES.inc(agent=name, outcome=outcome)
+    return FanOutResult(responses, timed_out, failed)
+
+
+def merge_responses(result: FanOutResult) -> str:
+    """
+    Merge the agents' replies into one message.
+
+    A single reply is returned as is. Several are joined in routing order and
+    followed by a note for each agent that did not finish.
+    """
+    sections = [response for response in result.responses.values() if response]
+    for name in result.timed_out:
+        sections.append(f"I couldn't finish the {agent_label(name)} part of your request in time. Please ask again.")
+    for name in result.failed:
+        sections.append(f"I ran into a problem with the {agent_label(name)} part of your request. Please try again.")
+    return RESPONSE_SEPARATOR.join(sections)
+
+
+def agent_thread(thread_id: str, agent_name: str, agent_count: int) -> str:
+    """Checkpoint thread an agent uses for a message routed to `agent_count` agents."""
+    return thread_id if agent_count == 1 else f"{thread_id}_{agent_name}"
+
+
+def run_agents(
+    agents: Dict[str, Any],
+    agent_names: Sequence[str],
+    user_message: str,
+    thread_id: str,
+    timeout: float = GATEWAY_FANOUT_TIMEOUT
+) -> str:
+    """
+    Send a message to several agents at once and return their merged reply.
+
+    A message routed to a single agent uses the conversation's thread_id, as
+    the agents always did, so existing conversations keep their history. When
+    several agents run at once, each uses its own checkpoint thread,
+    `<thread_id>_<agent name>`, so concurrent agents never write to the same
+    one. Those threads start empty and only hold the multi-agent turns.
+
+    Args:
+        agents: Agents with a `call_llm(user_message, thread_id)` method, by name
+        agent_names: Names of the agents to run, in routing order
+        user_message: The user's message
+        thread_id: The conversation's thread ID
+        timeout: Seconds to wait for all agents
+
+    Returns:
+        The merged reply
+    """
+    def call(name: str) -> Callable[[], str]:
+        agent, agent_thread_id = agents[name], agent_thread(thread_id, name, len(agent_names))
+        return lambda: agent.call_llm(user_message, agent_thread_id)
+
+    calls = {name: call(name) for name in agent_names}
+    with observe("gateway_fanout", agent="Gateway"):
+        result = fan_out(calls, timeout=timeout)
+    return merge_responses(result)
@@ -0,0 +1,343 @@
+"""
+Local routing tiers for the GatewayAgent.
+
+Most messages name their domain outright ("order biryani", "reply to John's
+email"), so asking the LLM to set the gateway's flags only pays off for the
+ambiguous ones. `TieredRouter` first tries keyword rules and a small
+hashed-feature linear model trained on the LLM's past decisions, and only
+calls the LLM classifier when they are not confident.
+
+No model ships with the repository: it is trained on a deployment's own
+traffic, and until GATEWAY_ROUTER_MODEL points at one the keyword rules
+decide alone. To add the model, collect the routing log by setting
+GATEWAY_ROUTING_LOG, then train it with:
+
+    python -m app.agents.gateway_router train routing_log.jsonl gateway_router.npz
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple, Type
+
+import numpy as np
+
+from app.common.metrics import Counter, registry
+
+# Minimum confidence (probability of the chosen value, for every flag) to skip the LLM
+GATEWAY_ROUTER_THRESHOLD = float(os.environ.get("GATEWAY_ROUTER_THRESHOLD", 0.85))
+# Trained linear model (see `train`); the rules are used alone when unset or missing
+GATEWAY_ROUTER_MODEL = os.environ.get("GATEWAY_ROUTER_MODEL", "gateway_router.npz")
+# LLM routing decisions are appended here as training data when set. The log
+# holds users' messages, so it is off by default and rotated to `<path>.1` once
+# it reaches GATEWAY_ROUTING_LOG_MAX_BYTES
+GATEWAY_ROUTING_LOG = os.environ.get("GATEWAY_ROUTING_LOG", "")
+GATEWAY_ROUTING_LOG_MAX_BYTES = int(os.environ.get("GATEWAY_ROUTING_LOG_MAX_BYTES", 20 * 1024 * 1024))
+GATEWAY_LOCAL_ROUTING = os.environ.get("GATEWAY_LOCAL_ROUTING", "true").lower() == "true"
+
+GATEWAY_ROUTES = registry.register(Counter(
+    "dash_gateway_routes_total", "Gateway routing decisions by the tier that made them", ["tier"]
+))
+
+# Keyword rules per gateway flag. A match sets the flag; they are meant to be
+# precise rather than complete, the model and the LLM handle the rest.
+ROUTING_RULES: Dict[str, List[str]] = {
+    "is_related_to_email": [
+        r"\be-?mails?\b", r"\binbox\b", r"\bgmail\b", r"\boutlook\b", r"\bunread\b",
+    ],
+    "is_related_to_dineout_restaurant": [
+        r"\b(book|reserve|reservation)\b.*\b(table|restaurant|dinner|lunch|brunch)\b",
+        r"\btable for\b", r"\bdine[ -]?out\b", r"\bdining out\b",
+        r"\b(eat|dinner|lunch) out\b",
+    ],
+    "is_related_to_online_order_restaurant": [
+        r"\b(order|deliver|delivery)\b.*\b(food|pizza|biryani|burger|sushi|noodles|dinner|lunch|meal|dish|dishes)\b",
+        r"\b(order|get)\b \w+ (from|for delivery)\b",
+        r"\bfood delivery\b", r"\bi'?m hungry\b", r"\bi want to eat\b", r"\border (some )?(biryani|pizza|burgers?|sushi)\b",
+    ],
+    "contains_rememberable_information": [
+        r"\bremember\b", r"\bdon'?t forget\b", r"\bnote that\b", r"\bmy (birthday|anniversary|address) is\b",
+        r"\bi (am allergic|prefer|like|love|hate|don'?t like)\b", r"\bcall me\b",
+    ],
+    "is_related_to_whatsapp": [r"\bwhats ?app\b", r"\bwa group\b"],
+    "is_related_to_slack": [r"\bslack\b", r"\bslack status\b"],
+    # These only send the message to the LLM, which alone sets the flag
+    "is_attempting_prompt_injection": [
+        r"\bignore (all |any )?(the )?(previous|prior|above) (instructions|prompts?)\b",
+        r"\b(system|developer) prompt\b", r"\byou are now\b", r"\bjailbreak\b",
+        r"\bdisregard (your|all|the) (rules|instructions)\b",
+    ],
+}
+
+# Flags only the LLM classifier may decide
+LLM_ONLY_FLAGS = ("is_attempting_prompt_injection",)
+
+_TOKEN_RE = re.compile(r"[a-z0-9#']+")
+
+
+def features(message: str) -> List[str]:
+    """Word unigrams and bigrams of a message."""
+    words = _TOKEN_RE.findall(message.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class RuleRouter:
+    """Sets gateway flags from keyword rules."""
+
+    def __init__(self, rules: Dict[str, List[str]] = ROUTING_RULES):
+        self.rules: Dict[str, List[Pattern]] = {
+            field: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for field, patterns in rules.items()
+        }
+
+    def match(self, message: str) -> Dict[str, bool]:
+        """Return the flags whose rules match the message."""
+        return {
+            field: True
+            for field, patterns in self.rules.items()
+            if any(pattern.search(message) for pattern in patterns)
+        }
+
+
+class HashedLinearRouter:
+    """
+    One logistic regression per gateway flag over hashed word and bigram
+    features, trained on routing decisions the LLM made.
+    """
+
+    def __init__(self, fields: Sequence[str], n_features: int = 2 ** 16):
+        """
+        Initialize an untrained model.
+
+        Args:
+            fields: Names of the flags to predict
+            n_features: Size of the hashed feature space
+        """
+        self.fields = list(fields)
+        self.n_features = n_features
+        self.weights = np.zeros((len(self.fields), n_features), dtype=np.float32)
+        self.bias = np.zeros(len(self.fields), dtype=np.float32)
+
+    def _indices(self, message: str) -> np.ndarray:
+        return np.unique(np.array(
+            [zlib.crc32(feature.encode()) % self.n_features for feature in features(message)],
+            dtype=np.int64
+        ))
+
+    def predict(self, message: str) -> Dict[str, float]:
+        """Return the probability of each flag being set."""
+        indices = self._indices(message)
+        scores = self.weights[:, indices].sum(axis=1) + self.bias
+        probabilities = 1 / (1 + np.exp(-scores))
+        return dict(zip(self.fields, probabilities.tolist()))
+
+    def train(
+        self,
+        examples: Sequence[Tuple[str, Dict[str, bool]]],
+        epochs: int = 10,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        seed: int = 0
+    ) -> None:
+        """
+        Fit the model with stochastic gradient descent.
+
+        Args:
+            examples: (message, flags) pairs, e.g. from the routing log
+            epochs: Passes over the examples
+            learning_rate: SGD step size
+            l2: L2 regularisation strength
+            seed: Seed for shuffling the examples
+        """
+        rng = np.random.default_rng(seed)
+        encoded = [
+            (self._indices(message), np.array([float(labels.get(field, False)) for field in self.fields]))
+            for message, labels in examples
+        ]
+        for _ in range(epochs):
+            for i in rng.permutation(len(encoded)):
+                indices, targets = encoded[i]
+                scores = self.weights[:, indices].sum(axis=1) + self.bias
+                error = (1 / (1 + np.exp(-scores)) - targets).astype(np.float32)
+                self.weights[:, indices] -= learning_rate * (
+                    error[:, None] + l2 * self.weights[:, indices]
+                )
+                self.bias -= learning_rate * error
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path, weights=self.weights, bias=self.bias, fields=np.array(self.fields)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "HashedLinearRouter":
+        data = np.load(path)
+        model = cls([str(field) for field in data["fields"]], n_features=data["weights"].shape[1])
+        model.weights = data["weights"]
+        model.bias = data["bias"]
+        return model
+
+
+class TieredRouter:
+    """
+    Decides the gateway flags locally when it can and asks the LLM otherwise.
+
+    A flag whose rule matches is set. The remaining flags take the linear
+    model's probability; without a model they are unset if a rule matched
+    another flag (the message was recognised), and unknown (0.5) otherwise.
+    The decision is local when every flag's probability of its chosen value
+    is at least `threshold`. Flags in `llm_only` are never set locally: a
+    rule match or a model prediction for one sends the message to the LLM.
+    Decisions made by the LLM are appended to `log_path` as training data for
+    the model, up to `log_max_bytes` per file.
+    """
+
+    def __init__(
+        self,
+        meta_schema: Type[Any],
+        rules: Optional[RuleRouter] = None,
+        model: Optional[HashedLinearRouter] = None,
+        threshold: float = GATEWAY_ROUTER_THRESHOLD,
+        log_path: Optional[str] = GATEWAY_ROUTING_LOG,
+        log_max_bytes: int = GATEWAY_ROUTING_LOG_MAX_BYTES,
+        llm_only: Sequence[str] = LLM_ONLY_FLAGS
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            meta_schema: Pydantic model of the gateway flags (GatewayMetaSchema)
+            rules: Keyword rules; defaults to ROUTING_RULES
+            model: Trained linear model, if any
+            threshold: Minimum confidence to skip the LLM
+            log_path: JSON lines file LLM decisions are appended to
+            log_max_bytes: Size at which the log is rotated to `<log_path>.1`
+            llm_only: Flags only the LLM may set
+        """
+        self.meta_schema = meta_schema
+        self.fields = list(meta_schema.model_fields)
+        self.rules = rules or RuleRouter()
+        self.model = model
+        self.threshold = threshold
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self.llm_only = set(llm_only)
+        self._log_lock = threading.Lock()
+
+    def local_decision(self, message: str) -> Tuple[Dict[str, bool], float, str]:
+        """
+        Decide the flags without the LLM.
+
+        Returns:
+            The flags, the confidence (lowest probability of a chosen value) and
+            the tier that decided ("rules" or "model")
+        """
+        matched = self.rules.match(message)
+        predicted = self.model.predict(message) if self.model is not None else {}
+        # A match for a flag the rules may set means the message was recognised
+        recognised = any(field not in self.llm_only for field in matched)
+        flags, confidence = {}, 1.0
+        for field in self.fields:
+            if matched.get(field):
+                probability = 1.0
+            elif field in predicted:
+                probability = predicted[field]
+            else:
+                probability = 0.0 if recognised else 0.5
+            if field in self.llm_only and probability >= 0.5:
+                probability = 0.5
+            flags[field] = probability > 0.5
+            confidence = min(confidence, max(probability, 1 - probability))
+        return flags, confidence, "model" if predicted else "rules"
+
+    def route(self, message: str, classify: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        Get the gateway flags for a message.
+
+        Args:
+            message: The user's message
+            classify: Calls the LLM classifier and returns a `meta_schema` instance
+
+        Returns:
+            The flags as a `meta_schema` instance and the tier that decided
+            ("rules", "model" or "llm")
+        """
+        flags, confidence, tier = self.local_decision(message)
+        if confidence >= self.threshold:
+            GATEWAY_ROUTES.inc(tier=tier)
+            return self.meta_schema(**flags), tier
+
+        meta = classify()
+        GATEWAY_ROUTES.inc(tier="llm")
+        self._log(message, meta)
+        return meta, "llm"
+
+    def _log(self, message: str, meta: Any) -> None:
+        if not self.log_path:
+            return
+        labels = {field: bool(getattr(meta, field, False)) for field in self.fields}
+        with self._log_lock:
+            try:
+                if os.path.getsize(self.log_path) >= self.log_max_bytes:
+                    os.replace(self.log_path, self.log_path + ".1")
+            except FileNotFoundError:
+                pass
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"message": message, "labels": labels}) + "\n")
+
+
+def read_routing_log(path: str) -> List[Tuple[str, Dict[str, bool]]]:
+    """Read the (message, flags) pairs logged by `TieredRouter`."""
+    examples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                examples.append((entry["message"], entry["labels"]))
+    return examples
+
+
+def train(log_paths: Iterable[str], output_path: str, epochs: int = 10) -> HashedLinearRouter:
+    """Train the linear model on routing logs and save it."""
+    examples = [example for path in log_paths for example in read_routing_log(path)]
+    if not examples:
+        raise ValueError("No routing decisions to train on")
+    model = HashedLinearRouter(list(ROUTING_RULES))
+    model.train(examples, epochs=epochs)
+    model.save(output_path)
+    return model
+
+
+def load_router(meta_schema: Type[Any]) -> Optional[TieredRouter]:
+    """
+    Create the router from the environment settings.
+
+    Returns:
+        The router, or None if local routing is disabled
+    """
+    if not GATEWAY_LOCAL_ROUTING:
+        return None
+    model = None
+    if GATEWAY_ROUTER_MODEL and os.path.exists(GATEWAY_ROUTER_MODEL):
+        model = HashedLinearRouter.load(GATEWAY_ROUTER_MODEL)
+    return TieredRouter(meta_schema, model=model)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the gateway's local routing model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train from routing logs")
+    train_parser.add_argument("logs", nargs="+", help="Routing log files (JSON lines)")
+    train_parser.add_argument("output", help="Where to save the model (.npz)")
+    train_parser.add_argument("--epochs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    model = train(args.logs, args.output, epochs=args.epochs)
+    print(f"Trained on {len(model.fields)} flags, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
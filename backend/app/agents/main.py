@@ -21,6 +21,9 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
 from app.common.utils import safely_check_interrupts
+from app.common.agent_cache import get_agent_cache
+from app.common.agent_streaming import run_agent_graph
+from app.common.metrics import agent_call
 from app.agents.whatsapp.prompts import PRIVATE_AQL_GENERATION_PROMPT
 from app.common.prompts import PUBLIC_AQL_GENERATION_PROMPT
 
@@ -62,6 +65,9 @@ from app.agents.dineout.prompts import RESTAURANT_AQL_GENERATION_TEMPLATE as DIN
 from app.agents.email_agent.prompts import EMAIL_ANALYSIS_PROMPT as EMAIL_PRIVATE_AQL_PROMPT
 from app.agents.slack.prompts import PRIVATE_AQL_GENERATION_PROMPT as SLACK_PRIVATE_AQL_PROMPT
 
+from app.db import get_user_db
+from langchain_community.graphs import ArangoGraph
+
 # Prompts for AQL generatio
 class MainAgent:
     """Main agent with combined tools from all specialized agents."""
@@ -199,6 +205,7 @@ class MainAgent:
             checkpointer=self.checkpointer
         )
 
+    @agent_call("Main_Agent")
     def call_llm(self, user_message: str, thread_id: Optional[str] = None) -> str:
         """
         Process a user message and return the agent's response.
@@ -220,11 +227,8 @@ class MainAgent:
         else:
             inputs = {"messages": [HumanMessage(content=user_message)]}
         
-        # Get the final response
-        result = self.agent_graph.invoke(inputs, config)
-        final_message = result["messages"][-1]
-        
-        return final_message.content
+        # Get the final response, streaming it to the client if requested
+        return run_agent_graph(self.agent_graph, inputs, config)
 
     def run_interactive(self, thread_id: str, debug=False):
         """
@@ -276,6 +280,48 @@ class MainAgent:
         except Exception as e:
             console.print(f"\nAn error occurred: {str(e)}", style="bold red")
 
+def get_main_agent(
+    user_id: str,
+    model: BaseChatModel,
+    checkpointer: BaseCheckpointSaver,
+    public_db,
+    confirmation_callback: Callable = None
+) -> MainAgent:
+    """
+    Get the MainAgent for a user, building it on first use.
+
+    Agents are kept in the process-wide agent cache (see app.common.agent_cache),
+    so only a user's first turn, or the first after their agent was evicted,
+    pays for connecting to their database and creating the tools.
+    
+    Args:
+        user_id: ID of the user whose private database the agent uses
+        model: The LLM model to use
+        checkpointer: The checkpointer to use for conversation history
+        public_db: ArangoGraph instance for the public database
+        confirmation_callback: Callback for human confirmation; it is bound when
+            the agent is built, so it must not depend on the request
+    
+    Returns:
+        The user's MainAgent
+    """
+    user_db = get_user_db(user_id)
+    if user_db is None:
+        raise ValueError(f"Database for user {user_id} not found")
+
+    def build():
+        return MainAgent(
+            checkpointer=checkpointer,
+            model=model,
+            private_db=ArangoGraph(user_db),
+            public_db=public_db,
+            confirmation_callback=confirmation_callback
+        )
+
+    # Shared resources are not counted in the agent's memory
+    shared = (model, checkpointer, public_db, public_db.db, user_db)
+    return get_agent_cache().get((str(user_id), "Main_Agent"), build, shared=shared)
+
 if __name__ == "__main__":
     from app.common.llm_manager import LLMManager
     from arango import ArangoClient
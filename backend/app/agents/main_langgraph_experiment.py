@@ -1,6 +1,5 @@
 from typing import TypedDict, Annotated
 import operator
-import functools
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
@@ -13,40 +12,65 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
-from app.agents.email_agent.user_facing_agent import EmailAgent
-from app.agents.foodorder.food_ordering_agent import FoodOrderingAgent
-from app.agents.dineout.restaurant_agent import RestaurantAgent 
-from app.agents.whatsapp.user_facing_agent import WhatsAppAgent
-from app.agents.slack.user_facing_agent import SlackAgent
-
 from app.common.llm_manager import LLMManager
+from app.common.metrics import observe
+from app.agents.gateway_router import load_router
+from app.agents.gateway_fanout import GATEWAY_FANOUT_TIMEOUT, run_agents
+from app.agents.registry import AgentRegistry, LazyResource, warm_up_in_background
 from langchain_community.graphs import ArangoGraph
 from arango import ArangoClient
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
+import threading
+from app.common.checkpointer import CHECKPOINT_DB_PATH, get_checkpointer
 import uuid
 
-model = LLMManager.get_openai_model(model_name="gpt-4o")
+GATEWAY_MODEL = os.environ.get("GATEWAY_MODEL", "gpt-4o")
+GATEWAY_ARANGO_URL = os.environ.get("GATEWAY_ARANGO_URL", "http://localhost:8529")
+GATEWAY_ARANGO_USERNAME = os.environ.get("GATEWAY_ARANGO_USERNAME", "root")
+GATEWAY_ARANGO_PASSWORD = os.environ.get("GATEWAY_ARANGO_PASSWORD", "zxcv")
+GATEWAY_PRIVATE_DB = os.environ.get("GATEWAY_PRIVATE_DB", "user_1235")
+GATEWAY_PUBLIC_DB = os.environ.get("GATEWAY_PUBLIC_DB", "common_db")
+GATEWAY_CHECKPOINTS_PATH = os.environ.get("GATEWAY_CHECKPOINTS_PATH", CHECKPOINT_DB_PATH)
 
-# Create a direct sqlite connection instead of using SQLAlchemy
-conn = sqlite3.connect("checkpoints.sqlite", check_same_thread=False)
-memory = SqliteSaver(conn)
+# Nothing below connects or builds anything until the first message needs it
+model = LazyResource(lambda: LLMManager.get_openai_model(model_name=GATEWAY_MODEL))
 
-db_client = ArangoClient(hosts="http://localhost:8529")
-private_db = ArangoGraph(db_client.db("user_1235", username="root", password="zxcv", verify=True))
-public_db = ArangoGraph(db_client.db("common_db", username="root", password="zxcv", verify=True))
+# WAL-mode SQLite with a connection per thread and old checkpoints pruned in the background
+memory = LazyResource(lambda: get_checkpointer(GATEWAY_CHECKPOINTS_PATH))
 
-email_agent = EmailAgent(checkpointer=memory, model=model, private_db=private_db, public_db=public_db)
-food_ordering_agent = FoodOrderingAgent(checkpointer=memory, model=model, private_db=private_db, public_db=public_db)
-restaurant_agent = RestaurantAgent(checkpointer=memory, model=model, private_db=private_db, public_db=public_db)
-whatsapp_agent = WhatsAppAgent(checkpointer=memory, model=model, private_db=private_db, public_db=public_db)
-slack_agent = SlackAgent(checkpointer=memory, model=model, private_db=private_db, public_db=public_db)  
+db_client = LazyResource(lambda: ArangoClient(hosts=GATEWAY_ARANGO_URL))
+private_db = LazyResource(lambda: ArangoGraph(db_client.get().db(
+    GATEWAY_PRIVATE_DB, username=GATEWAY_ARANGO_USERNAME, password=GATEWAY_ARANGO_PASSWORD, verify=True
+)))
+public_db = LazyResource(lambda: ArangoGraph(db_client.get().db(
+    GATEWAY_PUBLIC_DB, username=GATEWAY_ARANGO_USERNAME, password=GATEWAY_ARANGO_PASSWORD, verify=True
+)))
 
+def _agent_resources():
+    return dict(checkpointer=memory.get(), model=model.get(), private_db=private_db.get(), public_db=public_db.get())
 
-from pydantic import BaseModel, Field
-from langgraph.checkpoint.memory import MemorySaver
+# Agent modules are imported on first use too, they pull in their tools and prompts
+def create_email_agent():
+    from app.agents.email_agent.user_facing_agent import EmailAgent
+    return EmailAgent(**_agent_resources())
+
+def create_food_ordering_agent():
+    from app.agents.foodorder.food_ordering_agent import FoodOrderingAgent
+    return FoodOrderingAgent(**_agent_resources())
+
+def create_restaurant_agent():
+    from app.agents.dineout.restaurant_agent import RestaurantAgent
+    return RestaurantAgent(**_agent_resources())
 
-memory = MemorySaver()
+def create_whatsapp_agent():
+    from app.agents.whatsapp.user_facing_agent import WhatsAppAgent
+    return WhatsAppAgent(**_agent_resources())
+
+def create_slack_agent():
+    from app.agents.slack.user_facing_agent import SlackAgent
+    return SlackAgent(**_agent_resources())
+
+
+from pydantic import BaseModel, Field
 
 class GatewayMetaSchema(BaseModel):
     """
@@ -79,64 +103,47 @@ class GatewayMetaSchema(BaseModel):
 class GatewayAgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
     meta: GatewayMetaSchema
+    config: dict
 
-# Dummy agent that now prints its thread_id from config before returning
+# Dummy agent that now prints its thread_id before returning
 class DummyAgent:
     def __init__(self, name):
         self.name = name
 
-    def call_llm(self, state: GatewayAgentState):
-        # Extract config from state and get the thread_id
-        config = state.get("config", {})
-        thread_id = config.get("configurable", {}).get("thread_id", "default_thread_id")
+    def call_llm(self, user_message: str, thread_id: str) -> str:
         print(f"Agent: {self.name} using thread id: {thread_id}")
-        return {"messages": [AIMessage(content=f"Agent: {self.name} using thread id: {thread_id}")]}
-
-# Define agent nodes and update state config with agent-specific thread_id
-def agent_node(state, agent):
-    # Override the config's thread id for this agent
-    user_message = state["messages"][-1].content
-    thread_id = state.get("config", {}).get("configurable", {}).get("thread_id", "default_thread_id")
-    result = agent.call_llm(user_message, thread_id)
-    return result
+        return f"Agent: {self.name} using thread id: {thread_id}"
 
 # Define the GatewayAgent
 class GatewayAgent:
-    def __init__(self, model, prompt, debug=False):
+    def __init__(self, model, prompt, debug=False, router=None, fanout_timeout=GATEWAY_FANOUT_TIMEOUT, agents=None):
         self.prompt = prompt
         self.model = model
         self.debug = debug
-
-        # Create dummy agents for each type
-        self.agents = {
-            "Email_Agent": email_agent,
-            "Dineout_Restaurant_Agent": restaurant_agent,
-            "Online_Order_Restaurant_Agent": food_ordering_agent,
-            "Memory_Agent": DummyAgent("Memory Agent"),
-            "WhatsApp_Agent": whatsapp_agent,
-            "Slack_Agent": slack_agent,
-            "Safety_Agent": DummyAgent("Safety Agent"),
-            "Default_Agent": DummyAgent("Default Agent")
-        }
+        # Shared deadline for the agents a message is routed to
+        self.fanout_timeout = fanout_timeout
+        # Local rules/model tier that skips the LLM classifier for obvious messages
+        self.router = router if router is not None else load_router(GatewayMetaSchema)
+
+        # Agents are built the first time a message is routed to them
+        self.agents = agents if agents is not None else AgentRegistry({
+            "Email_Agent": create_email_agent,
+            "Dineout_Restaurant_Agent": create_restaurant_agent,
+            "Online_Order_Restaurant_Agent": create_food_ordering_agent,
+            "Memory_Agent": lambda: DummyAgent("Memory Agent"),
+            "WhatsApp_Agent": create_whatsapp_agent,
+            "Slack_Agent": create_slack_agent,
+            "Safety_Agent": lambda: DummyAgent("Safety Agent"),
+            "Default_Agent": lambda: DummyAgent("Default Agent")
+        })
 
         gateway_graph = StateGraph(GatewayAgentState)
         gateway_graph.add_node("Gateway", self.gateway)
+        # Runs the routed agents concurrently and merges their replies
+        gateway_graph.add_node("Fan_Out", self.fan_out)
 
-        # Add agent nodes
-        for agent_name in self.agents:
-            gateway_graph.add_node(agent_name, functools.partial(agent_node, agent=self.agents[agent_name]))
-
-        # Define the routing based on meta data flags
-        gateway_graph.add_conditional_edges(
-            "Gateway",
-            self.find_route,
-            {agent_name: agent_name for agent_name in self.agents}
-        )
-        gateway_graph.add_edge("Gateway", END)
-
-        # Agents lead to END
-        for agent_name in self.agents:
-            gateway_graph.add_edge(agent_name, END)
+        gateway_graph.add_edge("Gateway", "Fan_Out")
+        gateway_graph.add_edge("Fan_Out", END)
 
         # Set the starting point
         gateway_graph.set_entry_point("Gateway")
@@ -157,11 +164,15 @@ User Message: {user_message}
 
         # Extract config from state for the main thread (should only contain thread_id)
         config = state.get("config", {})
-        meta_data = self.model.invoke([SystemMessage(content=prompt)], config=config)
+        classify = lambda: self.model.invoke([SystemMessage(content=prompt)], config=config)
+        with observe("gateway", agent="Gateway"):
+            if self.router is not None:
+                meta_data, tier = self.router.route(user_message, classify)
+            else:
+                meta_data, tier = classify(), "llm"
         if self.debug:
-            print(f"Gateway meta data: {meta_data}")
-        state["meta"] = meta_data
-        return state
+            print(f"Gateway meta data ({tier}): {meta_data}")
+        return {"meta": meta_data}
 
     def find_route(self, state: GatewayAgentState):
         meta = state["meta"]
@@ -184,18 +195,68 @@ User Message: {user_message}
         print(f"Routing to agents: {agents}")
         return agents
 
-# Start Generation Here
-if __name__ == "__main__":
-
-    # Instantiate the model with structured output
-    model = ChatOpenAI(temperature=0, model_name="gpt-4o")
-    model_with_structure = model.with_structured_output(GatewayMetaSchema)
+    def process_message(self, message: str, thread_id: str, user_id=None) -> str:
+        """
+        Route a user message to the agents and return the merged reply.
+
+        Args:
+            message: The user's message
+            thread_id: The conversation's thread ID
+            user_id: The user who sent it (the agents use the configured private database)
+
+        Returns:
+            The reply
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        state = {"messages": [HumanMessage(content=message)], "config": config}
+        response = self.gateway_graph.invoke(state)
+        return response["messages"][-1].content
+
+    def fan_out(self, state: GatewayAgentState):
+        """Run the routed agents with a shared deadline and reply with their merged responses."""
+        user_message = state["messages"][-1].content
+        thread_id = state.get("config", {}).get("configurable", {}).get("thread_id", "default_thread_id")
+        response = run_agents(
+            self.agents, self.find_route(state), user_message, thread_id, timeout=self.fanout_timeout
+        )
+        return {"messages": [AIMessage(content=response)]}
 
-    gateway_prompt = """
+GATEWAY_PROMPT = """
 You are an assistant that extracts meta data from the user's message according to the specified schema.
 """
 
-    gateway_agent = GatewayAgent(model=model_with_structure, prompt=gateway_prompt, debug=True)
+def create_gateway_agent(debug=False) -> GatewayAgent:
+    """Create a GatewayAgent; its agents, databases and checkpointer are set up on first use."""
+    model_with_structure = ChatOpenAI(temperature=0, model_name=GATEWAY_MODEL).with_structured_output(GatewayMetaSchema)
+    return GatewayAgent(model=model_with_structure, prompt=GATEWAY_PROMPT, debug=debug)
+
+_gateway_agent = None
+_gateway_agent_lock = threading.Lock()
+
+def get_gateway_agent() -> GatewayAgent:
+    """Get or create the process-wide GatewayAgent"""
+    global _gateway_agent
+    with _gateway_agent_lock:
+        if _gateway_agent is None:
+            _gateway_agent = create_gateway_agent(debug=bool(os.environ.get('DEBUG', False)))
+        return _gateway_agent
+
+def warm_up_gateway_agent(port=None) -> threading.Thread:
+    """
+    Build the GatewayAgent and all of its agents in a background thread.
+
+    Args:
+        port: If given, start once the server accepts connections on this port
+
+    Returns:
+        The warm-up thread
+    """
+    return warm_up_in_background(lambda: get_gateway_agent().agents.warm_up(), port=port)
+
+# Start Generation Here
+if __name__ == "__main__":
+
+    gateway_agent = create_gateway_agent(debug=True)
 
     while True:
         user_input = input("You: ")
@@ -0,0 +1,121 @@
+"""Agents and shared resources that are built on first use instead of at import."""
+
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, Mapping, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource(Generic[T]):
+    """A value (model, database handle, checkpointer) created on first `get`, once across threads."""
+
+    def __init__(self, build: Callable[[], T]):
+        self._build = build
+        self._value: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def get(self) -> T:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._build()
+                    self._built = True
+        return self._value
+
+
+class AgentRegistry(Mapping[str, Any]):
+    """
+    Agents by name, each built by its factory the first time it is looked up.
+
+    A message routed to one agent only pays for building that agent; the
+    others are built when first needed or by `warm_up`.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]]):
+        """
+        Initialize the registry without building anything.
+
+        Args:
+            factories: Function building each agent, by agent name
+        """
+        self._agents = {name: LazyResource(factory) for name, factory in factories.items()}
+
+    def __getitem__(self, name: str) -> Any:
+        return self._agents[name].get()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._agents)
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def is_built(self, name: str) -> bool:
+        return self._agents[name].built
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Build agents ahead of their first message.
+
+        Args:
+            names: Agents to build; defaults to all. An agent that fails to
+                build is logged and skipped, it is retried on first use.
+        """
+        for name in names if names is not None else list(self._agents):
+            try:
+                start = time.monotonic()
+                self[name]
+                logger.info(f"Built {name} in {time.monotonic() - start:.2f}s")
+            except Exception:
+                logger.exception(f"Failed to build {name}")
+
+
+def wait_for_port(port: int, host: str = "127.0.0.1", timeout: float = 60, interval: float = 0.2) -> bool:
+    """
+    Wait until something accepts connections on a port.
+
+    Returns:
+        True once the port accepts a connection, False after `timeout` seconds
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=interval):
+                return True
+        except OSError:
+            time.sleep(interval)
+    return False
+
+
+def warm_up_in_background(warm_up: Callable[[], None], port: Optional[int] = None) -> threading.Thread:
+    """
+    Run a warm-up function in a daemon thread.
+
+    Args:
+        warm_up: Function building whatever should be ready before the first request
+        port: If given, wait until the server accepts connections on this port
+            so warming up does not delay the server's start
+
+    Returns:
+        The started thread
+    """
+    def run():
+        if port is not None and not wait_for_port(port):
+            logger.warning(f"Server did not start listening on port {port}; warming up anyway")
+        try:
+            warm_up()
+        except Exception:
+            logger.exception("Warm-up failed")
+
+    thread = threading.Thread(target=run, name="agent-warm-up", daemon=True)
+    thread.start()
+    return thread
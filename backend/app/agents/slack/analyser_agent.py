@@ -25,8 +25,10 @@ class SlackAnalyzer(BaseGraphConsumer):
     """
     A Celery consumer that analyzes Slack messages for spam, urgency, and importance.
     It reuses our graph nodes (contacts, slack_channels, slack_messages, identifiers)
-    and adds extra analysis nodes.
+    and adds extra analysis nodes, skipping them if their collections are missing.
     """
+    create_collections = False
+
     def __init__(
         self, 
         model_provider: str = "openai", 
@@ -41,11 +43,12 @@ class SlackAnalyzer(BaseGraphConsumer):
         Initialize the SlackAnalyzer.
         """
         super().__init__()
-        self.llm = LLMManager.get_model(
+        self.llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=AnalysisResult,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(AnalysisResult)
+        )
         
         self.spam_threshold = spam_threshold
         self.urgent_threshold = urgent_threshold
@@ -72,65 +75,18 @@ Provide scores and reasoning in your response.
         response = self.llm.invoke([{"role": "user", "content": prompt}])
         return response
     
-    def _add_analysis_identifier(self, db, analysis_type: str, analysis_data: Dict[str, Any]) -> str:
-        """
-        Add an analysis result document to the database.
-        """
-        if not db.has_collection(ANALYSIS_COLLECTION):
-            return None
-        
-        analysis_doc = {
-            "type": analysis_type,
-            "score": analysis_data.get("score", 0),
-            "reason": analysis_data.get("reason", ""),
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        
-        result = db.collection(ANALYSIS_COLLECTION).insert(analysis_doc)
-        return result["_id"]
-    
-    def _add_edge(self, db, from_id: str, to_id: str, collection_name: str, data: Dict[str, Any] = None) -> str:
-        """
-        Add an edge between two vertices if it doesn't already exist.
-        """
-        if not db.has_collection(collection_name):
-            return None
-        
-        # Ensure from_id and to_id are in the correct "<collection>/<key>" format.
-        if "/" not in from_id or "/" not in to_id:
-            return None
-        
-        aql = f"""
-        FOR edge IN {collection_name}
-          FILTER edge._from == @from_id AND edge._to == @to_id
-          RETURN edge._id
-        """
-        cursor = db.aql.execute(aql, bind_vars={"from_id": from_id, "to_id": to_id})
-        edge_id = cursor.next() if cursor.has_more() else None
-        
-        if edge_id:
-            return edge_id
-        
-        edge_doc = {
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        if data:
-            edge_doc.update(data)
-        
-        result = db.collection(collection_name).insert(edge_doc)
-        return result["_id"]
-
     def process_message(
         self,
         user_id: str,
         message_data: Dict[str, Any],
         identifiers: List[str],
-        message_id: Optional[str] = None
+        message_id: Optional[str] = None,
+        analysis_result: Optional[AnalysisResult] = None
     ) -> Dict[str, Any]:
         """
         Process and analyze a Slack message.
+        
+        An analysis_result from the fused analysis call skips the analysis call.
         """
         try:
             db = get_user_db(user_id)
@@ -143,47 +99,28 @@ Provide scores and reasoning in your response.
             
             
             # Analyze the message.
-            analysis_result = self.analyze_message(content, identifiers)
-            
-            # Add analysis results to the database.
-            spam_analysis_id = self._add_analysis_identifier(db, "spam", {
-                "score": analysis_result.spam_score,
-                "reason": analysis_result.reason
-            })
-            urgent_analysis_id = self._add_analysis_identifier(db, "urgent", {
-                "score": analysis_result.urgency_score,
-                "reason": analysis_result.reason
-            })
-            important_analysis_id = self._add_analysis_identifier(db, "important", {
-                "score": analysis_result.importance_score,
-                "reason": analysis_result.reason
-            })
+            if analysis_result is None:
+                analysis_result = self.analyze_message(content, identifiers)
             
-            # Link analyses to the message.
-            if spam_analysis_id:
-                self._add_edge(
-                    db,
-                    message_id,
-                    f"{spam_analysis_id}",
-                    SLACK_MESSAGE_ANALYSIS_EDGE_COLLECTION,
-                    {"type": "spam"}
-                )
-            if urgent_analysis_id:
-                self._add_edge(
-                    db,
-                    message_id,
-                    f"{urgent_analysis_id}",
-                    SLACK_MESSAGE_ANALYSIS_EDGE_COLLECTION,
-                    {"type": "urgent"}
-                )
-            if important_analysis_id:
-                self._add_edge(
-                    db,
-                    message_id,
-                    f"{important_analysis_id}",
-                    SLACK_MESSAGE_ANALYSIS_EDGE_COLLECTION,
-                    {"type": "important"}
-                )
+            # Add the analysis results and link them to the message in one batch.
+            now = datetime.datetime.now().isoformat()
+            with self.batch(db):
+                for analysis_type, score in (
+                    ("spam", analysis_result.spam_score),
+                    ("urgent", analysis_result.urgency_score),
+                    ("important", analysis_result.importance_score)
+                ):
+                    analysis_ref = self.add_node(ANALYSIS_COLLECTION, {
+                        "type": analysis_type,
+                        "score": score,
+                        "reason": analysis_result.reason,
+                        "created_at": now
+                    })
+                    # The analysis is new, so the edge cannot exist yet
+                    if message_id and "/" in message_id:
+                        self.add_edge(
+                            SLACK_MESSAGE_ANALYSIS_EDGE_COLLECTION, message_id, analysis_ref, {"type": analysis_type}
+                        )
             
             # Determine notification conditions.
             is_spam = analysis_result.spam_score >= self.spam_threshold
@@ -11,9 +11,13 @@ from app.db import get_system_db, get_user_db
 from app.agents.slack.consumer_agent import SlackConsumer
 from app.agents.slack.analyser_agent import SlackAnalyzer
 from app.agents.slack.analyser_agent import notify_message
+from app.agents.slack.schemas import AnalysisResult
+from app.common.message_insights import FUSED_MESSAGE_ANALYSIS
+from app.common.metrics import install_celery_metrics
 
 # Initialize Celery app
 celery_app = Celery('slack_processing', broker=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+install_celery_metrics()
 
 @celery_app.task(name="slack.process_message")
 def process_message(
@@ -22,7 +26,8 @@ def process_message(
     spam_threshold: float = 0.5,
     urgent_threshold: float = 0.7,
     important_threshold: float = 0.6,
-    notification_callback = notify_message
+    notification_callback = notify_message,
+    fused: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Process a Slack message from start to finish: extract identifiers and analyze.
@@ -34,17 +39,24 @@ def process_message(
         urgent_threshold: Threshold for urgency detection (0-1)
         important_threshold: Threshold for importance detection (0-1)
         notification_callback: Callback function for message notifications
+        fused: Extract identifiers and analysis in one LLM call instead of two
+            (defaults to FUSED_MESSAGE_ANALYSIS)
         
     Returns:
         A dictionary with the combined results of processing and analysis
     """
     try:
-        # Step 1: Extract identifiers using the SlackConsumer
+        if fused is None:
+            fused = FUSED_MESSAGE_ANALYSIS
+        
+        # Step 1: Extract identifiers using the SlackConsumer; in fused mode one LLM
+        # call returns both identifiers and analysis
         consumer = SlackConsumer()
-        consumer_result = consumer.process_message(user_id, message_data)
+        consumer_result = consumer.process_message(user_id, message_data, fused=fused)
         
         if consumer_result.get("status") != "success":
             return consumer_result
+        insights = consumer_result.pop("insights", None)
         
         identifiers = consumer_result.get("identifiers", [])
         message_id = consumer_result.get("message_id")
@@ -61,7 +73,8 @@ def process_message(
             user_id=user_id, 
             message_data=message_data, 
             identifiers=identifiers,
-            message_id=message_id
+            message_id=message_id,
+            analysis_result=insights.to_analysis_result(AnalysisResult) if insights else None
         )
         
         # Combine results
@@ -13,7 +13,8 @@ from app.agents.slack.analyser_agent import analyze_slack_message
 from app.db import get_system_db, get_user_db
 from app.agents.slack.schemas import Identifiers
 from app.common.llm_manager import LLMManager
-from arango.database import StandardDatabase
+from app.common.base_consumer import BaseGraphConsumer
+from app.common.message_insights import extract_message_insights
 
 # Initialize Celery app
 celery_app = Celery('slack', broker=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
@@ -28,7 +29,7 @@ IDENTIFIER_MESSAGE_EDGE_COLLECTION = "identifier__slack_message"
 CONTACT_MESSAGE_EDGE_COLLECTION = "contact__slack_message"
 CHANNEL_MESSAGE_EDGE_COLLECTION = "channel__slack_message"
 
-class SlackConsumer:
+class SlackConsumer(BaseGraphConsumer):
     """
     A simplified Celery consumer that processes Slack messages differently based on the payload flag:
     
@@ -36,14 +37,21 @@ class SlackConsumer:
       - If "is_channel" is False: only the contact (from the "from" field) is saved.
       
     The message document is then inserted with either a channel_id or sender_id accordingly.
+    Collections are provisioned with the user's database; missing ones are skipped.
     """
+    create_collections = False
+
     def __init__(self, model_provider: str = "openai", model_name: str = "gpt-4o-mini", temperature: float = 0):
+        super().__init__()
+        self.model_provider = model_provider
+        self.model_name = model_name
         # Initialize the LLM with structured output to extract identifiers.
-        self.llm = LLMManager.get_model(
+        self.llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=Identifiers,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(Identifiers)
+        )
     
     def extract_identifiers(self, message_content: str) -> List[str]:
         """
@@ -69,132 +77,21 @@ Message:
         response = self.llm.invoke([{"role": "user", "content": prompt}])
         return [identifier.lower() for identifier in response.identifiers]
 
-    def _add_contact(self, db: StandardDatabase, slack_username: str) -> Optional[str]:
-        """
-        Add or retrieve a contact by slack_username.
-        """
-        if not db.has_collection(CONTACTS_COLLECTION):
-            return None
-
-        aql = f"""
-        FOR contact IN {CONTACTS_COLLECTION}
-          FILTER contact.slack_username == "{slack_username}"
-          RETURN contact._id
-        """
-        cursor = db.aql.execute(aql)
-        contact_ids = list(cursor)
-        if contact_ids:
-            return contact_ids[0]
-
-        contact_doc = {
-            "slack_username": slack_username,
-            "created_at": datetime.datetime.now().isoformat(),
-            "active": True
-        }
-        result = db.collection(CONTACTS_COLLECTION).insert(contact_doc)
-        return result["_id"]
-
-    def _add_channel(self, db: StandardDatabase, channel_name: str) -> Optional[str]:
-        """
-        Add or retrieve a Slack channel.
-        """
-        if not db.has_collection(CHANNELS_COLLECTION):
-            return None
-
-        aql = f"""
-        FOR channel IN {CHANNELS_COLLECTION}
-          FILTER channel.name == "{channel_name}"
-          RETURN channel._id
-        """
-        cursor = db.aql.execute(aql)
-        channel_ids = list(cursor)
-        if channel_ids:
-            return channel_ids[0]
-
-        channel_doc = {
-            "name": channel_name,
-            "created_at": datetime.datetime.now().isoformat(),
-            "active": True
-        }
-        result = db.collection(CHANNELS_COLLECTION).insert(channel_doc)
-        return result["_id"]
-
-    def _add_message(self, db: StandardDatabase, message_data: Dict[str, Any],
-                     contact_id: Optional[str] = None, channel_id: Optional[str] = None) -> Optional[str]:
-        """
-        Add a message document that includes either a contact or a channel reference.
-        """
-        if not db.has_collection(MESSAGES_COLLECTION):
-            return None
-
-        message_doc = {
-            **message_data,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        if contact_id is not None:
-            message_doc["sender_id"] = contact_id
-        if channel_id is not None:
-            message_doc["channel_id"] = channel_id
-
-        result = db.collection(MESSAGES_COLLECTION).insert(message_doc)
-        return result["_id"]
-
-    def _add_identifier(self, db: StandardDatabase, identifier: str) -> Optional[str]:
-        """
-        Add or retrieve an identifier.
-        """
-        if not db.has_collection(IDENTIFIERS_COLLECTION):
-            return None
-
-        aql = f"""
-        FOR ident IN {IDENTIFIERS_COLLECTION}
-          FILTER ident.value == "{identifier}"
-          RETURN ident._id
-        """
-        cursor = db.aql.execute(aql)
-        identifier_ids = list(cursor)
-        if identifier_ids:
-            return identifier_ids[0]
-
-        identifier_doc = {
-            "value": identifier,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        result = db.collection(IDENTIFIERS_COLLECTION).insert(identifier_doc)
-        return result["_id"]
-
-    def _add_edge(self, db: StandardDatabase, from_id: str, to_id: str, collection_name: str) -> Optional[str]:
-        """
-        Add an edge between two vertices if it does not already exist.
-        """
-        if not db.has_collection(collection_name):
-            return None
-
-        aql = f"""
-        FOR edge IN {collection_name}
-          FILTER edge._from == "{from_id}" AND edge._to == "{to_id}"
-          RETURN edge._id
-        """
-        cursor = db.aql.execute(aql)
-        edge_ids = list(cursor)
-        if edge_ids:
-            return edge_ids[0]
-
-        edge_doc = {
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        result = db.collection(collection_name).insert(edge_doc)
-        return result["_id"]
-
-    def process_message(self, user_id: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
+    def process_message(self, user_id: str, message_data: Dict[str, Any],
+                        identifiers: Optional[List[str]] = None, fused: bool = False) -> Dict[str, Any]:
         """
         Process an incoming Slack message using the new payload structure:
         
           - "from": sender username
           - "to": either a channel name (if is_channel is True) or a recipient identifier (if not)
           - "is_channel": if True, process as a channel message; otherwise process as a direct message (contact)
+        
+        Identifiers already extracted can be passed in to skip the extraction
+        call. With fused=True, identifiers and analysis come from one call
+        (see app.common.message_insights), made with this consumer's model
+        once the message is known to be stored, and the result carries the
+        MessageInsights under "insights". All documents and edges of the
+        message are written in one batch.
         """
         try:
             db = get_user_db(user_id)
@@ -206,53 +103,74 @@ Message:
                 return {"status": "error", "message": "Message content is empty"}
 
             is_channel = message_data.get("is_channel", False)
-            identifier_ids = []
-            message_id = None
-
             if is_channel:
-                # For channel messages, save the channel (from the "to" field)
                 channel_name = message_data.get("to")
                 if not channel_name or not channel_name.strip():
                     return {"status": "error", "message": "No valid channel found in message data"}
-                channel_id = self._add_channel(db, channel_name)
-                if not channel_id:
-                    return {"status": "error", "message": "Failed to add channel"}
-                message_id = self._add_message(db, message_data, channel_id=channel_id)
-                result_data = {"channel_id": channel_id}
-                # Create edge between channel and message
-                self._add_edge(db, channel_id, message_id, CHANNEL_MESSAGE_EDGE_COLLECTION)
             else:
-                # For direct messages, save the contact (from the "from" field)
                 contact_username = message_data.get("from")
                 if not contact_username or not contact_username.strip():
                     return {"status": "error", "message": "No valid sender found in message data"}
-                contact_id = self._add_contact(db, contact_username)
-                if not contact_id:
-                    return {"status": "error", "message": "Failed to add contact"}
-                message_id = self._add_message(db, message_data, contact_id=contact_id)
-                result_data = {"contact_id": contact_id}
-                # Create edge between contact and message
-                self._add_edge(db, contact_id, message_id, CONTACT_MESSAGE_EDGE_COLLECTION)
 
-            if not message_id:
-                return {"status": "error", "message": "Failed to add message"}
-
-            # Extract identifiers from the message content.
-            identifiers = self.extract_identifiers(content)
-            for identifier in identifiers:
-                id_id = self._add_identifier(db, identifier)
-                if id_id:
-                    identifier_ids.append(id_id)
+            # Extract identifiers first so all writes below go out in one batch
+            insights = None
+            if identifiers is None and fused:
+                insights = extract_message_insights("Slack", content, self.model_provider, self.model_name)
+                identifiers = insights.normalized_identifiers
+            elif identifiers is None:
+                identifiers = self.extract_identifiers(content)
+            now = datetime.datetime.now().isoformat()
+
+            with self.batch(db):
+                message_doc = {**message_data, "created_at": now}
+                if is_channel:
+                    # For channel messages, save the channel (from the "to" field)
+                    owner_ref = self.add_node(
+                        CHANNELS_COLLECTION,
+                        {"name": channel_name, "created_at": now, "active": True},
+                        unique_key="name", unique_value=channel_name, update=False
+                    )
+                    message_doc["channel_id"] = owner_ref
+                    owner_edge_collection = CHANNEL_MESSAGE_EDGE_COLLECTION
+                else:
+                    # For direct messages, save the contact (from the "from" field)
+                    owner_ref = self.add_node(
+                        CONTACTS_COLLECTION,
+                        {"slack_username": contact_username, "created_at": now, "active": True},
+                        unique_key="slack_username", unique_value=contact_username, update=False
+                    )
+                    message_doc["sender_id"] = owner_ref
+                    owner_edge_collection = CONTACT_MESSAGE_EDGE_COLLECTION
+
+                message_ref = self.add_node(MESSAGES_COLLECTION, message_doc)
+                self.add_edge(owner_edge_collection, owner_ref, message_ref, unique=True)
+
+                identifier_refs = []
+                for identifier in identifiers:
+                    identifier_ref = self.add_node(
+                        IDENTIFIERS_COLLECTION,
+                        {"value": identifier, "created_at": now},
+                        unique_key="value", unique_value=identifier, update=False
+                    )
+                    identifier_refs.append(identifier_ref)
                     # Create an edge from the identifier to the message.
-                    self._add_edge(db, id_id, message_id, IDENTIFIER_MESSAGE_EDGE_COLLECTION)
+                    self.add_edge(IDENTIFIER_MESSAGE_EDGE_COLLECTION, identifier_ref, message_ref, unique=True)
+
+            if owner_ref.id is None:
+                return {"status": "error", "message": "Failed to add channel" if is_channel else "Failed to add contact"}
+            if message_ref.id is None:
+                return {"status": "error", "message": "Failed to add message"}
 
+            result_data = {"channel_id": owner_ref.id} if is_channel else {"contact_id": owner_ref.id}
             result_data.update({
                 "status": "success",
                 "message": "Message processed successfully",
-                "message_id": message_id,
+                "message_id": message_ref.id,
                 "identifiers": identifiers,
-                "identifier_ids": identifier_ids
+                "identifier_ids": list(dict.fromkeys(ref.id for ref in identifier_refs if ref.id))
             })
+            if insights is not None:
+                result_data["insights"] = insights
             return result_data
 
         except Exception as e:
@@ -4,6 +4,7 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_community.graphs import ArangoGraph
 from app.common.arangodb import ArangoGraphQAChain
+from app.common.tools import built_on_first_use
 from celery import Celery
 import os
 import datetime
@@ -312,7 +313,7 @@ def set_status_factory(user_id: str):
 
 # Database query tools
 def private_db_query_factory(model, arango_graph, aql_generation_prompt):
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
@@ -321,7 +322,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         perform_qa=False,
         top_k=5,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
 
     @tool
     def private_db_query(query: str) -> str:
@@ -334,7 +335,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         Returns:
             Query results as text
         """
-        result = chain.invoke(query)
+        result = chain().invoke(query)
         return result
     
     return private_db_query 
\ No newline at end of file
@@ -22,7 +22,10 @@ WHATSAPP_MESSAGE_ANALYSIS_EDGE_COLLECTION = "whatsapp_message__analysis"
 class WhatsAppAnalyzer(BaseGraphConsumer):
     """
     A Celery consumer that analyzes WhatsApp messages for spam, urgency, and importance.
+    Analysis nodes are skipped if their collections are missing.
     """
+    create_collections = False
+
     def __init__(
         self, 
         model_provider: str = "openai", 
@@ -46,11 +49,12 @@ class WhatsAppAnalyzer(BaseGraphConsumer):
             notification_callback: Optional callback for notifications.
         """
         super().__init__()
-        self.llm = LLMManager.get_model(
+        self.llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=AnalysisResult,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(AnalysisResult)
+        )
         
         self.spam_threshold = spam_threshold
         self.urgent_threshold = urgent_threshold
@@ -84,75 +88,13 @@ class WhatsAppAnalyzer(BaseGraphConsumer):
         response = self.llm.invoke([{"role": "user", "content": prompt}])
         return response
     
-    def _add_analysis_identifier(self, db, analysis_type: str, analysis_data: Dict[str, Any]) -> str:
-        """
-        Add an analysis result to the database.
-        
-        Args:
-            db: Database connection.
-            analysis_type: Type of analysis (spam, urgent, important).
-            analysis_data: Analysis data including score and reasoning.
-            
-        Returns:
-            The ID of the inserted analysis.
-        """
-        if not db.has_collection(ANALYSIS_COLLECTION):
-            return None
-        
-        analysis_doc = {
-            "type": analysis_type,
-            "score": analysis_data.get("score", 0),
-            "reason": analysis_data.get("reason", ""),
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        result = db.collection(ANALYSIS_COLLECTION).insert(analysis_doc)
-        return result["_id"]
-    
-    def _add_edge(self, db, from_id: str, to_id: str, collection_name: str, data: Dict[str, Any] = None) -> str:
-        """
-        Add an edge between two vertices if it doesn't already exist.
-        
-        Args:
-            db: Database connection.
-            from_id: The ID of the from vertex.
-            to_id: The ID of the to vertex.
-            collection_name: The name of the edge collection.
-            data: Additional data to store on the edge.
-            
-        Returns:
-            The ID of the edge.
-        """
-        if not db.has_collection(collection_name):
-            return None
-        
-        # Using Python formatter for AQL with {collection_name}
-        aql = f"""
-        FOR edge IN {collection_name}
-            FILTER edge._from == @from_id AND edge._to == @to_id
-            RETURN edge._id
-        """
-        cursor = db.execute_query(aql, {"from_id": from_id, "to_id": to_id})
-        edge_ids = list(cursor)
-        if edge_ids:
-            return edge_ids[0]
-        
-        edge_doc = {
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        if data:
-            edge_doc.update(data)
-        
-        result = db.collection(collection_name).insert(edge_doc)
-        return result["_id"]
-    
     def process_message(
         self,
         user_id: str,
         message_data: Dict[str, Any],
         identifiers: List[str],
-        message_id: Optional[str] = None
+        message_id: Optional[str] = None,
+        analysis_result: Optional[AnalysisResult] = None
     ) -> Dict[str, Any]:
         """
         Process and analyze a WhatsApp message.
@@ -162,6 +104,7 @@ class WhatsAppAnalyzer(BaseGraphConsumer):
             message_data: WhatsApp message data.
             identifiers: List of extracted identifiers.
             message_id: Optional ID of an existing message.
+            analysis_result: Analysis from the fused analysis call, to skip the analysis call.
             
         Returns:
             A dictionary with the results of analysis.
@@ -178,45 +121,28 @@ class WhatsAppAnalyzer(BaseGraphConsumer):
         
             message_doc_id = message_id
             
-            analysis_result = self.analyze_message(text, identifiers)
-            
-            spam_analysis_id = self._add_analysis_identifier(db, "spam", {
-                "score": analysis_result.spam_score,
-                "reason": analysis_result.summary or ""
-            })
-            urgent_analysis_id = self._add_analysis_identifier(db, "urgent", {
-                "score": analysis_result.urgency_score,
-                "reason": analysis_result.summary or ""
-            })
-            important_analysis_id = self._add_analysis_identifier(db, "important", {
-                "score": analysis_result.importance_score,
-                "reason": analysis_result.summary or ""
-            })
+            if analysis_result is None:
+                analysis_result = self.analyze_message(text, identifiers)
             
-            if spam_analysis_id:
-                self._add_edge(
-                    db,
-                    message_doc_id,
-                    f"{ANALYSIS_COLLECTION}/{spam_analysis_id}",
-                    WHATSAPP_MESSAGE_ANALYSIS_EDGE_COLLECTION,
-                    {"type": "spam"}
-                )
-            if urgent_analysis_id:
-                self._add_edge(
-                    db,
-                    message_doc_id,
-                    f"{ANALYSIS_COLLECTION}/{urgent_analysis_id}",
-                    WHATSAPP_MESSAGE_ANALYSIS_EDGE_COLLECTION,
-                    {"type": "urgent"}
-                )
-            if important_analysis_id:
-                self._add_edge(
-                    db,
-                    message_doc_id,
-                    f"{ANALYSIS_COLLECTION}/{important_analysis_id}",
-                    WHATSAPP_MESSAGE_ANALYSIS_EDGE_COLLECTION,
-                    {"type": "important"}
-                )
+            # Add the analysis results and link them to the message in one batch.
+            now = datetime.datetime.now().isoformat()
+            with self.batch(db):
+                for analysis_type, score in (
+                    ("spam", analysis_result.spam_score),
+                    ("urgent", analysis_result.urgency_score),
+                    ("important", analysis_result.importance_score)
+                ):
+                    analysis_ref = self.add_node(ANALYSIS_COLLECTION, {
+                        "type": analysis_type,
+                        "score": score,
+                        "reason": analysis_result.summary or "",
+                        "created_at": now
+                    })
+                    # The analysis is new, so the edge cannot exist yet
+                    if message_doc_id:
+                        self.add_edge(
+                            WHATSAPP_MESSAGE_ANALYSIS_EDGE_COLLECTION, message_doc_id, analysis_ref, {"type": analysis_type}
+                        )
             
             is_spam = analysis_result.spam_score >= self.spam_threshold
             is_urgent = analysis_result.urgency_score >= self.urgent_threshold
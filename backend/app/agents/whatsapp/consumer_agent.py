@@ -11,6 +11,7 @@ from app.db import get_system_db, get_user_db
 from app.agents.whatsapp.schemas import Identifiers
 from app.common.llm_manager import LLMManager
 from app.common.base_consumer import BaseGraphConsumer
+from app.common.message_insights import extract_message_insights
 
 # Initialize Celery app
 celery_app = Celery(
@@ -40,14 +41,21 @@ class WhatsAppConsumer(BaseGraphConsumer):
       - from: Sender's phone number (always a number; stored as whatsapp_number in contact).
       - to: For group messages, the group identifier; for direct messages, the recipient identifier.
       - is_group: Boolean flag indicating if the message comes from a group.
+
+    Collections are provisioned with the user's database; missing ones are skipped.
     """
+    create_collections = False
+
     def __init__(self, model_provider: str = "openai", model_name: str = "gpt-4o-mini", temperature: float = 0):
         super().__init__()
-        self.llm = LLMManager.get_model(
+        self.model_provider = model_provider
+        self.model_name = model_name
+        self.llm = LLMManager.get_structured_model(
             provider=model_provider,
+            schema=Identifiers,
             model_name=model_name,
             temperature=temperature
-        ).with_structured_output(Identifiers)
+        )
     
     def extract_identifiers(self, message_content: str) -> List[str]:
         prompt = f"""
@@ -67,114 +75,8 @@ class WhatsAppConsumer(BaseGraphConsumer):
         response = self.llm.invoke([{"role": "user", "content": prompt}])
         return [identifier.lower() for identifier in response.identifiers]
     
-    def _add_contact(self, db, whatsapp_number: str) -> Optional[str]:
-        if not db.has_collection(CONTACTS_COLLECTION):
-            return None
-        
-        aql = f'''
-        FOR contact IN {CONTACTS_COLLECTION}
-          FILTER contact.whatsapp_number == "{whatsapp_number}"
-          RETURN contact._id
-        '''
-        cursor = db.aql.execute(aql)
-        contact_ids = list(cursor)
-        
-        if contact_ids:
-            return contact_ids[0]
-        
-        contact_doc = {
-            "whatsapp_number": whatsapp_number,
-            "created_at": datetime.datetime.now().isoformat(),
-            "active": True
-        }
-        result = db.collection(CONTACTS_COLLECTION).insert(contact_doc)
-        return result["_id"]
-    
-    def _add_whatsapp_group(self, db, group_identifier: str) -> Optional[str]:
-        if not db.has_collection(WHATSAPP_GROUPS_COLLECTION):
-            return None
-        
-        aql = f'''
-        FOR group IN {WHATSAPP_GROUPS_COLLECTION}
-          FILTER group.identifier == "{group_identifier}"
-          RETURN group._id
-        '''
-        cursor = db.aql.execute(aql)
-        group_ids = list(cursor)
-        
-        if group_ids:
-            return group_ids[0]
-        
-        group_doc = {
-            "identifier": group_identifier,
-            "created_at": datetime.datetime.now().isoformat(),
-            "active": True
-        }
-        result = db.collection(WHATSAPP_GROUPS_COLLECTION).insert(group_doc)
-        return result["_id"]
-    
-    def _add_whatsapp_message(self, db, message_data: Dict[str, Any]) -> Optional[str]:
-        if not db.has_collection(WHATSAPP_MESSAGES_COLLECTION):
-            return None
-        
-        message_doc = {
-            "text": message_data.get("text", ""),
-            "from": message_data.get("from"),
-            "to": message_data.get("to"),
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        result = db.collection(WHATSAPP_MESSAGES_COLLECTION).insert(message_doc)
-        return result["_id"]
-        
-    def _add_identifier(self, db, identifier: str) -> Optional[str]:
-        if not db.has_collection(IDENTIFIERS_COLLECTION):
-            return None
-        
-        aql = f'''
-        FOR ident IN {IDENTIFIERS_COLLECTION}
-          FILTER ident.value == "{identifier}"
-          RETURN ident._id
-        '''
-        cursor = db.aql.execute(aql)
-        identifier_ids = list(cursor)
-        
-        if identifier_ids:
-            return identifier_ids[0]
-        
-        identifier_doc = {
-            "value": identifier,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        result = db.collection(IDENTIFIERS_COLLECTION).insert(identifier_doc)
-        return result["_id"]
-    
-    def _add_edge(self, db, from_id: str, to_id: str, collection_name: str, data: Dict[str, Any] = None) -> Optional[str]:
-        if not db.has_collection(collection_name):
-            return None
-
-        aql = f'''
-        FOR edge IN {collection_name}
-          FILTER edge._from == "{from_id}" AND edge._to == "{to_id}"
-          RETURN edge._id
-        '''
-        cursor = db.aql.execute(aql)
-        edge_ids = list(cursor)
-
-        if edge_ids:
-            return edge_ids[0]
-
-        edge_doc = {
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        if data:
-            edge_doc.update(data)
-
-        result = db.collection(collection_name).insert(edge_doc)
-        return result["_id"]
-    
-    def process_message(self, user_id: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
+    def process_message(self, user_id: str, message_data: Dict[str, Any],
+                        identifiers: Optional[List[str]] = None, fused: bool = False) -> Dict[str, Any]:
         """
         Process a WhatsApp message by:
           - Storing a simplified message document.
@@ -184,6 +86,12 @@ class WhatsAppConsumer(BaseGraphConsumer):
               • For direct messages: contact → message.
               • For group messages: group → message and contact → group.
           - Extracting identifiers from the text and linking them to the message.
+        
+        Identifiers already extracted can be passed in to skip the extraction
+        call. With fused=True, identifiers and analysis come from one call
+        (see app.common.message_insights), made with this consumer's model
+        once the message is known to be stored, and the result carries the
+        MessageInsights under "insights".
         """
         try:
             db = get_user_db(user_id)
@@ -200,44 +108,69 @@ class WhatsAppConsumer(BaseGraphConsumer):
             if not sender or not to_identifier:
                 return {"status": "error", "message": "Missing 'from' or 'to' in message data"}
             
-            # Always create a contact vertex for the sender.
-            sender_id = self._add_contact(db, whatsapp_number=sender)
-            
-            # For group messages, create a group vertex using the 'to' field.
-            group_id = None
-            if is_group:
-                group_id = self._add_whatsapp_group(db, group_identifier=to_identifier)
-            
-            # Insert the simplified WhatsApp message document.
-            message_id = self._add_whatsapp_message(db, message_data)
-            if not message_id:
-                return {"status": "error", "message": "Failed to add message to database"}
-            
-            # Create edges based on message type.
-            if is_group and group_id:
-                # Link group to message.
-                self._add_edge(db, group_id, message_id, WHATSAPP_GROUP_MESSAGE_EDGE_COLLECTION)
-                # Link sender (contact) to group.
-                self._add_edge(db, sender_id, group_id, CONTACT_WHATSAPP_GROUP_EDGE_COLLECTION)
-            else:
-                # For direct messages, link contact to message.
-                self._add_edge(db, sender_id, message_id, CONTACT_WHATSAPP_MESSAGE_EDGE_COLLECTION)
+            # Extract identifiers first so all writes below go out in one batch
+            insights = None
+            if identifiers is None and fused:
+                insights = extract_message_insights("WhatsApp", text, self.model_provider, self.model_name)
+                identifiers = insights.normalized_identifiers
+            elif identifiers is None:
+                identifiers = self.extract_identifiers(text)
+            now = datetime.datetime.now().isoformat()
             
-            # Extract identifiers from the payload and create vertices/edges.
-            identifiers = self.extract_identifiers(text)
-            identifier_ids = []
-            for identifier in identifiers:
-                identifier_id = self._add_identifier(db, identifier)
-                if identifier_id:
-                    identifier_ids.append(identifier_id)
-                    self._add_edge(
-                        db,
-                        identifier_id,
-                        message_id,
-                        WHATSAPP_IDENTIFIER_MESSAGE_EDGE_COLLECTION
+            with self.batch(db):
+                # Always create a contact vertex for the sender.
+                sender_ref = self.add_node(
+                    CONTACTS_COLLECTION,
+                    {"whatsapp_number": sender, "created_at": now, "active": True},
+                    unique_key="whatsapp_number", unique_value=sender, update=False
+                )
+                
+                # For group messages, create a group vertex using the 'to' field.
+                group_ref = None
+                if is_group:
+                    group_ref = self.add_node(
+                        WHATSAPP_GROUPS_COLLECTION,
+                        {"identifier": to_identifier, "created_at": now, "active": True},
+                        unique_key="identifier", unique_value=to_identifier, update=False
                     )
+                
+                # Insert the simplified WhatsApp message document.
+                message_ref = self.add_node(WHATSAPP_MESSAGES_COLLECTION, {
+                    "text": text,
+                    "from": sender,
+                    "to": to_identifier,
+                    "created_at": now
+                })
+                
+                # Create edges based on message type.
+                if is_group:
+                    # Link group to message.
+                    self.add_edge(WHATSAPP_GROUP_MESSAGE_EDGE_COLLECTION, group_ref, message_ref, unique=True)
+                    # Link sender (contact) to group.
+                    self.add_edge(CONTACT_WHATSAPP_GROUP_EDGE_COLLECTION, sender_ref, group_ref, unique=True)
+                else:
+                    # For direct messages, link contact to message.
+                    self.add_edge(CONTACT_WHATSAPP_MESSAGE_EDGE_COLLECTION, sender_ref, message_ref, unique=True)
+                
+                # Create identifier vertices and link them to the message.
+                identifier_refs = []
+                for identifier in identifiers:
+                    identifier_ref = self.add_node(
+                        IDENTIFIERS_COLLECTION,
+                        {"value": identifier, "created_at": now},
+                        unique_key="value", unique_value=identifier, update=False
+                    )
+                    identifier_refs.append(identifier_ref)
+                    self.add_edge(WHATSAPP_IDENTIFIER_MESSAGE_EDGE_COLLECTION, identifier_ref, message_ref, unique=True)
             
-            return {
+            if message_ref.id is None:
+                return {"status": "error", "message": "Failed to add message"}
+            message_id = message_ref.id
+            group_id = group_ref.id if group_ref else None
+            sender_id = sender_ref.id
+            identifier_ids = list(dict.fromkeys(ref.id for ref in identifier_refs if ref.id))
+            
+            result = {
                 "status": "success",
                 "message": "Message processed successfully",
                 "message_id": message_id,
@@ -246,6 +179,9 @@ class WhatsAppConsumer(BaseGraphConsumer):
                 "identifiers": identifiers,
                 "identifier_ids": identifier_ids
             }
+            if insights is not None:
+                result["insights"] = insights
+            return result
             
         except Exception as e:
             import traceback
@@ -4,6 +4,7 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_community.graphs import ArangoGraph
 from app.common.arangodb import ArangoGraphQAChain
+from app.common.tools import built_on_first_use
 import datetime
 from celery import Celery
 import os
@@ -243,7 +244,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
     Factory function to create a private_db_query tool with model and graph closures.
     This tool enables natural language queries against the private database graph.
     """
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
@@ -252,7 +253,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         perform_qa=False,
         top_k=5,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
     @tool
     def private_db_query(query: str) -> str:
         """
@@ -266,7 +267,7 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
             Query results as text
         """
         # Execute the query
-        result = chain.run(query)
+        result = chain().run(query)
         return result
     
     return private_db_query
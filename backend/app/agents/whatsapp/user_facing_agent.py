@@ -12,6 +12,8 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../")))
 
 from app.common.utils import safely_check_interrupts
+from app.common.agent_streaming import run_agent_graph
+from app.common.metrics import agent_call
 from app.agents.whatsapp.prompts import PRIVATE_AQL_GENERATION_PROMPT
 from app.common.prompts import PUBLIC_AQL_GENERATION_PROMPT
 
@@ -121,6 +123,7 @@ class WhatsAppAgent:
             checkpointer=self.checkpointer
         )
 
+    @agent_call("WhatsApp_Agent")
     def call_llm(self, user_message: str, thread_id: Optional[str] = None) -> str:
         """
         Process a user message and return the agent's response.
@@ -142,11 +145,8 @@ class WhatsAppAgent:
         else:
             inputs = {"messages": [HumanMessage(content=user_message)]}
         
-        # Get the final response
-        result = self.agent_graph.invoke(inputs, config)
-        final_message = result["messages"][-1]
-        
-        return final_message.content
+        # Get the final response, streaming it to the client if requested
+        return run_agent_graph(self.agent_graph, inputs, config)
 
 
     def run_interactive(self, thread_id: str, debug=False):
@@ -1,4 +1,13 @@
-from .llm_manager import LLMManager
-from .base_consumer import BaseGraphConsumer
+__all__ = ["LLMManager", "BaseGraphConsumer"]
 
-__all__ = ["LLMManager", "BaseGraphConsumer"]
\ No newline at end of file
+
+# Imported on first access, so importing a light submodule (e.g. app.common.metrics)
+# does not load every LLM provider's SDK
+def __getattr__(name):
+    if name == "LLMManager":
+        from .llm_manager import LLMManager
+        return LLMManager
+    if name == "BaseGraphConsumer":
+        from .base_consumer import BaseGraphConsumer
+        return BaseGraphConsumer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,274 @@
+"""LRU cache of per-user chat agents with idle eviction and a memory budget."""
+
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from app.common.metrics import Counter, registry
+
+AGENT_CACHE_MAX_AGENTS = int(os.environ.get("AGENT_CACHE_MAX_AGENTS", 64))
+# Agents unused for this many seconds are dropped
+AGENT_CACHE_IDLE_SECONDS = float(os.environ.get("AGENT_CACHE_IDLE_SECONDS", 1800))
+AGENT_CACHE_MAX_BYTES = int(os.environ.get("AGENT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Seconds between re-estimates of a cached agent's size, which grows as its
+# tools build their chains on first use
+AGENT_CACHE_REMEASURE_SECONDS = float(os.environ.get("AGENT_CACHE_REMEASURE_SECONDS", 60))
+# Upper bound on the objects visited when estimating one agent's size
+SIZE_ESTIMATE_MAX_OBJECTS = 200000
+
+AGENT_CACHE_EVENTS = registry.register(Counter(
+    "dash_agent_cache_events_total", "Agent cache lookups and evictions", ["event"]
+))
+
+# Objects that are shared rather than owned by an agent, never counted in its size
+_UNOWNED_TYPES = (type, types.ModuleType, types.BuiltinFunctionType, types.CodeType)
+
+
+def estimate_size(obj: Any, exclude: Iterable[Any] = ()) -> int:
+    """
+    Estimate the memory held by an object and everything it references.
+
+    Objects in `exclude` (and what only they reference) are not counted, which
+    is how shared resources such as the model, database handles and the
+    checkpointer are kept out of an agent's size.
+
+    Args:
+        obj: Object to measure
+        exclude: Shared objects to skip
+
+    Returns:
+        Approximate size in bytes
+    """
+    seen = {id(shared) for shared in exclude}
+    stack = [obj]
+    total = 0
+    visited = 0
+    while stack and visited < SIZE_ESTIMATE_MAX_OBJECTS:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _UNOWNED_TYPES):
+            continue
+        seen.add(id(current))
+        visited += 1
+        try:
+            total += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, OrderedDict)):
+            stack.extend(current)
+        elif isinstance(current, (str, bytes, int, float, bool)) or current is None:
+            continue
+        else:
+            if hasattr(current, "__dict__"):
+                stack.append(vars(current))
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+            # Tools keep their state in closures
+            for cell in getattr(current, "__closure__", None) or ():
+                try:
+                    stack.append(cell.cell_contents)
+                except ValueError:
+                    # Cell not filled yet
+                    pass
+    return total
+
+
+class _Entry:
+    __slots__ = ("agent", "shared", "size", "last_used", "measured_at")
+
+    def __init__(self, agent: Any, shared: tuple, size: int):
+        self.agent = agent
+        self.shared = shared
+        self.size = size
+        self.last_used = time.monotonic()
+        # None until re-measured after the agent's first use
+        self.measured_at: Optional[float] = None
+
+
+class AgentCache:
+    """
+    Thread-safe LRU cache of built agents, keyed by e.g. (user_id, agent name).
+
+    Each agent's size is estimated when it is built (see `estimate_size`), again
+    on its first hit, once its tools have had a turn to build what they defer,
+    and then at most every `remeasure_seconds`. The least recently used agents
+    are evicted once there are more than `max_agents` or their total size
+    exceeds `max_bytes`. Agents idle for longer than `idle_seconds` are evicted
+    on the next lookup or `evict_idle`.
+
+    An agent is built at most once per key even when several requests for the
+    same user arrive together; requests for other users are not blocked.
+    """
+
+    def __init__(
+        self,
+        max_agents: int = AGENT_CACHE_MAX_AGENTS,
+        idle_seconds: float = AGENT_CACHE_IDLE_SECONDS,
+        max_bytes: int = AGENT_CACHE_MAX_BYTES,
+        remeasure_seconds: float = AGENT_CACHE_REMEASURE_SECONDS
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_agents: Maximum number of cached agents
+            idle_seconds: Seconds after its last use an agent is dropped
+            max_bytes: Maximum estimated size of all cached agents
+            remeasure_seconds: Minimum seconds between size estimates of an agent
+        """
+        self.max_agents = max_agents
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.remeasure_seconds = remeasure_seconds
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any], shared: Iterable[Any] = ()) -> Any:
+        """
+        Get the agent for a key, building it on a miss.
+
+        Args:
+            key: Cache key, e.g. (user_id, "Main_Agent")
+            build: Function building the agent
+            shared: Objects the agent uses but does not own (model, databases,
+                checkpointer); they are not counted in its size
+
+        Returns:
+            The cached or newly built agent
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self._remeasure(key, entry)
+            return entry.agent
+
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            # Another request may have built it while we waited
+            entry = self._lookup(key, count=False)
+            if entry is not None:
+                return entry.agent
+            try:
+                agent = build()
+                shared = tuple(shared)
+                size = estimate_size(agent, exclude=shared)
+                with self._lock:
+                    self._insert(key, _Entry(agent, shared, size))
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return agent
+
+    def _lookup(self, key: Hashable, count: bool = True) -> Optional[_Entry]:
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                if count:
+                    self.misses += 1
+                    AGENT_CACHE_EVENTS.inc(event="miss")
+                return None
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+                AGENT_CACHE_EVENTS.inc(event="hit")
+            return entry
+
+    def _remeasure(self, key: Hashable, entry: _Entry) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if entry.measured_at is not None and now - entry.measured_at < self.remeasure_seconds:
+                return
+            # Claimed, so concurrent hits do not measure the same agent
+            entry.measured_at = now
+        try:
+            size = estimate_size(entry.agent, exclude=entry.shared)
+        except RuntimeError:
+            # The agent changed while being walked (e.g. a tool building its chain)
+            return
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self._bytes += size - entry.size
+                entry.size = size
+                self._enforce_budget()
+
+    def _insert(self, key: Hashable, entry: _Entry) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._enforce_budget()
+
+    def _enforce_budget(self) -> None:
+        # The most recently used agent is kept even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_agents or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)), "evict_lru")
+
+    def _remove(self, key: Hashable, event: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        self.evictions += 1
+        AGENT_CACHE_EVENTS.inc(event=event)
+
+    def _evict_idle(self, now: float) -> None:
+        # Entries are in least recently used order, so stop at the first fresh one
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_used < self.idle_seconds:
+                break
+            self._remove(key, "evict_idle")
+
+    def evict_idle(self) -> None:
+        """Drop agents that have been idle for longer than `idle_seconds`."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one agent, or every agent if key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._bytes -= self._entries.pop(key).size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_agents": self.max_agents,
+                "max_bytes": self.max_bytes
+            }
+
+
+_agent_cache: Optional[AgentCache] = None
+_agent_cache_lock = threading.Lock()
+
+
+def get_agent_cache() -> AgentCache:
+    """Get the process-wide agent cache."""
+    global _agent_cache
+    with _agent_cache_lock:
+        if _agent_cache is None:
+            _agent_cache = AgentCache()
+        return _agent_cache
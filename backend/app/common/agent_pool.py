@@ -0,0 +1,257 @@
+"""Bounded pool of worker threads that run chat agent requests."""
+
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from app.common.metrics import Counter, registry
+
+AGENT_POOL_WORKERS = int(os.environ.get("AGENT_POOL_WORKERS", 8))
+# Requests a user may have waiting (not running) before new ones are refused
+AGENT_POOL_MAX_QUEUE_PER_USER = int(os.environ.get("AGENT_POOL_MAX_QUEUE_PER_USER", 5))
+AGENT_POOL_MAX_PENDING = int(os.environ.get("AGENT_POOL_MAX_PENDING", 100))
+
+AGENT_POOL_REJECTIONS = registry.register(Counter(
+    "dash_agent_pool_rejections_total", "Chat requests refused because the agent pool was full",
+    ["reason"]
+))
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ("user_id", "thread_id", "func")
+
+    def __init__(self, user_id: str, thread_id: str, func: Callable[[], Any]):
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.func = func
+
+
+class AgentSlot:
+    """
+    A place in an AgentWorkerPool's queue, held for a request between the
+    capacity check and its submission (e.g. while the message is saved).
+    """
+
+    def __init__(self, pool: "AgentWorkerPool", user_id: str):
+        self._pool = pool
+        self.user_id = user_id
+        self._used = False
+
+    def submit(self, thread_id: str, func: Callable[[], Any]) -> bool:
+        """
+        Queue the request in the reserved place.
+
+        Args:
+            thread_id: Conversation the request belongs to
+            func: Function running the request
+
+        Returns:
+            True if queued, False if the pool was closed in the meantime
+        """
+        if self._used:
+            raise RuntimeError("The agent pool slot was already used")
+        self._used = True
+        return self._pool._submit_reserved(self.user_id, str(thread_id), func)
+
+    def release(self) -> None:
+        """Give the place back without submitting a request."""
+        if not self._used:
+            self._used = True
+            self._pool._release(self.user_id)
+
+
+class AgentWorkerPool:
+    """
+    A fixed number of worker threads running chat agent requests.
+
+    Requests for the same thread_id run one at a time in submission order, so
+    two messages of a conversation never use its checkpoint concurrently.
+    Conversations that are ready to run are picked round-robin by user, so one
+    user's burst does not delay everyone else. Each user may have at most
+    `max_queue_per_user` waiting requests and the pool `max_pending`; beyond
+    that `submit` refuses the request so the caller can report it as busy.
+
+    Callers with work to do before submitting (saving and emitting the
+    message) take a place with `reserve` first, so the check and the
+    submission cannot be raced by the user's other messages.
+    """
+
+    def __init__(
+        self,
+        workers: int = AGENT_POOL_WORKERS,
+        max_queue_per_user: int = AGENT_POOL_MAX_QUEUE_PER_USER,
+        max_pending: int = AGENT_POOL_MAX_PENDING
+    ):
+        """
+        Start the worker threads.
+
+        Args:
+            workers: Number of requests run concurrently
+            max_queue_per_user: Maximum waiting requests per user
+            max_pending: Maximum waiting requests in total
+        """
+        self.max_queue_per_user = max_queue_per_user
+        self.max_pending = max_pending
+        self._condition = threading.Condition()
+        # Waiting requests per conversation, in submission order
+        self._thread_jobs: Dict[str, Deque[_Job]] = {}
+        # Conversations whose next request can start, grouped by its user
+        self._ready: "OrderedDict[str, Deque[str]]" = OrderedDict()
+        self._running: Set[str] = set()
+        self._user_pending: Dict[str, int] = {}
+        self._pending = 0
+        self._closed = False
+        self._workers: List[threading.Thread] = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f"agent-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def pending(self) -> int:
+        """Number of requests waiting to run, including reserved places."""
+        with self._condition:
+            return self._pending
+
+    def has_capacity(self, user_id: str) -> bool:
+        """Whether a request from the user would currently be accepted."""
+        with self._condition:
+            return self._refusal_reason(str(user_id)) is None
+
+    def _refusal_reason(self, user_id: str) -> Optional[str]:
+        if self._closed:
+            return "closed"
+        if self._user_pending.get(user_id, 0) >= self.max_queue_per_user:
+            return "user_queue_full"
+        if self._pending >= self.max_pending:
+            return "queue_full"
+        return None
+
+    def reserve(self, user_id: str) -> Optional[AgentSlot]:
+        """
+        Take a place in the queue for a request that will be submitted later.
+
+        Args:
+            user_id: User who sent the message
+
+        Returns:
+            The slot to submit the request with (or release), or None if the
+            user's or the pool's queue is full
+        """
+        user_id = str(user_id)
+        with self._condition:
+            reason = self._refusal_reason(user_id)
+            if reason is not None:
+                AGENT_POOL_REJECTIONS.inc(reason=reason)
+                return None
+            self._user_pending[user_id] = self._user_pending.get(user_id, 0) + 1
+            self._pending += 1
+            return AgentSlot(self, user_id)
+
+    def submit(self, user_id: str, thread_id: str, func: Callable[[], Any]) -> bool:
+        """
+        Queue a request.
+
+        Args:
+            user_id: User who sent the message
+            thread_id: Conversation the request belongs to
+            func: Function running the request
+
+        Returns:
+            True if queued, False if the user's or the pool's queue is full
+        """
+        slot = self.reserve(user_id)
+        return slot is not None and slot.submit(thread_id, func)
+
+    def _submit_reserved(self, user_id: str, thread_id: str, func: Callable[[], Any]) -> bool:
+        with self._condition:
+            if self._closed:
+                self._release_locked(user_id)
+                AGENT_POOL_REJECTIONS.inc(reason="closed")
+                return False
+            jobs = self._thread_jobs.setdefault(thread_id, deque())
+            jobs.append(_Job(user_id, thread_id, func))
+            if len(jobs) == 1 and thread_id not in self._running:
+                self._mark_ready(user_id, thread_id)
+            self._condition.notify()
+            return True
+
+    def _release(self, user_id: str) -> None:
+        with self._condition:
+            self._release_locked(user_id)
+
+    def _release_locked(self, user_id: str) -> None:
+        self._pending -= 1
+        self._user_pending[user_id] -= 1
+        if not self._user_pending[user_id]:
+            del self._user_pending[user_id]
+
+    def _mark_ready(self, user_id: str, thread_id: str) -> None:
+        self._ready.setdefault(user_id, deque()).append(thread_id)
+
+    def _take(self) -> Optional[_Job]:
+        if not self._ready:
+            return None
+        user_id, thread_ids = next(iter(self._ready.items()))
+        thread_id = thread_ids.popleft()
+        if thread_ids:
+            # The user goes to the back of the line for their next conversation
+            self._ready.move_to_end(user_id)
+        else:
+            del self._ready[user_id]
+        job = self._thread_jobs[thread_id].popleft()
+        self._running.add(thread_id)
+        self._release_locked(job.user_id)
+        return job
+
+    def _finish(self, job: _Job) -> None:
+        self._running.discard(job.thread_id)
+        jobs = self._thread_jobs.get(job.thread_id)
+        if jobs:
+            self._mark_ready(jobs[0].user_id, job.thread_id)
+            self._condition.notify()
+        else:
+            self._thread_jobs.pop(job.thread_id, None)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job = self._take()
+                while job is None:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                    job = self._take()
+            try:
+                job.func()
+            except Exception:
+                logger.exception(f"Agent request for thread {job.thread_id} failed")
+            finally:
+                with self._condition:
+                    self._finish(job)
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting requests; workers exit once the queue is drained."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+_pool: Optional[AgentWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_agent_pool() -> AgentWorkerPool:
+    """Get the process-wide agent worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AgentWorkerPool()
+        return _pool
@@ -0,0 +1,162 @@
+"""Incremental token and tool events from agent graphs, and cooperative cancellation."""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.runnables.config import var_child_runnable_config
+
+from app.common.metrics import current_labels
+
+# Nodes of create_react_agent graphs whose output is shown to the user
+AGENT_NODE = "agent"
+# Characters of a tool result sent with its "end" event
+TOOL_OUTPUT_PREVIEW = 500
+
+
+class AgentStreamListener:
+    """Receives an agent's output as it is produced; override the callbacks you need."""
+
+    def on_token(self, agent: str, token: str) -> None:
+        """Called with each text chunk of the agent's reply."""
+
+    def on_tool(self, agent: str, event: Dict[str, Any]) -> None:
+        """
+        Called when the agent calls a tool and when the tool returns.
+
+        Args:
+            agent: Name of the agent
+            event: {"status": "start", "name", "args", "id"} or
+                {"status": "end", "name", "output", "id"}
+        """
+
+
+class AgentCancelled(Exception):
+    """Raised inside an agent run whose caller stopped waiting for it."""
+
+
+_listener: ContextVar[Optional[AgentStreamListener]] = ContextVar("agent_stream_listener", default=None)
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("agent_cancel_event", default=None)
+
+
+@contextmanager
+def streaming_to(listener: AgentStreamListener) -> Iterator[None]:
+    """Stream the output of agents run in this context to a listener."""
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+@contextmanager
+def cancellable(event: threading.Event) -> Iterator[None]:
+    """
+    Let agents run in this context be stopped by setting `event`.
+
+    Runs stop at the next step boundary where the conversation is consistent,
+    i.e. not between a tool call and its result, and raise AgentCancelled.
+    """
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def run_agent_graph(agent_graph: Any, inputs: Any, config: Dict[str, Any]) -> str:
+    """
+    Run a ReAct agent graph and return its final message.
+
+    Without a listener (see `streaming_to`) or cancellation event (see
+    `cancellable`) this is a plain `invoke`. With a listener, the graph is
+    streamed: text chunks of the agent's replies go to `on_token` as the model
+    produces them, and tool calls and results to `on_tool`. With an event, the
+    run checks it after every step. The returned content is the same in all
+    modes.
+
+    Args:
+        agent_graph: A compiled create_react_agent graph
+        inputs: Graph input (messages or a resume Command)
+        config: Run config with the thread_id
+
+    Returns:
+        The content of the last message in the graph state
+    """
+    listener = _listener.get()
+    cancel = _cancel_event.get()
+    if listener is None and cancel is None:
+        result = agent_graph.invoke(inputs, config)
+        return result["messages"][-1].content
+    if listener is None:
+        return _stream_agent_graph(agent_graph, inputs, config, None, cancel)
+
+    # An agent called as a tool of another agent streams under its own name.
+    # Detach it from the calling run's callbacks, otherwise the caller's
+    # stream would receive its tokens too and report them as its own.
+    parent_config = var_child_runnable_config.set(None)
+    try:
+        return _stream_agent_graph(agent_graph, inputs, config, listener, cancel)
+    finally:
+        var_child_runnable_config.reset(parent_config)
+
+
+def _stream_agent_graph(
+    agent_graph: Any,
+    inputs: Any,
+    config: Dict[str, Any],
+    listener: Optional[AgentStreamListener],
+    cancel: Optional[threading.Event]
+) -> str:
+    agent = current_labels()["agent"]
+    tool_names: Dict[str, str] = {}
+    last_message = None
+    stream_mode = ["messages", "updates"] if listener is not None else ["updates"]
+    for mode, payload in agent_graph.stream(inputs, config, stream_mode=stream_mode):
+        if mode == "messages":
+            chunk, metadata = payload
+            if (
+                isinstance(chunk, AIMessageChunk)
+                and metadata.get("langgraph_node") == AGENT_NODE
+                and isinstance(chunk.content, str)
+                and chunk.content
+            ):
+                listener.on_token(agent, chunk.content)
+            continue
+
+        for update in payload.values():
+            if not isinstance(update, dict):
+                # e.g. interrupts raised by human confirmation
+                continue
+            for message in update.get("messages", []):
+                last_message = message
+                if listener is None:
+                    continue
+                if isinstance(message, AIMessage):
+                    for call in message.tool_calls:
+                        tool_names[call["id"]] = call["name"]
+                        listener.on_tool(agent, {
+                            "status": "start", "name": call["name"], "args": call["args"], "id": call["id"]
+                        })
+                elif isinstance(message, ToolMessage):
+                    listener.on_tool(agent, {
+                        "status": "end",
+                        "name": message.name or tool_names.get(message.tool_call_id, ""),
+                        "output": str(message.content)[:TOOL_OUTPUT_PREVIEW],
+                        "id": message.tool_call_id
+                    })
+
+        # Stopping between a tool call and its result would leave the thread
+        # unusable for the next message, so finish the tool step first
+        if (
+            cancel is not None and cancel.is_set()
+            and not (isinstance(last_message, AIMessage) and last_message.tool_calls)
+        ):
+            raise AgentCancelled(f"{agent or 'Agent'} run cancelled")
+
+    if last_message is None:
+        # Nothing ran (e.g. resuming a finished thread); report the stored state
+        last_message = agent_graph.get_state(config).values["messages"][-1]
+    return last_message.content
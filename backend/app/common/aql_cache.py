@@ -0,0 +1,176 @@
+"""Persistent cache of natural language questions translated to AQL."""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+def fingerprint(value: Any) -> str:
+    """
+    Return a stable hash for a schema, prompt or any JSON-serializable value.
+
+    Args:
+        value: The value to hash
+
+    Returns:
+        A hex digest that only changes when the value changes
+    """
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def normalize_user_input(user_input: str) -> str:
+    """
+    Collapse whitespace and drop trailing punctuation.
+
+    Case is kept: the generated AQL embeds names from the question in
+    case-sensitive string literals, so "John" and "john" are different queries.
+    """
+    normalized = re.sub(r"\s+", " ", user_input.strip())
+    return normalized.rstrip("?!. ")
+
+
+class AQLQueryCache:
+    """
+    SQLite-backed LRU cache mapping a question (plus the schema and prompt it
+    was asked against) to an AQL query that executed successfully.
+
+    Safe to share between threads and processes; every operation opens its own
+    short-lived connection.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Path of the SQLite file
+            max_entries: Maximum number of queries kept before evicting the least recently used
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS aql_cache (
+                    key TEXT PRIMARY KEY,
+                    user_input TEXT NOT NULL,
+                    aql_query TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS aql_cache_last_used ON aql_cache (last_used_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(user_input: str, *context: Any) -> str:
+        """
+        Build a cache key from the normalized question and its context.
+
+        Args:
+            user_input: The natural language question
+            *context: Anything the generated AQL depends on (schema, prompt, examples)
+
+        Returns:
+            The cache key
+        """
+        parts = [normalize_user_input(user_input)] + [fingerprint(c) for c in context]
+        return fingerprint("\n".join(parts))
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached AQL query for a key, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT aql_query FROM aql_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE aql_cache SET last_used_at = ? WHERE key = ?",
+                    (time.time(), key)
+                )
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, user_input: str, aql_query: str) -> None:
+        """Store a validated AQL query and evict the least recently used overflow."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO aql_cache VALUES (?, ?, ?, ?, ?)",
+                (key, user_input, aql_query, now, now)
+            )
+            conn.execute(
+                """
+                DELETE FROM aql_cache WHERE key IN (
+                    SELECT key FROM aql_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Remove one cached query, or all of them if key is None."""
+        with self._connect() as conn:
+            if key is None:
+                conn.execute("DELETE FROM aql_cache")
+            else:
+                conn.execute("DELETE FROM aql_cache WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM aql_cache").fetchone()[0]
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_aql_cache() -> Optional[AQLQueryCache]:
+    """
+    Get the process-wide AQL cache.
+
+    The location is read from AQL_CACHE_PATH (set it to an empty string to
+    disable caching) and the size from AQL_CACHE_MAX_ENTRIES.
+
+    Returns:
+        The shared AQLQueryCache, or None if caching is disabled
+    """
+    global _default_cache
+    path = os.environ.get("AQL_CACHE_PATH", "aql_cache.sqlite")
+    if not path:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.path != path:
+            _default_cache = AQLQueryCache(
+                path,
+                max_entries=int(os.environ.get("AQL_CACHE_MAX_ENTRIES", 5000))
+            )
+        return _default_cache
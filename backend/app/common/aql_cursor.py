@@ -0,0 +1,133 @@
+"""Bounded, streaming execution of AQL queries for tool results."""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from typing import Any, Dict, Optional, Tuple
+
+from arango.database import StandardDatabase
+
+# Key signing continuation tokens. Tokens pass through the LLM, so an unsigned
+# one could carry arbitrary AQL. Without AQL_CONTINUATION_SECRET or SECRET_KEY
+# a random key is used and tokens only resume in the process that issued them.
+AQL_CONTINUATION_SECRET = (
+    os.environ.get("AQL_CONTINUATION_SECRET") or os.environ.get("SECRET_KEY") or secrets.token_hex(32)
+)
+
+
+def _sign(payload: bytes) -> str:
+    digest = hmac.new(AQL_CONTINUATION_SECRET.encode("utf-8"), payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii")
+
+
+def encode_continuation_token(aql_query: str, offset: int) -> str:
+    """Encode and sign the query and the number of rows already returned."""
+    payload = json.dumps({"aql_query": aql_query, "offset": offset}).encode("utf-8")
+    return f"{base64.urlsafe_b64encode(payload).decode('ascii')}.{_sign(payload)}"
+
+
+def decode_continuation_token(token: str) -> Tuple[str, int]:
+    """
+    Decode a token created by encode_continuation_token.
+
+    Raises:
+        ValueError: If the token is malformed or its signature does not match
+    """
+    try:
+        encoded, signature = token.split(".")
+        payload = base64.urlsafe_b64decode(encoded.encode("ascii"))
+    except (ValueError, AttributeError) as e:
+        raise ValueError("Invalid continuation token. Run the query again without a token.") from e
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("Invalid continuation token. Run the query again without a token.")
+    try:
+        data = json.loads(payload)
+        return data["aql_query"], int(data["offset"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid continuation token. Run the query again without a token.") from e
+
+
+# Row count used for a page without a row limit; AQL's LIMIT needs one
+MAX_PAGE_ROWS = 2 ** 31 - 1
+
+
+def page_query(aql_query: str, offset: int, count: int) -> str:
+    """
+    Wrap a query so the server skips `offset` rows and returns at most `count`.
+
+    Only the page is transferred, instead of every row up to the offset.
+    """
+    return f"FOR row IN (\n{aql_query}\n) LIMIT {int(offset)}, {int(count)} RETURN row"
+
+
+def execute_bounded(
+    db: StandardDatabase,
+    aql_query: str,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    offset: int = 0
+) -> Dict[str, Any]:
+    """
+    Execute an AQL query with a streaming cursor and stop at a row or byte budget.
+
+    Rows are fetched `batch_size` at a time, so the server never materializes
+    more than one batch beyond what is returned. Truncation is deterministic
+    for a deterministic query: the same rows are cut at the same place, and
+    the continuation token resumes right after them.
+
+    Args:
+        db: Database to query
+        aql_query: The AQL query to execute
+        max_rows: Maximum number of rows to return
+        max_bytes: Maximum size of the JSON-serialized rows
+        batch_size: Cursor batch size (defaults to fetching the skipped rows,
+            max_rows and one extra row to detect truncation in one batch)
+        offset: Number of leading rows to skip (from a continuation token);
+            skipped on the server, see `page_query`
+
+    Returns:
+        A dictionary with the rows, whether they were truncated, and a
+        continuation token if more rows are available
+    """
+    if batch_size is None and max_rows is not None:
+        batch_size = max_rows + 1
+    executed_query = aql_query
+    if offset:
+        # One extra row tells whether the page is the last one
+        executed_query = page_query(aql_query, offset, max_rows + 1 if max_rows is not None else MAX_PAGE_ROWS)
+    cursor = db.aql.execute(executed_query, batch_size=batch_size, stream=True)
+
+    rows = []
+    used_bytes = 0
+    truncated = False
+    try:
+        for row in cursor:
+            if max_rows is not None and len(rows) >= max_rows:
+                truncated = True
+                break
+
+            serialized = json.dumps(row, default=str)
+            if max_bytes is not None and used_bytes + len(serialized) > max_bytes:
+                truncated = True
+                if not rows:
+                    # A single oversized row is cut rather than returning nothing;
+                    # the marker keeps it from being read as a complete string row
+                    rows.append({"_truncated_row": serialized[:max_bytes]})
+                break
+            rows.append(row)
+            used_bytes += len(serialized)
+    finally:
+        if cursor.has_more():
+            cursor.close(ignore_missing=True)
+
+    return {
+        "rows": rows,
+        "truncated": truncated,
+        "continuation_token": (
+            encode_continuation_token(aql_query, offset + len(rows)) if truncated else None
+        )
+    }
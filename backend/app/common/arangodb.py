@@ -23,6 +23,13 @@ from langchain_community.graphs.arangodb_graph import ArangoGraph
 
 from arango.graph import Graph
 
+from app.common.aql_cache import AQLQueryCache, get_aql_cache
+from app.common.aql_cursor import decode_continuation_token, execute_bounded, page_query
+from app.common.metrics import instrumented, observe
+from app.common.schema_service import get_schema_service
+from app.common.nx_graph_cache import get_networkx_graph
+from app.common.nx_sandbox import NetworkXSandbox, SandboxClosed, get_nx_sandbox
+
 class ArangoGraphQAChain(Chain):
     """Chain for question-answering against a graph by generating AQL statements.
 
@@ -63,6 +70,37 @@ class ArangoGraphQAChain(Chain):
     # Specify the maximum amount of AQL Generation attempts that should be made
     max_aql_generation_attempts: int = 3
 
+    # Specify whether to reuse previously validated AQL for repeated questions
+    use_aql_cache: bool = True
+
+    # Cache to use instead of the process-wide one from get_aql_cache()
+    aql_cache: Optional[AQLQueryCache] = Field(default=None, exclude=True)
+
+    # Specify whether to use the shared, cached schema of the database
+    use_schema_service: bool = True
+
+    # Specify whether to only pass the collections relevant to the question
+    trim_schema: bool = False
+
+    # Specify whether to EXPLAIN generated AQL before executing it
+    explain_aql_query: bool = True
+
+    # Reject plans whose estimated cost is above this value
+    max_estimated_cost: Optional[float] = 1_000_000
+
+    # Reject full collection scans over collections larger than this
+    max_full_scan_documents: Optional[int] = 100_000
+
+    # Specify whether to execute with a streaming cursor bounded by top_k,
+    # and max_result_bytes instead of ArangoGraph.query
+    stream_results: bool = False
+
+    # Cursor batch size used when streaming (defaults to top_k + 1)
+    batch_size: Optional[int] = None
+
+    # Maximum size of the JSON-serialized AQL result when streaming
+    max_result_bytes: Optional[int] = None
+
     allow_dangerous_requests: bool = False
     """Forced user opt-in to acknowledge that the chain can make dangerous requests.
 
@@ -140,6 +178,85 @@ class ArangoGraphQAChain(Chain):
             **kwargs,
         )
 
+    def _check_aql_query_plan(self, aql_query: str) -> str:
+        """
+        EXPLAIN an AQL query without executing it.
+
+        Args:
+            aql_query: The AQL query to check
+
+        Returns:
+            An error message for the fix chain, or an empty string if the
+            query may be executed
+        """
+        from arango import AQLQueryExplainError
+
+        try:
+            plan = self.graph.db.aql.explain(aql_query)
+        except AQLQueryExplainError as e:
+            return e.error_message
+
+        estimated_cost = plan.get("estimatedCost", 0)
+        if self.max_estimated_cost is not None and estimated_cost > self.max_estimated_cost:
+            return (
+                f"The query is too expensive (estimated cost {estimated_cost:.0f}, "
+                f"limit {self.max_estimated_cost:.0f}). Use indexed attributes in "
+                "FILTER statements and add a LIMIT."
+            )
+
+        if self.max_full_scan_documents is not None:
+            for node in plan.get("nodes", []):
+                if node.get("type") != "EnumerateCollectionNode":
+                    continue
+                scanned = node.get("estimatedNrItems", 0)
+                if scanned > self.max_full_scan_documents:
+                    return (
+                        f"The query scans the whole '{node.get('collection')}' "
+                        f"collection ({scanned} documents). Use indexed attributes "
+                        "in FILTER statements or traverse from a specific vertex."
+                    )
+        return ""
+
+    def resume(self, continuation_token: str) -> Dict[str, Any]:
+        """
+        Fetch the next page of a truncated result without calling the LLM.
+
+        The token's query goes through the same EXPLAIN check as generated
+        AQL before it is executed.
+
+        Args:
+            continuation_token: Token returned with a truncated result
+
+        Returns:
+            A dictionary with the rows and, if more are available, the next
+            continuation token
+
+        Raises:
+            ValueError: If the token is invalid or the query is rejected
+        """
+        from arango import AQLQueryExecuteError, CursorNextError
+
+        aql_query, offset = decode_continuation_token(continuation_token)
+        if self.explain_aql_query:
+            count = self.top_k + 1 if self.top_k is not None else 1
+            aql_error = self._check_aql_query_plan(page_query(aql_query, offset, count))
+            if aql_error:
+                raise ValueError(aql_error)
+        with observe("aql_execution") as span:
+            try:
+                result = execute_bounded(
+                    self.graph.db,
+                    aql_query,
+                    max_rows=self.top_k,
+                    max_bytes=self.max_result_bytes,
+                    batch_size=self.batch_size,
+                    offset=offset
+                )
+            except (AQLQueryExecuteError, CursorNextError) as e:
+                span.outcome = "error"
+                raise ValueError(e.error_message) from e
+        return {"aql_result": result["rows"], "aql_continuation_token": result["continuation_token"]}
+
     def _call(
         self,
         inputs: Dict[str, Any],
@@ -176,26 +293,88 @@ class ArangoGraphQAChain(Chain):
             Generation attempts to be made prior to raising the last
             AQL Query Execution Error. Defaults to 3.
         :type max_aql_generation_attempts: int
+
+        :var use_aql_cache: Whether to look up the question in the AQL
+            cache before calling the LLM. Queries are only cached after
+            they executed successfully. When False, `aql_cache` is ignored
+            too. Defaults to True.
+        :type use_aql_cache: bool
+
+        :var use_schema_service: Whether to read the schema from the
+            shared SchemaService, which refreshes it when collections or
+            graph definitions change. Defaults to True.
+        :type use_schema_service: bool
+
+        :var trim_schema: Whether to only pass the part of the schema
+            relevant to the question to the prompts. Requires
+            use_schema_service. Defaults to False.
+        :type trim_schema: bool
+
+        :var explain_aql_query: Whether to EXPLAIN generated AQL before
+            executing it. Parse errors and plans exceeding
+            max_estimated_cost or max_full_scan_documents are sent to the
+            fix chain without being executed. Defaults to True.
+        :type explain_aql_query: bool
+
+        :var stream_results: Whether to execute the query with a streaming
+            cursor of batch_size rows and stop at top_k rows or
+            max_result_bytes serialized bytes.
+            A truncated result adds "aql_continuation_token" to the output.
+            Defaults to False.
+        :type stream_results: bool
         """
         _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
         callbacks = _run_manager.get_child()
         user_input = inputs[self.input_key]
 
+        if self.use_schema_service:
+            schema_service = get_schema_service(self.graph)
+            schema_service.refresh()
+            schema_fingerprint = schema_service.fingerprint
+            if self.trim_schema:
+                adb_schema = schema_service.subset(user_input)
+            else:
+                adb_schema = schema_service.rendered
+        else:
+            adb_schema = self.graph.schema
+            schema_fingerprint = adb_schema
+
         #########################
-        # Generate AQL Query #
-        aql_generation_output = self.aql_generation_chain.run(
-            {
-                "adb_schema": self.graph.schema,
-                "aql_examples": self.aql_examples,
-                "user_input": user_input,
-            },
-            callbacks=callbacks,
-        )
+        # Look up AQL Cache #
+        aql_cache = (self.aql_cache or get_aql_cache()) if self.use_aql_cache else None
+        cache_key = None
+        cached_aql_query = None
+        if aql_cache is not None:
+            cache_key = aql_cache.make_key(
+                user_input,
+                schema_fingerprint,
+                getattr(self.aql_generation_chain.prompt, "template", ""),
+                self.aql_examples,
+            )
+            cached_aql_query = aql_cache.get(cache_key)
         #########################
 
+        if cached_aql_query is not None:
+            _run_manager.on_text("AQL Cache Hit", end="\n", verbose=self.verbose)
+            aql_generation_output = f"```aql\n{cached_aql_query}\n```"
+        else:
+            #########################
+            # Generate AQL Query #
+            with observe("aql_generation"):
+                aql_generation_output = self.aql_generation_chain.run(
+                    {
+                        "adb_schema": adb_schema,
+                        "aql_examples": self.aql_examples,
+                        "user_input": user_input,
+                    },
+                    callbacks=callbacks,
+                )
+            #########################
+
         aql_query = ""
         aql_error = ""
         aql_result = None
+        continuation_token = None
         aql_generation_attempt = 1
 
         while (
@@ -227,15 +406,39 @@ class ArangoGraphQAChain(Chain):
 
             #####################
             # Execute AQL Query #
-            from arango import AQLQueryExecuteError
-
-            try:
-                aql_result = self.graph.query(aql_query, self.top_k)
-            except AQLQueryExecuteError as e:
-                aql_error = e.error_message
+            from arango import AQLQueryExecuteError, CursorNextError
+
+            aql_error = ""
+            with observe("aql_execution") as span:
+                try:
+                    # Cached queries were already validated when they were stored
+                    if self.explain_aql_query and cached_aql_query is None:
+                        aql_error = self._check_aql_query_plan(aql_query)
+                    if not aql_error and self.stream_results:
+                        bounded_result = execute_bounded(
+                            self.graph.db,
+                            aql_query,
+                            max_rows=self.top_k,
+                            max_bytes=self.max_result_bytes,
+                            batch_size=self.batch_size,
+                        )
+                        aql_result = bounded_result["rows"]
+                        continuation_token = bounded_result["continuation_token"]
+                    elif not aql_error:
+                        aql_result = self.graph.query(aql_query, self.top_k)
+                except (AQLQueryExecuteError, CursorNextError) as e:
+                    aql_error = e.error_message
+                if aql_error:
+                    span.outcome = "error"
+
+            if aql_error:
+                # A cached query no longer works (e.g. the data model changed)
+                if cached_aql_query is not None:
+                    aql_cache.invalidate(cache_key)
+                    cached_aql_query = None
 
                 _run_manager.on_text(
-                    "AQL Query Execution Error: ", end="\n", verbose=self.verbose
+                    "AQL Query Error: ", end="\n", verbose=self.verbose
                 )
                 _run_manager.on_text(
                     aql_error, color="yellow", end="\n\n", verbose=self.verbose
@@ -243,14 +446,15 @@ class ArangoGraphQAChain(Chain):
 
                 ########################
                 # Retry AQL Generation #
-                aql_generation_output = self.aql_fix_chain.run(
-                    {
-                        "adb_schema": self.graph.schema,
-                        "aql_query": aql_query,
-                        "aql_error": aql_error,
-                    },
-                    callbacks=callbacks,
-                )
+                with observe("aql_fix"):
+                    aql_generation_output = self.aql_fix_chain.run(
+                        {
+                            "adb_schema": adb_schema,
+                            "aql_query": aql_query,
+                            "aql_error": aql_error,
+                        },
+                        callbacks=callbacks,
+                    )
                 ########################
 
             #####################
@@ -265,6 +469,9 @@ class ArangoGraphQAChain(Chain):
             """
             raise ValueError(m)
 
+        if aql_cache is not None and cached_aql_query is None:
+            aql_cache.put(cache_key, user_input, aql_query)
+
         _run_manager.on_text("AQL Result:", end="\n", verbose=self.verbose)
         _run_manager.on_text(
             str(aql_result), color="green", end="\n", verbose=self.verbose
@@ -278,7 +485,7 @@ class ArangoGraphQAChain(Chain):
             # Interpret AQL Result #
             qa_result = self.qa_chain(
                 {
-                    "adb_schema": self.graph.schema,
+                    "adb_schema": adb_schema,
                     "user_input": user_input,
                     "aql_query": aql_query,
                     "aql_result": aql_result,
@@ -298,6 +505,9 @@ class ArangoGraphQAChain(Chain):
         if self.return_aql_query:
             result["aql_query"] = aql_query
 
+        if continuation_token is not None:
+            result["aql_continuation_token"] = continuation_token
+
         return result
 
 
@@ -318,7 +528,8 @@ class ArangoNetworkxQAChain(Chain):
 
         See https://python.langchain.com/docs/security for more information.
     """
-    G_adb: nx.DiGraph = Field(exclude=True)
+    # Graph the code runs on when neither the sandbox nor the cache is used
+    G_adb: Optional[nx.DiGraph] = Field(default=None, exclude=True)
     db: StandardDatabase = Field(exclude=True)
     graph: Graph = Field(exclude=True)
     graph_schema: Optional[Dict[str, Any]] = Field(exclude=True)
@@ -340,17 +551,48 @@ class ArangoNetworkxQAChain(Chain):
     # Specify the maximum amount of NetworkX code generation attempts that should be made
     max_nx_generation_attempts: int = 3
     
-    # Specify whether to use a cache to avoid converting the graph multiple times
+    # Specify whether to run on the process-wide cached graph (see
+    # app.common.nx_graph_cache), refreshed with the latest changes on each
+    # call, instead of the static G_adb graph (also used when G_adb is not given)
     use_nx_cache: bool = True
-    
-    # Internal cache for the NetworkX graph
-    _nx_graph_cache: Optional[Any] = None
+
+    # Specify whether to run the generated code in worker processes with
+    # wall-clock and memory limits (see app.common.nx_sandbox) instead of
+    # exec in the calling thread. Workers see a read-only snapshot of the
+    # graph with every document attribute.
+    use_sandbox: bool = False
+
+    # The sandbox to use; defaults to the process-wide one for the graph
+    nx_sandbox: Optional[NetworkXSandbox] = Field(default=None, exclude=True)
 
     def __init__(self, **kwargs: Any) -> None:
         """Initialize from kwargs."""
         super().__init__(**kwargs)
         # Import NetworkX only when this class is instantiated
 
+    @instrumented("nx_execution")
+    def _execute_nx_code(self, nx_code: str) -> Dict[str, Any]:
+        """Run the generated code and return its local variables."""
+        if self.use_sandbox:
+            if self.nx_sandbox is not None:
+                return {"FINAL_RESULT": self.nx_sandbox.run(nx_code)}
+            try:
+                return {"FINAL_RESULT": get_nx_sandbox(self.db, self.graph).run(nx_code)}
+            except SandboxClosed:
+                # Replaced by a sandbox on a newer snapshot while waiting for a worker
+                return {"FINAL_RESULT": get_nx_sandbox(self.db, self.graph).run(nx_code)}
+
+        if self.use_nx_cache or self.G_adb is None:
+            G_adb = get_networkx_graph(self.db, self.graph)
+        else:
+            G_adb = self.G_adb
+        # The graph is shared by every user and agent: the generated code gets a
+        # frozen view, and the cache's attributes are read-only mappings
+        global_vars = {"G_adb": nx.freeze(G_adb.copy(as_view=True)), "nx": nx}
+        local_vars = {}
+        exec(nx_code, global_vars, local_vars)
+        return local_vars
+
     @property
     def input_keys(self) -> List[str]:
         """Return the input keys."""
@@ -469,12 +711,8 @@ class ArangoNetworkxQAChain(Chain):
                     "Executing NetworkX code...", end="\n", verbose=self.verbose
                 )
                 
-                # Prepare global variables for execution
-                global_vars = {"G_adb": self.G_adb, "nx": nx}
-                local_vars = {}
-                
                 # Execute the code
-                exec(nx_code_cleaned, global_vars, local_vars)
+                local_vars = self._execute_nx_code(nx_code_cleaned)
                 
                 # Check if FINAL_RESULT is in the local variables
                 if "FINAL_RESULT" not in local_vars:
@@ -1,20 +1,259 @@
 import datetime
-from typing import Dict, Any, List, Optional, Union, Tuple
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Union, Tuple, Set
 from arango import ArangoClient
 from arango.database import StandardDatabase
 
+from app.common.metrics import GRAPH_WRITES, observe
+
+# (database name, collection name) pairs known to exist, shared by all consumers
+_known_collections: Set[Tuple[str, str]] = set()
+_known_collections_lock = threading.Lock()
+
+
+def ensure_collection(db: StandardDatabase, collection_name: str, edge: bool = False, create: bool = True) -> bool:
+    """
+    Make sure a collection exists, asking the server only the first time a
+    collection is seen in this process.
+
+    Existing and created collections are remembered until the process
+    restarts, so a collection dropped later is not created again; writes to it
+    fail instead. Missing collections are not remembered.
+
+    Args:
+        db: Database connection
+        collection_name: The name of the collection
+        edge: Whether to create an edge collection
+        create: Create the collection if it is missing
+
+    Returns:
+        Whether the collection exists
+    """
+    cache_key = (db.name, collection_name)
+    if cache_key in _known_collections:
+        return True
+    if not db.has_collection(collection_name):
+        if not create:
+            return False
+        db.create_collection(collection_name, edge=edge)
+    with _known_collections_lock:
+        _known_collections.add(cache_key)
+    return True
+
+
+class DocumentRef:
+    """
+    Placeholder for a document written by a GraphBatch. `id` is set when the
+    batch is flushed; refs can be passed to `add_edge`, or used as top-level
+    values of node data, before that. `id` stays None if the write was
+    skipped because its collection does not exist.
+    """
+
+    def __init__(self):
+        self.id: Optional[str] = None
+        # Whether the batch has written (or skipped) the document
+        self.done = False
+
+    def __str__(self) -> str:
+        if self.id is None:
+            raise ValueError("Document has not been flushed yet")
+        return self.id
+
+
+def _ref_id(value: Union[str, DocumentRef, None]) -> Optional[str]:
+    return value.id if isinstance(value, DocumentRef) else value
+
+
+def _refs_done(data: Dict[str, Any]) -> bool:
+    return all(value.done for value in data.values() if isinstance(value, DocumentRef))
+
+
+def _resolve_refs(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace top-level DocumentRef values by the ids they were written under."""
+    return {key: _ref_id(value) for key, value in data.items()}
+
+
+class GraphBatch:
+    """
+    Unit of work that buffers node upserts and edge inserts and writes them
+    in as few requests as possible: one AQL query upserting all nodes (one
+    UPSERT loop per collection over an array) and one `import_bulk` per edge
+    collection.
+
+    Nodes with the same collection and unique value are written once, with
+    later upserts merged over earlier ones as if they had run in order. Node
+    data may hold refs to other nodes of the batch; those nodes are written
+    first, in an earlier query. Edges added with `unique=True` are looked up
+    by their endpoints and only inserted if no such edge exists yet,
+    whatever its key.
+
+    With `create_collections=False`, writes to missing collections are
+    skipped: their refs keep `id` None, and edges touching them are skipped
+    as well.
+    """
+
+    def __init__(self, db: StandardDatabase, create_collections: bool = True):
+        self.db = db
+        self.create_collections = create_collections
+        # (collection, unique_key) -> list of [match value, data, update, ref]
+        self._nodes: Dict[Tuple[str, str], List[List[Any]]] = {}
+        # (collection, unique_key, match value) -> the node's entry in self._nodes
+        self._node_entries: Dict[Tuple[str, str, Any], List[Any]] = {}
+        # collection -> list of (from, to, data, unique, ref)
+        self._edges: Dict[str, List[Tuple[Any, Any, Dict[str, Any], bool, DocumentRef]]] = {}
+
+    def add_node(self, collection_name: str, data: Dict[str, Any], unique_key: Optional[str] = None,
+                 unique_value: Optional[Any] = None, update: bool = True) -> DocumentRef:
+        """Buffer a node upsert (or insert without a unique key) and return its ref."""
+        if unique_key and unique_value is not None:
+            ref_key = (collection_name, unique_key, unique_value)
+            entry = self._node_entries.get(ref_key)
+            if entry is not None:
+                if update:
+                    # Inserted with the first data and updated by this one,
+                    # or updated by both: the later values win either way
+                    entry[1] = {**entry[1], **data}
+                    entry[2] = {**entry[2], **data}
+                return entry[3]
+        else:
+            # Generate the key here so plain inserts go through the same UPSERT
+            unique_key, unique_value = "_key", data.get("_key") or uuid.uuid4().hex
+            data = {**data, "_key": unique_value}
+            ref_key = (collection_name, unique_key, unique_value)
+
+        ref = DocumentRef()
+        entry = [unique_value, data, data if update else {}, ref]
+        self._node_entries[ref_key] = entry
+        self._nodes.setdefault((collection_name, unique_key), []).append(entry)
+        return ref
+
+    def add_edge(self, edge_collection: str, from_id: Union[str, DocumentRef], to_id: Union[str, DocumentRef],
+                 data: Optional[Dict[str, Any]] = None, unique: bool = False) -> DocumentRef:
+        """Buffer an edge insert and return its ref."""
+        ref = DocumentRef()
+        self._edges.setdefault(edge_collection, []).append((from_id, to_id, data or {}, unique, ref))
+        return ref
+
+    def _flush_nodes(self) -> None:
+        # A query may modify each collection only once, so groups sharing a
+        # collection (different unique keys) go into separate queries, as do
+        # nodes whose data refers to nodes not written yet
+        pending = list(self._nodes.items())
+        while pending:
+            lets, bind_vars, groups, seen, rest = [], {}, [], set(), []
+            for (collection_name, unique_key), items in pending:
+                if not ensure_collection(self.db, collection_name, create=self.create_collections):
+                    for _, _, _, ref in items:
+                        ref.done = True
+                    continue
+                ready, waiting = [], []
+                for item in items:
+                    (ready if collection_name not in seen and _refs_done(item[1]) else waiting).append(item)
+                if waiting:
+                    rest.append(((collection_name, unique_key), waiting))
+                if not ready:
+                    continue
+                seen.add(collection_name)
+                i = len(groups)
+                lets.append(
+                    f"LET g{i} = (FOR d IN @docs{i} "
+                    f"UPSERT {{ {unique_key}: d.value }} INSERT d.data UPDATE d.update "
+                    f"IN @@collection{i} RETURN NEW._id)"
+                )
+                bind_vars[f"docs{i}"] = [
+                    {"value": value, "data": _resolve_refs(data), "update": _resolve_refs(update)}
+                    for value, data, update, _ in ready
+                ]
+                bind_vars[f"@collection{i}"] = collection_name
+                groups.append(ready)
+            if not groups:
+                if rest:
+                    raise ValueError("Batched nodes refer to each other in a cycle")
+                return
+            query = "\n".join(lets) + "\nRETURN [" + ", ".join(f"g{i}" for i in range(len(groups))) + "]"
+            results = next(self.db.aql.execute(query, bind_vars=bind_vars))
+            for items, ids in zip(groups, results):
+                for (_, _, _, ref), node_id in zip(items, ids):
+                    ref.id = node_id
+                    ref.done = True
+            pending = rest
+
+    def _flush_edges(self) -> None:
+        for edge_collection, items in self._edges.items():
+            exists = ensure_collection(self.db, edge_collection, edge=True, create=self.create_collections)
+            docs, unique_docs = [], {}
+            for from_id, to_id, data, unique, ref in items:
+                ref.done = True
+                from_id, to_id = _ref_id(from_id), _ref_id(to_id)
+                if not exists or from_id is None or to_id is None:
+                    continue
+                doc = {**data, "_from": from_id, "_to": to_id}
+                doc.setdefault("created_at", str(datetime.datetime.utcnow()))
+                if unique:
+                    # The same endpoints within one batch are written once
+                    unique_docs.setdefault((from_id, to_id), (doc, []))[1].append(ref)
+                else:
+                    doc.setdefault("_key", uuid.uuid4().hex)
+                    ref.id = f"{edge_collection}/{doc['_key']}"
+                    docs.append(doc)
+
+            if docs:
+                result = self.db.collection(edge_collection).import_bulk(docs, on_duplicate="ignore", details=True)
+                if result.get("errors"):
+                    raise ValueError(f"Failed to import edges into '{edge_collection}': {result.get('details')}")
+            if unique_docs:
+                # Existing edges keep their first version and are found by the
+                # edge index whatever key they were stored under
+                cursor = self.db.aql.execute(
+                    """
+                    FOR e IN @edges
+                      LET existing = FIRST(
+                        FOR x IN @@collection FILTER x._from == e._from AND x._to == e._to LIMIT 1 RETURN x._id
+                      )
+                      LET inserted = existing == null ? (INSERT e INTO @@collection RETURN NEW._id) : []
+                      RETURN existing || inserted[0]
+                    """,
+                    bind_vars={"edges": [doc for doc, _ in unique_docs.values()], "@collection": edge_collection}
+                )
+                for (_, refs), edge_id in zip(unique_docs.values(), cursor):
+                    for ref in refs:
+                        ref.id = edge_id
+
+    def flush(self) -> None:
+        """Write all buffered nodes, then all buffered edges."""
+        with observe("graph_write"):
+            if self._nodes:
+                self._flush_nodes()
+            if self._edges:
+                self._flush_edges()
+        for (collection_name, _), items in self._nodes.items():
+            GRAPH_WRITES.inc(len(items), collection=collection_name, kind="node")
+        for edge_collection, items in self._edges.items():
+            GRAPH_WRITES.inc(len(items), collection=edge_collection, kind="edge")
+        self._nodes, self._node_entries, self._edges = {}, {}, {}
+
+
 class BaseGraphConsumer:
     """
     Base class for graph database consumers that provides common functionality
     for managing nodes and edges in an ArangoDB graph database.
     """
     
+    # Create missing collections on write. Consumers whose collections are
+    # provisioned with the user's database set this to False, so writes to a
+    # missing collection are skipped instead of creating collections outside
+    # the graph definition.
+    create_collections: bool = True
+
     def __init__(self):
         """
         Initialize the BaseGraphConsumer.
         """
         self.db = None
         self.graph = None
+        self._batch: Optional[GraphBatch] = None
         
     def setup_graph(self, db: StandardDatabase, graph_name: str, edge_definitions: List[Dict[str, Any]], 
                    orphan_collections: List[str]) -> None:
@@ -58,8 +297,34 @@ class BaseGraphConsumer:
         else:
             self.graph = self.db.graph(graph_name)
             print(f"Graph '{graph_name}' already exists.")
+
+    @contextmanager
+    def batch(self, db: Optional[StandardDatabase] = None):
+        """
+        Buffer `add_node` and `add_edge` calls and write them together on exit.
+
+        Inside the block both methods return DocumentRef placeholders whose
+        `id` is available after the block. Nothing is written if the block
+        raises.
+
+        Args:
+            db: Database connection to use (defaults to self.db)
+
+        Yields:
+            The GraphBatch being filled
+        """
+        if db is not None:
+            self.db = db
+        self._batch = GraphBatch(self.db, self.create_collections)
+        try:
+            yield self._batch
+            self._batch.flush()
+        finally:
+            self._batch = None
+
     def add_node(self, collection_name: str, data: Dict[str, Any], 
-                unique_key: Optional[str] = None, unique_value: Optional[str] = None) -> str:
+                unique_key: Optional[str] = None, unique_value: Optional[str] = None,
+                update: bool = True) -> Union[str, DocumentRef, None]:
         """
         Add a node to a collection if it doesn't already exist.
         
@@ -68,19 +333,23 @@ class BaseGraphConsumer:
             data: The data to store in the node
             unique_key: Optional key to check for uniqueness (e.g., 'email')
             unique_value: Optional value to check for uniqueness
+            update: Whether to overwrite an existing node with data
             
         Returns:
-            The ID of the node
+            The ID of the node (None if the collection is missing and
+            create_collections is False), or a DocumentRef inside a batch
         """
-        # Ensure collection exists
-        if not self.db.has_collection(collection_name):
-            self.db.create_collection(collection_name)
-            
-        collection = self.db.collection(collection_name)
-        
         # Add timestamp if not provided
         if "created_at" not in data:
             data["created_at"] = str(datetime.datetime.utcnow())
+
+        if self._batch is not None:
+            return self._batch.add_node(collection_name, data, unique_key, unique_value, update)
+
+        # Ensure collection exists
+        if not ensure_collection(self.db, collection_name, create=self.create_collections):
+            return None
+        collection = self.db.collection(collection_name)
         
         # Perform upsert operation - update if exists, insert if not
         if unique_key and unique_value:
@@ -88,13 +357,13 @@ class BaseGraphConsumer:
             query = f"""
             UPSERT {{ {unique_key}: @value }}
             INSERT @data
-            UPDATE @data
+            UPDATE @update
             IN {collection_name}
             RETURN NEW
             """
             cursor = self.db.aql.execute(
                 query,
-                bind_vars={"value": unique_value, "data": data}
+                bind_vars={"value": unique_value, "data": data, "update": data if update else {}}
             )
             result = next(cursor)
             return result["_id"]
@@ -103,37 +372,29 @@ class BaseGraphConsumer:
             result = collection.insert(data)
             return result["_id"]
     
-    def add_edge(self, edge_collection: str, from_id: str, to_id: str, 
-                data: Optional[Dict[str, Any]] = None) -> str:
+    def add_edge(self, edge_collection: str, from_id: Union[str, DocumentRef], to_id: Union[str, DocumentRef],
+                data: Optional[Dict[str, Any]] = None, unique: bool = False) -> Union[str, DocumentRef]:
         """
         Add an edge between two nodes in the database.
         
         Args:
             edge_collection: The name of the edge collection
-            from_id: The ID of the source node
-            to_id: The ID of the target node
+            from_id: The ID (or DocumentRef) of the source node
+            to_id: The ID (or DocumentRef) of the target node
             data: Optional additional data for the edge
+            unique: Only insert the edge if no edge with the same endpoints exists
             
         Returns:
-            The ID of the created edge
+            The ID of the created edge, or a DocumentRef inside a batch
         """
-        # Ensure edge collection exists
-        if not self.db.has_collection(edge_collection):
-            self.db.create_collection(edge_collection, edge=True)
-            
-        edges = self.db.collection(edge_collection)
-        
-        # Prepare edge data
-        edge_data = data or {}
-        edge_data.update({
-            "_from": from_id,
-            "_to": to_id,
-            "created_at": str(datetime.datetime.utcnow())
-        })
-        
-        # Create the edge
-        result = edges.insert(edge_data)
-        return result["_id"]
+        if self._batch is not None:
+            return self._batch.add_edge(edge_collection, from_id, to_id, data, unique)
+
+        # Writing through a one-edge batch looks up unique edges the same way
+        batch = GraphBatch(self.db, self.create_collections)
+        ref = batch.add_edge(edge_collection, from_id, to_id, data, unique)
+        batch.flush()
+        return ref.id
     
     def get_node_by_id(self, node_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -178,11 +439,13 @@ class BaseGraphConsumer:
             
         Returns:
             Result of the bulk import
+
+        Raises:
+            ValueError: If the collection is missing and create_collections is False
         """
         # Ensure collection exists
-        if not self.db.has_collection(collection_name):
-            self.db.create_collection(collection_name)
-            
+        if not ensure_collection(self.db, collection_name, create=self.create_collections):
+            raise ValueError(f"Collection '{collection_name}' does not exist")
         collection = self.db.collection(collection_name)
         
         # Add timestamps if not provided
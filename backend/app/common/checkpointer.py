@@ -0,0 +1,346 @@
+"""SQLite checkpointers for the agents, tuned for concurrent use and bounded growth."""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Set
+
+import aiosqlite
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from app.common.metrics import Counter, registry
+
+CHECKPOINT_DB_PATH = os.environ.get("CHECKPOINT_DB_PATH", "checkpoints.sqlite")
+# Checkpoints kept per conversation thread (and subgraph namespace); older ones are pruned.
+# Resuming a thread only needs its latest checkpoint, the rest is history for time travel.
+CHECKPOINT_KEEP_LAST = int(os.environ.get("CHECKPOINT_KEEP_LAST", 20))
+# Seconds between background compaction passes
+CHECKPOINT_COMPACTION_INTERVAL = float(os.environ.get("CHECKPOINT_COMPACTION_INTERVAL", 60))
+# Milliseconds a connection waits for another writer before failing with "database is locked"
+CHECKPOINT_BUSY_TIMEOUT_MS = int(os.environ.get("CHECKPOINT_BUSY_TIMEOUT_MS", 30000))
+
+# WAL lets readers run alongside the single writer, and with synchronous=NORMAL a
+# commit only appends to the WAL instead of syncing the database file. Freed pages
+# are handed back by `PRAGMA incremental_vacuum` (auto_vacuum only takes effect on
+# a new database file).
+CONNECTION_PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={CHECKPOINT_BUSY_TIMEOUT_MS}",
+)
+
+# Checkpoints of a thread beyond the newest `keep_last` per namespace
+_PRUNE_CHECKPOINTS = """
+DELETE FROM checkpoints WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid, ROW_NUMBER() OVER (
+            PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC
+        ) AS position
+        FROM checkpoints WHERE thread_id = ?
+    ) WHERE position > ?
+)
+"""
+# Pending writes whose checkpoint was pruned
+_PRUNE_WRITES = """
+DELETE FROM writes WHERE thread_id = ? AND NOT EXISTS (
+    SELECT 1 FROM checkpoints
+    WHERE checkpoints.thread_id = writes.thread_id
+      AND checkpoints.checkpoint_ns = writes.checkpoint_ns
+      AND checkpoints.checkpoint_id = writes.checkpoint_id
+)
+"""
+
+CHECKPOINTS_PRUNED = registry.register(Counter(
+    "dash_checkpoints_pruned_total", "Checkpoints deleted by the retention policy"
+))
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a connection to a checkpoint database with the tuned pragmas applied."""
+    # Used by one thread at a time, but may be closed from another
+    conn = sqlite3.connect(path, timeout=CHECKPOINT_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def create_tables(path: str) -> None:
+    """Create the checkpoint tables of a database if they don't exist."""
+    conn = connect(path)
+    try:
+        SqliteSaver(conn).setup()
+    finally:
+        conn.close()
+
+
+def prune_checkpoints(conn: sqlite3.Connection, thread_ids: Iterable[str], keep_last: int) -> int:
+    """
+    Delete all but the newest checkpoints of some threads, and their pending writes.
+
+    Checkpoint IDs are time-ordered, so the newest are the largest.
+
+    Args:
+        conn: Connection to the checkpoint database
+        thread_ids: Threads to prune
+        keep_last: Checkpoints to keep per thread and namespace
+
+    Returns:
+        The number of checkpoints deleted
+    """
+    deleted = 0
+    with conn:
+        for thread_id in thread_ids:
+            deleted += conn.execute(_PRUNE_CHECKPOINTS, (str(thread_id), keep_last)).rowcount
+            conn.execute(_PRUNE_WRITES, (str(thread_id),))
+    return deleted
+
+
+class CheckpointCompactor:
+    """
+    Applies the retention policy to a checkpoint database off the request path.
+
+    Savers report the threads they write to with `mark`; every `interval`
+    seconds a background thread prunes those threads, truncates the WAL and
+    returns freed pages to the file system, so checkpoint writes stay cheap
+    and the database stops growing once every thread has `keep_last`
+    checkpoints.
+    """
+
+    def __init__(self, path: str, keep_last: int = CHECKPOINT_KEEP_LAST,
+                 interval: float = CHECKPOINT_COMPACTION_INTERVAL):
+        """
+        Initialize the compactor without starting it.
+
+        Args:
+            path: Path of the checkpoint database
+            keep_last: Checkpoints to keep per thread and namespace
+            interval: Seconds between compaction passes
+        """
+        self.path = path
+        self.keep_last = keep_last
+        self.interval = interval
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def mark(self, thread_id: str) -> None:
+        """Note that a thread got a new checkpoint."""
+        with self._lock:
+            self._dirty.add(str(thread_id))
+
+    def compact(self) -> int:
+        """
+        Run one compaction pass now.
+
+        Returns:
+            The number of checkpoints deleted
+        """
+        with self._lock:
+            thread_ids, self._dirty = self._dirty, set()
+        if not thread_ids:
+            return 0
+        conn = connect(self.path)
+        try:
+            deleted = prune_checkpoints(conn, sorted(thread_ids), self.keep_last)
+            if deleted:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.execute("PRAGMA incremental_vacuum")
+        except sqlite3.Error:
+            # Retry these threads on the next pass
+            with self._lock:
+                self._dirty |= thread_ids
+            raise
+        finally:
+            conn.close()
+        CHECKPOINTS_PRUNED.inc(deleted)
+        return deleted
+
+    def start(self) -> "CheckpointCompactor":
+        """Start compacting in a daemon thread; does nothing if already started."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="checkpoint-compactor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the background thread after a last compaction pass."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._compact_logged()
+        self._compact_logged()
+
+    def _compact_logged(self) -> None:
+        try:
+            start = time.monotonic()
+            deleted = self.compact()
+            if deleted:
+                logger.info(f"Pruned {deleted} checkpoints in {time.monotonic() - start:.2f}s")
+        except Exception:
+            logger.exception("Checkpoint compaction failed")
+
+
+class ManagedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver with a connection per thread and a retention policy.
+
+    The stock saver shares one connection behind a lock, so concurrent agents
+    (e.g. the gateway's fan-out) wait on each other even for reads. Here each
+    thread gets its own connection and SQLite's WAL locking arbitrates writers.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, compactor: Optional[CheckpointCompactor] = None, **kwargs):
+        """
+        Initialize the saver and create the tables.
+
+        Args:
+            path: Path of the checkpoint database; must be a file, since
+                `:memory:` would give every thread its own database
+            compactor: Compactor told about written threads; pass None to keep
+                every checkpoint
+            **kwargs: Passed to SqliteSaver (e.g. serde)
+        """
+        if path == ":memory:":
+            raise ValueError("ManagedSqliteSaver needs a database file; use MemorySaver for in-memory checkpoints")
+        self.path = path
+        self.compactor = compactor
+        # Dropped with their thread, e.g. when a fan-out pool's workers exit
+        self._connections: "weakref.WeakKeyDictionary[threading.Thread, sqlite3.Connection]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._connections_lock = threading.Lock()
+        super().__init__(connect(path), **kwargs)
+        self.setup()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on its first use."""
+        thread = threading.current_thread()
+        with self._connections_lock:
+            conn = self._connections.get(thread)
+            if conn is None:
+                conn = self._connections[thread] = connect(self.path)
+            return conn
+
+    @conn.setter
+    def conn(self, conn: sqlite3.Connection) -> None:
+        with self._connections_lock:
+            self._connections[threading.current_thread()] = conn
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        # Same as SqliteSaver.cursor without the saver-wide lock: the connection is the thread's own
+        self.setup()
+        conn = self.conn
+        cur = conn.cursor()
+        try:
+            yield cur
+        finally:
+            if transaction:
+                conn.commit()
+            cur.close()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        if self.compactor is not None:
+            self.compactor.mark(config["configurable"]["thread_id"])
+        return saved
+
+    def close(self) -> None:
+        """Close every thread's connection."""
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+
+
+class ManagedAsyncSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver with the tuned pragmas and the retention policy, for `astream` runs."""
+
+    def __init__(self, conn: aiosqlite.Connection, path: str,
+                 compactor: Optional[CheckpointCompactor] = None, **kwargs):
+        """
+        Initialize the saver.
+
+        Args:
+            conn: Open connection to the checkpoint database
+            path: Path of the same database
+            compactor: Compactor told about written threads; pass None to keep
+                every checkpoint
+            **kwargs: Passed to AsyncSqliteSaver (e.g. serde)
+        """
+        super().__init__(conn, **kwargs)
+        self.path = path
+        self.compactor = compactor
+
+    async def setup(self) -> None:
+        # AsyncSqliteSaver.setup calls aiosqlite's Connection.is_alive, which
+        # aiosqlite 0.22 removed; the tables come from the sync saver's schema instead
+        async with self.lock:
+            if self.is_setup:
+                return
+            for pragma in CONNECTION_PRAGMAS:
+                await self.conn.execute(pragma)
+            await asyncio.to_thread(create_tables, self.path)
+            self.is_setup = True
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        saved = await super().aput(config, checkpoint, metadata, new_versions)
+        if self.compactor is not None:
+            self.compactor.mark(config["configurable"]["thread_id"])
+        return saved
+
+
+@asynccontextmanager
+async def async_checkpointer(path: str = CHECKPOINT_DB_PATH) -> AsyncIterator[ManagedAsyncSqliteSaver]:
+    """
+    Open an async checkpointer on a database, for graphs run with `astream`/`ainvoke`.
+
+    It shares the background compactor of `get_checkpointer(path)`, so both
+    variants can be used on the same database.
+    """
+    compactor = get_compactor(path)
+    async with aiosqlite.connect(path, timeout=CHECKPOINT_BUSY_TIMEOUT_MS / 1000) as conn:
+        saver = ManagedAsyncSqliteSaver(conn, path, compactor=compactor)
+        await saver.setup()
+        yield saver
+
+
+_compactors: Dict[str, CheckpointCompactor] = {}
+_checkpointers: Dict[str, ManagedSqliteSaver] = {}
+_lock = threading.Lock()
+
+
+def get_compactor(path: str = CHECKPOINT_DB_PATH) -> CheckpointCompactor:
+    """Get the running background compactor of a checkpoint database."""
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _compactors:
+            _compactors[path] = CheckpointCompactor(path).start()
+        return _compactors[path]
+
+
+def get_checkpointer(path: str = CHECKPOINT_DB_PATH) -> ManagedSqliteSaver:
+    """Get the shared checkpointer of a database, creating it and its compactor on first use."""
+    compactor = get_compactor(path)
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _checkpointers:
+            _checkpointers[path] = ManagedSqliteSaver(path, compactor=compactor)
+        return _checkpointers[path]
@@ -0,0 +1,265 @@
+"""Offline chat model for load tests and benchmarks."""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+FAKE_LLM_SEED = int(os.environ.get("FAKE_LLM_SEED", 0))
+# "constant:S", "uniform:MIN,MAX", "normal:MEAN,STDDEV" or "lognormal:MEDIAN,SIGMA", in seconds
+FAKE_LLM_LATENCY = os.environ.get("FAKE_LLM_LATENCY", "constant:0")
+
+WORDS = [
+    "project", "meeting", "invoice", "deadline", "review", "release", "budget", "design",
+    "customer", "report", "schedule", "contract", "launch", "roadmap", "feedback", "update",
+    "alice", "bob", "carol", "dave", "acme", "globex", "initech", "umbrella"
+]
+
+AQL_TASK_MARKERS = (
+    "Generate an ArangoDB Query Language (AQL) query",
+    "Address the ArangoDB Query Language (AQL) error"
+)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution.
+
+    Args:
+        spec: "constant:S", "uniform:MIN,MAX", "normal:MEAN,STDDEV" or
+            "lognormal:MEDIAN,SIGMA", in seconds
+
+    Returns:
+        A function drawing a non-negative latency from a random generator
+
+    Raises:
+        ValueError: If the spec is not recognized
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        params = [float(value) for value in args.split(",")] if args else [0.0]
+    except ValueError:
+        raise ValueError(f"Invalid latency distribution: {spec}")
+    kind = kind.strip().lower()
+    if kind == "constant" and len(params) == 1:
+        return lambda rng: max(0.0, params[0])
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: max(0.0, rng.uniform(params[0], params[1]))
+    if kind == "normal" and len(params) == 2:
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal" and len(params) == 2 and params[0] > 0:
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Invalid latency distribution: {spec}")
+
+
+def fake_value(schema: Dict[str, Any], rng: random.Random, name: str = "",
+               defs: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Generate a value that validates against a JSON schema.
+
+    Args:
+        schema: JSON schema (as produced by pydantic or convert_to_openai_tool)
+        rng: Random generator
+        name: Property name, used to pick plausible strings
+        defs: Definitions referenced by `$ref`
+
+    Returns:
+        A JSON-compatible value
+    """
+    defs = schema.get("$defs", defs or {})
+    if "$ref" in schema:
+        return fake_value(defs[schema["$ref"].split("/")[-1]], rng, name, defs)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if "const" in schema:
+        return schema["const"]
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return fake_value(options[0], rng, name, defs)
+    if "allOf" in schema:
+        return fake_value(schema["allOf"][0], rng, name, defs)
+
+    kind = schema.get("type", "object" if "properties" in schema else "string")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {key: fake_value(value, rng, key, defs) for key, value in properties.items()}
+    if kind == "array":
+        low = schema.get("minItems", 1)
+        count = rng.randint(low, max(low, min(schema.get("maxItems", 4), 4)))
+        return [fake_value(schema.get("items", {}), rng, name, defs) for _ in range(count)]
+    if kind == "number":
+        return round(rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0)), 3)
+    if kind == "integer":
+        return rng.randint(schema.get("minimum", 0), schema.get("maximum", 10))
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    if "email" in name.lower():
+        return f"{rng.choice(WORDS)}@example.com"
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers without a network, for load tests and benchmarks.
+
+    Responses depend only on the seed and the prompt, so runs are repeatable:
+    - structured-output and other forced tool calls get arguments generated
+      from the tool's JSON schema, so they validate against it
+    - AQL generation prompts get an AQL query over a collection named in
+      the prompt's schema
+    - agents with bound tools call one tool, then answer once it returned
+    - anything else gets a short text answer
+
+    Each call sleeps for a latency drawn from `latency`, to emulate the API.
+    """
+
+    model_name: str = "fake"
+    seed: int = Field(default_factory=lambda: FAKE_LLM_SEED)
+    latency: str = Field(default_factory=lambda: FAKE_LLM_LATENCY)
+
+    _latency_rng: random.Random = PrivateAttr()
+    _latency_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _sample_latency: Callable[[random.Random], float] = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latency_rng = random.Random(self.seed)
+        self._sample_latency = parse_latency(self.latency)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "seed": self.seed}
+
+    def bind_tools(
+        self,
+        tools: Sequence[Union[Dict[str, Any], type, Callable, BaseTool]],
+        *,
+        tool_choice: Optional[Union[str, bool, dict]] = None,
+        **kwargs: Any
+    ) -> Runnable:
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools],
+            tool_choice=tool_choice,
+            **kwargs
+        )
+
+    def _rng_for(self, messages: List[BaseMessage]) -> random.Random:
+        prompt = "\n".join(f"{message.type}:{message.content}" for message in messages)
+        digest = hashlib.sha256(f"{self.seed}|{self.model_name}|{prompt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _sleep(self) -> None:
+        with self._latency_lock:
+            delay = self._sample_latency(self._latency_rng)
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def _forced_tool(tools: List[Dict[str, Any]], tool_choice: Any) -> Optional[Dict[str, Any]]:
+        if not tools or tool_choice in (None, False, "auto", "none"):
+            return None
+        if isinstance(tool_choice, dict):
+            tool_choice = tool_choice.get("function", {}).get("name", tool_choice.get("name"))
+        for tool in tools:
+            if tool["function"]["name"] == tool_choice:
+                return tool
+        return tools[0]
+
+    def _tool_call(self, tool: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+        function = tool["function"]
+        return {
+            "name": function["name"],
+            "args": fake_value(function.get("parameters", {}), rng),
+            "id": f"call_{uuid.UUID(int=rng.getrandbits(128)).hex[:24]}",
+            "type": "tool_call"
+        }
+
+    def _respond(self, messages: List[BaseMessage], tools: List[Dict[str, Any]],
+                 tool_choice: Any) -> AIMessage:
+        rng = self._rng_for(messages)
+        forced = self._forced_tool(tools, tool_choice)
+        if forced is not None:
+            return AIMessage(content="", tool_calls=[self._tool_call(forced, rng)])
+
+        last = str(messages[-1].content) if messages else ""
+        if any(marker in last for marker in AQL_TASK_MARKERS):
+            collections = re.findall(r"""["']collection_name["']\s*:\s*["']([^"']+)["']""", last)
+            collection = rng.choice(collections) if collections else "users"
+            return AIMessage(content=f"```aql\nFOR doc IN {collection}\n    LIMIT 10\n    RETURN doc\n```")
+
+        if tools and not isinstance(messages[-1], ToolMessage):
+            return AIMessage(content="", tool_calls=[self._tool_call(rng.choice(tools), rng)])
+
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+        return AIMessage(content=" ".join(words).capitalize() + ".")
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        message = self._respond(messages, tools or [], tool_choice)
+        message.usage_metadata = self._usage(messages, message)
+        self._sleep()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        """Stream the same response word by word; the latency is spent before the first chunk."""
+        message = self._respond(messages, tools or [], tool_choice)
+        self._sleep()
+        if message.tool_calls:
+            chunks = [AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ])]
+        else:
+            chunks = [AIMessageChunk(content=token) for token in re.findall(r"\S+\s*", message.content)]
+        chunks.append(AIMessageChunk(content="", usage_metadata=self._usage(messages, message)))
+        for chunk in chunks:
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], message: AIMessage) -> Dict[str, int]:
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = (len(str(message.content)) + len(json.dumps(message.tool_calls))) // 4
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
@@ -0,0 +1,607 @@
+"""Compact, array-backed snapshots of ArangoDB graphs for NetworkX algorithms."""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import networkx as nx
+import numpy as np
+from arango.database import StandardDatabase
+from arango.graph import Graph
+
+# Directory holding one snapshot sub-directory per (database, graph)
+GRAPH_SNAPSHOT_DIR = os.environ.get("GRAPH_SNAPSHOT_DIR", "graph_snapshots")
+# Seconds a saved snapshot is used before it is checked against ArangoDB again
+GRAPH_SNAPSHOT_TTL = float(os.environ.get("GRAPH_SNAPSHOT_TTL", 3600))
+# Versions kept besides the current one, for processes that still have them mapped
+GRAPH_SNAPSHOT_KEEP_VERSIONS = 2
+
+# File in a snapshot directory naming its current version sub-directory
+CURRENT_VERSION_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+class AttributeColumn(Sequence):
+    """
+    One attribute of every node (or edge), stored as JSON values packed into a
+    byte array plus an offsets array, so it can be memory-mapped like the
+    graph structure. A missing value is an empty slice and reads as None.
+
+    Values are decoded on first access. Immutable ones (strings, numbers) are
+    cached, so algorithms reading the same attribute repeatedly decode it
+    once; lists and dicts are decoded on every access so that a caller
+    changing one cannot affect later reads.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self._decoded: Dict[int, Any] = {}
+
+    @classmethod
+    def from_values(cls, values: Iterable[Any]) -> "AttributeColumn":
+        encoded = [b"" if value is None else json.dumps(value, default=str).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __getitem__(self, i: int) -> Any:
+        if i in self._decoded:
+            return self._decoded[i]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        value = None if start == end else json.loads(self.data[start:end].tobytes())
+        if not isinstance(value, (list, dict)):
+            self._decoded[i] = value
+        return value
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class NumericColumn(Sequence):
+    """
+    One attribute whose values are all numbers (or all booleans), stored as a
+    native array plus a mask of present values. Reading a value, e.g. an edge
+    weight inside a shortest path search, needs no JSON decoding. Integers
+    mixed with floats read back as floats.
+    """
+
+    def __init__(self, values: np.ndarray, present: np.ndarray):
+        self.values = values
+        self.present = present
+
+    @classmethod
+    def from_values(cls, values: List[Any]) -> Optional["NumericColumn"]:
+        """Build a column from the values, or return None if they are not all numeric."""
+        numbers = [value for value in values if value is not None]
+        if all(isinstance(value, bool) for value in numbers):
+            dtype = np.bool_
+        elif any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in numbers):
+            return None
+        elif all(isinstance(value, int) for value in numbers):
+            if numbers and not -2 ** 63 <= min(numbers) <= max(numbers) < 2 ** 63:
+                return None
+            dtype = np.int64
+        else:
+            dtype = np.float64
+        present = np.array([value is not None for value in values], dtype=np.bool_)
+        native = np.array([value if value is not None else 0 for value in values], dtype=dtype)
+        return cls(native, present)
+
+    def __getitem__(self, i: int) -> Any:
+        if not self.present[i]:
+            return None
+        return self.values[i].item()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def column_from_values(values: Iterable[Any]) -> Sequence:
+    """Store an attribute as a NumericColumn if every value is numeric, else as an AttributeColumn."""
+    values = list(values)
+    return NumericColumn.from_values(values) or AttributeColumn.from_values(values)
+
+
+# Arrays saved for each column type, in constructor order
+COLUMN_ARRAYS = {AttributeColumn: ("data", "offsets"), NumericColumn: ("values", "present")}
+COLUMN_TYPES = {"json": AttributeColumn, "numeric": NumericColumn}
+
+
+def _row(columns: Dict[str, Sequence], i: int) -> Dict[str, Any]:
+    """Return the non-missing values of one node or edge."""
+    row = {}
+    for field, column in columns.items():
+        value = column[i]
+        if value is not None:
+            row[field] = value
+    return row
+
+
+class GraphSnapshot:
+    """
+    A directed graph stored as CSR arrays.
+
+    Nodes are numbered by the sorted order of their ArangoDB `_id`, so an id is
+    looked up with a binary search instead of a Python dict. Out-edges are
+    `indices[indptr[i]:indptr[i + 1]]` (sorted per node) and in-edges are kept
+    the same way in `in_indptr`/`in_indices`, with `in_edge_pos` pointing back
+    at the out-edge position that holds the edge attributes.
+
+    Attributes are kept column by column, either all of them (so the view
+    matches the documents described by the graph schema) or only
+    whitelisted ones. `save` writes the
+    structure and the attribute columns as .npy files that `load`
+    memory-maps, so several worker processes reading the same snapshot share
+    one copy in the page cache.
+    """
+
+    ARRAYS = ["node_ids", "indptr", "indices", "in_indptr", "in_indices", "in_edge_pos"]
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        in_indptr: np.ndarray,
+        in_indices: np.ndarray,
+        in_edge_pos: np.ndarray,
+        node_attrs: Dict[str, Sequence],
+        edge_attrs: Dict[str, Sequence],
+        metadata: Optional[Dict[str, Any]] = None,
+        path: Optional[str] = None
+    ):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.in_edge_pos = in_edge_pos
+        self.node_attrs = node_attrs
+        self.edge_attrs = edge_attrs
+        # When the snapshot was built (or last found up to date) and from
+        # which collection revisions
+        self.metadata = metadata or {}
+        # Version directory the snapshot was loaded from, if any
+        self.path = path
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(
+        cls,
+        nodes: Dict[str, Dict[str, Any]],
+        edges: List[tuple],
+        node_fields: Optional[List[str]] = None,
+        edge_fields: Optional[List[str]] = None
+    ) -> "GraphSnapshot":
+        """
+        Build a snapshot from node attributes and (source, target, attrs) edges.
+
+        Parallel edges collapse into one, like in nx.DiGraph (the last one wins),
+        and edges to unknown nodes add those nodes without attributes.
+
+        Args:
+            nodes: node_id -> attributes
+            edges: (source, target, attributes) tuples
+            node_fields: Node attributes to keep; None keeps all of them
+            edge_fields: Edge attributes to keep; None keeps all of them
+        """
+        if node_fields is None:
+            node_fields = list(dict.fromkeys(field for attrs in nodes.values() for field in attrs))
+        if edge_fields is None:
+            edge_fields = list(dict.fromkeys(field for _, _, attrs in edges for field in attrs))
+        node_set = set(nodes)
+        for source, target, _ in edges:
+            node_set.add(source)
+            node_set.add(target)
+        node_ids = np.array(sorted(node_set), dtype=str)
+        index = {node_id: i for i, node_id in enumerate(node_ids.tolist())}
+
+        edge_map = {}
+        for source, target, attrs in edges:
+            edge_map[(index[source], index[target])] = attrs
+        pairs = sorted(edge_map)
+        sources = np.array([p[0] for p in pairs], dtype=np.int64)
+        targets = np.array([p[1] for p in pairs], dtype=np.int32)
+
+        n = len(node_ids)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(indptr, sources + 1, 1)
+        indptr = np.cumsum(indptr)
+
+        # In-edges: order out-edge positions by (target, source)
+        in_edge_pos = np.lexsort((sources, targets)).astype(np.int64)
+        in_indices = sources[in_edge_pos].astype(np.int32)
+        in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(in_indptr, targets.astype(np.int64) + 1, 1)
+        in_indptr = np.cumsum(in_indptr)
+
+        node_list = node_ids.tolist()
+        node_attrs = {
+            field: column_from_values(nodes.get(node_id, {}).get(field) for node_id in node_list)
+            for field in node_fields
+        }
+        edge_attrs = {
+            field: column_from_values(edge_map[p].get(field) for p in pairs)
+            for field in edge_fields
+        }
+        return cls(node_ids, indptr, targets, in_indptr, in_indices, in_edge_pos, node_attrs, edge_attrs)
+
+    @classmethod
+    def from_networkx(
+        cls,
+        G: nx.DiGraph,
+        node_fields: Optional[List[str]] = None,
+        edge_fields: Optional[List[str]] = None
+    ) -> "GraphSnapshot":
+        """Build a snapshot from an existing NetworkX graph."""
+        return cls.from_edges(dict(G.nodes(data=True)), list(G.edges(data=True)), node_fields, edge_fields)
+
+    @classmethod
+    def from_arangodb(
+        cls,
+        db: StandardDatabase,
+        arango_graph: Graph,
+        node_fields: Optional[List[str]] = None,
+        edge_fields: Optional[List[str]] = None
+    ) -> "GraphSnapshot":
+        """
+        Build a snapshot straight from ArangoDB.
+
+        With whitelisted fields the projection happens in AQL, so the rest of
+        each document is never transferred. By default documents are kept
+        whole, like in the full NetworkX graph.
+        """
+        nodes = {}
+        for vc_name in arango_graph.vertex_collections():
+            if node_fields is None:
+                query, bind_vars = "FOR doc IN @@collection RETURN doc", {"@collection": vc_name}
+            else:
+                query = "FOR doc IN @@collection RETURN MERGE(KEEP(doc, @fields), {_id: doc._id})"
+                bind_vars = {"@collection": vc_name, "fields": node_fields}
+            cursor = db.aql.execute(query, bind_vars=bind_vars, batch_size=10000, stream=True)
+            for doc in cursor:
+                node_id = doc["_id"] if node_fields is None or "_id" in node_fields else doc.pop("_id")
+                nodes[node_id] = doc
+
+        edges = []
+        for edge_definition in arango_graph.edge_definitions():
+            ec_name = edge_definition["edge_collection"]
+            if edge_fields is None:
+                query, bind_vars = "FOR doc IN @@collection RETURN doc", {"@collection": ec_name}
+            else:
+                query = "FOR doc IN @@collection RETURN MERGE(KEEP(doc, @fields), {_from: doc._from, _to: doc._to})"
+                bind_vars = {"@collection": ec_name, "fields": edge_fields}
+            cursor = db.aql.execute(query, bind_vars=bind_vars, batch_size=10000, stream=True)
+            for doc in cursor:
+                edges.append((doc["_from"], doc["_to"], doc))
+
+        return cls.from_edges(nodes, edges, node_fields, edge_fields)
+
+    def save(self, path: str, keep_versions: int = GRAPH_SNAPSHOT_KEEP_VERSIONS) -> str:
+        """
+        Write the snapshot as a new version in a directory and make it current.
+
+        The version is written to a temporary directory, renamed into place
+        and then published by atomically replacing the CURRENT file, so
+        readers see either the previous version or the complete new one.
+        The arrays of a version are never modified afterwards, which keeps
+        them safe to memory-map while newer versions are written; only the
+        manifest is replaced when `is_fresh` finds the version up to date.
+
+        Args:
+            path: Snapshot directory
+            keep_versions: Older versions to keep besides the new one
+
+        Returns:
+            The directory of the new version
+        """
+        os.makedirs(path, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix=".tmp-", dir=path)
+        try:
+            for name in self.ARRAYS:
+                np.save(os.path.join(temp_path, f"{name}.npy"), getattr(self, name))
+            manifest = {"metadata": self.metadata}
+            for kind, attrs in (("node", self.node_attrs), ("edge", self.edge_attrs)):
+                manifest[f"{kind}_fields"] = list(attrs)
+                manifest[f"{kind}_column_types"] = []
+                for i, column in enumerate(attrs.values()):
+                    manifest[f"{kind}_column_types"].append(
+                        "numeric" if isinstance(column, NumericColumn) else "json"
+                    )
+                    for name in COLUMN_ARRAYS[type(column)]:
+                        np.save(os.path.join(temp_path, f"{kind}_attr_{i}_{name}.npy"), getattr(column, name))
+            _write_manifest(temp_path, manifest)
+
+            version = f"v{time.time_ns()}-{os.getpid()}"
+            version_path = os.path.join(path, version)
+            os.replace(temp_path, version_path)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+        current_file = os.path.join(path, CURRENT_VERSION_FILE)
+        with open(f"{current_file}.{version}", "w") as f:
+            f.write(version)
+        os.replace(f"{current_file}.{version}", current_file)
+
+        # Older versions may still be mapped by other processes; on POSIX their
+        # files stay readable after removal until they are unmapped
+        versions = sorted(name for name in os.listdir(path) if name.startswith("v") and name != version)
+        for name in versions[:max(0, len(versions) - keep_versions)]:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        return version_path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "GraphSnapshot":
+        """
+        Load a snapshot written by `save`, memory-mapping the arrays by default.
+
+        Args:
+            path: Snapshot directory (its current version is loaded), or the
+                directory of one version
+            mmap: Memory-map the files instead of reading them into memory
+        """
+        path = current_version_path(path) or path
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls.ARRAYS
+        }
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        attrs = {}
+        for kind in ("node", "edge"):
+            fields = manifest[f"{kind}_fields"]
+            # Snapshots saved before numeric columns only have JSON columns
+            column_types = manifest.get(f"{kind}_column_types", ["json"] * len(fields))
+            attrs[kind] = {}
+            for i, (field, column_type) in enumerate(zip(fields, column_types)):
+                column_class = COLUMN_TYPES[column_type]
+                attrs[kind][field] = column_class(*(
+                    np.load(os.path.join(path, f"{kind}_attr_{i}_{name}.npy"), mmap_mode=mmap_mode)
+                    for name in COLUMN_ARRAYS[column_class]
+                ))
+        return cls(
+            node_attrs=attrs["node"], edge_attrs=attrs["edge"], metadata=manifest["metadata"], path=path, **arrays
+        )
+
+    def is_fresh(self, db: StandardDatabase, arango_graph: Graph, max_age: float = GRAPH_SNAPSHOT_TTL) -> bool:
+        """
+        Whether the snapshot can still be served.
+
+        A snapshot younger than `max_age` is fresh. An older one is still
+        fresh if none of the graph's collections changed since it was built,
+        which costs one revision request per collection. In that case
+        `built_at` is moved to now (and saved, for a loaded snapshot), so the
+        revisions are not requested again until `max_age` has passed.
+        """
+        built_at = self.metadata.get("built_at")
+        if built_at is None:
+            return False
+        if time.time() - built_at < max_age:
+            return True
+        checked_at = time.time()
+        if self.metadata.get("collection_revisions") != collection_revisions(db, arango_graph):
+            return False
+        self.metadata["built_at"] = checked_at
+        if self.path is not None:
+            with open(os.path.join(self.path, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            manifest["metadata"]["built_at"] = checked_at
+            _write_manifest(self.path, manifest)
+        return True
+
+    def index_of(self, node_id: str) -> int:
+        """Return the integer index of a node, or -1 if it is not in the graph."""
+        i = int(np.searchsorted(self.node_ids, node_id))
+        if i < len(self.node_ids) and self.node_ids[i] == node_id:
+            return i
+        return -1
+
+    def node_data(self, i: int) -> Dict[str, Any]:
+        return _row(self.node_attrs, i)
+
+    def edge_data(self, pos: int) -> Dict[str, Any]:
+        return _row(self.edge_attrs, pos)
+
+    def view(self) -> "SnapshotDiGraph":
+        """Return a read-only nx.DiGraph backed by this snapshot."""
+        return SnapshotDiGraph(self)
+
+
+class _NodeMap(Mapping):
+    """node_id -> attribute dict, built on access."""
+
+    def __init__(self, snapshot: GraphSnapshot):
+        self._s = snapshot
+
+    def __getitem__(self, node_id):
+        i = self._s.index_of(node_id) if isinstance(node_id, str) else -1
+        if i < 0:
+            raise KeyError(node_id)
+        return self._s.node_data(i)
+
+    def __contains__(self, node_id):
+        return isinstance(node_id, str) and self._s.index_of(node_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for node_id in self._s.node_ids:
+            yield str(node_id)
+
+    def __len__(self):
+        return self._s.number_of_nodes
+
+
+class _NeighborMap(Mapping):
+    """neighbor_id -> edge attribute dict for one node and one direction."""
+
+    def __init__(self, snapshot: GraphSnapshot, i: int, outgoing: bool):
+        self._s = snapshot
+        if outgoing:
+            start, end = snapshot.indptr[i], snapshot.indptr[i + 1]
+            self._neighbors = snapshot.indices[start:end]
+            self._positions = np.arange(start, end)
+        else:
+            start, end = snapshot.in_indptr[i], snapshot.in_indptr[i + 1]
+            self._neighbors = snapshot.in_indices[start:end]
+            self._positions = snapshot.in_edge_pos[start:end]
+
+    def _find(self, node_id) -> int:
+        j = self._s.index_of(node_id) if isinstance(node_id, str) else -1
+        if j < 0:
+            return -1
+        k = int(np.searchsorted(self._neighbors, j))
+        if k < len(self._neighbors) and self._neighbors[k] == j:
+            return k
+        return -1
+
+    def __getitem__(self, node_id):
+        k = self._find(node_id)
+        if k < 0:
+            raise KeyError(node_id)
+        return self._s.edge_data(int(self._positions[k]))
+
+    def __contains__(self, node_id):
+        return self._find(node_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        node_ids = self._s.node_ids
+        for j in self._neighbors:
+            yield str(node_ids[j])
+
+    def __len__(self):
+        return len(self._neighbors)
+
+
+class _AdjacencyMap(Mapping):
+    """node_id -> _NeighborMap, the outer adjacency dict NetworkX expects."""
+
+    def __init__(self, snapshot: GraphSnapshot, outgoing: bool):
+        self._s = snapshot
+        self._outgoing = outgoing
+
+    def __getitem__(self, node_id):
+        i = self._s.index_of(node_id) if isinstance(node_id, str) else -1
+        if i < 0:
+            raise KeyError(node_id)
+        return _NeighborMap(self._s, i, self._outgoing)
+
+    def __contains__(self, node_id):
+        return isinstance(node_id, str) and self._s.index_of(node_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for node_id in self._s.node_ids:
+            yield str(node_id)
+
+    def __len__(self):
+        return self._s.number_of_nodes
+
+
+class SnapshotDiGraph(nx.DiGraph):
+    """
+    A read-only nx.DiGraph whose node and adjacency dicts are lazy views over a
+    GraphSnapshot. Algorithms that read the graph (shortest paths, centrality,
+    degree, traversal, ...) work unchanged; mutating it raises an error, while
+    `G.copy()` returns an ordinary mutable graph.
+
+    Without a snapshot it is an ordinary empty DiGraph, which is what NetworkX
+    helpers such as `copy` and `subgraph` expect from `G.__class__()`.
+    """
+
+    def __init__(self, snapshot: Optional[GraphSnapshot] = None, **attr):
+        super().__init__(**attr)
+        self.snapshot = snapshot
+        if snapshot is not None:
+            self._node = _NodeMap(snapshot)
+            self._succ = self._adj = _AdjacencyMap(snapshot, outgoing=True)
+            self._pred = _AdjacencyMap(snapshot, outgoing=False)
+            nx.freeze(self)
+
+    def number_of_edges(self, u: Optional[str] = None, v: Optional[str] = None) -> int:
+        if u is None and self.snapshot is not None:
+            return self.snapshot.number_of_edges
+        return super().number_of_edges(u, v)
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Write a version's manifest, atomically replacing an existing one."""
+    temp_file = os.path.join(path, f".{MANIFEST_FILE}.{os.getpid()}.{threading.get_ident()}")
+    with open(temp_file, "w") as f:
+        json.dump(manifest, f, default=str)
+    os.replace(temp_file, os.path.join(path, MANIFEST_FILE))
+
+
+def collection_revisions(db: StandardDatabase, arango_graph: Graph) -> Dict[str, str]:
+    """Return the current revision of every collection of a graph."""
+    names = list(arango_graph.vertex_collections())
+    names += [ed["edge_collection"] for ed in arango_graph.edge_definitions()]
+    return {name: db.collection(name).revision() for name in names}
+
+
+def current_version_path(path: str) -> Optional[str]:
+    """Return the directory of the current version of a snapshot, or None if it has none."""
+    try:
+        with open(os.path.join(path, CURRENT_VERSION_FILE)) as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_path(db_name: str, graph_name: str) -> str:
+    """Return the directory used for the snapshot of one graph."""
+    return os.path.join(GRAPH_SNAPSHOT_DIR, db_name, graph_name)
+
+
+def build_graph_snapshot(db: StandardDatabase, arango_graph: Graph) -> str:
+    """
+    Build a snapshot of a graph from ArangoDB and save it as the current version.
+
+    Returns:
+        The directory of the new version
+    """
+    # Read the revisions first so changes made while building count as newer
+    revisions = collection_revisions(db, arango_graph)
+    snapshot = GraphSnapshot.from_arangodb(db, arango_graph)
+    snapshot.metadata = {"built_at": time.time(), "collection_revisions": revisions}
+    return snapshot.save(snapshot_path(db.name, arango_graph.name))
+
+
+def get_graph_snapshot(
+    db: StandardDatabase,
+    arango_graph: Graph,
+    rebuild: bool = False,
+    max_age: float = GRAPH_SNAPSHOT_TTL
+) -> GraphSnapshot:
+    """
+    Load the saved snapshot of a graph, building and saving it first if it is
+    missing or stale (see `GraphSnapshot.is_fresh`).
+
+    Args:
+        db: Database containing the graph
+        arango_graph: The ArangoDB graph
+        rebuild: Rebuild the snapshot from ArangoDB even if it is fresh
+        max_age: Seconds after which the snapshot is checked against ArangoDB
+
+    Returns:
+        The memory-mapped GraphSnapshot
+    """
+    path = snapshot_path(db.name, arango_graph.name)
+    if not rebuild and current_version_path(path) is not None:
+        snapshot = GraphSnapshot.load(path)
+        if snapshot.is_fresh(db, arango_graph, max_age):
+            return snapshot
+    return GraphSnapshot.load(build_graph_snapshot(db, arango_graph))
@@ -0,0 +1,162 @@
+"""Persistent cache of deterministic LLM responses."""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from app.common.aql_cache import fingerprint
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    SQLite-backed LangChain cache for temperature-0 model calls.
+
+    The key is a hash of the prompt and LangChain's `llm_string`, which holds
+    the model, its parameters and any bound tools, so the output schema of a
+    structured-output call is part of the key. Entries expire after `ttl`
+    seconds, and the least recently used entries are evicted once the stored
+    responses exceed `max_bytes`.
+
+    Safe to share between threads and processes; every operation opens its own
+    short-lived connection.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Path of the SQLite file
+            max_bytes: Maximum total size of the stored responses
+            ttl: Seconds after which an entry expires (None to keep entries until evicted)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return fingerprint(prompt + "\n" + llm_string)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Return the cached generations for a prompt and model, or None."""
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Store generations and evict the least recently used overflow."""
+        response = dumps(list(return_val))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(prompt, llm_string), response, len(response), now, now)
+            )
+            conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used_at DESC, key) AS total
+                        FROM llm_cache
+                    ) WHERE total > ?
+                )
+                """,
+                (self.max_bytes,)
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        """Remove all cached responses."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            size, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": size,
+                "bytes": total_bytes
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[SQLiteLLMCache]:
+    """
+    Get the process-wide LLM response cache.
+
+    Caching is opt-in: set LLM_CACHE_PATH to the SQLite file to use.
+    LLM_CACHE_MAX_BYTES and LLM_CACHE_TTL (seconds) bound its size and age.
+
+    Returns:
+        The shared SQLiteLLMCache, or None if caching is disabled
+    """
+    global _default_cache
+    path = os.environ.get("LLM_CACHE_PATH", "")
+    if not path:
+        return None
+    ttl = os.environ.get("LLM_CACHE_TTL")
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.path != path:
+            _default_cache = SQLiteLLMCache(
+                path,
+                max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+                ttl=float(ttl) if ttl else None
+            )
+        return _default_cache
@@ -1,9 +1,15 @@
 import os
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Tuple, Type
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+from app.common.fake_llm import FakeChatModel
+from app.common.llm_cache import get_llm_cache
+from app.common.llm_rate_limiter import governed_class
 
 
 
@@ -11,7 +17,20 @@ class LLMManager:
     """
     A manager class for handling different LLM providers and models.
     Provides a centralized way to create and configure LLM instances.
+
+    Models are rate limited per provider and model (see
+    app.common.llm_rate_limiter). Models returned by `get_model` and
+    `get_structured_model` come from a
+    process-wide registry keyed by provider, model, temperature, extra
+    arguments and output schema, so consumers built per task share one
+    client (and its connection pool) instead of building a new one each time.
     """
+
+    _models: Dict[Tuple, BaseChatModel] = {}
+    _structured_models: Dict[Tuple, Runnable] = {}
+    _registry_lock = threading.Lock()
+    # Clients are not shared across fork(); a child process starts a new registry
+    _registry_pid = os.getpid()
     
     @staticmethod
     def get_openai_model(
@@ -30,7 +49,7 @@ class LLMManager:
         Returns:
             A configured ChatOpenAI instance
         """
-        return ChatOpenAI(
+        return governed_class(ChatOpenAI, "openai")(
             model=model_name,
             temperature=temperature,
             **kwargs
@@ -53,7 +72,7 @@ class LLMManager:
         Returns:
             A configured ChatAnthropic instance
         """
-        return ChatAnthropic(
+        return governed_class(ChatAnthropic, "anthropic")(
             model=model_name,
             temperature=temperature,
             **kwargs
@@ -76,14 +95,37 @@ class LLMManager:
         Returns:
             A configured ChatGoogleGenerativeAI instance
         """
-        return ChatGoogleGenerativeAI(
+        return governed_class(ChatGoogleGenerativeAI, "google")(
             model=model_name,
             temperature=temperature,
             **kwargs
         )
     
+    @staticmethod
+    def get_fake_model(
+        model_name: str = "fake",
+        temperature: float = 0,
+        **kwargs: Any
+    ) -> FakeChatModel:
+        """
+        Create and return an offline fake chat model for load tests and benchmarks.
+        
+        Args:
+            model_name: Name reported by the model (default: "fake")
+            temperature: Ignored; outputs depend only on the seed and prompt
+            **kwargs: Additional parameters to pass to the FakeChatModel
+                constructor (e.g. seed, latency)
+            
+        Returns:
+            A configured FakeChatModel instance
+        """
+        return governed_class(FakeChatModel, "fake")(
+            model_name=model_name,
+            **kwargs
+        )
+    
     @classmethod
-    def get_model(
+    def create_model(
         cls,
         provider: str,
         model_name: Optional[str] = None,
@@ -91,10 +133,13 @@ class LLMManager:
         **kwargs: Any
     ) -> BaseChatModel:
         """
-        Factory method to get an LLM instance based on provider.
+        Factory method to create a new LLM instance based on provider.
+        
+        Temperature-0 models use the response cache from app.common.llm_cache
+        when LLM_CACHE_PATH is set.
         
         Args:
-            provider: The LLM provider ("openai", "anthropic", "google")
+            provider: The LLM provider ("openai", "anthropic", "google", "fake")
             model_name: The specific model name (if None, uses provider default)
             temperature: The temperature setting for generation (default: 0)
             **kwargs: Additional parameters to pass to the model constructor
@@ -107,6 +152,12 @@ class LLMManager:
         """
         provider = provider.lower()
         
+        # Only temperature-0 calls are deterministic enough to replay
+        if temperature == 0 and "cache" not in kwargs:
+            cache = get_llm_cache()
+            if cache is not None:
+                kwargs["cache"] = cache
+        
         if provider == "openai":
             model_name = model_name or "gpt-4o"
             return cls.get_openai_model(model_name, temperature, **kwargs)
@@ -119,5 +170,98 @@ class LLMManager:
             model_name = model_name or "gemini-pro"
             return cls.get_gemini_model(model_name, temperature, **kwargs)
         
+        elif provider == "fake":
+            model_name = model_name or "fake"
+            return cls.get_fake_model(model_name, temperature, **kwargs)
+        
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
+
+    @classmethod
+    def _registry_key(cls, provider: str, model_name: Optional[str], temperature: float,
+                      kwargs: Dict[str, Any]) -> Optional[Tuple]:
+        """Return the registry key, or None if the arguments cannot be keyed."""
+        key = (provider.lower(), model_name, float(temperature), tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. callbacks or clients passed as kwargs; build a private instance
+            return None
+        if os.getpid() != cls._registry_pid:
+            cls.clear_registry()
+        return key
+
+    @classmethod
+    def get_model(
+        cls,
+        provider: str,
+        model_name: Optional[str] = None,
+        temperature: float = 0,
+        **kwargs: Any
+    ) -> BaseChatModel:
+        """
+        Get a shared LLM instance based on provider, creating it on first use.
+        
+        Args:
+            provider: The LLM provider ("openai", "anthropic", "google", "fake")
+            model_name: The specific model name (if None, uses provider default)
+            temperature: The temperature setting for generation (default: 0)
+            **kwargs: Additional parameters to pass to the model constructor
+            
+        Returns:
+            A configured LLM instance
+            
+        Raises:
+            ValueError: If an unsupported provider is specified
+        """
+        key = cls._registry_key(provider, model_name, temperature, kwargs)
+        if key is None:
+            return cls.create_model(provider, model_name, temperature, **kwargs)
+        with cls._registry_lock:
+            model = cls._models.get(key)
+            if model is None:
+                model = cls.create_model(provider, model_name, temperature, **kwargs)
+                cls._models[key] = model
+            return model
+
+    @classmethod
+    def get_structured_model(
+        cls,
+        provider: str,
+        schema: Type[Any],
+        model_name: Optional[str] = None,
+        temperature: float = 0,
+        **kwargs: Any
+    ) -> Runnable:
+        """
+        Get a shared `with_structured_output(schema)` wrapper of a model.
+        
+        Args:
+            provider: The LLM provider ("openai", "anthropic", "google", "fake")
+            schema: The output schema (e.g. a pydantic model)
+            model_name: The specific model name (if None, uses provider default)
+            temperature: The temperature setting for generation (default: 0)
+            **kwargs: Additional parameters to pass to the model constructor
+            
+        Returns:
+            A runnable returning instances of schema
+        """
+        model = cls.get_model(provider, model_name, temperature, **kwargs)
+        key = cls._registry_key(provider, model_name, temperature, kwargs)
+        if key is None:
+            return model.with_structured_output(schema)
+        key = key + (schema,)
+        with cls._registry_lock:
+            structured_model = cls._structured_models.get(key)
+            if structured_model is None:
+                structured_model = model.with_structured_output(schema)
+                cls._structured_models[key] = structured_model
+            return structured_model
+
+    @classmethod
+    def clear_registry(cls) -> None:
+        """Drop all shared instances, e.g. after fork or when keys are rotated."""
+        with cls._registry_lock:
+            cls._models.clear()
+            cls._structured_models.clear()
+            cls._registry_pid = os.getpid()
@@ -0,0 +1,384 @@
+"""Client-side rate limiting and concurrency limits for LLM calls."""
+
+import asyncio
+import functools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Type
+
+# Off by default: the limits below must match the provider quotas of the deployment,
+# and every call then goes through the shared bucket store
+LLM_RATE_LIMITING = os.environ.get("LLM_RATE_LIMITING", "false").lower() == "true"
+LLM_RATE_LIMIT_RPM = float(os.environ.get("LLM_RATE_LIMIT_RPM", 500))
+LLM_RATE_LIMIT_TPM = float(os.environ.get("LLM_RATE_LIMIT_TPM", 200000))
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", 16))
+# Share of each bucket and of the in-flight slots that background calls cannot use
+LLM_INTERACTIVE_RESERVE = float(os.environ.get("LLM_INTERACTIVE_RESERVE", 0.2))
+# Per provider or "provider:model" overrides, e.g. {"openai:gpt-4o": {"rpm": 500, "tpm": 30000}}
+LLM_RATE_LIMITS = json.loads(os.environ.get("LLM_RATE_LIMITS", "{}"))
+LLM_RATE_LIMIT_REDIS_URL = os.environ.get("LLM_RATE_LIMIT_REDIS_URL", "")
+LLM_RATE_LIMIT_DIR = os.environ.get(
+    "LLM_RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "llm_rate_limits")
+)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default=BACKGROUND)
+# Set while a call holds a slot, so nested _generate/_stream calls are not counted twice
+_in_slot: ContextVar[bool] = ContextVar("llm_in_slot", default=False)
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Run LLM calls made in this context with the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def take_tokens(state: Dict[str, float], now: float, rpm: float, tpm: float, requests: float,
+                tokens: float, reserve: float, force: bool = False) -> float:
+    """
+    Refill a request and a token bucket and try to take from both.
+
+    Args:
+        state: Bucket levels `r` and `k` and the last update time `t`; updated in place
+        now: Current time in seconds
+        rpm: Requests per minute (bucket capacity and refill rate)
+        tpm: Tokens per minute (bucket capacity and refill rate)
+        requests: Requests to take
+        tokens: Tokens to take (negative to give back)
+        reserve: Share of each bucket that must remain after taking
+        force: Take even if the buckets go negative (for usage corrections)
+
+    Returns:
+        0 if taken, otherwise the seconds to wait before trying again
+    """
+    elapsed = max(0.0, now - state.get("t", now))
+    r = min(rpm, state.get("r", rpm) + elapsed * rpm / 60)
+    k = min(tpm, state.get("k", tpm) + elapsed * tpm / 60)
+    state["t"] = now
+    need_r = requests + rpm * reserve
+    # A single call larger than the bucket can still go once the bucket is full
+    need_k = min(tokens, tpm) + tpm * reserve
+    if force or (r >= need_r and k >= need_k):
+        state["r"], state["k"] = r - requests, min(tpm, k - tokens)
+        return 0.0
+    state["r"], state["k"] = r, k
+    return max((need_r - r) * 60 / rpm, (need_k - k) * 60 / tpm, 0.01)
+
+
+class MemoryBucketStore:
+    """Buckets shared by the threads of one process."""
+
+    def __init__(self):
+        self._states: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, *args, **kwargs) -> float:
+        with self._lock:
+            return take_tokens(self._states.setdefault(key, {}), time.time(), *args, **kwargs)
+
+
+class FileBucketStore:
+    """Buckets shared by the processes of one machine through locked files."""
+
+    def __init__(self, directory: str):
+        import fcntl  # noqa: F401 - fail early where file locks are unavailable
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def take(self, key: str, *args, **kwargs) -> float:
+        import fcntl
+        path = os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ".json")
+        with open(path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                wait = take_tokens(state, time.time(), *args, **kwargs)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_REDIS_TAKE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local requests, tokens = tonumber(ARGV[3]), tonumber(ARGV[4])
+local reserve, force = tonumber(ARGV[5]), ARGV[6] == '1'
+local state = redis.call('HMGET', KEYS[1], 'r', 'k', 't')
+local t = tonumber(state[3]) or now
+local elapsed = math.max(0, now - t)
+local r = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60)
+local k = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60)
+local need_r = requests + rpm * reserve
+local need_k = math.min(tokens, tpm) + tpm * reserve
+local wait = 0
+if force or (r >= need_r and k >= need_k) then
+    r = r - requests
+    k = math.min(tpm, k - tokens)
+else
+    wait = math.max((need_r - r) * 60 / rpm, (need_k - k) * 60 / tpm, 0.01)
+end
+redis.call('HSET', KEYS[1], 'r', r, 'k', k, 't', now)
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by all processes using the same Redis."""
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TAKE_SCRIPT)
+
+    def take(self, key: str, rpm: float, tpm: float, requests: float, tokens: float,
+             reserve: float, force: bool = False) -> float:
+        return float(self._script(
+            keys=[f"llm_rate_limit:{key}"],
+            args=[rpm, tpm, requests, tokens, reserve, "1" if force else "0"]
+        ))
+
+
+class LLMGovernor:
+    """
+    Rate and concurrency limits for one provider and model.
+
+    Requests and tokens per minute are token buckets kept in a shared store,
+    so every thread and process calling the same model draws from the same
+    budget. In-flight calls are capped per process. Background calls leave a
+    reserved share of both for interactive calls.
+    """
+
+    def __init__(self, key: str, store, rpm: float, tpm: float, max_in_flight: int,
+                 reserve: float = LLM_INTERACTIVE_RESERVE):
+        self.key = key
+        self.store = store
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.reserve = reserve
+        self.in_flight = 0
+        self._interactive_waiting = 0
+        self._condition = threading.Condition()
+
+    def _may_start(self, priority: str) -> bool:
+        if priority == INTERACTIVE:
+            return self.in_flight < self.max_in_flight
+        reserved_slots = 0
+        if self.reserve > 0 and self.max_in_flight > 1:
+            reserved_slots = max(1, int(self.max_in_flight * self.reserve))
+        return self._interactive_waiting == 0 and self.in_flight < self.max_in_flight - reserved_slots
+
+    def acquire(self, tokens: int, priority: Optional[str] = None) -> None:
+        """Block until an in-flight slot and bucket capacity are available."""
+        priority = priority or _priority.get()
+        with self._condition:
+            if priority == INTERACTIVE:
+                self._interactive_waiting += 1
+            try:
+                self._condition.wait_for(lambda: self._may_start(priority))
+                self.in_flight += 1
+            finally:
+                if priority == INTERACTIVE:
+                    self._interactive_waiting -= 1
+        try:
+            reserve = 0.0 if priority == INTERACTIVE else self.reserve
+            while True:
+                wait = self.store.take(self.key, self.rpm, self.tpm, 1, tokens, reserve)
+                if wait <= 0:
+                    return
+                time.sleep(min(wait, 1.0))
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def adjust(self, tokens: int) -> None:
+        """Charge (or refund) the difference between estimated and actual tokens."""
+        if tokens:
+            self.store.take(self.key, self.rpm, self.tpm, 0, tokens, 0.0, force=True)
+
+    @contextmanager
+    def slot(self, tokens: int) -> Iterator[None]:
+        """Hold capacity for one call; nested calls in the same context are free."""
+        if _in_slot.get():
+            yield
+            return
+        self.acquire(tokens)
+        token = _in_slot.set(True)
+        try:
+            yield
+        finally:
+            _in_slot.reset(token)
+            self.release()
+
+
+_store = None
+_governors: Dict[str, LLMGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        if LLM_RATE_LIMIT_REDIS_URL:
+            _store = RedisBucketStore(LLM_RATE_LIMIT_REDIS_URL)
+        else:
+            try:
+                _store = FileBucketStore(LLM_RATE_LIMIT_DIR)
+            except ImportError:
+                # No fcntl (Windows): limits are shared by threads only
+                _store = MemoryBucketStore()
+    return _store
+
+
+def get_governor(provider: str, model_name: str) -> LLMGovernor:
+    """
+    Get the process-wide governor for a provider and model.
+
+    Limits come from LLM_RATE_LIMITS["provider:model"], then
+    LLM_RATE_LIMITS["provider"], then the LLM_RATE_LIMIT_RPM/TPM and
+    LLM_MAX_IN_FLIGHT defaults.
+    """
+    key = f"{provider}:{model_name}"
+    with _governors_lock:
+        governor = _governors.get(key)
+        if governor is None:
+            limits = {
+                "rpm": LLM_RATE_LIMIT_RPM, "tpm": LLM_RATE_LIMIT_TPM, "max_in_flight": LLM_MAX_IN_FLIGHT,
+                **LLM_RATE_LIMITS.get(provider, {}), **LLM_RATE_LIMITS.get(key, {})
+            }
+            governor = LLMGovernor(
+                key, _get_store(), float(limits["rpm"]), float(limits["tpm"]), int(limits["max_in_flight"])
+            )
+            _governors[key] = governor
+        return governor
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """Rough prompt size in tokens (4 characters per token)."""
+    return max(1, sum(len(str(getattr(m, "content", m))) for m in messages) // 4)
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    for generation in getattr(result, "generations", []):
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            return usage.get("total_tokens")
+    return None
+
+
+class GovernedChatModelMixin:
+    """Applies the provider's LLMGovernor around a chat model's API calls."""
+
+    llm_provider: ClassVar[str] = ""
+
+    def _get_governor(self) -> LLMGovernor:
+        model_name = getattr(self, "model_name", None) or getattr(self, "model", "")
+        return get_governor(self.llm_provider, str(model_name))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = self._get_governor()
+        estimate = estimate_tokens(messages)
+        nested = _in_slot.get()
+        with governor.slot(estimate):
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        actual = _usage_tokens(result)
+        if actual is not None and not nested:
+            governor.adjust(actual - estimate)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if _in_slot.get():
+            yield from chunks
+            return
+        governor = self._get_governor()
+        governor.acquire(estimate_tokens(messages))
+        try:
+            while True:
+                # The generator runs in its consumer's context, so the slot is
+                # only marked while producing a chunk, never across a yield
+                token = _in_slot.set(True)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    _in_slot.reset(token)
+                yield chunk
+        finally:
+            chunks.close()
+            governor.release()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = self._get_governor()
+        if _in_slot.get():
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        await asyncio.to_thread(governor.acquire, estimate_tokens(messages), _priority.get())
+        token = _in_slot.set(True)
+        try:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        finally:
+            _in_slot.reset(token)
+            governor.release()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if _in_slot.get():
+            async for chunk in chunks:
+                yield chunk
+            return
+        governor = self._get_governor()
+        await asyncio.to_thread(governor.acquire, estimate_tokens(messages), _priority.get())
+        try:
+            while True:
+                # As in _stream, the slot is only marked while producing a chunk
+                token = _in_slot.set(True)
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    _in_slot.reset(token)
+                yield chunk
+        finally:
+            await chunks.aclose()
+            governor.release()
+
+
+@functools.lru_cache(maxsize=None)
+def governed_class(model_class: Type, provider: str) -> Type:
+    """
+    Return a subclass of a chat model class whose API calls go through the
+    provider's governor, or the class itself if LLM_RATE_LIMITING is off.
+    """
+    if not LLM_RATE_LIMITING:
+        return model_class
+    return type(
+        f"Governed{model_class.__name__}",
+        (GovernedChatModelMixin, model_class),
+        {"__annotations__": {"llm_provider": ClassVar[str]}, "llm_provider": provider}
+    )
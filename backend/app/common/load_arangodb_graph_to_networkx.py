@@ -5,6 +5,9 @@ from arango.database import StandardDatabase
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
+from app.common.metrics import instrumented
+
+@instrumented("graph_load")
 def load_arangodb_graph_to_networkx(db: StandardDatabase, arango_graph: Graph) -> nx.DiGraph:
     # Create a directed NetworkX graph.
     # Change to nx.Graph() if your graph is undirected.
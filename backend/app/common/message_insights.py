@@ -0,0 +1,225 @@
+"""One LLM call that extracts identifiers and analysis scores for an ingested message."""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Tuple, Type, TypeVar
+
+from celery.signals import worker_process_init
+from pydantic import BaseModel, Field
+
+from app.common.llm_manager import LLMManager
+from app.common.micro_batcher import MicroBatcher
+
+# Use one fused call per message instead of separate identifier extraction and
+# analysis calls; can be overridden per task with the `fused` argument. Off by
+# default until the fused prompt's scores and identifiers have been compared
+# with the separate calls on real traffic
+FUSED_MESSAGE_ANALYSIS = os.environ.get("FUSED_MESSAGE_ANALYSIS", "false").lower() == "true"
+
+# Group fused calls made concurrently in one process into multi-message
+# requests. This needs a worker running several tasks per process: start Celery
+# with `--pool threads` or `--pool gevent` (CELERY_POOL in docker-compose.yml).
+# It is skipped in prefork worker processes, which run one task at a time.
+LLM_MICRO_BATCHING = os.environ.get("LLM_MICRO_BATCHING", "false").lower() == "true"
+LLM_MICRO_BATCH_SIZE = int(os.environ.get("LLM_MICRO_BATCH_SIZE", 8))
+LLM_MICRO_BATCH_WAIT_MS = int(os.environ.get("LLM_MICRO_BATCH_WAIT_MS", 200))
+
+# The fields asked for, shared by the single and multi-message prompts
+INSIGHTS_INSTRUCTIONS = """
+1. identifiers: unique identifiers found in the message, such as email addresses,
+   person names, company names, project names, technical terms and keywords that
+   seem important in the context
+2. spam_score: the likelihood this message is spam (0.0 to 1.0)
+3. urgency_score: how urgent/time-sensitive the message is (0.0 to 1.0)
+4. importance_score: how important the message is for the recipient (0.0 to 1.0)
+5. category: the category of the message (e.g. personal, work, promotional, notification)
+6. summary: a brief summary of the message
+7. reason: a short reason for the scores
+"""
+
+FUSED_ANALYSIS_PROMPT = """
+Analyze this {channel} message and return all of the following at once:
+""" + INSIGHTS_INSTRUCTIONS + """
+Message:
+{content}
+"""
+
+BATCH_ANALYSIS_PROMPT = """
+Analyze each of the following messages independently. For every message return
+its index together with:
+""" + INSIGHTS_INSTRUCTIONS + """
+{messages}
+"""
+
+T = TypeVar("T", bound=BaseModel)
+
+logger = logging.getLogger(__name__)
+
+
+class MessageInsights(BaseModel):
+    """Schema for identifiers and analysis extracted from a message in one call."""
+    identifiers: List[str] = Field(description="List of identifiers found in the message content")
+    spam_score: float = Field(..., description="The likelihood this message is spam (0.0 to 1.0)")
+    urgency_score: float = Field(..., description="How urgent/time-sensitive the message is (0.0 to 1.0)")
+    importance_score: float = Field(..., description="How important the message is for the recipient (0.0 to 1.0)")
+    category: str = Field(description="Category of the message (e.g., personal, work, promotional, etc.)")
+    summary: str = Field(description="Brief summary of the message")
+    reason: str = Field(description="Reason for the analysis results")
+
+    @property
+    def normalized_identifiers(self) -> List[str]:
+        """Lower-cased identifiers, as the two-call consumers store them."""
+        return [identifier.lower() for identifier in self.identifiers]
+
+    def to_analysis_result(self, schema: Type[T]) -> T:
+        """
+        Convert to a channel's AnalysisResult schema.
+
+        Args:
+            schema: The channel's AnalysisResult class
+
+        Returns:
+            An instance of schema with the fields it declares
+        """
+        data = self.model_dump()
+        return schema(**{name: data[name] for name in schema.model_fields if name in data})
+
+
+class IndexedMessageInsights(MessageInsights):
+    """MessageInsights for one message of a batch."""
+    index: int = Field(description="Index of the message this result belongs to")
+
+
+class MessageInsightsBatch(BaseModel):
+    """Schema for the results of a multi-message request."""
+    results: List[IndexedMessageInsights] = Field(description="One result per message")
+
+
+class MessageInsightsExtractor:
+    """Runs the fused identifier extraction and analysis call."""
+
+    def __init__(self, model_provider: str = "openai", model_name: str = "gpt-4o-mini", temperature: float = 0):
+        """
+        Initialize the extractor.
+
+        Args:
+            model_provider: The LLM provider to use
+            model_name: The model name to use
+            temperature: The temperature for the model
+        """
+        self.llm = LLMManager.get_structured_model(
+            provider=model_provider,
+            schema=MessageInsights,
+            model_name=model_name,
+            temperature=temperature
+        )
+        self.batch_llm = LLMManager.get_structured_model(
+            provider=model_provider,
+            schema=MessageInsightsBatch,
+            model_name=model_name,
+            temperature=temperature
+        )
+
+    def extract(self, channel: str, content: str) -> MessageInsights:
+        """
+        Extract identifiers, scores and a summary from a message.
+
+        Args:
+            channel: Where the message comes from (WhatsApp, Slack or email)
+            content: The text content of the message
+
+        Returns:
+            The MessageInsights for the message
+        """
+        prompt = FUSED_ANALYSIS_PROMPT.format(channel=channel, content=content)
+        return self.llm.invoke([{"role": "user", "content": prompt}])
+
+    def extract_many(self, messages: List[Tuple[str, str]]) -> List[MessageInsights]:
+        """
+        Extract insights for several messages with one request.
+
+        Messages missing from the response are retried one by one.
+
+        Args:
+            messages: (channel, content) pairs
+
+        Returns:
+            One MessageInsights per message, in order
+        """
+        if len(messages) == 1:
+            return [self.extract(*messages[0])]
+
+        rendered = "\n\n".join(
+            f"Message {i} ({channel}):\n{content}" for i, (channel, content) in enumerate(messages)
+        )
+        response = self.batch_llm.invoke(
+            [{"role": "user", "content": BATCH_ANALYSIS_PROMPT.format(messages=rendered)}]
+        )
+        by_index = {result.index: result for result in response.results}
+        insights = []
+        for i, message in enumerate(messages):
+            result = by_index.get(i)
+            if result is None:
+                insights.append(self.extract(*message))
+            else:
+                insights.append(MessageInsights(**result.model_dump(exclude={"index"})))
+        return insights
+
+
+# Extractors and micro-batchers per (provider, model), so each consumer's
+# fused call uses the model the consumer was configured with
+_extractors: Dict[Tuple[str, str], MessageInsightsExtractor] = {}
+_batchers: Dict[Tuple[str, str], MicroBatcher] = {}
+_lock = threading.Lock()
+
+# Set in Celery prefork child processes, where micro-batching cannot batch
+_prefork_child = False
+
+
+@worker_process_init.connect(weak=False)
+def _on_prefork_child_start(**kwargs) -> None:
+    global _prefork_child
+    _prefork_child = True
+    if LLM_MICRO_BATCHING:
+        logger.warning(
+            "LLM_MICRO_BATCHING is ignored in prefork worker processes, which run one task at a time; "
+            "start the worker with --pool threads or --pool gevent to batch fused calls"
+        )
+
+
+def extract_message_insights(
+    channel: str,
+    content: str,
+    model_provider: str = "openai",
+    model_name: str = "gpt-4o-mini"
+) -> MessageInsights:
+    """
+    Run the fused call for one message with the shared extractor for a model,
+    through its micro-batcher when LLM_MICRO_BATCHING is enabled.
+
+    Args:
+        channel: Where the message comes from (WhatsApp, Slack or email)
+        content: The text content of the message
+        model_provider: The LLM provider to use
+        model_name: The model name to use
+
+    Returns:
+        The MessageInsights for the message
+    """
+    key = (model_provider, model_name)
+    with _lock:
+        extractor = _extractors.get(key)
+        if extractor is None:
+            extractor = _extractors[key] = MessageInsightsExtractor(model_provider, model_name)
+        batcher = _batchers.get(key)
+        if LLM_MICRO_BATCHING and not _prefork_child and batcher is None:
+            batcher = _batchers[key] = MicroBatcher(
+                extractor.extract_many,
+                max_batch_size=LLM_MICRO_BATCH_SIZE,
+                max_wait=LLM_MICRO_BATCH_WAIT_MS / 1000,
+                process_item=lambda message: extractor.extract(*message)
+            )
+    if batcher is None:
+        return extractor.extract(channel, content)
+    return batcher((channel, content))
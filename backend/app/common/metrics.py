@@ -0,0 +1,450 @@
+"""Lightweight metrics and traces for hot paths, exposed in Prometheus text format."""
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+# Per-user series can be many and expose user ids to whoever scrapes /metrics;
+# set to true to add the user label
+METRICS_USER_LABEL = os.environ.get("METRICS_USER_LABEL", "false").lower() == "true"
+METRICS_TRACE_BUFFER = int(os.environ.get("METRICS_TRACE_BUFFER", 1000))
+# Spans carry user ids and tool names; only serve /metrics/traces on internal deployments
+METRICS_TRACES_ROUTE_ENABLED = os.environ.get("METRICS_TRACES_ROUTE_ENABLED", "false").lower() == "true"
+# Celery workers serve /metrics on this port (prefork children on the following ports)
+CELERY_METRICS_PORT = int(os.environ.get("CELERY_METRICS_PORT", 9808))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Values of one metric, keyed by label values."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram(_Metric):
+    """Counts of observations per bucket, plus their sum and count, per label set."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket counts followed by the sum and the count
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(series[-1]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                counts = series[:len(self.buckets)] + [series[-1]]
+                for bound, count in zip(bounds, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, bound)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics rendered by /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "dash_stage_seconds", "Duration of instrumented stages",
+    ["stage", "agent", "user", "outcome"]
+))
+AGENT_CALL_SECONDS = registry.register(Histogram(
+    "dash_agent_call_seconds", "Duration of agent calls for one user message",
+    ["agent", "user", "outcome"]
+))
+TOOL_CALL_SECONDS = registry.register(Histogram(
+    "dash_tool_call_seconds", "Duration of agent tool calls",
+    ["agent", "tool", "user", "outcome"]
+))
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    "dash_llm_request_seconds", "Duration of LLM requests",
+    ["agent", "model", "outcome"]
+))
+LLM_TOKENS = registry.register(Counter(
+    "dash_llm_tokens_total", "Tokens used by LLM requests",
+    ["agent", "model", "kind"]
+))
+CELERY_TASK_SECONDS = registry.register(Histogram(
+    "dash_celery_task_seconds", "Duration of Celery tasks",
+    ["task", "outcome"]
+))
+GRAPH_WRITES = registry.register(Counter(
+    "dash_graph_writes_total", "Documents written by graph consumers",
+    ["collection", "kind"]
+))
+
+# Labels inherited by everything measured in the current context
+_labels: ContextVar[Dict[str, str]] = ContextVar("metric_labels", default={})
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_recent_spans: "deque[Dict[str, Any]]" = deque(maxlen=METRICS_TRACE_BUFFER)
+
+
+def current_labels() -> Dict[str, str]:
+    labels = {"agent": "", "user": "", **_labels.get()}
+    if not METRICS_USER_LABEL:
+        labels["user"] = ""
+    return labels
+
+
+@contextmanager
+def metric_labels(**labels: Any) -> Iterator[None]:
+    """Add labels (e.g. agent, user) to everything measured in this context."""
+    token = _labels.set({**_labels.get(), **{k: str(v) for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.outcome = "ok"
+        self.start = time.time()
+        self.duration = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "outcome": self.outcome,
+            "attributes": self.attributes
+        }
+
+
+@contextmanager
+def trace(name: str, histogram: Optional[Histogram] = None, **labels: Any) -> Iterator[Span]:
+    """
+    Time a block as a span of the current trace and optionally observe a histogram.
+
+    The outcome is "error" if the block raises; the block can also set
+    `span.outcome` itself (e.g. for handled failures).
+
+    Args:
+        name: Span name
+        histogram: Histogram to observe the duration in, with the context
+            labels, `labels` and the outcome
+        **labels: Extra labels and span attributes
+    """
+    if not METRICS_ENABLED:
+        yield Span(name, labels)
+        return
+    all_labels = {**current_labels(), **labels}
+    span = Span(name, all_labels)
+    token = _current_span.set(span)
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span.outcome = "error"
+        raise
+    finally:
+        span.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        if histogram is not None:
+            histogram.observe(span.duration, outcome=span.outcome, **all_labels)
+        _recent_spans.append(span.to_dict())
+        logger.debug("span %s %.3fs %s", name, span.duration, span.outcome)
+
+
+def observe(stage: str, **labels: Any):
+    """Time a block as a stage in dash_stage_seconds (see `trace`)."""
+    return trace(stage, STAGE_SECONDS, stage=stage, **labels)
+
+
+def instrumented(stage: str, **labels: Any) -> Callable:
+    """Decorator form of `observe`."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe(stage, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def agent_call(agent: str) -> Callable:
+    """
+    Decorator for an agent's entry point: times it in dash_agent_call_seconds
+    and labels the LLM and tool calls made inside it with the agent.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metric_labels(agent=agent):
+                with trace(f"agent:{agent}", AGENT_CALL_SECONDS):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def recent_spans(limit: int = 100) -> List[Dict[str, Any]]:
+    """The most recently finished spans, newest first."""
+    return list(_recent_spans)[-limit:][::-1]
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times every LangChain tool and chat model call made in the process."""
+
+    def __init__(self):
+        self._runs: Dict[Any, Tuple[float, str, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: Any, name: str) -> None:
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), name, current_labels())
+
+    def _end(self, run_id: Any) -> Optional[Tuple[float, str, Dict[str, str]]]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        start, name, labels = run
+        return time.perf_counter() - start, name, labels
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: Any, **kwargs: Any) -> None:
+        self._start(run_id, (serialized or {}).get("name") or kwargs.get("name") or "unknown")
+
+    def _tool_done(self, run_id: Any, outcome: str) -> None:
+        run = self._end(run_id)
+        if run is not None:
+            duration, tool, labels = run
+            TOOL_CALL_SECONDS.observe(duration, tool=tool, outcome=outcome, **labels)
+
+    def on_tool_end(self, output: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._tool_done(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._tool_done(run_id, "error")
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: Any, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        self._start(run_id, str(params.get("model_name") or params.get("model") or params.get("_type") or "unknown"))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, **kwargs)
+
+    def on_llm_end(self, response: Any, *, run_id: Any, **kwargs: Any) -> None:
+        run = self._end(run_id)
+        if run is None:
+            return
+        duration, model, labels = run
+        LLM_REQUEST_SECONDS.observe(duration, model=model, outcome="ok", agent=labels["agent"])
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                for kind in ("input_tokens", "output_tokens"):
+                    if usage.get(kind):
+                        LLM_TOKENS.inc(usage[kind], agent=labels["agent"], model=model, kind=kind)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        run = self._end(run_id)
+        if run is not None:
+            duration, model, labels = run
+            LLM_REQUEST_SECONDS.observe(duration, model=model, outcome="error", agent=labels["agent"])
+
+
+callback_handler = MetricsCallbackHandler()
+# LangChain adds the handler held by this variable to every run's callbacks
+_callback_var: ContextVar[Optional[MetricsCallbackHandler]] = ContextVar(
+    "metrics_callback_handler", default=callback_handler if METRICS_ENABLED else None
+)
+register_configure_hook(_callback_var, inheritable=True)
+
+
+def start_metrics_server(port: int) -> Optional[threading.Thread]:
+    """
+    Serve /metrics on a port from a daemon thread, for processes without a
+    Flask app (e.g. Celery workers).
+
+    Returns:
+        The server thread, or None if the port is in use
+    """
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    def app(environ, start_response):
+        if environ.get("PATH_INFO") != "/metrics":
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Not found\n"]
+        start_response("200 OK", [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")])
+        return [registry.render().encode("utf-8")]
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = make_server("", port, app, handler_class=QuietHandler)
+    except OSError as e:
+        logger.warning(f"Could not serve metrics on port {port}: {e}")
+        return None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+_task_runs: Dict[str, Tuple[float, Any]] = {}
+
+
+def install_celery_metrics() -> None:
+    """
+    Record Celery task durations and serve /metrics from Celery workers.
+
+    The worker process serves on CELERY_METRICS_PORT; prefork pool children,
+    which run the tasks, serve on CELERY_METRICS_PORT + 1 + their pool index.
+    Safe to call from every module that defines a Celery app.
+    """
+    from celery import signals
+
+    def on_prerun(task_id=None, task=None, args=(), kwargs=None, **extra):
+        # Label everything measured in the task with its user_id argument
+        try:
+            user = inspect.signature(task.run).bind_partial(*args, **(kwargs or {})).arguments.get("user_id")
+        except (TypeError, ValueError):
+            user = None
+        token = _labels.set({**_labels.get(), "user": str(user) if user is not None else ""})
+        _task_runs[task_id] = (time.perf_counter(), token)
+
+    def on_postrun(task_id=None, task=None, state=None, retval=None, **extra):
+        run = _task_runs.pop(task_id, None)
+        if run is None:
+            return
+        start, token = run
+        # The consumer tasks report failures as {"status": "error"} results
+        failed = state != "SUCCESS" or (isinstance(retval, dict) and retval.get("status") == "error")
+        CELERY_TASK_SECONDS.observe(
+            time.perf_counter() - start, task=task.name, outcome="error" if failed else "ok"
+        )
+        try:
+            _labels.reset(token)
+        except ValueError:
+            pass
+
+    def on_worker_init(**kwargs):
+        start_metrics_server(CELERY_METRICS_PORT)
+
+    def on_process_init(**kwargs):
+        from billiard.process import current_process
+        start_metrics_server(CELERY_METRICS_PORT + 1 + (current_process().index or 0))
+
+    signals.task_prerun.connect(on_prerun, weak=False, dispatch_uid="dash_metrics_prerun")
+    signals.task_postrun.connect(on_postrun, weak=False, dispatch_uid="dash_metrics_postrun")
+    signals.worker_init.connect(on_worker_init, weak=False, dispatch_uid="dash_metrics_worker_init")
+    signals.worker_process_init.connect(on_process_init, weak=False, dispatch_uid="dash_metrics_process_init")
@@ -0,0 +1,106 @@
+"""Collect concurrent single-item calls into batched calls."""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """
+    Groups items submitted from many threads into batches for one call.
+
+    A batch is sent when it has max_batch_size items or when its first item
+    has waited max_wait seconds, so batching never adds more than max_wait
+    to an item's latency. Batches run on a small thread pool, so the next
+    batch is collected while the previous one is in flight.
+
+    If a batch fails, its items are retried one by one, so one bad item (or a
+    response the batch call cannot parse) only fails its own caller.
+
+    This only batches work submitted in the same process, e.g. by Celery
+    workers started with `--pool threads` or `--pool gevent`. A prefork
+    worker process runs one task at a time, so every batch would hold a
+    single item that waited max_wait for nothing.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait: float = 0.2,
+        max_concurrent_batches: int = 4,
+        process_item: Optional[Callable[[Any], Any]] = None
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            process_batch: Function mapping a list of items to a list of
+                results in the same order
+            max_batch_size: Maximum number of items per batch
+            max_wait: Maximum seconds the first item of a batch waits for more
+            max_concurrent_batches: Maximum number of batches in flight
+            process_item: Function processing one item, used when a batch
+                fails (defaults to process_batch on a one-item list)
+        """
+        self.process_batch = process_batch
+        self.process_item = process_item or (lambda item: process_batch([item])[0])
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches)
+        self._collector: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_collector(self) -> None:
+        with self._lock:
+            if self._collector is None or not self._collector.is_alive():
+                self._collector = threading.Thread(target=self._collect, daemon=True)
+                self._collector.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item and return a future for its result."""
+        self._ensure_collector()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Process one item through a batch and wait for its result."""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[tuple]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise ValueError(f"Expected {len(items)} results, got {len(results)}")
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Retry each item alone so only the failing ones raise
+            for item, future in batch:
+                try:
+                    future.set_result(self.process_item(item))
+                except Exception as item_error:
+                    future.set_exception(item_error)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
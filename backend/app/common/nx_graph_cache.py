@@ -0,0 +1,357 @@
+"""Process-wide NetworkX copies of ArangoDB graphs, refreshed from deltas."""
+
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import networkx as nx
+from arango.database import StandardDatabase
+from arango.graph import Graph
+
+from app.common.load_arangodb_graph_to_networkx import load_arangodb_graph_to_networkx
+
+# Number of documents fetched per request when applying deltas
+FETCH_CHUNK_SIZE = 1000
+
+
+def _read_only_attributes(G: nx.DiGraph) -> nx.DiGraph:
+    """
+    Replace a graph's node and edge attribute dicts with read-only mappings,
+    so graph versions can share them without one changing another.
+    """
+    for node_id, attrs in G._node.items():
+        G._node[node_id] = MappingProxyType(attrs)
+    for source, targets in G._adj.items():
+        for target, attrs in targets.items():
+            # The same mapping is shared by the successor and predecessor views
+            data = MappingProxyType(attrs)
+            targets[target] = data
+            G._pred[target][source] = data
+    return G
+
+
+class _CopyOnWriteDiGraph:
+    """
+    Builds the next version of a DiGraph without copying the whole graph.
+
+    The new graph starts with shallow copies of the node and adjacency dicts,
+    sharing every per-node dict with the old graph. A per-node dict is copied
+    the first time it is changed, so the old graph, which readers may still
+    be using, never sees a change, and a refresh costs O(nodes) pointer copies
+    plus the size of the delta instead of a full `G.copy()`. Attributes are
+    read-only mappings that are replaced, never changed, so versions can
+    share them.
+    """
+
+    def __init__(self, graph: nx.DiGraph):
+        G = graph.__class__()
+        G.graph = dict(graph.graph)
+        G._node = dict(graph._node)
+        G._adj = dict(graph._adj)
+        G._pred = dict(graph._pred)
+        self.graph = G
+        self._owned_succ: Set[str] = set()
+        self._owned_pred: Set[str] = set()
+
+    def _succ(self, node_id: str) -> dict:
+        if node_id not in self._owned_succ:
+            self.graph._adj[node_id] = dict(self.graph._adj[node_id])
+            self._owned_succ.add(node_id)
+        return self.graph._adj[node_id]
+
+    def _pred(self, node_id: str) -> dict:
+        if node_id not in self._owned_pred:
+            self.graph._pred[node_id] = dict(self.graph._pred[node_id])
+            self._owned_pred.add(node_id)
+        return self.graph._pred[node_id]
+
+    def has_node(self, node_id: str) -> bool:
+        return node_id in self.graph._node
+
+    def set_node(self, node_id: str, attrs: dict) -> None:
+        """Add a node or replace all its attributes."""
+        self.graph._node[node_id] = MappingProxyType(dict(attrs))
+        if node_id not in self.graph._adj:
+            self.graph._adj[node_id] = {}
+            self.graph._pred[node_id] = {}
+            self._owned_succ.add(node_id)
+            self._owned_pred.add(node_id)
+
+    def remove_node(self, node_id: str) -> List[Tuple[str, str]]:
+        """Remove a node and its edges, returning the (source, target) pairs removed."""
+        pairs = [(node_id, target) for target in self.graph._adj[node_id]]
+        pairs += [(source, node_id) for source in self.graph._pred[node_id] if source != node_id]
+        for target in self.graph._adj[node_id]:
+            if target != node_id:
+                del self._pred(target)[node_id]
+        for source in self.graph._pred[node_id]:
+            if source != node_id:
+                del self._succ(source)[node_id]
+        del self.graph._node[node_id], self.graph._adj[node_id], self.graph._pred[node_id]
+        return pairs
+
+    def edge_data(self, source: str, target: str) -> Optional[dict]:
+        return self.graph._adj.get(source, {}).get(target)
+
+    def set_edge(self, source: str, target: str, attrs: dict) -> None:
+        """Add an edge or replace all its attributes, adding missing endpoints."""
+        for node_id in (source, target):
+            if not self.has_node(node_id):
+                self.set_node(node_id, {})
+        data = MappingProxyType(dict(attrs))
+        self._succ(source)[target] = data
+        self._pred(target)[source] = data
+
+    def remove_edge(self, source: str, target: str) -> None:
+        del self._succ(source)[target]
+        del self._pred(target)[source]
+
+
+class NetworkXGraphCache:
+    """
+    A NetworkX copy of one ArangoDB graph that is kept up to date by applying
+    the documents added, updated or removed since the last refresh.
+
+    Each collection's revision is the watermark: unchanged collections cost a
+    single cheap request. For changed collections only `_key`/`_rev` pairs
+    (plus endpoints for edges) are compared, and only the differing documents
+    are fetched.
+
+    Deltas are applied to a copy-on-write version of the graph which then
+    replaces `self.graph`, so code already running an algorithm on the
+    previous graph is unaffected. The bookkeeping of what the graph contains
+    is only updated once the new graph is in place, so a refresh that fails
+    half-way is retried in full by the next one. Node and edge attributes are
+    read-only mappings; `.copy()` one to get a dict.
+    """
+
+    def __init__(self, db: StandardDatabase, arango_graph: Graph, min_refresh_interval: float = 30):
+        """
+        Load the graph in full once.
+
+        Args:
+            db: Database containing the graph
+            arango_graph: The ArangoDB graph to mirror
+            min_refresh_interval: Minimum number of seconds between refreshes
+        """
+        self.db = db
+        self.arango_graph = arango_graph
+        self.min_refresh_interval = min_refresh_interval
+        self._lock = threading.Lock()
+
+        self.vertex_collections = list(arango_graph.vertex_collections())
+        self.edge_collections = [ed["edge_collection"] for ed in arango_graph.edge_definitions()]
+
+        # Read the watermarks and edge revisions before loading, so a write made
+        # during the load is recorded as older than the graph and picked up later
+        self._collection_revisions = self._read_collection_revisions()
+        edge_revisions = {name: self._read_document_revisions(name) for name in self.edge_collections}
+        self.graph = _read_only_attributes(load_arangodb_graph_to_networkx(db, arango_graph))
+        self._last_refresh = time.monotonic()
+
+        # key -> _rev for vertex collections, key -> (_rev, _from, _to) for edge collections
+        self._document_revisions: Dict[str, Dict[str, Any]] = {
+            name: {} for name in self.vertex_collections
+        }
+        for node_id, attrs in self.graph.nodes(data=True):
+            collection_name, key = node_id.split("/", 1)
+            self._document_revisions.setdefault(collection_name, {})[key] = attrs.get("_rev")
+        # Edge documents by (source, target): parallel edges share one DiGraph edge,
+        # which shows the attributes of one of them
+        self._pair_edges: Dict[Tuple[str, str], FrozenSet[str]] = {}
+        for collection_name, current in edge_revisions.items():
+            self._document_revisions[collection_name] = current
+            for key, (_, source, target) in current.items():
+                pair = (source, target)
+                self._pair_edges[pair] = self._pair_edges.get(pair, frozenset()) | {f"{collection_name}/{key}"}
+
+    def _read_collection_revisions(self) -> Dict[str, str]:
+        return {
+            name: self.db.collection(name).revision()
+            for name in self.vertex_collections + self.edge_collections
+        }
+
+    def _read_document_revisions(self, collection_name: str) -> Dict[str, Any]:
+        if collection_name in self.edge_collections:
+            query = "FOR doc IN @@collection RETURN [doc._key, [doc._rev, doc._from, doc._to]]"
+        else:
+            query = "FOR doc IN @@collection RETURN [doc._key, doc._rev]"
+        cursor = self.db.aql.execute(
+            query,
+            bind_vars={"@collection": collection_name},
+            batch_size=10000,
+            stream=True
+        )
+        return {key: tuple(value) if isinstance(value, list) else value for key, value in cursor}
+
+    def _diff_collection(self, collection_name: str) -> Tuple[List[str], List[str], Dict[str, Any]]:
+        """
+        Return the keys that are new or changed, the keys that were removed,
+        and the current revisions to record once the refresh succeeded.
+        """
+        current = self._read_document_revisions(collection_name)
+        known = self._document_revisions.get(collection_name, {})
+        changed = [key for key, rev in current.items() if known.get(key) != rev]
+        removed = [key for key in known if key not in current]
+        return changed, removed, current
+
+    def _fetch(self, collection_name: str, keys: List[str]):
+        collection = self.db.collection(collection_name)
+        for start in range(0, len(keys), FETCH_CHUNK_SIZE):
+            yield from collection.get_many(keys[start:start + FETCH_CHUNK_SIZE])
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """
+        Apply the changes made in ArangoDB since the last refresh.
+
+        Args:
+            force: Refresh even if min_refresh_interval has not passed
+
+        Returns:
+            Counts of added/updated and removed vertices and edges
+        """
+        stats = {"vertices_upserted": 0, "vertices_removed": 0, "edges_upserted": 0, "edges_removed": 0}
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < self.min_refresh_interval:
+                return stats
+            self._last_refresh = time.monotonic()
+
+            revisions = self._read_collection_revisions()
+            changed_collections = [
+                name for name, rev in revisions.items() if self._collection_revisions.get(name) != rev
+            ]
+            if not changed_collections:
+                return stats
+
+            G = _CopyOnWriteDiGraph(self.graph)
+            # Committed together with the new graph
+            document_revisions: Dict[str, Dict[str, Any]] = {}
+            pair_edges: Dict[Tuple[str, str], FrozenSet[str]] = {}
+
+            for collection_name in [c for c in self.vertex_collections if c in changed_collections]:
+                changed, removed, document_revisions[collection_name] = self._diff_collection(collection_name)
+                for key in removed:
+                    node_id = f"{collection_name}/{key}"
+                    if G.has_node(node_id):
+                        # Forget the removed node's edges along with it
+                        for pair in G.remove_node(node_id):
+                            pair_edges[pair] = frozenset()
+                        stats["vertices_removed"] += 1
+                for doc in self._fetch(collection_name, changed):
+                    G.set_node(doc["_id"], doc)
+                    stats["vertices_upserted"] += 1
+
+            for collection_name in [c for c in self.edge_collections if c in changed_collections]:
+                changed, removed, document_revisions[collection_name] = self._diff_collection(collection_name)
+                known = self._document_revisions.get(collection_name, {})
+                current = document_revisions[collection_name]
+                for key in removed:
+                    if self._remove_edge(G, pair_edges, f"{collection_name}/{key}", known[key][1:]):
+                        stats["edges_removed"] += 1
+                for key in changed:
+                    # An edge moved to other vertices leaves its old endpoints
+                    if key in known and known[key][1:] != current[key][1:]:
+                        self._remove_edge(G, pair_edges, f"{collection_name}/{key}", known[key][1:])
+                for doc in self._fetch(collection_name, changed):
+                    pair = (doc["_from"], doc["_to"])
+                    pair_edges[pair] = pair_edges.get(pair, self._pair_edges.get(pair, frozenset())) | {doc["_id"]}
+                    G.set_edge(doc["_from"], doc["_to"], doc)
+                    stats["edges_upserted"] += 1
+
+            self.graph = G.graph
+            self._collection_revisions = revisions
+            self._document_revisions.update(document_revisions)
+            for pair, edge_ids in pair_edges.items():
+                if edge_ids:
+                    self._pair_edges[pair] = edge_ids
+                else:
+                    self._pair_edges.pop(pair, None)
+        return stats
+
+    def _remove_edge(
+        self,
+        G: _CopyOnWriteDiGraph,
+        pair_edges: Dict[Tuple[str, str], FrozenSet[str]],
+        edge_id: str,
+        pair: Tuple[str, str]
+    ) -> bool:
+        """
+        Remove an edge document from the graph.
+
+        If a parallel edge document remains, the DiGraph edge stays and shows
+        the remaining document's attributes.
+
+        Returns:
+            True if the DiGraph edge was removed or changed
+        """
+        edge_ids = pair_edges.get(pair, self._pair_edges.get(pair, frozenset()))
+        if edge_id not in edge_ids:
+            # Already removed, e.g. with one of its vertices
+            return False
+        remaining = edge_ids - {edge_id}
+        pair_edges[pair] = remaining
+        data = G.edge_data(*pair)
+        if data is None or data.get("_id") != edge_id:
+            # The DiGraph edge shows another parallel edge document
+            return False
+        for remaining_id in sorted(remaining):
+            collection_name, key = remaining_id.split("/", 1)
+            doc = self.db.collection(collection_name).get(key)
+            if doc is not None:
+                G.set_edge(*pair, doc)
+                return True
+        G.remove_edge(*pair)
+        return True
+
+
+_caches: Dict[Tuple[str, str], NetworkXGraphCache] = {}
+# Held while loading a graph, so loading one graph does not block the others
+_load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_caches_lock = threading.Lock()
+
+
+def get_networkx_graph_cache(db: StandardDatabase, arango_graph: Graph) -> NetworkXGraphCache:
+    """
+    Get the process-wide cache for a graph, loading it on first use.
+
+    Args:
+        db: Database containing the graph
+        arango_graph: The ArangoDB graph
+
+    Returns:
+        The NetworkXGraphCache keyed by (database name, graph name)
+    """
+    cache_key = (db.name, arango_graph.name)
+    with _caches_lock:
+        cache = _caches.get(cache_key)
+        if cache is not None:
+            return cache
+        load_lock = _load_locks.setdefault(cache_key, threading.Lock())
+    with load_lock:
+        # Another request may have loaded it while we waited
+        with _caches_lock:
+            cache = _caches.get(cache_key)
+        if cache is None:
+            cache = NetworkXGraphCache(db, arango_graph)
+            with _caches_lock:
+                _caches[cache_key] = cache
+        return cache
+
+
+def get_networkx_graph(db: StandardDatabase, arango_graph: Graph, refresh: bool = True) -> nx.DiGraph:
+    """
+    Get an up-to-date NetworkX copy of an ArangoDB graph.
+
+    Args:
+        db: Database containing the graph
+        arango_graph: The ArangoDB graph
+        refresh: Whether to apply pending changes before returning
+
+    Returns:
+        The cached NetworkX graph
+    """
+    cache = get_networkx_graph_cache(db, arango_graph)
+    if refresh:
+        cache.refresh()
+    return cache.graph
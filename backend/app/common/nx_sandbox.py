@@ -0,0 +1,358 @@
+"""Pre-forked worker processes that run generated NetworkX code with limits."""
+
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+import networkx as nx
+import numpy as np
+from arango.database import StandardDatabase
+from arango.graph import Graph
+
+from app.common.graph_snapshot import GraphSnapshot, current_version_path, get_graph_snapshot, snapshot_path
+
+NX_SANDBOX_WORKERS = int(os.environ.get("NX_SANDBOX_WORKERS", min(4, os.cpu_count() or 1)))
+NX_SANDBOX_TIMEOUT = float(os.environ.get("NX_SANDBOX_TIMEOUT", 30))
+NX_SANDBOX_MEMORY_MB = int(os.environ.get("NX_SANDBOX_MEMORY_MB", 2048))
+NX_SANDBOX_MAX_RESULT_BYTES = int(os.environ.get("NX_SANDBOX_MAX_RESULT_BYTES", 100000))
+# Seconds after which the snapshot is checked for changes in the background
+# and, if the graph changed, the workers are moved to a rebuilt snapshot
+NX_SANDBOX_SNAPSHOT_TTL = float(os.environ.get("NX_SANDBOX_SNAPSHOT_TTL", 3600))
+
+logger = logging.getLogger(__name__)
+
+
+class SandboxError(Exception):
+    """Raised when generated code fails, times out or exceeds a limit in the sandbox."""
+
+
+class SandboxClosed(SandboxError):
+    """Raised when a run is started on a sandbox that was closed, e.g. replaced by a newer one."""
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convert values NetworkX code commonly returns into JSON-serializable ones."""
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, nx.Graph):
+        return {"nodes": value.number_of_nodes(), "edges": value.number_of_edges()}
+    if hasattr(value, "__iter__") and not isinstance(value, (str, bytes, dict)):
+        # Generators and views such as G.degree()
+        return list(value)
+    return str(value)
+
+
+def _json_key(key: Any) -> str:
+    if isinstance(key, str):
+        return key
+    if isinstance(key, tuple):
+        # Edge keys, e.g. from nx.edge_betweenness_centrality
+        return "|".join(_json_key(part) for part in key)
+    return str(_to_jsonable(key))
+
+
+def _with_json_keys(value: Any) -> Any:
+    """Recursively turn dict keys json.dumps rejects (tuples, numpy scalars, ...) into strings."""
+    if isinstance(value, dict):
+        return {_json_key(key): _with_json_keys(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_with_json_keys(item) for item in value]
+    return value
+
+
+def serialize_result(result: Any, max_bytes: int) -> str:
+    """
+    Serialize FINAL_RESULT to compact JSON.
+
+    Non-string dict keys become strings at any depth; tuple keys are joined
+    with "|", so {("a", "b"): 1} becomes {"a|b": 1}.
+
+    Raises:
+        SandboxError: If the serialized result is larger than max_bytes
+    """
+    payload = json.dumps(_with_json_keys(result), default=_to_jsonable, separators=(",", ":"))
+    if len(payload) > max_bytes:
+        raise SandboxError(
+            f"FINAL_RESULT is {len(payload)} bytes, more than the limit of {max_bytes}. "
+            "Return a smaller result, e.g. only the top 10 items or aggregate values."
+        )
+    return payload
+
+
+def _limit_memory(memory_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows; only the wall-clock limit applies there
+        return
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, path: str, memory_mb: int, max_result_bytes: int) -> None:
+    """Load the snapshot once, then run one code string per message until told to stop."""
+    G_adb = GraphSnapshot.load(path).view()
+    _limit_memory(memory_mb)
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            return
+        if code is None:
+            return
+        try:
+            local_vars = {}
+            exec(code, {"G_adb": G_adb, "nx": nx}, local_vars)
+            if "FINAL_RESULT" not in local_vars:
+                raise SandboxError(
+                    "The code did not define FINAL_RESULT variable. "
+                    "Please ensure the code sets this variable with the final answer."
+                )
+            response = ("ok", serialize_result(local_vars["FINAL_RESULT"], max_result_bytes))
+        except MemoryError:
+            response = ("error", f"The code exceeded the memory limit of {memory_mb} MB.")
+        except Exception as e:
+            response = ("error", f"{type(e).__name__}: {e}")
+        conn.send(response)
+
+
+def _get_context():
+    # Forking the web app directly would copy the locks of its other threads
+    # (LLM clients, DB pools) in whatever state they are in. Workers are
+    # forked from a single-threaded fork server instead, which imports this
+    # module (and with it NetworkX and NumPy) once so new workers start warm.
+    # Spawn is the fallback where there is no fork server, e.g. on Windows.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    """One worker process and the parent's end of its pipe."""
+
+    def __init__(self, context, path: str, memory_mb: int, max_result_bytes: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, path, memory_mb, max_result_bytes),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class NetworkXSandbox:
+    """
+    A fixed pool of worker processes, each holding a memory-mapped view of
+    the same graph snapshot, that run generated NetworkX code.
+
+    Every run has a wall-clock limit: a worker that does not answer in time is
+    killed and replaced, so a runaway algorithm cannot block the caller or
+    keep a core busy. Each worker also has an address-space limit. Because the
+    snapshot arrays are memory-mapped, the workers share one copy of the graph.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        workers: int = NX_SANDBOX_WORKERS,
+        timeout: float = NX_SANDBOX_TIMEOUT,
+        memory_mb: int = NX_SANDBOX_MEMORY_MB,
+        max_result_bytes: int = NX_SANDBOX_MAX_RESULT_BYTES
+    ):
+        """
+        Start the worker processes.
+
+        Args:
+            path: Directory of a snapshot saved with GraphSnapshot.save
+            workers: Number of worker processes
+            timeout: Wall-clock limit in seconds for one run
+            memory_mb: Address-space limit per worker in megabytes
+            max_result_bytes: Maximum size of the serialized FINAL_RESULT
+        """
+        self.path = path
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_result_bytes = max_result_bytes
+        self.started_at = time.monotonic()
+        self._closed = False
+        self._context = _get_context()
+        # Idle workers; None once the sandbox is closed
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self) -> _Worker:
+        return _Worker(self._context, self.path, self.memory_mb, self.max_result_bytes)
+
+    def run(self, code: str, timeout: Optional[float] = None) -> Any:
+        """
+        Run code in a worker and return its FINAL_RESULT.
+
+        The time spent waiting for a free worker counts towards the timeout.
+
+        Args:
+            code: Python code using `G_adb` and `nx` that sets FINAL_RESULT
+            timeout: Wall-clock limit in seconds (defaults to the sandbox timeout)
+
+        Returns:
+            FINAL_RESULT after a JSON round trip
+
+        Raises:
+            SandboxError: If the code fails, times out or exceeds a limit
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SandboxError(f"No NetworkX worker became free within {timeout} seconds.")
+        if worker is None:
+            # Pass the close marker on to the next waiting run
+            self._idle.put(None)
+            raise SandboxClosed("The NetworkX sandbox was closed.")
+
+        try:
+            worker.conn.send(code)
+            if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                worker.kill()
+                worker = self._start_worker()
+                raise SandboxError(
+                    f"The code did not finish within {timeout} seconds. "
+                    "Use a cheaper algorithm or restrict it to a subgraph."
+                )
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker died, e.g. killed by the OS for exceeding memory
+            worker.kill()
+            worker = self._start_worker()
+            raise SandboxError("The NetworkX worker crashed while running the code.")
+        finally:
+            if self._closed:
+                worker.stop()
+            else:
+                self._idle.put(worker)
+
+        if status != "ok":
+            raise SandboxError(payload)
+        return json.loads(payload)
+
+    def close(self) -> None:
+        """
+        Stop all workers; busy ones stop when their current run ends. Runs
+        started or waiting for a worker afterwards raise SandboxClosed.
+        """
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.stop()
+        self._idle.put(None)
+
+
+_sandboxes: Dict[Tuple[str, str], NetworkXSandbox] = {}
+# When each sandbox's snapshot was last checked for changes
+_checked_at: Dict[Tuple[str, str], float] = {}
+_refreshing: Set[Tuple[str, str]] = set()
+_start_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_sandboxes_lock = threading.Lock()
+
+
+def _current_snapshot(db: StandardDatabase, arango_graph: Graph) -> str:
+    """Return the directory of an up-to-date snapshot version, rebuilding it if the graph changed."""
+    get_graph_snapshot(db, arango_graph, max_age=0)
+    return current_version_path(snapshot_path(db.name, arango_graph.name))
+
+
+def _refresh_sandbox(db: StandardDatabase, arango_graph: Graph, key: Tuple[str, str]) -> None:
+    """
+    Move a graph's sandbox to an up-to-date snapshot. Runs in a background
+    thread; requests keep using the old sandbox until the new one is started.
+    """
+    try:
+        path = _current_snapshot(db, arango_graph)
+        old_sandbox = _sandboxes[key]
+        if path != old_sandbox.path:
+            sandbox = NetworkXSandbox(path)
+            with _sandboxes_lock:
+                _sandboxes[key] = sandbox
+            old_sandbox.close()
+        with _sandboxes_lock:
+            _checked_at[key] = time.monotonic()
+    except Exception:
+        # Keep serving the current snapshot; the check is retried on the next request
+        logger.exception("Refreshing the NetworkX sandbox snapshot of %s/%s failed", *key)
+    finally:
+        with _sandboxes_lock:
+            _refreshing.discard(key)
+
+
+def get_nx_sandbox(db: StandardDatabase, arango_graph: Graph) -> NetworkXSandbox:
+    """
+    Get the process-wide sandbox for a graph.
+
+    The graph snapshot is built and the workers started on first use. Once
+    the snapshot was last checked more than NX_SANDBOX_SNAPSHOT_TTL ago, a
+    background thread rebuilds it if the graph changed, as a new snapshot
+    version, and swaps in a sandbox on that version; until then the current
+    sandbox keeps serving requests.
+
+    Args:
+        db: Database containing the graph
+        arango_graph: The ArangoDB graph
+
+    Returns:
+        The NetworkXSandbox keyed by (database name, graph name)
+    """
+    key = (db.name, arango_graph.name)
+    with _sandboxes_lock:
+        sandbox = _sandboxes.get(key)
+        if sandbox is not None:
+            if time.monotonic() - _checked_at[key] >= NX_SANDBOX_SNAPSHOT_TTL and key not in _refreshing:
+                _refreshing.add(key)
+                threading.Thread(
+                    target=_refresh_sandbox, args=(db, arango_graph, key),
+                    name="nx-sandbox-refresh", daemon=True
+                ).start()
+            return sandbox
+        start_lock = _start_locks.setdefault(key, threading.Lock())
+
+    # Only callers of the same graph wait for its first snapshot
+    with start_lock:
+        with _sandboxes_lock:
+            sandbox = _sandboxes.get(key)
+        if sandbox is None:
+            sandbox = NetworkXSandbox(_current_snapshot(db, arango_graph))
+            with _sandboxes_lock:
+                _sandboxes[key] = sandbox
+                _checked_at[key] = time.monotonic()
+        return sandbox
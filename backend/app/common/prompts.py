@@ -78,6 +78,8 @@ Generate the Python Code required to answer the query using the `G_adb` object.
 
 `G_adb` and `nx` are already imported.
 
+`G_adb` is read-only: to change the graph or its attributes, work on a copy (`G = G_adb.copy()`).
+
 The code is executing in google colab where you can also show the graph using `nx.draw()`. Feel free to use this.
 
 Be very precise on the NetworkX algorithm you select to answer this query. Think step by step.
@@ -0,0 +1,215 @@
+"""Cached, incrementally refreshed ArangoDB schema for the AQL chains."""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_community.graphs.arangodb_graph import ArangoGraph
+
+from app.common.aql_cache import fingerprint
+
+# Words that never help to pick a collection for a question
+STOP_WORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "at", "by", "can", "do", "does",
+    "find", "for", "from", "get", "give", "have", "how", "i", "in", "is", "list",
+    "me", "my", "of", "on", "or", "show", "that", "the", "to", "what", "when",
+    "where", "which", "who", "with",
+}
+
+
+def _tokens(text: str) -> Set[str]:
+    """Split text into lowercase word tokens, also splitting snake_case names."""
+    words = re.findall(r"[a-z0-9]+", text.lower().replace("_", " "))
+    tokens = set()
+    for word in words:
+        if word in STOP_WORDS or len(word) < 3:
+            continue
+        tokens.add(word)
+        # Cheap plural folding so "restaurants" matches "restaurant"
+        if word.endswith("s"):
+            tokens.add(word[:-1])
+    return tokens
+
+
+class SchemaService:
+    """
+    Keeps the schema of one database, its rendered prompt string and its hash.
+
+    The expensive sampling done by ArangoGraph.generate_schema is only repeated
+    for collections that were added or went from empty to non-empty. The check
+    itself (collection list, counts and graph definitions) runs at most once
+    every `refresh_interval` seconds.
+    """
+
+    def __init__(self, graph: ArangoGraph, refresh_interval: float = 60):
+        """
+        Initialize the service from the schema the ArangoGraph already generated.
+
+        Args:
+            graph: ArangoGraph wrapper for the database
+            refresh_interval: Minimum number of seconds between state checks
+        """
+        self.graph = graph
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._collection_state: Optional[Dict[str, Tuple[str, bool]]] = None
+        self._last_check = time.monotonic()
+        self._set_schema(graph.schema)
+
+    def _set_schema(self, schema: Dict[str, Any]) -> None:
+        self._schema = schema
+        self._rendered = str(schema)
+        self._fingerprint = fingerprint(schema)
+        self._collections_by_name = {
+            c["collection_name"]: c for c in schema.get("Collection Schema", [])
+        }
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        return self._schema
+
+    @property
+    def rendered(self) -> str:
+        """The schema as it is interpolated into the prompts."""
+        return self._rendered
+
+    @property
+    def fingerprint(self) -> str:
+        return self._fingerprint
+
+    def _read_state(self) -> Tuple[Dict[str, Tuple[str, bool]], List[Dict[str, Any]]]:
+        """Read collection names, types, emptiness and graph definitions."""
+        db = self.graph.db
+        collection_state = {}
+        for collection in db.collections():
+            if collection["system"]:
+                continue
+            name = collection["name"]
+            collection_state[name] = (collection["type"], db.collection(name).count() > 0)
+        graph_schema = [
+            {"graph_name": g["name"], "edge_definitions": g["edge_definitions"]}
+            for g in db.graphs()
+        ]
+        return collection_state, graph_schema
+
+    def _sample_collection(self, name: str, col_type: str) -> Dict[str, Any]:
+        """Build the schema entry for one collection the same way ArangoGraph does."""
+        doc: Dict[str, Any] = {}
+        properties: List[Dict[str, str]] = []
+        for doc in self.graph.db.aql.execute(f"FOR doc IN `{name}` LIMIT 1 RETURN doc"):
+            for key, value in doc.items():
+                properties.append({"name": key, "type": type(value).__name__})
+        return {
+            "collection_name": name,
+            "collection_type": col_type,
+            f"{col_type}_properties": properties,
+            f"example_{col_type}": doc,
+        }
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Update the schema if collections or graph definitions changed.
+
+        Args:
+            force: Check the database even if the refresh interval has not passed
+
+        Returns:
+            True if the schema changed
+        """
+        if not force and time.monotonic() - self._last_check < self.refresh_interval:
+            return False
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            collection_state, graph_schema = self._read_state()
+            previous_state = self._collection_state
+            self._collection_state = collection_state
+
+            collection_schema = []
+            changed = graph_schema != self._schema.get("Graph Schema")
+            for name, (col_type, has_documents) in collection_state.items():
+                if not has_documents:
+                    continue
+                entry = self._collections_by_name.get(name)
+                was_known = previous_state is None or previous_state.get(name) == (col_type, True)
+                if entry is None or not was_known:
+                    entry = self._sample_collection(name, col_type)
+                    changed = True
+                collection_schema.append(entry)
+
+            if len(collection_schema) != len(self._collections_by_name):
+                changed = True
+
+            if changed:
+                schema = {"Graph Schema": graph_schema, "Collection Schema": collection_schema}
+                self._set_schema(schema)
+                self.graph.set_schema(schema)
+            return changed
+
+    def subset(self, user_input: str) -> str:
+        """
+        Render only the part of the schema relevant to a question.
+
+        Collections whose name or properties share words with the question are
+        kept, together with the edge collections connecting them and the vertex
+        collections at the other end of those edges. Falls back to the full
+        schema when nothing matches.
+
+        Args:
+            user_input: The natural language question
+
+        Returns:
+            The trimmed schema rendered as a string
+        """
+        question_tokens = _tokens(user_input)
+        matched = set()
+        for name, entry in self._collections_by_name.items():
+            properties = entry.get(f"{entry['collection_type']}_properties", [])
+            names = name + " " + " ".join(p["name"] for p in properties)
+            if question_tokens & _tokens(names):
+                matched.add(name)
+
+        if not matched:
+            return self._rendered
+
+        graph_schema = []
+        related = set(matched)
+        for graph in self._schema.get("Graph Schema", []):
+            edge_definitions = []
+            for edge_def in graph["edge_definitions"]:
+                ends = set(edge_def["from_vertex_collections"]) | set(edge_def["to_vertex_collections"])
+                if edge_def["edge_collection"] in matched or ends & matched:
+                    edge_definitions.append(edge_def)
+                    related.add(edge_def["edge_collection"])
+                    related |= ends
+            if edge_definitions:
+                graph_schema.append({"graph_name": graph["graph_name"], "edge_definitions": edge_definitions})
+
+        collection_schema = [
+            entry for name, entry in self._collections_by_name.items() if name in related
+        ]
+        return str({"Graph Schema": graph_schema, "Collection Schema": collection_schema})
+
+
+_services: Dict[str, SchemaService] = {}
+_services_lock = threading.Lock()
+
+
+def get_schema_service(graph: ArangoGraph) -> SchemaService:
+    """
+    Get the process-wide SchemaService for the database behind an ArangoGraph.
+
+    Args:
+        graph: ArangoGraph wrapper for the database
+
+    Returns:
+        The SchemaService shared by every chain querying that database
+    """
+    db_name = graph.db.name
+    with _services_lock:
+        service = _services.get(db_name)
+        if service is None:
+            service = SchemaService(graph)
+            _services[db_name] = service
+        return service
@@ -1,15 +1,69 @@
 import json
 import re
+import threading
 from langchain_core.tools import tool
 from app.common.arangodb import ArangoGraphQAChain, ArangoNetworkxQAChain
 from langgraph.types import Command, interrupt
-from typing import Callable
+from typing import Any, Callable, Optional
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.common.load_arangodb_graph_to_networkx import load_arangodb_graph_to_networkx
+# Bounds applied to AQL tool results so one tool message cannot blow up the context
+AQL_TOOL_TOP_K = 10
+AQL_TOOL_MAX_RESULT_BYTES = int(os.environ.get("AQL_TOOL_MAX_RESULT_BYTES", 16000))
+AQL_TOOL_BATCH_SIZE = int(os.environ.get("AQL_TOOL_BATCH_SIZE", 50))
+
+# Run generated NetworkX code in the process sandbox (see app.common.nx_sandbox).
+# Only disable it where worker processes cannot be started: generated code
+# then runs in the request thread without time or memory limits
+NX_SANDBOX_ENABLED = os.environ.get("NX_SANDBOX_ENABLED", "true").lower() == "true"
+
+
+def _run_aql_tool_query(chain, query: str, continuation_token: Optional[str]) -> str:
+    """
+    Run a natural language query through an AQL chain, or resume a previous
+    truncated result from its continuation token without calling the LLM.
+    """
+    if continuation_token:
+        try:
+            result = chain.resume(continuation_token)
+        except ValueError as e:
+            return str(e)
+    else:
+        result = chain.invoke(query)
+    rows, token = result["aql_result"], result.get("aql_continuation_token")
+
+    if token is None:
+        return json.dumps(rows)
+    return json.dumps({"results": rows, "continuation_token": token})
+
+def built_on_first_use(build: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Defer an expensive part of a tool (e.g. a QA chain) to the tool's first call,
+    so constructing an agent with many tools stays cheap.
+
+    Args:
+        build: Function creating the value
+
+    Returns:
+        A function returning the value, calling `build` once across all threads
+    """
+    value = None
+    built = False
+    lock = threading.Lock()
+
+    def get():
+        nonlocal value, built
+        if not built:
+            with lock:
+                if not built:
+                    value = build()
+                    built = True
+        return value
+
+    return get
 
 def about_me_factory(arango_graph):
     cache_me_str = None
@@ -76,19 +130,22 @@ def get_current_datetime() -> str:
 
 
 def public_db_query_factory(model, arango_graph, aql_generation_prompt):
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
         allow_dangerous_requests=True,
         return_aql_result=True,
         perform_qa=False,
-        top_k=10,
+        top_k=AQL_TOOL_TOP_K,
+        stream_results=True,
+        batch_size=AQL_TOOL_BATCH_SIZE,
+        max_result_bytes=AQL_TOOL_MAX_RESULT_BYTES,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
     
     @tool
-    def public_db_query(query: str) -> str:
+    def public_db_query(query: str, continuation_token: Optional[str] = None) -> str:
         """
         Translates natural language to AQL queries for the public database (common_db).
         
@@ -103,26 +160,32 @@ def public_db_query_factory(model, arango_graph, aql_generation_prompt):
         Use this tool multiple times if you get empty results.
 
         "Popularity" field is not what we show, we show ratings and reviews because it is for internal use.
+
+        Large results are truncated. If the response contains a "continuation_token", call this
+        tool again with the same query and that token to get the next rows. A single row too
+        large to return is cut and wrapped as {"_truncated_row": "<cut JSON>"}; query fewer fields.
         """ 
-        result = chain.invoke(query)
-        return json.dumps(result["aql_result"])
+        return _run_aql_tool_query(chain(), query, continuation_token)
     
     return public_db_query
 
 def private_db_query_factory(model, arango_graph, aql_generation_prompt):
-    chain = ArangoGraphQAChain.from_llm(
+    chain = built_on_first_use(lambda: ArangoGraphQAChain.from_llm(
         llm=model,
         graph=arango_graph,
         verbose=True,
         allow_dangerous_requests=True,
         return_aql_result=True,
         perform_qa=False,
-        top_k=10,
+        top_k=AQL_TOOL_TOP_K,
+        stream_results=True,
+        batch_size=AQL_TOOL_BATCH_SIZE,
+        max_result_bytes=AQL_TOOL_MAX_RESULT_BYTES,
         aql_generation_prompt=aql_generation_prompt
-    )
+    ))
     
     @tool
-    def private_db_query(query: str) -> str:
+    def private_db_query(query: str, continuation_token: Optional[str] = None) -> str:
         """
         Translates natural language to AQL queries for the private database (private_db).
         
@@ -137,25 +200,30 @@ def private_db_query_factory(model, arango_graph, aql_generation_prompt):
         Use case-insensitive, generic queries for better results.
 
         Use this tool multiple times if you get empty results.
+
+        Large results are truncated. If the response contains a "continuation_token", call this
+        tool again with the same query and that token to get the next rows. A single row too
+        large to return is cut and wrapped as {"_truncated_row": "<cut JSON>"}; query fewer fields.
         """ 
-        result = chain.invoke(query)
-        return json.dumps(result["aql_result"])
+        return _run_aql_tool_query(chain(), query, continuation_token)
     
     return private_db_query
 
 
 def text_to_nx_algorithm_for_public_db_factory(model, db, arango_graph, graph_schema):
-    G_adb = load_arangodb_graph_to_networkx(db, arango_graph)
-    chain = ArangoNetworkxQAChain.from_llm(
-        G_adb=G_adb,
+    # The chain is only built when the tool is first used, and the graph (or
+    # the sandbox's snapshot) is shared across agents and loaded by the chain
+    # on its first run, so building an agent does not pay for it
+    chain = built_on_first_use(lambda: ArangoNetworkxQAChain.from_llm(
         llm=model,
         db=db,
         graph=arango_graph,
         verbose=True,
         allow_dangerous_requests=True,
         return_nx_result=True,
-        graph_schema=graph_schema
-    )
+        graph_schema=graph_schema,
+        use_sandbox=NX_SANDBOX_ENABLED
+    ))
     @tool
     def text_to_nx_algorithm_for_public_db(query):
         """
@@ -173,7 +241,7 @@ def text_to_nx_algorithm_for_public_db_factory(model, db, arango_graph, graph_sc
         2. Online food ordering restaurants (menus, dishes)
         """
 
-        result = chain.invoke(query)
+        result = chain().invoke(query)
         return json.dumps(result["nx_result"])
 
     return text_to_nx_algorithm_for_public_db
\ No newline at end of file
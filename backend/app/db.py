@@ -1,47 +1,127 @@
 from arango import ArangoClient, Optional
+from arango.http import DefaultHTTPClient
 from config import Config
 from flask import g, session, current_app
 import functools
 import os
 import datetime
 import logging
+import threading
+import time
 import traceback
 from flask_login import current_user
 from arango.database import StandardDatabase
 
-# Initialize the ArangoDB client
-client = ArangoClient(hosts=Config.ARANGO_URL)
+# Initialize the ArangoDB client. Every handle created from it shares the same
+# HTTP session, so the pool size bounds the connections to the server.
+client = ArangoClient(
+    hosts=Config.ARANGO_URL,
+    http_client=DefaultHTTPClient(
+        pool_connections=Config.ARANGO_POOL_MAXSIZE,
+        pool_maxsize=Config.ARANGO_POOL_MAXSIZE
+    )
+)
+
+_system_db = None
+_system_db_lock = threading.Lock()
+
+
+class UserDBCache:
+    """
+    Thread-safe cache of per-user database handles keyed by user_id.
+
+    Keys are normalized with `str`, so 42 and "42" share one handle and one
+    `invalidate` drops it whichever form the caller has. Handles expire after `ttl` seconds so credential changes are picked up,
+    and can be dropped explicitly with `invalidate`.
+    """
+
+    def __init__(self, ttl: float = Config.USER_DB_CACHE_TTL):
+        self.ttl = ttl
+        self._handles = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id) -> Optional[StandardDatabase]:
+        key = str(user_id)
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self._handles.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, user_id, db: StandardDatabase) -> None:
+        with self._lock:
+            self._handles[str(user_id)] = (db, time.monotonic())
+
+    def invalidate(self, user_id=None) -> None:
+        """Drop the handle for one user, or every handle if user_id is None."""
+        with self._lock:
+            if user_id is None:
+                self._handles.clear()
+            else:
+                self._handles.pop(str(user_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._handles),
+                "ttl": self.ttl
+            }
+
+
+user_db_cache = UserDBCache()
+
 
 def get_system_db():
     """Get the system database connection with proper error handling"""
-    try:
-        # Connect to the system database with provided credentials
-        sys_db = client.db(
-            Config.ARANGO_DB_NAME, 
-            username=Config.ARANGO_USERNAME, 
-            password=Config.ARANGO_PASSWORD,
-            verify=True
-        )
-        # Test connection
-        sys_db.properties()
-        return sys_db
-    except Exception as e:
-        logging.error(f"Database connection error: {str(e)}")
-        logging.error(traceback.format_exc())
-        logging.error(f"Check your ArangoDB credentials and make sure the server is running at {Config.ARANGO_URL}")
-        # Re-raise to let the error handler deal with it
-        raise
+    global _system_db
+    if _system_db is not None:
+        return _system_db
+
+    with _system_db_lock:
+        if _system_db is not None:
+            return _system_db
+        try:
+            # Connect to the system database with provided credentials
+            sys_db = client.db(
+                Config.ARANGO_DB_NAME, 
+                username=Config.ARANGO_USERNAME, 
+                password=Config.ARANGO_PASSWORD,
+                verify=True
+            )
+            # Test connection
+            sys_db.properties()
+            _system_db = sys_db
+            return sys_db
+        except Exception as e:
+            logging.error(f"Database connection error: {str(e)}")
+            logging.error(traceback.format_exc())
+            logging.error(f"Check your ArangoDB credentials and make sure the server is running at {Config.ARANGO_URL}")
+            # Re-raise to let the error handler deal with it
+            raise
 
 def get_user_db(user_id=None) -> Optional[StandardDatabase]:
     """
     Get the database connection for a user.
     
+    Handles are cached per user_id (see `user_db_cache`), so only the first
+    call for a user pays for the existence check and credential lookup.
+    
     Args:
         user_id: User ID (if not provided, uses current user)
         
     Returns:
         ArangoDB database connection for the user
     """
+    cached_db = user_db_cache.get(user_id)
+    if cached_db is not None:
+        return cached_db
 
     # Get the database name for this user
     db_name = f"user_{user_id}"
@@ -70,24 +150,41 @@ def get_user_db(user_id=None) -> Optional[StandardDatabase]:
             # If we have the credentials, connect using those
             if user_db_doc and 'username' in user_db_doc and 'password' in user_db_doc:
                 try:
-                    return client.db(
+                    db = client.db(
                         db_name,
                         username=user_db_doc['username'],
                         password=user_db_doc['password']
                     )
+                    user_db_cache.put(user_id, db)
+                    return db
                 except Exception as e:
                     logging.error(f"Error connecting with user credentials: {str(e)}")
         
         # Fall back to admin credentials
-        return client.db(
+        db = client.db(
             db_name,
             username=Config.ARANGO_USERNAME,
             password=Config.ARANGO_PASSWORD
         )
+        user_db_cache.put(user_id, db)
+        return db
     except Exception as e:
         logging.error(f"Error connecting to user database: {str(e)}")
         return None
 
+def invalidate_user_db(user_id=None):
+    """
+    Drop cached database handles so the next `get_user_db` reconnects.
+    
+    Args:
+        user_id: User ID to invalidate (if not provided, clears every handle)
+    """
+    user_db_cache.invalidate(user_id)
+
+def get_user_db_cache_stats():
+    """Return hit/miss counters for the per-user database handle cache."""
+    return user_db_cache.stats()
+
 def close_db(e=None):
     """Close database connections."""
     # ArangoDB connections are handled automatically
@@ -111,18 +208,57 @@ def init_app(app):
             logging.info(f"Using database: {Config.ARANGO_DB_NAME}")
             
             # Ensure system collections exist
-            system_collections = ['users', 'user_databases']
+            system_collections = ['users', 'user_databases', 'chat_messages']
             for collection_name in system_collections:
                 if not db.has_collection(collection_name):
                     db.create_collection(collection_name)
                     logging.info(f"Created system collection: {collection_name}")
                 else:
                     logging.info(f"System collection exists: {collection_name}")
+
+            ensure_system_indexes(db)
         
         except Exception as e:
             logging.error(f"Failed to connect to database during initialization: {str(e)}")
             # Don't crash the app, but log the error for debugging
 
+# Persistent indexes on the system database: (collection, index name, fields)
+SYSTEM_INDEXES = [
+    # Serves a thread's history sorted by (timestamp, _key), and the
+    # pagination cursors, without sorting messages with equal timestamps
+    ('chat_messages', 'thread_timestamp', ['thread_id', 'timestamp', '_key']),
+]
+
+def ensure_system_indexes(db):
+    """
+    Create the persistent indexes of the system database that don't exist yet.
+    
+    An index whose name is taken by an index on other fields (an older
+    definition) is replaced.
+    
+    Args:
+        db: ArangoDB system database connection
+    """
+    for collection_name, index_name, fields in SYSTEM_INDEXES:
+        if not db.has_collection(collection_name):
+            continue
+        collection = db.collection(collection_name)
+        indexes = collection.indexes()
+        if any(idx["fields"] == fields for idx in indexes):
+            continue
+        for idx in indexes:
+            if idx.get("name") == index_name:
+                collection.delete_index(idx["id"])
+                logging.info(f"Dropped outdated index {index_name} on {collection_name}")
+        collection.add_index({
+            "type": "persistent",
+            "name": index_name,
+            "fields": fields,
+            "unique": False,
+            "sparse": False
+        })
+        logging.info(f"Created index {index_name} on {collection_name}")
+
 def setup_user_collections(db):
     """
     Set up the required collections for a user's personal database.
@@ -280,6 +416,9 @@ def create_user_database(user_id, email, password):
                 "created_at": datetime.datetime.utcnow().isoformat()
             })
             
+            # Make sure no stale handle for this user survives the new credentials
+            invalidate_user_db(user_id)
+            
             return True
         return True
     except Exception as e:
@@ -172,11 +172,59 @@ class ChatMessage:
         return ChatMessage(chat_doc)
 
     @staticmethod
-    def get_messages_for_thread(thread_id):
+    def get_messages_for_thread(thread_id, before=None, after=None, limit=None, before_key=None, after_key=None):
+        """
+        Get a thread's messages, oldest first, optionally one page at a time.
+        
+        Pages are cut by timestamp using the (thread_id, timestamp) index, so a
+        page costs the same however long the thread is. Messages are ordered
+        by (timestamp, _key), and a cursor with a key resumes within messages
+        sharing its timestamp instead of skipping them.
+        
+        Args:
+            thread_id: Thread to read
+            before: Only messages older than this ISO timestamp
+            after: Only messages newer than this ISO timestamp
+            limit: At most this many messages: the newest ones, unless `after`
+                is given, then the oldest ones after it. None returns all.
+            before_key: With `before`, also messages at that timestamp whose
+                _key is lower
+            after_key: With `after`, also messages at that timestamp whose
+                _key is higher
+            
+        Returns:
+            List of ChatMessage sorted by timestamp ascending
+        """
         db = get_system_db()
-        query = "FOR m IN chat_messages FILTER m.thread_id == @thread_id SORT m.timestamp ASC RETURN m"
-        cursor = db.aql.execute(query, bind_vars={'thread_id': thread_id})
-        return [ChatMessage(doc) for doc in cursor]
+        filters = ["m.thread_id == @thread_id"]
+        bind_vars = {'thread_id': thread_id}
+        if before is not None:
+            if before_key is None:
+                filters.append("m.timestamp < @before")
+            else:
+                filters.append("m.timestamp <= @before AND (m.timestamp < @before OR m._key < @before_key)")
+                bind_vars['before_key'] = before_key
+            bind_vars['before'] = before
+        if after is not None:
+            if after_key is None:
+                filters.append("m.timestamp > @after")
+            else:
+                filters.append("m.timestamp >= @after AND (m.timestamp > @after OR m._key > @after_key)")
+                bind_vars['after_key'] = after_key
+            bind_vars['after'] = after
+        # A page without `after` is the newest messages, read newest first
+        newest_first = limit is not None and after is None
+        order = 'DESC' if newest_first else 'ASC'
+        query = f"FOR m IN chat_messages FILTER {' AND '.join(filters)} SORT m.timestamp {order}, m._key {order}"
+        if limit is not None:
+            query += " LIMIT @limit"
+            bind_vars['limit'] = limit
+        query += " RETURN m"
+        cursor = db.aql.execute(query, bind_vars=bind_vars)
+        messages = [ChatMessage(doc) for doc in cursor]
+        if newest_first:
+            messages.reverse()
+        return messages
 
 # Flask-Login user loader
 from app import login_manager
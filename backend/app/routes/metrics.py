@@ -0,0 +1,18 @@
+from flask import Blueprint, Response, jsonify, request
+from app.common import metrics as metrics_settings
+from app.common.metrics import recent_spans, registry
+
+metrics = Blueprint('metrics', __name__)
+
+@metrics.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Route for Prometheus scraping."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@metrics.route('/metrics/traces', methods=['GET'])
+def traces():
+    """Route returning the most recently finished trace spans (internal deployments only)."""
+    if not metrics_settings.METRICS_TRACES_ROUTE_ENABLED:
+        return jsonify({"error": "Resource not found"}), 404
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({"spans": recent_spans(limit)}), 200
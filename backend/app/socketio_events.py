@@ -1,28 +1,103 @@
 from flask_socketio import emit, join_room, leave_room
 from flask import request, current_app
 from app.models import ChatMessage
+from app.common.agent_pool import get_agent_pool
+from app.common.agent_streaming import AgentStreamListener, streaming_to
+from app.common.llm_rate_limiter import INTERACTIVE, llm_priority
+from app.common.metrics import metric_labels
 from datetime import datetime
 from flask_login import current_user
+from contextlib import nullcontext
+import os
 import time
-import threading
 import uuid
 
-# Import the GatewayAgent
-from backend.app.agents.main_langgraph_experiment import GatewayAgent
+# Stream agent tokens and tool calls to the client unless a message opts out
+AGENT_STREAMING = os.environ.get('AGENT_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+# Agent answering chat messages: "gateway" routes to the specialized agents,
+# "main" uses the user's MainAgent (with all tools), kept in the agent cache
+CHAT_AGENT = os.environ.get('CHAT_AGENT', 'gateway').lower()
+# Messages sent when joining a thread and per "load older" request; older ones are fetched on demand
+MESSAGE_HISTORY_PAGE_SIZE = int(os.environ.get('MESSAGE_HISTORY_PAGE_SIZE', 50))
 
-# Global variable to hold the agent instance
-gateway_agent = None
+def message_history_page(thread_id, before=None, before_id=None, limit=MESSAGE_HISTORY_PAGE_SIZE):
+    """
+    Build the page of a thread's history that ends just before a cursor.
+    
+    Args:
+        thread_id: Thread to read
+        before: ISO timestamp cursor; only messages older than it. None for the latest page.
+        before_id: Message id completing the cursor, so messages sharing its
+            timestamp are not skipped
+        limit: Messages in the page
+        
+    Returns:
+        Payload with the page's messages (oldest first), whether older ones
+        exist, and the cursor (before, before_id) to request them with
+    """
+    # One extra message tells whether there is an older page
+    messages = ChatMessage.get_messages_for_thread(
+        thread_id, before=before, before_key=before_id, limit=limit + 1
+    )
+    has_more = len(messages) > limit
+    if has_more:
+        messages = messages[1:]
+    return {
+        'thread_id': thread_id,
+        'messages': [
+            {
+                'id': msg.id,
+                'content': msg.content,
+                'timestamp': msg.timestamp.isoformat(),
+                'sender_id': msg.sender_id,
+                'message_type': msg.message_type,
+                'thread_id': msg.thread_id
+            }
+            for msg in messages
+        ],
+        'has_more': has_more,
+        'before': messages[0].timestamp.isoformat() if messages else before,
+        'before_id': messages[0].id if messages else before_id
+    }
+
+class SocketIOStreamListener(AgentStreamListener):
+    """Emits an agent's tokens and tool calls to the thread's room as they happen"""
+
+    def __init__(self, socketio, thread_id, message_id):
+        self.socketio = socketio
+        self.thread_id = thread_id
+        # The thinking message the streamed reply replaces
+        self.message_id = message_id
+
+    def on_token(self, agent, token):
+        self.socketio.emit('agent_token', {
+            'thread_id': self.thread_id,
+            'message_id': self.message_id,
+            'agent': agent,
+            'token': token
+        }, room=f"thread_{self.thread_id}")
+
+    def on_tool(self, agent, event):
+        self.socketio.emit('agent_tool', {
+            'thread_id': self.thread_id,
+            'message_id': self.message_id,
+            'agent': agent,
+            **event
+        }, room=f"thread_{self.thread_id}")
 
 def get_gateway_agent():
-    """Get or create the GatewayAgent singleton"""
-    global gateway_agent
-    if gateway_agent is None:
-        import os
-        gateway_agent = GatewayAgent(
-            model_name=os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo'),
-            debug=bool(os.environ.get('DEBUG', False))
-        )
-    return gateway_agent
+    """Get the GatewayAgent singleton, importing the agent stack on first use"""
+    from app.agents.main_langgraph_experiment import get_gateway_agent as get_agent
+    return get_agent()
+
+def chat_reply(message, thread_id, user_id):
+    """Answer a chat message with the agent configured by CHAT_AGENT"""
+    if CHAT_AGENT == 'main':
+        from app.agents.main import get_main_agent
+        from app.agents.main_langgraph_experiment import memory, model, public_db
+        agent = get_main_agent(user_id, model.get(), memory.get(), public_db.get())
+        return agent.call_llm(message, thread_id)
+    return get_gateway_agent().process_message(message, thread_id, user_id)
 
 def register_socketio_events(socketio):
     @socketio.on('connect')
@@ -60,6 +135,17 @@ def register_socketio_events(socketio):
             emit('error', {'message': 'No thread_id provided'})
             return
         
+        # Hold a place in the agent queue before the message is saved, or
+        # refuse it up front when this user's queue is full
+        user_id = current_user.id
+        slot = get_agent_pool().reserve(user_id)
+        if slot is None:
+            emit('busy', {
+                'message': 'Too many messages are being processed. Please try again shortly.',
+                'thread_id': thread_id
+            })
+            return
+        
         try:
             # Save the user message to database
             user_message = ChatMessage.create(
@@ -89,12 +175,21 @@ def register_socketio_events(socketio):
             }, room=f"thread_{thread_id}")
             
             # Process the message with the GatewayAgent
-            # This happens in a separate process, responses will come via websocket events
+            # This happens on the agent worker pool, responses will come via websocket events
+            app = current_app._get_current_object()
+            stream = bool(data.get('stream', AGENT_STREAMING))
+            
             def process_with_agent():
                 try:
-                    agent = get_gateway_agent()
-                    # This will trigger thinking updates via websocket
-                    response_content = agent.process_message(message, thread_id, current_user.id)
+                    # Tokens and tool calls are emitted as agent_token/agent_tool events
+                    # while the agent runs; chat calls go ahead of background
+                    # (consumer) LLM traffic
+                    streaming = (
+                        streaming_to(SocketIOStreamListener(socketio, thread_id, thinking_message_id))
+                        if stream else nullcontext()
+                    )
+                    with llm_priority(INTERACTIVE), metric_labels(user=user_id), streaming:
+                        response_content = chat_reply(message, thread_id, user_id)
                     
                     # Save the final response to the database
                     assistant_message = ChatMessage.create(
@@ -104,9 +199,10 @@ def register_socketio_events(socketio):
                         message_type='assistant'
                     )
                     
-                    # Emit agent response through websocket
+                    # Emit agent response through websocket; it replaces the streamed tokens
                     socketio.emit('agent_response', {
                         'id': assistant_message.id,
+                        'stream_id': thinking_message_id,
                         'content': response_content,
                         'timestamp': assistant_message.timestamp.isoformat(),
                         'thread_id': thread_id,
@@ -115,19 +211,28 @@ def register_socketio_events(socketio):
                     }, room=f"thread_{thread_id}")
                     
                 except Exception as e:
-                    current_app.logger.error(f"Error processing message with agent: {str(e)}")
+                    app.logger.error(f"Error processing message with agent: {str(e)}")
                     # Send error message through websocket
                     socketio.emit('error', {
                         'message': f"Error processing your request: {str(e)}",
                         'thread_id': thread_id
                     }, room=f"thread_{thread_id}")
             
-            # Start processing in a separate thread
-            processing_thread = threading.Thread(target=process_with_agent)
-            processing_thread.daemon = True
-            processing_thread.start()
+            def run_in_app_context():
+                with app.app_context():
+                    process_with_agent()
+            
+            # Messages of one thread run one at a time, in order; this only
+            # fails if the pool is shutting down
+            if not slot.submit(thread_id, run_in_app_context):
+                emit('error', {
+                    'message': 'The server is shutting down. Please try again shortly.',
+                    'thread_id': thread_id,
+                    'thinking_id': thinking_message_id
+                })
             
         except Exception as e:
+            slot.release()
             print(f"Error handling message: {str(e)}")
             emit('error', {'message': str(e)})
     
@@ -153,23 +258,27 @@ def register_socketio_events(socketio):
             # Confirm to the client that they have joined
             emit('joined_thread', {'thread_id': thread_id})
             
-            # Fetch and send message history
-            messages = ChatMessage.get_messages_for_thread(thread_id)
-            if messages:
-                emit('message_history', {
-                    'thread_id': thread_id,
-                    'messages': [
-                        {
-                            'id': msg.id,
-                            'content': msg.content,
-                            'timestamp': msg.timestamp.isoformat(),
-                            'sender_id': msg.sender_id,
-                            'message_type': msg.message_type,
-                            'thread_id': msg.thread_id
-                        }
-                        for msg in messages
-                    ]
-                })
+            # Send the latest page of the history; older pages are requested with 'load_older_messages'
+            history = message_history_page(thread_id)
+            if history['messages']:
+                emit('message_history', history)
+    
+    @socketio.on('load_older_messages')
+    def handle_load_older_messages(data):
+        thread_id = data.get('thread_id')
+        before = data.get('before')
+        if not thread_id or not before:
+            emit('error', {'message': 'thread_id and before are required'})
+            return
+        
+        if current_user.is_authenticated:
+            try:
+                limit = min(int(data.get('limit', MESSAGE_HISTORY_PAGE_SIZE)), MESSAGE_HISTORY_PAGE_SIZE)
+            except (TypeError, ValueError):
+                limit = MESSAGE_HISTORY_PAGE_SIZE
+            emit('older_messages', message_history_page(
+                thread_id, before=before, before_id=data.get('before_id'), limit=max(limit, 1)
+            ))
     
     @socketio.on('leave_thread')
     def handle_leave_thread(data):
@@ -0,0 +1,408 @@
+"""
+Benchmark of the message ingestion path: analysis LLM call, consumer graph
+writes, analyzer and notification, replaying the datasets in migrations/data.
+
+Run against a local ArangoDB (e.g. `docker compose up arangodb`) with the
+offline fake LLM:
+
+    cd backend
+    python -m benchmarks.consumer_throughput --channel slack --rate 20 --messages 200
+
+Results are written as JSON (or appended as one line to a .jsonl file) so runs
+can be compared over time.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Add project root to path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "migrations", "data")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+CHANNELS = ("whatsapp", "slack", "email")
+
+
+def load_messages(channel: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Load benchmark messages for a channel from migrations/data.
+
+    There is no WhatsApp dataset, so WhatsApp messages are built from the
+    Slack messages (channels become groups).
+
+    Args:
+        channel: "whatsapp", "slack" or "email"
+        limit: Number of messages to return; the dataset is repeated to reach it
+
+    Returns:
+        Message payloads in the shape the channel's consumer expects
+    """
+    if channel not in CHANNELS:
+        raise ValueError(f"Unsupported channel: {channel}")
+    filename = "email_messages.json" if channel == "email" else "slack_messages.json"
+    with open(os.path.join(DATA_DIR, filename)) as f:
+        messages = json.load(f)["messages"]
+    if channel == "whatsapp":
+        messages = [
+            {"text": m["text"], "from": m["from"], "to": m["to"], "is_group": m.get("is_channel", False)}
+            for m in messages
+        ]
+    else:
+        # Identifiers in the dataset are import fixtures, not part of the payload
+        messages = [{k: v for k, v in m.items() if k != "identifiers"} for m in messages]
+    if limit is None:
+        return messages
+    return [dict(messages[i % len(messages)]) for i in range(limit)]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) with linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class StageRecorder:
+    """Thread-safe collection of per-stage latencies and per-message counters."""
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}
+        self.counters: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block as one sample of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages.setdefault(name, []).append(seconds)
+
+    def count(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters.setdefault(name, []).append(value)
+
+    def summary(self) -> Dict[str, Any]:
+        """Percentiles in milliseconds per stage and mean/percentiles per counter."""
+        with self._lock:
+            stages = {
+                name: {
+                    "count": len(samples),
+                    "mean_ms": 1000 * sum(samples) / len(samples),
+                    "p50_ms": 1000 * percentile(samples, 50),
+                    "p95_ms": 1000 * percentile(samples, 95),
+                    "p99_ms": 1000 * percentile(samples, 99),
+                    "max_ms": 1000 * max(samples)
+                }
+                for name, samples in self.stages.items()
+            }
+            counters = {
+                name: {
+                    "mean": sum(values) / len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "max": max(values)
+                }
+                for name, values in self.counters.items()
+            }
+        return {"stages": stages, "counters": counters}
+
+
+class RoundTripCounter:
+    """Counts ArangoDB HTTP requests made by each thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> int:
+        """Requests made by the calling thread since its last reset."""
+        return getattr(self._local, "count", 0)
+
+    def reset(self) -> None:
+        self._local.count = 0
+
+    @contextmanager
+    def installed(self) -> Iterator["RoundTripCounter"]:
+        """Count every request sent through python-arango's default HTTP client."""
+        from arango.http import DefaultHTTPClient
+
+        original = DefaultHTTPClient.send_request
+        counter = self
+
+        def send_request(client, *args, **kwargs):
+            counter._local.count = counter.current + 1
+            with counter._lock:
+                counter.total += 1
+            return original(client, *args, **kwargs)
+
+        DefaultHTTPClient.send_request = send_request
+        try:
+            yield self
+        finally:
+            DefaultHTTPClient.send_request = original
+
+
+class ConsumerPipeline:
+    """
+    The work of a channel's `process_message` Celery task, split into timed
+    stages: "insights" (fused LLM call), "consume" (identifiers and graph
+    writes), "analyze" (analysis and flags) and "notify" (notification callback).
+    """
+
+    def __init__(self, channel: str, user_id: str, provider: str = "fake",
+                 model_name: Optional[str] = None, fused: bool = True):
+        """
+        Build the consumer, analyzer and extractor for a channel.
+
+        Args:
+            channel: "whatsapp", "slack" or "email"
+            user_id: User whose database receives the messages
+            provider: LLM provider for every stage (see LLMManager)
+            model_name: Model name (defaults to the provider's default)
+            fused: Use one fused analysis call instead of separate calls
+        """
+        from app.common.message_insights import MessageInsightsExtractor
+
+        self.channel = channel
+        self.user_id = user_id
+        self.fused = fused
+        self.recorder: Optional[StageRecorder] = None
+        llm_args = {"model_provider": provider}
+        if model_name:
+            llm_args["model_name"] = model_name
+
+        if channel == "whatsapp":
+            from app.agents.whatsapp.analyser_agent import WhatsAppAnalyzer as Analyzer, notify_message
+            from app.agents.whatsapp.consumer_agent import WhatsAppConsumer as Consumer
+            from app.agents.whatsapp.schemas import AnalysisResult
+        elif channel == "slack":
+            from app.agents.slack.analyser_agent import SlackAnalyzer as Analyzer, notify_message
+            from app.agents.slack.consumer_agent import SlackConsumer as Consumer
+            from app.agents.slack.schemas import AnalysisResult
+        else:
+            from app.agents.email_agent.analyser_agent import EmailAnalyzer as Analyzer, notify_message
+            from app.agents.email_agent.consumer_agent import EmailConsumer as Consumer
+            from app.agents.email_agent.schemas import AnalysisResult
+
+        self.analysis_schema = AnalysisResult
+        self.extractor = MessageInsightsExtractor(**llm_args)
+        self.consumer = Consumer(**llm_args)
+        self._notify = notify_message
+        self.analyzer = Analyzer(notification_callback=self._timed_notify, **llm_args)
+
+    def _timed_notify(self, user_id: str, message_data: Dict[str, Any], analysis: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        self._notify(user_id, message_data, analysis)
+        if self.recorder is not None:
+            self.recorder.record("notify", time.perf_counter() - start)
+
+    def _content(self, message: Dict[str, Any]) -> str:
+        if self.channel == "email":
+            return f"Subject: {message.get('subject', '')}\n\n{message.get('body', '')}"
+        return message.get("text", "")
+
+    def __call__(self, message: Dict[str, Any], recorder: StageRecorder) -> None:
+        """Process one message, recording stage latencies; raises on failure."""
+        self.recorder = recorder
+        insights = None
+        if self.fused:
+            with recorder.stage("insights"):
+                insights = self.extractor.extract(self.channel, self._content(message))
+
+        with recorder.stage("consume"):
+            result = self.consumer.process_message(
+                self.user_id,
+                message,
+                identifiers=insights.normalized_identifiers if insights else None
+            )
+        if result.get("status") != "success":
+            raise RuntimeError(result.get("message") or result.get("error") or "consumer failed")
+
+        analysis_args = {}
+        if insights:
+            analysis_args["analysis_result"] = insights.to_analysis_result(self.analysis_schema)
+            if self.channel == "email":
+                analysis_args["summary"] = insights.summary
+        with recorder.stage("analyze"):
+            analysis = self.analyzer.process_message(
+                self.user_id,
+                message,
+                result.get("identifiers", []),
+                result.get("message_id"),
+                **analysis_args
+            )
+        if analysis.get("status") == "error":
+            raise RuntimeError(analysis.get("message") or analysis.get("error"))
+
+
+def run_benchmark(
+    messages: List[Dict[str, Any]],
+    process: Callable[[Dict[str, Any], StageRecorder], None],
+    rate: float = 0,
+    concurrency: int = 8,
+    round_trips: Optional[RoundTripCounter] = None
+) -> Dict[str, Any]:
+    """
+    Replay messages through a pipeline and measure it.
+
+    Messages are released on an open-loop schedule of `rate` per second (or
+    all at once if rate is 0) to `concurrency` worker threads, so time spent
+    queued behind slow messages shows up in the "queue" stage.
+
+    Args:
+        messages: Message payloads to replay
+        process: Called with each message and the recorder; raises on failure
+        rate: Messages released per second (0 for as fast as possible)
+        concurrency: Number of worker threads
+        round_trips: Counter whose per-thread count is recorded per message
+
+    Returns:
+        Throughput, error count and the recorder summary
+    """
+    recorder = StageRecorder()
+    errors: List[str] = []
+    errors_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def handle(message: Dict[str, Any], scheduled: float) -> None:
+        started = time.perf_counter()
+        recorder.record("queue", max(0.0, started - scheduled))
+        if round_trips is not None:
+            round_trips.reset()
+        try:
+            process(message, recorder)
+        except Exception as e:
+            with errors_lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        recorder.record("total", time.perf_counter() - started)
+        if round_trips is not None:
+            recorder.count("db_round_trips", round_trips.current)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, message in enumerate(messages):
+            scheduled = start + (i / rate if rate > 0 else 0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(handle, message, scheduled)
+
+    elapsed = time.perf_counter() - start
+    processed = len(messages) - len(errors)
+    return {
+        "messages": len(messages),
+        "processed": processed,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "elapsed_s": elapsed,
+        "messages_per_sec": processed / elapsed if elapsed else 0.0,
+        **recorder.summary()
+    }
+
+
+def write_results(results: Dict[str, Any], path: str) -> None:
+    """Write results as JSON, or append them as one line to a .jsonl file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith(".jsonl"):
+        with open(path, "a") as f:
+            f.write(json.dumps(results) + "\n")
+    else:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark consumer throughput")
+    parser.add_argument("--channel", choices=CHANNELS, default="slack")
+    parser.add_argument("--messages", type=int, default=100, help="Messages to replay (dataset is repeated)")
+    parser.add_argument("--rate", type=float, default=0, help="Messages per second (0 for as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--user-id", default="benchmark", help="User whose database receives the messages")
+    parser.add_argument("--provider", default="fake", help="LLM provider (default: the offline fake)")
+    parser.add_argument("--model-name", default=None)
+    parser.add_argument("--two-call", action="store_true", help="Use separate identifier and analysis calls")
+    parser.add_argument("--warmup", type=int, default=5, help="Messages processed before measuring")
+    parser.add_argument("--output", default=None, help="Results file (.json, or .jsonl to append)")
+    args = parser.parse_args(argv)
+
+    from app.db import create_user_database, get_user_db
+
+    if get_user_db(args.user_id) is None:
+        print(f"Creating database for benchmark user {args.user_id}")
+        if not create_user_database(args.user_id, f"{args.user_id}@benchmark.local", "benchmark"):
+            parser.error(f"Could not create the database for user {args.user_id}")
+
+    pipeline = ConsumerPipeline(
+        args.channel, args.user_id, provider=args.provider, model_name=args.model_name, fused=not args.two_call
+    )
+    warmup = StageRecorder()
+    for message in load_messages(args.channel, args.warmup):
+        pipeline(message, warmup)
+
+    messages = load_messages(args.channel, args.messages)
+    with RoundTripCounter().installed() as round_trips:
+        results = run_benchmark(messages, pipeline, args.rate, args.concurrency, round_trips)
+
+    results = {
+        "benchmark": "consumer_throughput",
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "commit": _git_commit(),
+        "config": {
+            "channel": args.channel,
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "provider": args.provider,
+            "model_name": args.model_name,
+            "fused": not args.two_call,
+            "fake_llm_latency": os.environ.get("FAKE_LLM_LATENCY")
+        },
+        **results
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"consumer_throughput-{args.channel}-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    )
+    write_results(results, output)
+
+    print(f"{results['processed']}/{results['messages']} messages, {results['errors']} errors, "
+          f"{results['messages_per_sec']:.1f} msgs/sec")
+    for name, stage in results["stages"].items():
+        print(f"  {name:<10} p50 {stage['p50_ms']:8.1f} ms  p95 {stage['p95_ms']:8.1f} ms  "
+              f"p99 {stage['p99_ms']:8.1f} ms")
+    if "db_round_trips" in results["counters"]:
+        print(f"  DB round trips per message: {results['counters']['db_round_trips']['mean']:.1f}")
+    print(f"Results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
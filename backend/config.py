@@ -10,6 +10,10 @@ class Config:
     ARANGO_DB_NAME = '_system'
     ARANGO_USERNAME = os.environ.get('ARANGO_USERNAME', 'root')
     ARANGO_PASSWORD = os.environ.get('ARANGO_PASSWORD', '')
+    # Size of the shared HTTP connection pool used by every ArangoDB handle
+    ARANGO_POOL_MAXSIZE = int(os.environ.get('ARANGO_POOL_MAXSIZE', 20))
+    # Seconds a cached per-user database handle stays valid
+    USER_DB_CACHE_TTL = int(os.environ.get('USER_DB_CACHE_TTL', 600))
 
 class TestConfig(Config):
     TESTING = True
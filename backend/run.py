@@ -42,4 +42,9 @@ def after_request(response):
 if __name__ == '__main__':
     # Use a different port to avoid AirPlay Receiver conflicts on macOS
     port = int(os.environ.get('PORT', 5000))
+    # Optionally build the chat agents once the server is listening; with the
+    # reloader only the child process that serves requests does it
+    if os.environ.get('GATEWAY_WARMUP', 'false').lower() == 'true' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.agents.main_langgraph_experiment import warm_up_gateway_agent
+        warm_up_gateway_agent(port=port)
     socketio.run(app, debug=True, host='0.0.0.0', port=port, allow_unsafe_werkzeug=True)
\ No newline at end of file
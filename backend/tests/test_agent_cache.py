@@ -0,0 +1,158 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.common.agent_cache import AgentCache, estimate_size
+from app.common import tools
+from app import socketio_events
+
+
+class Agent:
+    def __init__(self, payload_bytes=0, shared=None):
+        self.payload = b"x" * payload_bytes
+        self.shared = shared
+
+
+class AgentCacheTest(unittest.TestCase):
+    """Test the per-user agent cache."""
+
+    def test_hit_and_lru_eviction_by_count(self):
+        """The least recently used agent is evicted when the cache is full."""
+        cache = AgentCache(max_agents=2)
+        a = cache.get("a", Agent)
+        self.assertIs(cache.get("a", Agent), a)
+        b = cache.get("b", Agent)
+        cache.get("a", Agent)
+        cache.get("c", Agent)
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 3, 2))
+        # "b" was the least recently used
+        self.assertIsNot(cache.get("b", Agent), b)
+        self.assertEqual(cache.stats()["misses"], 4)
+
+    def test_eviction_by_memory(self):
+        """Agents are evicted once their estimated total size exceeds the budget."""
+        cache = AgentCache(max_agents=10, max_bytes=250000)
+        cache.get("a", lambda: Agent(100000))
+        cache.get("b", lambda: Agent(100000))
+        self.assertEqual(cache.stats()["size"], 2)
+        cache.get("c", lambda: Agent(100000))
+        stats = cache.stats()
+        self.assertEqual(stats["size"], 2)
+        self.assertLessEqual(stats["bytes"], 250000)
+        # An agent larger than the whole budget is still kept on its own
+        cache.get("huge", lambda: Agent(300000))
+        self.assertEqual(cache.stats()["size"], 1)
+
+    def test_shared_objects_are_not_counted(self):
+        """Objects passed as shared do not count towards an agent's size."""
+        model = Agent(100000)
+        self.assertGreater(estimate_size(Agent(shared=model)), 100000)
+        self.assertLess(estimate_size(Agent(shared=model), exclude=[model]), 100000)
+
+        cache = AgentCache(max_bytes=150000)
+        cache.get("a", lambda: Agent(shared=model), shared=[model])
+        cache.get("b", lambda: Agent(shared=model), shared=[model])
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_size_includes_lazily_built_tools(self):
+        """An agent is re-measured after its tools built their chains, and the budget applies."""
+        cache = AgentCache(max_agents=10, max_bytes=150000, remeasure_seconds=3600)
+
+        def build():
+            agent = Agent()
+            agent.chain = tools.built_on_first_use(lambda: b"x" * 100000)
+            return agent
+
+        a = cache.get("a", build)
+        cache.get("b", lambda: Agent(60000))
+        self.assertLess(cache.stats()["bytes"], 100000)
+
+        a.chain()
+        cache.get("a", build)
+        stats = cache.stats()
+        self.assertGreater(stats["bytes"], 100000)
+        # "b" was evicted to keep the re-measured "a" within the budget
+        self.assertEqual(stats["size"], 1)
+        self.assertIs(cache.get("a", build), a)
+
+    def test_idle_agents_are_evicted(self):
+        """Agents unused for idle_seconds are dropped."""
+        cache = AgentCache(idle_seconds=0.05)
+        a = cache.get("a", Agent)
+        time.sleep(0.1)
+        cache.evict_idle()
+        self.assertEqual(cache.stats()["size"], 0)
+        self.assertIsNot(cache.get("a", Agent), a)
+
+    def test_concurrent_requests_build_once(self):
+        """Concurrent misses for one key build the agent once."""
+        cache = AgentCache()
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.05)
+            return Agent()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("u1", build))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(len({id(agent) for agent in results}), 1)
+
+
+class LazyToolTest(unittest.TestCase):
+    """Test that expensive tool parts are built on first use."""
+
+    def test_built_on_first_use(self):
+        """The value is built once, on the first call."""
+        calls = []
+        get = tools.built_on_first_use(lambda: calls.append(1) or "chain")
+        self.assertEqual(calls, [])
+        self.assertEqual([get(), get()], ["chain", "chain"])
+        self.assertEqual(calls, [1])
+
+    def test_nx_tool_builds_chain_on_first_call(self):
+        """Creating the NetworkX tool does not build the chain, and the tool never loads the graph itself."""
+        with patch.object(tools.ArangoNetworkxQAChain, "from_llm") as from_llm:
+            from_llm.return_value.invoke.return_value = {"nx_result": 3}
+            nx_tool = tools.text_to_nx_algorithm_for_public_db_factory(None, None, None, {})
+            from_llm.assert_not_called()
+
+            self.assertEqual(nx_tool.invoke({"query": "how many restaurants?"}), "3")
+            self.assertEqual(nx_tool.invoke({"query": "again"}), "3")
+            from_llm.assert_called_once()
+            # The chain loads the cached graph or the sandbox snapshot when it runs
+            self.assertNotIn("G_adb", from_llm.call_args.kwargs)
+            self.assertEqual(from_llm.call_args.kwargs["use_sandbox"], tools.NX_SANDBOX_ENABLED)
+
+class ChatAgentTest(unittest.TestCase):
+    """Test that chat messages can be answered by the user's cached MainAgent."""
+
+    def test_main_chat_agent_comes_from_the_cache(self):
+        """With CHAT_AGENT=main the reply comes from get_main_agent for the user."""
+        main = MagicMock()
+        main.get_main_agent.return_value.call_llm.return_value = "reply"
+        gateway = MagicMock()
+        with patch.object(socketio_events, "CHAT_AGENT", "main"), \
+                patch.dict(sys.modules, {"app.agents.main": main, "app.agents.main_langgraph_experiment": gateway}):
+            self.assertEqual(socketio_events.chat_reply("hi", "t1", "u1"), "reply")
+        main.get_main_agent.assert_called_once_with(
+            "u1", gateway.model.get(), gateway.memory.get(), gateway.public_db.get()
+        )
+        main.get_main_agent.return_value.call_llm.assert_called_once_with("hi", "t1")
+
+
+if __name__ == '__main__':
+    unittest.main()
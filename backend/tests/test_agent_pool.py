@@ -0,0 +1,158 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.common.agent_pool import AgentWorkerPool
+
+
+class AgentWorkerPoolTest(unittest.TestCase):
+    """Test the bounded agent worker pool."""
+
+    def setUp(self):
+        """Track pools so they are stopped after each test."""
+        self.pools = []
+
+    def tearDown(self):
+        """Stop the pools."""
+        for pool in self.pools:
+            pool.close()
+
+    def make_pool(self, **kwargs):
+        pool = AgentWorkerPool(**kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def test_same_thread_runs_serially_in_order(self):
+        """Requests of one conversation never overlap and keep their order."""
+        pool = self.make_pool(workers=4, max_queue_per_user=10)
+        order, active, overlaps = [], [], []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def job(i):
+            def run():
+                with lock:
+                    active.append(i)
+                    if len(active) > 1:
+                        overlaps.append(i)
+                time.sleep(0.01)
+                with lock:
+                    active.remove(i)
+                    order.append(i)
+                    if len(order) == 5:
+                        done.set()
+            return run
+
+        for i in range(5):
+            self.assertTrue(pool.submit("u1", "t1", job(i)))
+        self.assertTrue(done.wait(2))
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertEqual(overlaps, [])
+
+    def test_concurrency_is_bounded(self):
+        """No more than `workers` requests run at once."""
+        pool = self.make_pool(workers=2, max_queue_per_user=10)
+        running, peak = [0], [0]
+        lock = threading.Lock()
+        finished = threading.Semaphore(0)
+
+        def run():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            finished.release()
+
+        for i in range(6):
+            pool.submit(f"u{i}", f"t{i}", run)
+        for _ in range(6):
+            self.assertTrue(finished.acquire(timeout=2))
+        self.assertEqual(peak[0], 2)
+
+    def test_backpressure(self):
+        """A user's queue and the pool's queue refuse requests when full."""
+        pool = self.make_pool(workers=1, max_queue_per_user=2, max_pending=3)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(2)
+
+        self.assertTrue(pool.submit("u1", "t1", blocking))
+        self.assertTrue(started.wait(1))
+        # The running request does not count as waiting
+        self.assertTrue(pool.submit("u1", "t1", lambda: None))
+        self.assertTrue(pool.submit("u1", "t2", lambda: None))
+        self.assertFalse(pool.has_capacity("u1"))
+        self.assertFalse(pool.submit("u1", "t3", lambda: None))
+        self.assertTrue(pool.submit("u2", "t4", lambda: None))
+        self.assertFalse(pool.submit("u3", "t5", lambda: None))
+        release.set()
+
+    def test_reserved_slots_count_against_the_queue(self):
+        """A reserved place is refused to later requests until it is submitted or released."""
+        pool = self.make_pool(workers=1, max_queue_per_user=1, max_pending=5)
+        done = threading.Event()
+
+        slot = pool.reserve("u1")
+        self.assertIsNotNone(slot)
+        self.assertIsNone(pool.reserve("u1"))
+        self.assertFalse(pool.submit("u1", "t2", lambda: None))
+        slot.release()
+        slot.release()
+        self.assertEqual(pool.pending, 0)
+
+        slot = pool.reserve("u1")
+        self.assertTrue(slot.submit("t1", done.set))
+        self.assertTrue(done.wait(2))
+        with self.assertRaises(RuntimeError):
+            slot.submit("t1", done.set)
+
+    def test_reserved_slot_is_refused_after_close(self):
+        """Submitting a slot to a closed pool fails and frees the place."""
+        pool = self.make_pool(workers=1)
+        slot = pool.reserve("u1")
+        pool.close()
+        self.assertFalse(slot.submit("t1", lambda: None))
+        self.assertEqual(pool.pending, 0)
+
+    def test_users_are_served_round_robin(self):
+        """A burst from one user does not starve another user."""
+        pool = self.make_pool(workers=1, max_queue_per_user=10)
+        release = threading.Event()
+        order = []
+        done = threading.Event()
+
+        pool.submit("u0", "t0", lambda: release.wait(2))
+        for i in range(3):
+            pool.submit("u1", f"a{i}", lambda i=i: order.append(f"u1-{i}"))
+        pool.submit("u2", "b0", lambda: order.append("u2-0"))
+        pool.submit("u2", "b1", lambda: (order.append("u2-1"), done.set()))
+        release.set()
+
+        self.assertTrue(done.wait(2))
+        self.assertEqual(order[:4], ["u1-0", "u2-0", "u1-1", "u2-1"])
+
+    def test_failing_request_does_not_stop_worker(self):
+        """A request raising an exception does not block its conversation."""
+        pool = self.make_pool(workers=1)
+        done = threading.Event()
+
+        def fail():
+            raise RuntimeError("agent failed")
+
+        pool.submit("u1", "t1", fail)
+        pool.submit("u1", "t1", done.set)
+        self.assertTrue(done.wait(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
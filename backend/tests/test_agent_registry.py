@@ -0,0 +1,105 @@
+import unittest
+import os
+import socket
+import sys
+import threading
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.agents import main_langgraph_experiment as gateway_module
+from app.agents.gateway_router import TieredRouter
+from app.agents.main_langgraph_experiment import DummyAgent, GatewayAgent, GatewayMetaSchema
+from app.agents.registry import AgentRegistry, LazyResource, warm_up_in_background
+
+
+class RecordingAgent:
+    def __init__(self, name):
+        self.name = name
+
+    def call_llm(self, user_message, thread_id):
+        return f"{self.name} handled: {user_message}"
+
+
+class AgentRegistryTest(unittest.TestCase):
+    """Test lazy construction of the gateway agents."""
+
+    def test_import_builds_nothing(self):
+        """Importing the gateway module connects to nothing and builds no agent."""
+        for resource in (gateway_module.model, gateway_module.memory, gateway_module.db_client,
+                         gateway_module.private_db, gateway_module.public_db):
+            self.assertIsInstance(resource, LazyResource)
+            self.assertFalse(resource.built)
+
+    def test_lazy_resource_builds_once(self):
+        """Concurrent first uses build the value once."""
+        builds = []
+        resource = LazyResource(lambda: builds.append(1) or object())
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(resource.get())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(len({id(value) for value in results}), 1)
+
+    def test_only_routed_agents_are_built(self):
+        """A message builds the agent it is routed to and no other."""
+        built = []
+
+        def factory(name):
+            def build():
+                built.append(name)
+                return RecordingAgent(name)
+            return build
+
+        registry = AgentRegistry({
+            "Email_Agent": factory("Email_Agent"),
+            "Online_Order_Restaurant_Agent": factory("Online_Order_Restaurant_Agent"),
+            "Slack_Agent": factory("Slack_Agent"),
+            "Default_Agent": lambda: DummyAgent("Default Agent"),
+        })
+        self.assertEqual(built, [])
+
+        model = MagicMock()
+        model.invoke.return_value = GatewayMetaSchema(**{
+            field: field == "is_related_to_online_order_restaurant" for field in GatewayMetaSchema.model_fields
+        })
+        agent = GatewayAgent(
+            model=model, prompt="", agents=registry,
+            router=TieredRouter(GatewayMetaSchema, log_path=None)
+        )
+        reply = agent.process_message("order biryani", "t1", user_id="u1")
+
+        self.assertEqual(reply, "Online_Order_Restaurant_Agent handled: order biryani")
+        self.assertEqual(built, ["Online_Order_Restaurant_Agent"])
+        self.assertFalse(registry.is_built("Email_Agent"))
+
+    def test_warm_up_waits_for_port_and_survives_failures(self):
+        """Background warm-up starts once the port listens and skips agents that fail."""
+        def fail():
+            raise RuntimeError("database unavailable")
+
+        registry = AgentRegistry({"Broken_Agent": fail, "Slack_Agent": lambda: RecordingAgent("Slack_Agent")})
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+
+        thread = warm_up_in_background(registry.warm_up, port=port)
+        thread.join(0.3)
+        # Nothing is built while the server is not listening yet
+        self.assertTrue(thread.is_alive())
+        self.assertFalse(registry.is_built("Slack_Agent"))
+
+        server.listen()
+        thread.join(5)
+        server.close()
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(registry.is_built("Slack_Agent"))
+        self.assertFalse(registry.is_built("Broken_Agent"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import sys
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.prebuilt import create_react_agent
+
+from app.common.agent_streaming import AgentStreamListener, run_agent_graph, streaming_to
+from app.common.fake_llm import FakeChatModel
+from app.common.metrics import agent_call
+
+
+@tool
+def lookup_contact(name: str) -> str:
+    """Look up a contact by name."""
+    return f"{name}: +10000000000"
+
+
+class RecordingListener(AgentStreamListener):
+    def __init__(self):
+        self.tokens = []
+        self.tools = []
+
+    def on_token(self, agent, token):
+        self.tokens.append((agent, token))
+
+    def on_tool(self, agent, event):
+        self.tools.append((agent, event))
+
+
+class AgentStreamingTest(unittest.TestCase):
+    """Test streaming agent tokens and tool calls to a listener."""
+
+    def make_agent(self, seed, tools):
+        return create_react_agent(FakeChatModel(seed=seed), tools, checkpointer=MemorySaver())
+
+    def test_without_listener_returns_final_message(self):
+        """Outside streaming_to the graph is invoked and its reply returned."""
+        graph = self.make_agent(1, [lookup_contact])
+        config = {"configurable": {"thread_id": "plain"}}
+        reply = run_agent_graph(graph, {"messages": [("user", "Bob's number?")]}, config)
+        self.assertEqual(reply, graph.get_state(config).values["messages"][-1].content)
+
+    def test_tokens_and_tool_events_are_streamed(self):
+        """The reply arrives token by token and tool calls as start/end events."""
+        graph = self.make_agent(1, [lookup_contact])
+        listener = RecordingListener()
+
+        @agent_call("Test_Agent")
+        def call_llm(message):
+            return run_agent_graph(graph, {"messages": [("user", message)]}, {"configurable": {"thread_id": "s"}})
+
+        with streaming_to(listener):
+            reply = call_llm("Bob's number?")
+
+        self.assertGreater(len(listener.tokens), 1)
+        self.assertEqual("".join(token for _, token in listener.tokens), reply)
+        self.assertEqual({agent for agent, _ in listener.tokens}, {"Test_Agent"})
+        statuses = [(event["status"], event["name"]) for _, event in listener.tools]
+        self.assertEqual(statuses, [("start", "lookup_contact"), ("end", "lookup_contact")])
+        self.assertEqual(listener.tools[0][1]["id"], listener.tools[1][1]["id"])
+        self.assertIn("+10000000000", listener.tools[1][1]["output"])
+
+    def test_nested_agent_tokens_are_not_duplicated(self):
+        """An agent used as a tool streams under its own name only."""
+        inner = self.make_agent(1, [lookup_contact])
+
+        @agent_call("Inner_Agent")
+        def inner_call(question):
+            return run_agent_graph(inner, {"messages": [("user", question)]}, {"configurable": {"thread_id": "i"}})
+
+        @tool
+        def ask_inner(question: str) -> str:
+            """Ask the inner agent."""
+            return inner_call(question)
+
+        outer = self.make_agent(2, [ask_inner])
+        listener = RecordingListener()
+
+        @agent_call("Outer_Agent")
+        def outer_call(message):
+            return run_agent_graph(outer, {"messages": [("user", message)]}, {"configurable": {"thread_id": "o"}})
+
+        with streaming_to(listener):
+            reply = outer_call("hi")
+
+        outer_text = "".join(token for agent, token in listener.tokens if agent == "Outer_Agent")
+        inner_text = "".join(token for agent, token in listener.tokens if agent == "Inner_Agent")
+        self.assertEqual(outer_text, reply)
+        self.assertEqual(inner_text, inner.get_state({"configurable": {"thread_id": "i"}}).values["messages"][-1].content)
+
+
+if __name__ == '__main__':
+    unittest.main()
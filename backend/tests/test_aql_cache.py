@@ -0,0 +1,111 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_community.graphs.arangodb_graph import ArangoGraph
+
+from app.common.aql_cache import AQLQueryCache
+from app.common.arangodb import ArangoGraphQAChain
+
+
+class AQLQueryCacheTest(unittest.TestCase):
+    """Test the persistent NL to AQL cache."""
+
+    def setUp(self):
+        """Create a cache in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = AQLQueryCache(os.path.join(self.temp_dir, "aql_cache.sqlite"), max_entries=2)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_key_normalizes_question(self):
+        """Questions differing only in spacing or punctuation share a key; case matters."""
+        schema = {"Collection Schema": []}
+        self.assertEqual(
+            self.cache.make_key("Restaurants in  Bangalore?", schema),
+            self.cache.make_key("Restaurants in Bangalore", schema)
+        )
+        self.assertNotEqual(
+            self.cache.make_key("messages from John", schema),
+            self.cache.make_key("messages from john", schema)
+        )
+        self.assertNotEqual(
+            self.cache.make_key("restaurants in bangalore", schema),
+            self.cache.make_key("restaurants in bangalore", {"Collection Schema": [1]})
+        )
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted once the cache is full."""
+        self.cache.put("a", "a", "RETURN 1")
+        self.cache.put("b", "b", "RETURN 2")
+        self.assertEqual(self.cache.get("a"), "RETURN 1")
+        self.cache.put("c", "c", "RETURN 3")
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "RETURN 1")
+        self.assertEqual(self.cache.get("c"), "RETURN 3")
+        self.assertEqual(self.cache.stats()["size"], 2)
+
+    def test_chain_skips_generation_on_repeat_question(self):
+        """A repeated question executes the cached AQL without calling the LLM."""
+        graph = MagicMock(spec=ArangoGraph)
+        graph.schema = {"Collection Schema": [], "Graph Schema": []}
+        graph.query.return_value = [{"name": "Biryani House"}]
+        graph.db.aql.explain.return_value = {"estimatedCost": 10, "nodes": []}
+        llm = FakeListLLM(responses=[
+            "```aql\nFOR r IN restaurants RETURN r\n```",
+            "```aql\nRETURN 'generated twice'\n```",
+        ])
+
+        chain = ArangoGraphQAChain.from_llm(
+            llm=llm,
+            graph=graph,
+            allow_dangerous_requests=True,
+            return_aql_result=True,
+            perform_qa=False,
+            return_aql_query=True,
+            aql_cache=self.cache
+        )
+
+        first = chain.invoke("Restaurants serving biryani")
+        second = chain.invoke("Restaurants serving  biryani?")
+
+        self.assertEqual(first["aql_query"].strip(), "FOR r IN restaurants RETURN r")
+        self.assertEqual(second["aql_query"].strip(), "FOR r IN restaurants RETURN r")
+        self.assertEqual(llm.i, 1)
+        self.assertEqual(graph.query.call_count, 2)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_chain_ignores_cache_when_disabled(self):
+        """use_aql_cache=False bypasses an explicitly passed cache too."""
+        graph = MagicMock(spec=ArangoGraph)
+        graph.schema = {"Collection Schema": [], "Graph Schema": []}
+        graph.query.return_value = []
+        graph.db.aql.explain.return_value = {"estimatedCost": 10, "nodes": []}
+        llm = FakeListLLM(responses=["```aql\nFOR r IN restaurants RETURN r\n```"])
+
+        chain = ArangoGraphQAChain.from_llm(
+            llm=llm,
+            graph=graph,
+            allow_dangerous_requests=True,
+            return_aql_result=True,
+            perform_qa=False,
+            use_aql_cache=False,
+            aql_cache=self.cache
+        )
+        chain.invoke("Restaurants serving biryani")
+
+        self.assertEqual(self.cache.stats(), {"hits": 0, "misses": 0, "size": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from arango.exceptions import AQLQueryExplainError
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_community.graphs.arangodb_graph import ArangoGraph
+
+from app.common.arangodb import ArangoGraphQAChain
+from app.common.aql_cursor import decode_continuation_token, encode_continuation_token, execute_bounded
+
+
+class ArangoGraphQAChainExplainTest(unittest.TestCase):
+    """Test that generated AQL is checked with EXPLAIN before it is executed."""
+
+    def setUp(self):
+        """Create a chain whose first generated query is rejected by EXPLAIN."""
+        self.graph = MagicMock(spec=ArangoGraph)
+        self.graph.schema = {"Collection Schema": [], "Graph Schema": []}
+        self.graph.query.return_value = [{"name": "Biryani House"}]
+        self.llm = FakeListLLM(responses=[
+            "```aql\nFOR r IN restaurants RETURN r\n```",
+            "```aql\nFOR r IN restaurants FILTER r.city == 'Bangalore' LIMIT 10 RETURN r\n```",
+        ])
+        self.chain = ArangoGraphQAChain.from_llm(
+            llm=self.llm,
+            graph=self.graph,
+            allow_dangerous_requests=True,
+            return_aql_result=True,
+            return_aql_query=True,
+            perform_qa=False,
+            use_aql_cache=False,
+            max_full_scan_documents=1000
+        )
+
+    def test_full_scan_is_fixed_without_execution(self):
+        """A full scan over a large collection goes to the fix chain unexecuted."""
+        self.graph.db.aql.explain.side_effect = [
+            {"estimatedCost": 50000, "nodes": [
+                {"type": "EnumerateCollectionNode", "collection": "restaurants", "estimatedNrItems": 50000}
+            ]},
+            {"estimatedCost": 20, "nodes": [
+                {"type": "IndexNode", "collection": "restaurants", "estimatedNrItems": 10}
+            ]},
+        ]
+
+        result = self.chain.invoke("restaurants in Bangalore")
+
+        self.assertIn("FILTER r.city == 'Bangalore'", result["aql_query"])
+        self.graph.query.assert_called_once()
+        self.assertEqual(self.graph.db.aql.explain.call_count, 2)
+
+    def test_parse_error_is_fixed_without_execution(self):
+        """A query that fails to parse is never executed."""
+        self.graph.db.aql.explain.side_effect = [
+            AQLQueryExplainError(MagicMock(error_message="syntax error", status_code=400), MagicMock()),
+            {"estimatedCost": 20, "nodes": []},
+        ]
+
+        self.chain.invoke("restaurants in Bangalore")
+
+        self.graph.query.assert_called_once()
+
+    def test_cost_threshold(self):
+        """Plans above max_estimated_cost are rejected."""
+        self.chain.max_estimated_cost = 100
+        self.graph.db.aql.explain.return_value = {"estimatedCost": 1000, "nodes": []}
+
+        with self.assertRaises(ValueError):
+            self.chain.invoke("restaurants in Bangalore")
+        self.graph.query.assert_not_called()
+
+
+class ExecuteBoundedTest(unittest.TestCase):
+    """Test streaming execution with row and byte budgets."""
+
+    def setUp(self):
+        """Mock a database whose cursor yields ten rows."""
+        self.rows = [{"_key": str(i), "name": f"restaurant {i}", "menu": ["dish"] * 50} for i in range(10)]
+        self.cursor = MagicMock()
+        self.cursor.__iter__.side_effect = lambda: iter(self.rows)
+        self.cursor.has_more.return_value = False
+        self.db = MagicMock()
+        self.db.aql.execute.return_value = self.cursor
+
+    def test_row_limit_and_continuation(self):
+        """Rows past max_rows are cut and resumed from the continuation token."""
+        result = execute_bounded(self.db, "FOR r IN restaurants RETURN r", max_rows=4)
+
+        self.assertEqual(result["rows"], self.rows[:4])
+        self.assertTrue(result["truncated"])
+        self.db.aql.execute.assert_called_with(
+            "FOR r IN restaurants RETURN r", batch_size=5, stream=True
+        )
+
+        aql_query, offset = decode_continuation_token(result["continuation_token"])
+        self.assertEqual(offset, 4)
+        # The server skips the returned rows and sends only the next page
+        self.rows = self.rows[4:9]
+        resumed = execute_bounded(self.db, aql_query, max_rows=4, offset=offset)
+        self.assertEqual(resumed["rows"][0], self.rows[0])
+        self.db.aql.execute.assert_called_with(
+            "FOR row IN (\nFOR r IN restaurants RETURN r\n) LIMIT 4, 5 RETURN row", batch_size=5, stream=True
+        )
+
+    def test_tampered_token_is_rejected(self):
+        """A token whose query was changed, or that was never signed, is refused."""
+        token = encode_continuation_token("FOR r IN restaurants RETURN r", 4)
+        payload, signature = token.split(".")
+        forged = encode_continuation_token("FOR u IN users REMOVE u IN users", 4).split(".")[0]
+
+        for bad in (f"{forged}.{signature}", payload, "not a token"):
+            with self.assertRaises(ValueError):
+                decode_continuation_token(bad)
+
+    def test_byte_budget(self):
+        """Serialized rows never exceed max_bytes and the last page has no token."""
+        result = execute_bounded(self.db, "FOR r IN restaurants RETURN r", max_bytes=1000)
+        self.assertLessEqual(len(json.dumps(result["rows"])), 1000 + len(result["rows"]) * 2)
+        self.assertTrue(result["truncated"])
+
+        complete = execute_bounded(self.db, "FOR r IN restaurants RETURN r", max_rows=10)
+        self.assertFalse(complete["truncated"])
+        self.assertIsNone(complete["continuation_token"])
+
+    def test_oversized_row_is_cut(self):
+        """A single row larger than the budget is returned cut, inside a truncation marker."""
+        result = execute_bounded(self.db, "FOR r IN restaurants RETURN r", max_bytes=20)
+        self.assertEqual(result["rows"], [{"_truncated_row": json.dumps(self.rows[0])[:20]}])
+        _, offset = decode_continuation_token(result["continuation_token"])
+        self.assertEqual(offset, 1)
+
+
+class ArangoGraphQAChainResumeTest(unittest.TestCase):
+    """Test resuming a truncated result from its continuation token."""
+
+    def setUp(self):
+        """Create a chain over a database whose cursor yields three rows."""
+        self.graph = MagicMock(spec=ArangoGraph)
+        self.graph.schema = {"Collection Schema": [], "Graph Schema": []}
+        self.graph.db = MagicMock()
+        cursor = MagicMock()
+        cursor.__iter__.side_effect = lambda: iter([{"name": "a"}, {"name": "b"}, {"name": "c"}])
+        cursor.has_more.return_value = False
+        self.graph.db.aql.execute.return_value = cursor
+        self.chain = ArangoGraphQAChain.from_llm(
+            llm=FakeListLLM(responses=[]),
+            graph=self.graph,
+            allow_dangerous_requests=True,
+            return_aql_result=True,
+            perform_qa=False,
+            use_aql_cache=False,
+            stream_results=True,
+            top_k=2,
+            max_full_scan_documents=1000
+        )
+
+    def test_resume_is_plan_checked(self):
+        """The resumed query is EXPLAINed and refused when it scans a whole collection."""
+        self.graph.db.aql.explain.return_value = {"estimatedCost": 10, "nodes": [
+            {"type": "EnumerateCollectionNode", "collection": "users", "estimatedNrItems": 50000}
+        ]}
+        token = encode_continuation_token("FOR u IN users RETURN u", 2)
+
+        with self.assertRaises(ValueError):
+            self.chain.resume(token)
+        self.graph.db.aql.execute.assert_not_called()
+
+    def test_resume_returns_next_page(self):
+        """An accepted token returns the next rows and a token for the rest."""
+        self.graph.db.aql.explain.return_value = {"estimatedCost": 10, "nodes": []}
+        result = self.chain.resume(encode_continuation_token("FOR r IN restaurants RETURN r", 2))
+
+        self.assertEqual(result["aql_result"], [{"name": "a"}, {"name": "b"}])
+        self.assertEqual(decode_continuation_token(result["aql_continuation_token"])[1], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.common.base_consumer import BaseGraphConsumer
+
+
+def fake_execute(existing_edges):
+    """
+    Return ids as the batched UPSERT query would, one per buffered document,
+    and look up unique edges in `existing_edges` ((from, to) -> id).
+    """
+    def execute(query, bind_vars):
+        if "edges" in bind_vars:
+            ids = []
+            for edge in bind_vars["edges"]:
+                pair = (edge["_from"], edge["_to"])
+                existing_edges.setdefault(pair, f"{bind_vars['@collection']}/{len(existing_edges)}")
+                ids.append(existing_edges[pair])
+            return iter(ids)
+        groups = []
+        i = 0
+        while f"docs{i}" in bind_vars:
+            collection_name = bind_vars[f"@collection{i}"]
+            groups.append([f"{collection_name}/{d['value']}" for d in bind_vars[f"docs{i}"]])
+            i += 1
+        return iter([groups])
+    return execute
+
+
+class GraphBatchTest(unittest.TestCase):
+    """Test that a batch writes a message's nodes and edges in a few requests."""
+
+    def setUp(self):
+        """Create a consumer on a mocked database."""
+        self.db = MagicMock()
+        self.db.name = "user_1"
+        self.db.has_collection.return_value = True
+        # An edge stored before unique edges were batched, under a server-generated key
+        self.existing_edges = {("contacts/1", "whatsapp_groups/g1"): "contact__whatsapp_group/123"}
+        self.db.aql.execute.side_effect = fake_execute(self.existing_edges)
+        self.db.collection.return_value.import_bulk.return_value = {"created": 1, "errors": 0}
+        self.consumer = BaseGraphConsumer()
+
+    def test_batch_flushes_once(self):
+        """Nodes go out in one AQL query and unique edges in one query per collection."""
+        with self.consumer.batch(self.db):
+            contact = self.consumer.add_node("contacts", {"whatsapp_number": "1"}, "whatsapp_number", "1")
+            message = self.consumer.add_node("whatsapp_messages", {"_key": "m1", "text": "hi"})
+            first = self.consumer.add_node("identifiers", {"value": "acme"}, "value", "acme", update=False)
+            second = self.consumer.add_node("identifiers", {"value": "acme"}, "value", "acme", update=False)
+            self.consumer.add_edge("contact__whatsapp_message", contact, message, unique=True)
+            edge = self.consumer.add_edge("identifier__message", first, message, unique=True)
+            again = self.consumer.add_edge("identifier__message", second, message, unique=True)
+            self.consumer.add_edge("message__log", message, contact)
+            self.db.aql.execute.assert_not_called()
+
+        self.assertEqual(self.db.aql.execute.call_count, 3)
+        self.assertEqual(self.db.collection.return_value.import_bulk.call_count, 1)
+        self.assertIs(first, second)
+        self.assertEqual(contact.id, "contacts/1")
+        self.assertEqual(message.id, "whatsapp_messages/m1")
+        self.assertEqual(edge.id, again.id)
+
+        bind_vars = self.db.aql.execute.call_args_list[0].kwargs["bind_vars"]
+        identifier_docs = [bind_vars[k] for k in bind_vars if k.startswith("docs") and len(bind_vars[k]) == 1
+                           and bind_vars[k][0]["value"] == "acme"][0]
+        self.assertEqual(identifier_docs[0]["update"], {})
+
+        # The same endpoints are sent once
+        edges = self.db.aql.execute.call_args_list[2].kwargs["bind_vars"]["edges"]
+        self.assertEqual([(e["_from"], e["_to"]) for e in edges], [("identifiers/acme", "whatsapp_messages/m1")])
+
+    def test_repeated_upsert_keeps_the_latest_data(self):
+        """Upserting the same node twice writes it once, with the later values winning."""
+        with self.consumer.batch(self.db):
+            first = self.consumer.add_node(
+                "contacts", {"whatsapp_number": "1", "name": "1", "email": "a@x.com"}, "whatsapp_number", "1"
+            )
+            second = self.consumer.add_node(
+                "contacts", {"whatsapp_number": "1", "name": "Alice"}, "whatsapp_number", "1"
+            )
+            self.consumer.add_node("contacts", {"whatsapp_number": "1", "name": "ignored"}, "whatsapp_number", "1",
+                                   update=False)
+
+        self.assertIs(first, second)
+        docs = self.db.aql.execute.call_args.kwargs["bind_vars"]["docs0"]
+        self.assertEqual(len(docs), 1)
+        for part in ("data", "update"):
+            self.assertEqual(docs[0][part]["name"], "Alice")
+            self.assertEqual(docs[0][part]["email"], "a@x.com")
+
+    def test_unique_edge_matches_existing_edge_key(self):
+        """A unique edge already stored under another key is found, not duplicated."""
+        with self.consumer.batch(self.db):
+            contact = self.consumer.add_node("contacts", {"whatsapp_number": "1"}, "whatsapp_number", "1")
+            group = self.consumer.add_node("whatsapp_groups", {"identifier": "g1"}, "identifier", "g1")
+            edge = self.consumer.add_edge("contact__whatsapp_group", contact, group, unique=True)
+        self.assertEqual(edge.id, "contact__whatsapp_group/123")
+        self.assertEqual(len(self.existing_edges), 1)
+
+    def test_node_data_can_refer_to_other_nodes(self):
+        """Nodes whose data holds refs are written after the nodes they refer to."""
+        with self.consumer.batch(self.db):
+            channel = self.consumer.add_node("slack_channels", {"name": "general"}, "name", "general")
+            message = self.consumer.add_node("slack_messages", {"_key": "m1", "channel_id": channel})
+
+        self.assertEqual(self.db.aql.execute.call_count, 2)
+        second_query = self.db.aql.execute.call_args_list[1].kwargs["bind_vars"]
+        self.assertEqual(second_query["docs0"][0]["data"]["channel_id"], "slack_channels/general")
+        self.assertEqual(message.id, "slack_messages/m1")
+
+    def test_missing_collections_are_skipped_when_not_created(self):
+        """Without create_collections, missing collections are neither created nor written."""
+        self.db.name = "user_provisioned"
+        self.db.has_collection.side_effect = lambda name: name != "identifiers"
+        self.consumer.create_collections = False
+        with self.consumer.batch(self.db):
+            message = self.consumer.add_node("slack_messages", {"_key": "m1"})
+            identifier = self.consumer.add_node("identifiers", {"value": "acme"}, "value", "acme")
+            edge = self.consumer.add_edge("identifier__slack_message", identifier, message, unique=True)
+
+        self.db.create_collection.assert_not_called()
+        self.assertEqual(message.id, "slack_messages/m1")
+        self.assertIsNone(identifier.id)
+        self.assertIsNone(edge.id)
+        self.assertEqual(self.db.aql.execute.call_count, 1)
+
+    def test_collection_checks_are_cached(self):
+        """Collection existence is only checked the first time."""
+        self.db.name = "user_cached"
+        for _ in range(3):
+            with self.consumer.batch(self.db):
+                self.consumer.add_node("contacts", {"name": "a"})
+        self.db.has_collection.assert_called_once_with("contacts")
+
+    def test_nothing_is_written_on_error(self):
+        """An exception inside the batch discards the buffered writes."""
+        with self.assertRaises(RuntimeError):
+            with self.consumer.batch(self.db):
+                self.consumer.add_node("contacts", {"name": "a"})
+                raise RuntimeError("LLM failed")
+        self.db.aql.execute.assert_not_called()
+        self.assertIsNone(self.consumer._batch)
+
+
+if __name__ == '__main__':
+    unittest.main()
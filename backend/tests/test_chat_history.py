@@ -0,0 +1,92 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models import ChatMessage
+from app.socketio_events import message_history_page
+
+
+def make_messages(count):
+    return [
+        ChatMessage({'_key': str(i), 'thread_id': 't1', 'content': f'message {i}',
+                     'timestamp': f'2025-01-01T00:00:{i:02d}'})
+        for i in range(count)
+    ]
+
+
+class ChatMessagePaginationTest(unittest.TestCase):
+    """Test reading a thread's history one page at a time."""
+    
+    @patch('app.models.get_system_db')
+    def test_page_reads_newest_first_and_returns_oldest_first(self, mock_get_system_db):
+        """A page before a cursor is the newest messages before it, in chronological order."""
+        aql = mock_get_system_db.return_value.aql
+        aql.execute.return_value = [
+            {'_key': '2', 'thread_id': 't1', 'timestamp': '2025-01-01T00:00:02'},
+            {'_key': '1', 'thread_id': 't1', 'timestamp': '2025-01-01T00:00:01'},
+        ]
+        
+        messages = ChatMessage.get_messages_for_thread('t1', before='2025-01-01T00:00:03', limit=2)
+        
+        query, = aql.execute.call_args[0]
+        bind_vars = aql.execute.call_args[1]['bind_vars']
+        self.assertIn("m.timestamp < @before", query)
+        self.assertIn("SORT m.timestamp DESC, m._key DESC LIMIT @limit", query)
+        self.assertEqual(bind_vars, {'thread_id': 't1', 'before': '2025-01-01T00:00:03', 'limit': 2})
+        self.assertEqual([message.id for message in messages], ['1', '2'])
+    
+    @patch('app.models.get_system_db')
+    def test_after_cursor_and_full_history_read_oldest_first(self, mock_get_system_db):
+        """Pages after a cursor, and the unpaginated history, are read in ascending order."""
+        aql = mock_get_system_db.return_value.aql
+        aql.execute.return_value = []
+        
+        ChatMessage.get_messages_for_thread('t1', after='2025-01-01T00:00:03', limit=10)
+        self.assertIn("m.timestamp > @after", aql.execute.call_args[0][0])
+        self.assertIn("SORT m.timestamp ASC, m._key ASC LIMIT @limit", aql.execute.call_args[0][0])
+        
+        ChatMessage.get_messages_for_thread('t1')
+        self.assertNotIn("LIMIT", aql.execute.call_args[0][0])
+        self.assertEqual(aql.execute.call_args[1]['bind_vars'], {'thread_id': 't1'})
+    
+    @patch('app.models.get_system_db')
+    def test_compound_cursor_keeps_messages_sharing_a_timestamp(self, mock_get_system_db):
+        """A cursor with a key also returns the remaining messages at its timestamp."""
+        aql = mock_get_system_db.return_value.aql
+        aql.execute.return_value = []
+        
+        ChatMessage.get_messages_for_thread('t1', before='2025-01-01T00:00:03', before_key='7', limit=2)
+        query, = aql.execute.call_args[0]
+        self.assertIn("m.timestamp <= @before AND (m.timestamp < @before OR m._key < @before_key)", query)
+        self.assertEqual(aql.execute.call_args[1]['bind_vars'], {
+            'thread_id': 't1', 'before': '2025-01-01T00:00:03', 'before_key': '7', 'limit': 2
+        })
+        
+        ChatMessage.get_messages_for_thread('t1', after='2025-01-01T00:00:03', after_key='7')
+        self.assertIn("m.timestamp >= @after AND (m.timestamp > @after OR m._key > @after_key)",
+                      aql.execute.call_args[0][0])
+    
+    @patch.object(ChatMessage, 'get_messages_for_thread')
+    def test_history_page_reports_older_messages(self, mock_get_messages):
+        """A full page says older messages exist and gives the cursor to fetch them."""
+        mock_get_messages.return_value = make_messages(4)
+        
+        page = message_history_page('t1', limit=3)
+        
+        mock_get_messages.assert_called_once_with('t1', before=None, before_key=None, limit=4)
+        self.assertTrue(page['has_more'])
+        self.assertEqual([message['id'] for message in page['messages']], ['1', '2', '3'])
+        self.assertEqual((page['before'], page['before_id']), ('2025-01-01T00:00:01', '1'))
+        
+        mock_get_messages.return_value = make_messages(2)
+        page = message_history_page('t1', before='2025-01-01T00:00:01', before_id='1', limit=3)
+        mock_get_messages.assert_called_with('t1', before='2025-01-01T00:00:01', before_key='1', limit=4)
+        self.assertFalse(page['has_more'])
+        self.assertEqual(len(page['messages']), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from app.common.checkpointer import (
+    CheckpointCompactor, ManagedSqliteSaver, async_checkpointer, connect, get_checkpointer
+)
+
+
+def echo_graph(checkpointer):
+    """A one-node graph replying with the number of messages it has seen."""
+    def reply(state):
+        return {"messages": [("ai", f"seen {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", reply)
+    builder.add_edge(START, "reply")
+    builder.add_edge("reply", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def count_rows(path, table, thread_id):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+
+
+class CheckpointerTest(unittest.TestCase):
+    """Test the managed SQLite checkpointers."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "checkpoints.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_connections_use_wal_and_normal_sync(self):
+        """Every connection is in WAL mode with synchronous=NORMAL."""
+        conn = connect(self.path)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        # 1 is NORMAL
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        conn.close()
+
+    def test_threads_use_their_own_connection(self):
+        """Concurrent runs each get a connection and all their checkpoints are saved."""
+        saver = ManagedSqliteSaver(self.path)
+        graph = echo_graph(saver)
+        connections, errors = set(), []
+
+        def run(index):
+            try:
+                config = {"configurable": {"thread_id": f"t{index}"}}
+                for _ in range(5):
+                    graph.invoke({"messages": [("user", "hi")]}, config)
+                connections.add(id(saver.conn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        saver.close()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(connections), 4)
+        for i in range(4):
+            state = graph.get_state({"configurable": {"thread_id": f"t{i}"}})
+            self.assertEqual(len(state.values["messages"]), 10)
+
+    def test_retention_keeps_last_checkpoints_and_history(self):
+        """Compaction keeps the newest checkpoints and the thread resumes where it was."""
+        compactor = CheckpointCompactor(self.path, keep_last=3)
+        graph = echo_graph(ManagedSqliteSaver(self.path, compactor=compactor))
+        config = {"configurable": {"thread_id": "long"}}
+        other = {"configurable": {"thread_id": "short"}}
+        for _ in range(10):
+            graph.invoke({"messages": [("user", "hi")]}, config)
+        graph.invoke({"messages": [("user", "hi")]}, other)
+        self.assertGreater(count_rows(self.path, "checkpoints", "long"), 3)
+        latest = graph.get_state(config).config["configurable"]["checkpoint_id"]
+
+        compactor.compact()
+
+        self.assertEqual(count_rows(self.path, "checkpoints", "long"), 3)
+        self.assertEqual(count_rows(self.path, "checkpoints", "short"), 3)
+        # Nothing new to prune until threads are written to again
+        self.assertEqual(compactor.compact(), 0)
+        self.assertEqual(graph.get_state(config).config["configurable"]["checkpoint_id"], latest)
+        reply = graph.invoke({"messages": [("user", "hi")]}, config)
+        self.assertEqual(reply["messages"][-1].content, "seen 21")
+
+    def test_compaction_runs_in_the_background(self):
+        """The compactor thread prunes written threads on its own."""
+        compactor = CheckpointCompactor(self.path, keep_last=2, interval=0.05).start()
+        graph = echo_graph(ManagedSqliteSaver(self.path, compactor=compactor))
+        config = {"configurable": {"thread_id": "bg"}}
+        for _ in range(5):
+            graph.invoke({"messages": [("user", "hi")]}, config)
+
+        deadline = time.monotonic() + 5
+        while count_rows(self.path, "checkpoints", "bg") > 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        compactor.stop()
+        self.assertEqual(count_rows(self.path, "checkpoints", "bg"), 2)
+
+    def test_async_checkpointer_shares_the_database(self):
+        """The async variant saves to the same database and reports writes to the compactor."""
+        async def run():
+            async with async_checkpointer(self.path) as saver:
+                graph = echo_graph(saver)
+                config = {"configurable": {"thread_id": "async"}}
+                await graph.ainvoke({"messages": [("user", "hi")]}, config)
+                return await graph.ainvoke({"messages": [("user", "hi")]}, config), saver
+
+        reply, saver = asyncio.run(run())
+        self.assertEqual(reply["messages"][-1].content, "seen 3")
+        self.assertIs(saver.compactor, get_checkpointer(self.path).compactor)
+
+        graph = echo_graph(get_checkpointer(self.path))
+        state = graph.get_state({"configurable": {"thread_id": "async"}})
+        self.assertEqual(len(state.values["messages"]), 4)
+        saver.compactor.stop()
+        get_checkpointer(self.path).close()
+
+
+if __name__ == '__main__':
+    unittest.main()
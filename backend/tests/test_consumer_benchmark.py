@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from arango.http import DefaultHTTPClient
+
+from benchmarks.consumer_throughput import (
+    RoundTripCounter, StageRecorder, load_messages, percentile, run_benchmark, write_results
+)
+
+
+class ConsumerBenchmarkTest(unittest.TestCase):
+    """Test the consumer throughput benchmark harness without a database."""
+
+    def test_load_messages(self):
+        """Datasets are converted to consumer payloads and repeated to the limit."""
+        slack = load_messages("slack")
+        self.assertTrue(slack)
+        self.assertNotIn("identifiers", slack[0])
+
+        whatsapp = load_messages("whatsapp", limit=len(slack) + 3)
+        self.assertEqual(len(whatsapp), len(slack) + 3)
+        self.assertEqual(set(whatsapp[0]), {"text", "from", "to", "is_group"})
+
+        self.assertIn("body", load_messages("email", limit=1)[0])
+        with self.assertRaises(ValueError):
+            load_messages("sms")
+
+    def test_percentile(self):
+        """Percentiles interpolate between samples."""
+        values = list(range(1, 101))
+        self.assertAlmostEqual(percentile(values, 50), 50.5)
+        self.assertAlmostEqual(percentile(values, 99), 99.01)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_run_benchmark(self):
+        """Stages, errors and throughput are reported for a replay."""
+        def process(message, recorder):
+            with recorder.stage("consume"):
+                time.sleep(0.001)
+            if message["n"] == 3:
+                raise RuntimeError("boom")
+
+        messages = [{"n": i} for i in range(10)]
+        results = run_benchmark(messages, process, rate=0, concurrency=4)
+        self.assertEqual(results["processed"], 9)
+        self.assertEqual(results["errors"], 1)
+        self.assertEqual(results["error_samples"], ["RuntimeError: boom"])
+        self.assertEqual(results["stages"]["consume"]["count"], 10)
+        self.assertEqual(results["stages"]["total"]["count"], 9)
+        self.assertGreater(results["messages_per_sec"], 0)
+
+    def test_round_trip_counter(self):
+        """Requests are counted per thread only while installed."""
+        session = MagicMock()
+        session.request.return_value = MagicMock(
+            url="http://db", headers={}, status_code=200, reason="OK", text="{}"
+        )
+        client = DefaultHTTPClient()
+        counter = RoundTripCounter()
+        with counter.installed():
+            client.send_request(session, "get", "http://db")
+            client.send_request(session, "get", "http://db")
+            thread = threading.Thread(target=client.send_request, args=(session, "get", "http://db"))
+            thread.start()
+            thread.join()
+            self.assertEqual(counter.current, 2)
+        client.send_request(session, "get", "http://db")
+        self.assertEqual(counter.total, 3)
+
+    def test_write_results(self):
+        """JSON files are overwritten and JSON lines files appended to."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            history = os.path.join(temp_dir, "history.jsonl")
+            write_results({"run": 1}, history)
+            write_results({"run": 2}, history)
+            with open(history) as f:
+                self.assertEqual([json.loads(line)["run"] for line in f], [1, 2])
+
+            summary = StageRecorder()
+            summary.record("total", 0.5)
+            path = os.path.join(temp_dir, "nested", "result.json")
+            write_results(summary.summary(), path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)["stages"]["total"]["p50_ms"], 500)
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -89,5 +89,125 @@ class DatabaseTest(unittest.TestCase):
         self.assertIn('personal_contacts', collection_names)
         self.assertIn('work_contacts', collection_names)
 
+class UserDBCacheTest(unittest.TestCase):
+    """Test the per-user database handle cache."""
+    
+    def setUp(self):
+        """Start every test with an empty cache."""
+        from app.db import user_db_cache
+        self.cache = user_db_cache
+        self.cache.invalidate()
+        self.cache.hits = 0
+        self.cache.misses = 0
+    
+    def tearDown(self):
+        """Drop any handles created by the test."""
+        self.cache.invalidate()
+    
+    @patch('app.db.client')
+    @patch('app.db.get_system_db')
+    def test_get_user_db_is_cached(self, mock_get_system_db, mock_client):
+        """The second lookup for a user should not touch the system database."""
+        from app.db import get_user_db, get_user_db_cache_stats
+        
+        mock_sys_db = mock_get_system_db.return_value
+        mock_sys_db.has_database.return_value = True
+        mock_sys_db.has_collection.return_value = False
+        
+        first = get_user_db("42")
+        second = get_user_db("42")
+        
+        self.assertIs(first, second)
+        mock_get_system_db.assert_called_once()
+        mock_client.db.assert_called_once()
+        stats = get_user_db_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    @patch('app.db.client')
+    @patch('app.db.get_system_db')
+    def test_missing_database_is_not_cached(self, mock_get_system_db, mock_client):
+        """A user without a database should be looked up again next time."""
+        from app.db import get_user_db
+        
+        mock_get_system_db.return_value.has_database.return_value = False
+        
+        self.assertIsNone(get_user_db("42"))
+        self.assertIsNone(get_user_db("42"))
+        self.assertEqual(mock_get_system_db.call_count, 2)
+        mock_client.db.assert_not_called()
+    
+    def test_invalidate_and_ttl(self):
+        """Handles expire after the TTL and can be invalidated explicitly."""
+        from app.db import invalidate_user_db
+        
+        handle = MagicMock()
+        self.cache.put("42", handle)
+        self.assertIs(self.cache.get("42"), handle)
+        
+        invalidate_user_db("42")
+        self.assertIsNone(self.cache.get("42"))
+        
+        self.cache.put("42", handle)
+        with patch('app.db.time.monotonic', return_value=float('inf')):
+            self.assertIsNone(self.cache.get("42"))
+
+    @patch('app.db.client')
+    @patch('app.db.get_system_db')
+    def test_int_and_str_ids_share_a_handle(self, mock_get_system_db, mock_client):
+        """A user looked up as 42 and as "42" gets one handle, dropped by either form."""
+        from app.db import get_user_db, invalidate_user_db
+        
+        mock_sys_db = mock_get_system_db.return_value
+        mock_sys_db.has_database.return_value = True
+        mock_sys_db.has_collection.return_value = False
+        
+        self.assertIs(get_user_db(42), get_user_db("42"))
+        mock_client.db.assert_called_once()
+        
+        invalidate_user_db(42)
+        self.assertIsNone(self.cache.get("42"))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+class SystemIndexesTest(unittest.TestCase):
+    """Test the indexes created on the system database at startup."""
+    
+    def test_missing_index_is_created_once(self):
+        """The chat message index is added when missing and left alone otherwise."""
+        from app.db import ensure_system_indexes
+        
+        db = MagicMock()
+        db.has_collection.return_value = True
+        collection = db.collection.return_value
+        collection.indexes.return_value = [{"fields": ["_key"]}]
+        
+        ensure_system_indexes(db)
+        
+        collection.add_index.assert_called_once()
+        index = collection.add_index.call_args[0][0]
+        self.assertEqual(index["type"], "persistent")
+        self.assertEqual(index["fields"], ["thread_id", "timestamp", "_key"])
+        
+        collection.indexes.return_value.append({"fields": ["thread_id", "timestamp", "_key"]})
+        ensure_system_indexes(db)
+        collection.add_index.assert_called_once()
+        collection.delete_index.assert_not_called()
+    
+    def test_outdated_index_is_replaced(self):
+        """An index of the same name on fewer fields is dropped before the new one is added."""
+        from app.db import ensure_system_indexes
+        
+        db = MagicMock()
+        db.has_collection.return_value = True
+        collection = db.collection.return_value
+        collection.indexes.return_value = [
+            {"id": "chat_messages/1", "name": "thread_timestamp", "fields": ["thread_id", "timestamp"]}
+        ]
+        
+        ensure_system_indexes(db)
+        
+        collection.delete_index.assert_called_once_with("chat_messages/1")
+        self.assertEqual(collection.add_index.call_args[0][0]["fields"], ["thread_id", "timestamp", "_key"])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+import random
+import time
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from typing import List, Literal, Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from app.common.fake_llm import FakeChatModel, fake_value, parse_latency
+from app.common.llm_manager import LLMManager
+from app.common.message_insights import MessageInsights
+
+
+class Contact(BaseModel):
+    email: str
+    tags: List[str]
+
+
+class Lead(BaseModel):
+    """Schema with nested, optional and enum fields."""
+    contact: Contact
+    stage: Literal["new", "won", "lost"]
+    score: float = Field(ge=0, le=100)
+    owner: Optional[str] = None
+
+
+@tool
+def find_person(name: str) -> str:
+    """Find a person by name."""
+    return f"Found {name}"
+
+
+class FakeChatModelTest(unittest.TestCase):
+    """Test the offline fake LLM provider."""
+
+    def tearDown(self):
+        """Drop shared models."""
+        LLMManager.clear_registry()
+
+    def test_structured_output_is_valid_and_deterministic(self):
+        """Structured outputs validate and depend only on the seed and prompt."""
+        model = LLMManager.get_structured_model("fake", MessageInsights)
+        first = model.invoke("Analyze: lunch tomorrow?")
+        self.assertIsInstance(first, MessageInsights)
+        self.assertEqual(first, model.invoke("Analyze: lunch tomorrow?"))
+        for score in (first.spam_score, first.urgency_score, first.importance_score):
+            self.assertTrue(0 <= score <= 1)
+
+        other_seed = LLMManager.get_structured_model("fake", MessageInsights, seed=1)
+        self.assertNotEqual(first, other_seed.invoke("Analyze: lunch tomorrow?"))
+
+    def test_fake_value_follows_schema(self):
+        """Generated values satisfy nested, enum and bounded fields."""
+        lead = Lead(**fake_value(Lead.model_json_schema(), random.Random(0)))
+        self.assertIn(lead.stage, ("new", "won", "lost"))
+        self.assertTrue(0 <= lead.score <= 100)
+        self.assertTrue(lead.contact.email.endswith("@example.com"))
+
+    def test_aql_generation(self):
+        """AQL generation prompts get a query over a collection from the schema."""
+        model = FakeChatModel()
+        prompt = (
+            "Task: Generate an ArangoDB Query Language (AQL) query from a User Input.\n"
+            "{'collection_name': 'Persons', 'collection_type': 'document'}"
+        )
+        self.assertIn("FOR doc IN Persons", model.invoke(prompt).content)
+
+    def test_agent_calls_tool_then_answers(self):
+        """With bound tools the model calls one, then answers after its result."""
+        model = FakeChatModel().bind_tools([find_person])
+        response = model.invoke("Who is Bob?")
+        self.assertEqual(response.tool_calls[0]["name"], "find_person")
+        self.assertIsInstance(response.tool_calls[0]["args"]["name"], str)
+
+        answer = model.invoke([
+            ("user", "Who is Bob?"),
+            response,
+            ToolMessage(content="Found Bob", tool_call_id=response.tool_calls[0]["id"])
+        ])
+        self.assertFalse(answer.tool_calls)
+        self.assertTrue(answer.content)
+
+    def test_latency(self):
+        """Calls sleep for the configured latency."""
+        model = FakeChatModel(latency="constant:0.05")
+        start = time.monotonic()
+        model.invoke("hello")
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+        sample = parse_latency("uniform:1,2")
+        self.assertTrue(all(1 <= sample(random.Random(i)) <= 2 for i in range(20)))
+        with self.assertRaises(ValueError):
+            parse_latency("pareto:1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.prebuilt import create_react_agent
+
+from app.agents.gateway_fanout import GATEWAY_FANOUT_OUTCOMES, RESPONSE_SEPARATOR, fan_out, run_agents
+from app.common.agent_streaming import run_agent_graph
+from app.common.fake_llm import FakeChatModel
+from app.common import metrics
+from app.common.metrics import current_labels, metric_labels
+
+
+class SleepyAgent:
+    def __init__(self, name, delay, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.thread_ids = []
+
+    def call_llm(self, user_message, thread_id):
+        self.thread_ids.append(thread_id)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("agent failed")
+        return f"{self.name}: {user_message}"
+
+
+class GatewayFanOutTest(unittest.TestCase):
+    """Test running routed agents concurrently and merging their replies."""
+
+    def test_agents_run_concurrently_and_merge_in_order(self):
+        """Wall-clock is the slowest agent and replies keep the routing order."""
+        agents = {"Email_Agent": SleepyAgent("email", 0.2), "Slack_Agent": SleepyAgent("slack", 0.1)}
+        start = time.monotonic()
+        reply = run_agents(agents, ["Email_Agent", "Slack_Agent"], "hi", "t1", timeout=5)
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.29)
+        self.assertEqual(reply, RESPONSE_SEPARATOR.join(["email: hi", "slack: hi"]))
+        # Each agent keeps its own checkpoint thread
+        self.assertEqual(agents["Email_Agent"].thread_ids, ["t1_Email_Agent"])
+        self.assertEqual(agents["Slack_Agent"].thread_ids, ["t1_Slack_Agent"])
+
+    def test_single_agent_reply_is_unchanged(self):
+        """A message routed to one agent gets that agent's reply as is."""
+        agents = {"Email_Agent": SleepyAgent("email", 0)}
+        reply = run_agents(agents, ["Email_Agent"], "hi", "t1")
+        self.assertEqual(reply, "email: hi")
+        # The conversation's own checkpoint thread, so its history is kept
+        self.assertEqual(agents["Email_Agent"].thread_ids, ["t1"])
+
+    def test_stragglers_and_failures_are_reported(self):
+        """Agents missing the deadline or failing are noted in the reply."""
+        agents = {
+            "Email_Agent": SleepyAgent("email", 0),
+            "Online_Order_Restaurant_Agent": SleepyAgent("food", 2),
+            "Slack_Agent": SleepyAgent("slack", 0, fail=True),
+        }
+        before = GATEWAY_FANOUT_OUTCOMES.value(agent="Online_Order_Restaurant_Agent", outcome="timeout")
+        start = time.monotonic()
+        reply = run_agents(agents, list(agents), "hi", "t1", timeout=0.2)
+
+        self.assertLess(time.monotonic() - start, 1)
+        sections = reply.split(RESPONSE_SEPARATOR)
+        self.assertEqual(sections[0], "email: hi")
+        self.assertIn("online order restaurant part", sections[1])
+        self.assertIn("slack part", sections[2])
+        self.assertEqual(
+            GATEWAY_FANOUT_OUTCOMES.value(agent="Online_Order_Restaurant_Agent", outcome="timeout") - before, 1
+        )
+
+    @patch.object(metrics, "METRICS_USER_LABEL", True)
+    def test_calls_inherit_the_callers_context(self):
+        """Metric labels set by the caller apply inside the agents."""
+        seen = []
+
+        def call():
+            seen.append(current_labels()["user"])
+            return "ok"
+
+        with metric_labels(user="u-fanout"):
+            result = fan_out({"a": call, "b": call}, timeout=5)
+        self.assertEqual(seen, ["u-fanout", "u-fanout"])
+        self.assertEqual(result.responses, {"a": "ok", "b": "ok"})
+
+    def test_cancelled_agent_stops_after_its_tool_step(self):
+        """A straggling ReAct agent stops at its next step instead of running on."""
+        tool_calls = []
+        release = threading.Event()
+
+        @tool
+        def slow_lookup(name: str) -> str:
+            """Look up a contact by name."""
+            tool_calls.append(name)
+            release.wait(2)
+            return "found"
+
+        checkpointer = MemorySaver()
+        graph = create_react_agent(FakeChatModel(seed=3), [slow_lookup], checkpointer=checkpointer)
+        config = {"configurable": {"thread_id": "cancel"}}
+        finished = threading.Event()
+
+        def call():
+            try:
+                return run_agent_graph(graph, {"messages": [("user", "hi")]}, config)
+            finally:
+                finished.set()
+
+        result = fan_out({"Slow_Agent": call, "Fast_Agent": lambda: "fast"}, timeout=0.2)
+        self.assertEqual(result.timed_out, ["Slow_Agent"])
+        release.set()
+        self.assertTrue(finished.wait(2))
+
+        # The run stopped after the tool result, before asking the model again
+        messages = graph.get_state(config).values["messages"]
+        self.assertEqual(len(tool_calls), 1)
+        self.assertEqual(messages[-1].type, "tool")
+        # The thread is still usable for the next message
+        self.assertTrue(run_agent_graph(graph, {"messages": [("user", "again")]}, config))
+
+
+if __name__ == '__main__':
+    unittest.main()
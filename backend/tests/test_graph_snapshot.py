@@ -0,0 +1,169 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import time
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import networkx as nx
+import numpy as np
+
+from app.common.graph_snapshot import (
+    AttributeColumn, GraphSnapshot, NumericColumn, column_from_values, current_version_path
+)
+
+
+class GraphSnapshotTest(unittest.TestCase):
+    """Test that algorithms give the same answers on a snapshot view."""
+
+    def setUp(self):
+        """Build a small restaurant/dish graph with bulky attributes."""
+        self.G = nx.DiGraph()
+        for i in range(6):
+            self.G.add_node(f"restaurants/r{i}", name=f"Restaurant {i}", address="x" * 500)
+        for i in range(10):
+            self.G.add_node(f"dishes/d{i}", name=f"Dish {i}", price=100 + i, desc="y" * 500)
+        for i in range(6):
+            for j in range(i, i + 4):
+                self.G.add_edge(f"restaurants/r{i}", f"dishes/d{j}", weight=j - i + 1)
+        self.G.add_edge("dishes/d9", "restaurants/r0", weight=1)
+        self.snapshot = GraphSnapshot.from_networkx(self.G, node_fields=["name", "price"], edge_fields=["weight"])
+        self.view = self.snapshot.view()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_structure_and_projection(self):
+        """Nodes, edges and whitelisted attributes match; other attributes are dropped."""
+        self.assertEqual(set(self.view.nodes), set(self.G.nodes))
+        self.assertEqual(set(self.view.edges), set(self.G.edges))
+        self.assertEqual(self.view.number_of_edges(), self.G.number_of_edges())
+        self.assertEqual(self.view.nodes["dishes/d3"], {"name": "Dish 3", "price": 103})
+        self.assertEqual(self.view["restaurants/r1"]["dishes/d2"], {"weight": 2})
+        self.assertEqual(dict(self.view.in_degree()), dict(self.G.in_degree()))
+        self.assertEqual(list(self.view.predecessors("dishes/d3")), sorted(self.G.predecessors("dishes/d3")))
+
+    def test_algorithms(self):
+        """NetworkX algorithms run unchanged on the lazy view."""
+        self.assertEqual(
+            nx.shortest_path_length(self.view, "dishes/d9", "dishes/d3", weight="weight"),
+            nx.shortest_path_length(self.G, "dishes/d9", "dishes/d3", weight="weight")
+        )
+        self.assertEqual(nx.in_degree_centrality(self.view), nx.in_degree_centrality(self.G))
+        self.assertEqual(
+            nx.betweenness_centrality(self.view), nx.betweenness_centrality(self.G)
+        )
+        subgraph = self.view.subgraph(["restaurants/r0", "dishes/d0", "dishes/d1"])
+        self.assertEqual(subgraph.number_of_edges(), 2)
+
+    def test_view_is_read_only(self):
+        """Mutations fail on the view but work on a copy."""
+        with self.assertRaises(nx.NetworkXError):
+            self.view.add_node("dishes/new")
+        copy = self.view.copy()
+        copy.add_node("dishes/new")
+        self.assertIn("dishes/new", copy)
+
+    def test_save_and_memory_mapped_load(self):
+        """A saved snapshot loads memory-mapped and behaves identically."""
+        self.snapshot.save(self.temp_dir)
+        loaded = GraphSnapshot.load(self.temp_dir)
+
+        self.assertIsInstance(loaded.indices, np.memmap)
+        view = loaded.view()
+        self.assertEqual(set(view.edges), set(self.G.edges))
+        self.assertEqual(view.nodes["restaurants/r2"], {"name": "Restaurant 2"})
+        self.assertIsInstance(loaded.node_attrs["name"].data, np.memmap)
+        self.assertIsInstance(loaded.edge_attrs["weight"].values, np.memmap)
+
+    def test_numeric_attributes_are_native_arrays(self):
+        """All-numeric attributes skip JSON; mixed ones keep their values as they were."""
+        self.assertIsInstance(self.snapshot.edge_attrs["weight"], NumericColumn)
+        self.assertEqual(self.snapshot.edge_attrs["weight"].values.dtype, np.int64)
+        # Restaurants have no price, so the column has missing values
+        self.assertIsNone(self.view.nodes["restaurants/r0"].get("price"))
+        self.assertIsInstance(self.view.nodes["dishes/d3"]["price"], int)
+
+        self.assertIsInstance(column_from_values([1, 2.5, None]), NumericColumn)
+        self.assertEqual(list(column_from_values([1, 2.5, None])), [1.0, 2.5, None])
+        self.assertEqual(list(column_from_values([True, None])), [True, None])
+        self.assertIsInstance(column_from_values([1, "2"]), AttributeColumn)
+        self.assertIsInstance(column_from_values([1, True]), AttributeColumn)
+        self.assertIsInstance(column_from_values([2 ** 70]), AttributeColumn)
+
+    def test_decoded_values_are_cached(self):
+        """Strings are decoded once; lists are decoded afresh so changing one has no effect."""
+        column = AttributeColumn.from_values(["a", ["b"]])
+        self.assertIs(column[0], column[0])
+        column[1].append("c")
+        self.assertEqual(column[1], ["b"])
+
+    def test_save_publishes_a_new_version(self):
+        """Saving again writes a new version and leaves the loaded one untouched."""
+        first_path = self.snapshot.save(self.temp_dir)
+        first = GraphSnapshot.load(self.temp_dir)
+        self.G.add_edge("dishes/d0", "dishes/d1", weight=7)
+        second_path = GraphSnapshot.from_networkx(self.G, ["name", "price"], ["weight"]).save(self.temp_dir)
+
+        self.assertNotEqual(first_path, second_path)
+        self.assertEqual(current_version_path(self.temp_dir), second_path)
+        self.assertNotIn(("dishes/d0", "dishes/d1"), set(first.view().edges))
+        self.assertIn(("dishes/d0", "dishes/d1"), set(GraphSnapshot.load(self.temp_dir).view().edges))
+        self.assertEqual(GraphSnapshot.load(first_path).number_of_edges, self.snapshot.number_of_edges)
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if name.startswith(".tmp-")])
+
+    def test_old_versions_are_removed(self):
+        """Only the newest versions are kept on disk."""
+        paths = [self.snapshot.save(self.temp_dir, keep_versions=1) for _ in range(4)]
+        versions = sorted(name for name in os.listdir(self.temp_dir) if name.startswith("v"))
+        self.assertEqual(versions, sorted(os.path.basename(path) for path in paths[-2:]))
+
+    def test_freshness(self):
+        """A snapshot is fresh while young or while its collections are unchanged."""
+        db = MagicMock()
+        db.collection.return_value.revision.return_value = "10"
+        arango_graph = MagicMock()
+        arango_graph.vertex_collections.return_value = ["restaurants"]
+        arango_graph.edge_definitions.return_value = [{"edge_collection": "serves"}]
+
+        self.assertFalse(self.snapshot.is_fresh(db, arango_graph))
+        self.snapshot.metadata = {"built_at": time.time(), "collection_revisions": {"restaurants": "9", "serves": "10"}}
+        self.assertTrue(self.snapshot.is_fresh(db, arango_graph))
+        db.collection.assert_not_called()
+
+        self.snapshot.metadata["built_at"] -= 7200
+        self.assertFalse(self.snapshot.is_fresh(db, arango_graph, max_age=3600))
+        self.snapshot.metadata["collection_revisions"]["restaurants"] = "10"
+        self.assertTrue(self.snapshot.is_fresh(db, arango_graph, max_age=3600))
+
+        # Finding the revisions unchanged restarts the max_age window
+        db.collection.reset_mock()
+        self.assertTrue(self.snapshot.is_fresh(db, arango_graph, max_age=3600))
+        db.collection.assert_not_called()
+
+    def test_unchanged_revisions_are_saved(self):
+        """A loaded snapshot found up to date is not checked again by the next process either."""
+        db = MagicMock()
+        db.collection.return_value.revision.return_value = "10"
+        arango_graph = MagicMock()
+        arango_graph.vertex_collections.return_value = ["restaurants"]
+        arango_graph.edge_definitions.return_value = [{"edge_collection": "serves"}]
+        self.snapshot.metadata = {
+            "built_at": time.time() - 7200, "collection_revisions": {"restaurants": "10", "serves": "10"}
+        }
+        self.snapshot.save(self.temp_dir)
+
+        self.assertTrue(GraphSnapshot.load(self.temp_dir).is_fresh(db, arango_graph, max_age=3600))
+        db.collection.reset_mock()
+        self.assertTrue(GraphSnapshot.load(self.temp_dir).is_fresh(db, arango_graph, max_age=3600))
+        db.collection.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
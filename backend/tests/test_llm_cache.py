@@ -0,0 +1,70 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import time
+from unittest.mock import patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.common.llm_cache import SQLiteLLMCache
+from app.common.llm_manager import LLMManager
+
+
+class SQLiteLLMCacheTest(unittest.TestCase):
+    """Test the persistent LLM response cache."""
+
+    def setUp(self):
+        """Create a cache in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "llm_cache.sqlite")
+        self.cache = SQLiteLLMCache(self.path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        LLMManager.clear_registry()
+        shutil.rmtree(self.temp_dir)
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        """The second identical call does not reach the model, even from a new process."""
+        model = FakeListChatModel(responses=["first", "second"], cache=self.cache)
+        self.assertEqual(model.invoke("Extract identifiers").content, "first")
+        self.assertEqual(model.invoke("Extract identifiers").content, "first")
+        self.assertEqual(model.invoke("Analyze").content, "second")
+
+        reopened = FakeListChatModel(responses=["first", "second"], cache=SQLiteLLMCache(self.path))
+        self.assertEqual(reopened.invoke("Analyze").content, "second")
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 2, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_ttl_and_size_eviction(self):
+        """Expired entries miss, and old entries are evicted past max_bytes."""
+        cache = SQLiteLLMCache(self.path, ttl=0.01)
+        model = FakeListChatModel(responses=["first", "second"], cache=cache)
+        model.invoke("Extract identifiers")
+        time.sleep(0.05)
+        self.assertEqual(model.invoke("Extract identifiers").content, "second")
+
+        small_cache = SQLiteLLMCache(os.path.join(self.temp_dir, "small.sqlite"), max_bytes=1)
+        small_model = FakeListChatModel(responses=["a", "b"], cache=small_cache)
+        small_model.invoke("one")
+        small_model.invoke("two")
+        self.assertLessEqual(small_cache.stats()["size"], 1)
+
+    def test_only_deterministic_models_are_cached(self):
+        """LLMManager attaches the cache to temperature-0 models when enabled."""
+        with patch.dict(os.environ, {"LLM_CACHE_PATH": self.path}):
+            self.assertIsNotNone(LLMManager.create_model("openai", "gpt-4o-mini", 0, api_key="sk-test").cache)
+            self.assertIsNone(LLMManager.create_model("openai", "gpt-4o-mini", 0.7, api_key="sk-test").cache)
+        with patch.dict(os.environ, {"LLM_CACHE_PATH": ""}):
+            self.assertIsNone(LLMManager.create_model("openai", "gpt-4o-mini", 0, api_key="sk-test").cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.common.llm_manager import LLMManager
+from app.agents.whatsapp.schemas import AnalysisResult, Identifiers
+
+
+class LLMRegistryTest(unittest.TestCase):
+    """Test that models and structured-output wrappers are shared."""
+
+    def setUp(self):
+        """Start from an empty registry."""
+        LLMManager.clear_registry()
+
+    def tearDown(self):
+        """Do not leak test clients into other tests."""
+        LLMManager.clear_registry()
+
+    def test_models_are_shared_by_key(self):
+        """The same arguments return the same instance; different ones do not."""
+        model = LLMManager.get_model("openai", "gpt-4o-mini", 0, api_key="sk-test")
+        self.assertIs(LLMManager.get_model("OpenAI", "gpt-4o-mini", 0.0, api_key="sk-test"), model)
+        self.assertIsNot(LLMManager.get_model("openai", "gpt-4o-mini", 0.5, api_key="sk-test"), model)
+
+    def test_structured_models_are_shared_by_schema(self):
+        """Structured wrappers are cached per schema on top of the shared model."""
+        identifiers = LLMManager.get_structured_model("openai", Identifiers, "gpt-4o-mini", api_key="sk-test")
+        self.assertIs(
+            LLMManager.get_structured_model("openai", Identifiers, "gpt-4o-mini", api_key="sk-test"), identifiers
+        )
+        self.assertIsNot(
+            LLMManager.get_structured_model("openai", AnalysisResult, "gpt-4o-mini", api_key="sk-test"), identifiers
+        )
+        self.assertEqual(len(LLMManager._models), 1)
+
+    def test_unhashable_arguments_are_not_shared(self):
+        """Models built with unhashable arguments get a private instance."""
+        model = LLMManager.get_model("openai", "gpt-4o-mini", api_key="sk-test", model_kwargs={"seed": 1})
+        self.assertIsNot(
+            LLMManager.get_model("openai", "gpt-4o-mini", api_key="sk-test", model_kwargs={"seed": 1}), model
+        )
+        self.assertEqual(len(LLMManager._models), 0)
+
+    def test_registry_resets_after_fork(self):
+        """A child process does not reuse the parent's clients."""
+        model = LLMManager.get_model("openai", "gpt-4o-mini", api_key="sk-test")
+        with patch("app.common.llm_manager.os.getpid", return_value=LLMManager._registry_pid + 1):
+            self.assertIsNot(LLMManager.get_model("openai", "gpt-4o-mini", api_key="sk-test"), model)
+
+
+if __name__ == '__main__':
+    unittest.main()
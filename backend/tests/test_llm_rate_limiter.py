@@ -0,0 +1,185 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import threading
+import time
+from unittest.mock import patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.common import llm_rate_limiter
+from app.common.llm_rate_limiter import (
+    BACKGROUND, INTERACTIVE, FileBucketStore, LLMGovernor, MemoryBucketStore,
+    governed_class, llm_priority, take_tokens
+)
+
+
+class TokenBucketTest(unittest.TestCase):
+    """Test the bucket arithmetic shared by all stores."""
+
+    def test_take_until_empty_then_wait(self):
+        """Requests are taken until the bucket is empty, then a wait is returned."""
+        state = {}
+        for _ in range(3):
+            self.assertEqual(take_tokens(state, 0.0, 3, 1000, 1, 10, 0.0), 0.0)
+        wait = take_tokens(state, 0.0, 3, 1000, 1, 10, 0.0)
+        self.assertAlmostEqual(wait, 20.0)
+        # One request refills every 20 seconds at 3 requests per minute
+        self.assertEqual(take_tokens(state, 20.0, 3, 1000, 1, 10, 0.0), 0.0)
+
+    def test_reserve_is_kept_for_interactive_calls(self):
+        """A background take must leave the reserve in the bucket."""
+        state = {"r": 10, "k": 1000, "t": 0.0}
+        self.assertGreater(take_tokens(state, 0.0, 10, 1000, 1, 900, 0.2), 0)
+        self.assertEqual(take_tokens(state, 0.0, 10, 1000, 1, 900, 0.0), 0.0)
+
+    def test_forced_adjustment(self):
+        """Corrections are applied even if the bucket goes negative."""
+        state = {"r": 10, "k": 100, "t": 0.0}
+        take_tokens(state, 0.0, 10, 1000, 0, 300, 0.0, force=True)
+        self.assertEqual(state["k"], -200)
+        self.assertEqual(state["r"], 10)
+
+
+class FileBucketStoreTest(unittest.TestCase):
+    """Test the cross-process file store."""
+
+    def setUp(self):
+        """Create a store in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_stores_share_state(self):
+        """Two stores on the same directory draw from the same bucket."""
+        first = FileBucketStore(self.temp_dir)
+        second = FileBucketStore(self.temp_dir)
+        self.assertEqual(first.take("openai:gpt-4o", 2, 1000, 1, 10, 0.0), 0.0)
+        self.assertEqual(second.take("openai:gpt-4o", 2, 1000, 1, 10, 0.0), 0.0)
+        self.assertGreater(first.take("openai:gpt-4o", 2, 1000, 1, 10, 0.0), 0)
+        self.assertEqual(second.take("openai:gpt-4o-mini", 2, 1000, 1, 10, 0.0), 0.0)
+
+
+class LLMGovernorTest(unittest.TestCase):
+    """Test the concurrency cap and priorities."""
+
+    def test_in_flight_cap(self):
+        """No more than max_in_flight calls run at once."""
+        governor = LLMGovernor("test", MemoryBucketStore(), 10000, 10 ** 7, 2, reserve=0.0)
+        peak = []
+        lock = threading.Lock()
+
+        def call():
+            with governor.slot(1):
+                with lock:
+                    peak.append(governor.in_flight)
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(governor.in_flight, 0)
+
+    def test_background_cannot_use_reserved_slot(self):
+        """Background calls leave a slot free that interactive calls can take."""
+        governor = LLMGovernor("test", MemoryBucketStore(), 10000, 10 ** 7, 4, reserve=0.25)
+        for _ in range(3):
+            governor.acquire(1, BACKGROUND)
+        started = threading.Event()
+
+        def background():
+            governor.acquire(1, BACKGROUND)
+            started.set()
+
+        thread = threading.Thread(target=background, daemon=True)
+        thread.start()
+        self.assertFalse(started.wait(0.1))
+
+        # The reserved slot is still free for an interactive call
+        with llm_priority(INTERACTIVE):
+            governor.acquire(1)
+        self.assertEqual(governor.in_flight, 4)
+
+        for _ in range(2):
+            governor.release()
+        self.assertTrue(started.wait(1))
+
+    def test_nested_slots_count_once(self):
+        """A call made inside a held slot does not take another one."""
+        governor = LLMGovernor("test", MemoryBucketStore(), 10000, 10 ** 7, 1)
+        with governor.slot(1):
+            with governor.slot(1):
+                self.assertEqual(governor.in_flight, 1)
+        self.assertEqual(governor.in_flight, 0)
+
+
+class GovernedModelTest(unittest.TestCase):
+    """Test that governed chat models go through the governor."""
+
+    def setUp(self):
+        """Use an in-memory store and forget governors from other tests."""
+        self.store_patch = patch.object(llm_rate_limiter, "_store", MemoryBucketStore())
+        self.governors_patch = patch.object(llm_rate_limiter, "_governors", {})
+        self.store_patch.start()
+        self.governors_patch.start()
+
+    def tearDown(self):
+        """Restore the module state."""
+        self.store_patch.stop()
+        self.governors_patch.stop()
+
+    def governed_model(self, responses):
+        with patch.object(llm_rate_limiter, "LLM_RATE_LIMITING", True):
+            return governed_class.__wrapped__(FakeListChatModel, "fake")(responses=responses)
+
+    def test_rate_limiting_is_opt_in(self):
+        """Without LLM_RATE_LIMITING, models are used as they are."""
+        self.assertFalse(llm_rate_limiter.LLM_RATE_LIMITING)
+        self.assertIs(governed_class.__wrapped__(FakeListChatModel, "fake"), FakeListChatModel)
+
+    def test_invoke_and_stream_acquire_and_release(self):
+        """Calls acquire a slot from the provider's governor and release it."""
+        model = self.governed_model(["hello", "world"])
+        governor = model._get_governor()
+
+        with patch.object(governor, "acquire", wraps=governor.acquire) as acquire:
+            self.assertEqual(model.invoke("hi").content, "hello")
+            self.assertEqual("".join(chunk.content for chunk in model.stream("hi")), "world")
+        self.assertEqual(acquire.call_count, 2)
+        self.assertEqual(governor.in_flight, 0)
+        self.assertEqual(governor.key, "fake:")
+
+    def test_stream_does_not_mark_the_consumers_context(self):
+        """Calls the consumer makes between streamed chunks take their own slot."""
+        model = self.governed_model(["streamed"])
+        governor = model._get_governor()
+        seen = []
+        for chunk in model.stream("hi"):
+            seen.append(llm_rate_limiter._in_slot.get())
+            self.assertEqual(governor.in_flight, 1)
+        self.assertTrue(seen)
+        self.assertFalse(any(seen))
+        self.assertEqual(governor.in_flight, 0)
+
+    def test_abandoned_stream_releases_its_slot(self):
+        """Closing a stream before its end gives the slot back."""
+        model = self.governed_model(["several chunks here"])
+        governor = model._get_governor()
+        stream = model.stream("hi")
+        next(stream)
+        stream.close()
+        self.assertEqual(governor.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
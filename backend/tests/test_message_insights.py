@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.common.llm_manager import LLMManager
+from app.common.message_insights import MessageInsights
+from app.agents.whatsapp import consumer as whatsapp_consumer
+from app.agents.whatsapp import consumer_agent as whatsapp_consumer_agent
+from app.agents.whatsapp.schemas import AnalysisResult as WhatsAppAnalysisResult
+from app.agents.slack.schemas import AnalysisResult as SlackAnalysisResult
+from app.agents.email_agent.schemas import AnalysisResult as EmailAnalysisResult
+
+
+INSIGHTS = MessageInsights(
+    identifiers=["Acme Inc", "john.doe@example.com"],
+    spam_score=0.1,
+    urgency_score=0.8,
+    importance_score=0.7,
+    category="work",
+    summary="John asks about the Acme dashboard.",
+    reason="Work request with a deadline"
+)
+
+
+class MessageInsightsTest(unittest.TestCase):
+    """Test the fused identifier extraction and analysis stage."""
+
+    def test_converts_to_channel_schemas(self):
+        """The fused result fills each channel's AnalysisResult."""
+        self.assertEqual(INSIGHTS.to_analysis_result(WhatsAppAnalysisResult).summary, INSIGHTS.summary)
+        self.assertEqual(INSIGHTS.to_analysis_result(SlackAnalysisResult).reason, INSIGHTS.reason)
+        email_result = INSIGHTS.to_analysis_result(EmailAnalysisResult)
+        self.assertEqual(email_result.category, "work")
+        self.assertEqual(email_result.urgency_score, 0.8)
+        self.assertEqual(INSIGHTS.normalized_identifiers, ["acme inc", "john.doe@example.com"])
+
+    @patch.object(whatsapp_consumer, "WhatsAppAnalyzer")
+    @patch.object(whatsapp_consumer, "WhatsAppConsumer")
+    def test_fused_mode_passes_insights_on(self, mock_consumer, mock_analyzer):
+        """In fused mode the consumer's insights are passed to the analyzer instead of generated."""
+        mock_consumer.return_value.process_message.return_value = {
+            "status": "success", "message_id": "whatsapp_messages/1",
+            "identifiers": INSIGHTS.normalized_identifiers, "insights": INSIGHTS
+        }
+
+        result = whatsapp_consumer.process_message("1", {"text": "hello", "from": "1", "to": "2"}, fused=True)
+
+        self.assertEqual(result["status"], "success")
+        self.assertNotIn("insights", result)
+        self.assertTrue(mock_consumer.return_value.process_message.call_args.kwargs["fused"])
+        analysis = mock_analyzer.return_value.process_message.call_args.kwargs["analysis_result"]
+        self.assertEqual(analysis.spam_score, 0.1)
+
+    @patch.object(whatsapp_consumer, "WhatsAppAnalyzer")
+    @patch.object(whatsapp_consumer, "WhatsAppConsumer")
+    def test_two_call_mode(self, mock_consumer, mock_analyzer):
+        """With fused=False each stage makes its own call as before."""
+        mock_consumer.return_value.process_message.return_value = {"status": "success", "identifiers": []}
+
+        whatsapp_consumer.process_message("1", {"text": "hello", "from": "1", "to": "2"}, fused=False)
+
+        self.assertFalse(mock_consumer.return_value.process_message.call_args.kwargs["fused"])
+        self.assertIsNone(mock_analyzer.return_value.process_message.call_args.kwargs["analysis_result"])
+
+
+@patch.object(LLMManager, "get_structured_model")
+class ConsumerFusedCallTest(unittest.TestCase):
+    """Test where and with which model the consumer makes the fused call."""
+
+    @patch.object(whatsapp_consumer_agent, "get_user_db", return_value=None)
+    @patch.object(whatsapp_consumer_agent, "extract_message_insights")
+    def test_no_call_without_database(self, mock_extract, mock_db, mock_model):
+        """A message that cannot be stored does not cost an LLM call."""
+        consumer = whatsapp_consumer_agent.WhatsAppConsumer()
+        result = consumer.process_message("1", {"text": "hello", "from": "1", "to": "2"}, fused=True)
+        self.assertEqual(result["status"], "error")
+        mock_extract.assert_not_called()
+
+    @patch.object(whatsapp_consumer_agent, "get_user_db")
+    @patch.object(whatsapp_consumer_agent, "extract_message_insights", return_value=INSIGHTS)
+    def test_call_uses_the_consumer_model(self, mock_extract, mock_db, mock_model):
+        """The fused call uses the consumer's provider and model and its insights are returned."""
+        consumer = whatsapp_consumer_agent.WhatsAppConsumer(model_provider="anthropic", model_name="claude-x")
+        with patch.object(consumer, "batch"), patch.object(consumer, "add_edge"), \
+                patch.object(consumer, "add_node") as add_node:
+            add_node.return_value.id = "whatsapp_messages/1"
+            result = consumer.process_message("1", {"text": "hello", "from": "1", "to": "2"}, fused=True)
+        mock_extract.assert_called_once_with("WhatsApp", "hello", "anthropic", "claude-x")
+        self.assertIs(result["insights"], INSIGHTS)
+        self.assertEqual(result["identifiers"], INSIGHTS.normalized_identifiers)
+
+if __name__ == '__main__':
+    unittest.main()
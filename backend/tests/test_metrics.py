@@ -0,0 +1,131 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from celery import Celery
+from flask import Flask
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from app.common import metrics
+from app.common.fake_llm import FakeChatModel
+from app.common.metrics import (
+    AGENT_CALL_SECONDS, CELERY_TASK_SECONDS, LLM_REQUEST_SECONDS, STAGE_SECONDS, TOOL_CALL_SECONDS,
+    Counter, Histogram, MetricsRegistry, agent_call, install_celery_metrics, metric_labels, observe,
+    recent_spans
+)
+from app.routes.metrics import metrics as metrics_blueprint
+
+
+@tool
+def lookup_contact(name: str) -> str:
+    """Look up a contact by name."""
+    return f"{name}: +10000000000"
+
+
+@patch.object(metrics, "METRICS_USER_LABEL", True)
+class MetricsTest(unittest.TestCase):
+    """Test the metrics registry, traces and LangChain/Celery hooks."""
+
+    def test_render_prometheus_format(self):
+        """Counters and histograms render in the text exposition format."""
+        registry = MetricsRegistry()
+        counter = registry.register(Counter("test_total", "A counter", ["kind"]))
+        histogram = registry.register(Histogram("test_seconds", "A histogram", ["stage"], buckets=(0.1, 1)))
+        counter.inc(2, kind='say "hi"')
+        histogram.observe(0.05, stage="a")
+        histogram.observe(0.5, stage="a")
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE test_total counter", lines)
+        self.assertIn('test_total{kind="say \\"hi\\""} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count{stage="a"} 2', lines)
+
+    def test_observe_records_outcome_and_span_nesting(self):
+        """Stages carry context labels and the outcome; nested spans share a trace."""
+        with metric_labels(user="u-observe"):
+            with observe("outer_stage") as outer:
+                with observe("inner_stage") as inner:
+                    pass
+            with self.assertRaises(RuntimeError):
+                with observe("failing_stage"):
+                    raise RuntimeError("boom")
+
+        self.assertEqual(inner.trace_id, outer.trace_id)
+        self.assertEqual(inner.parent_id, outer.span_id)
+        self.assertEqual(STAGE_SECONDS.count(stage="outer_stage", user="u-observe", outcome="ok"), 1)
+        self.assertEqual(STAGE_SECONDS.count(stage="failing_stage", user="u-observe", outcome="error"), 1)
+        self.assertEqual(recent_spans(1)[0]["name"], "failing_stage")
+
+    def test_agent_llm_and_tool_calls_are_labelled(self):
+        """LLM and tool calls inside an agent call are recorded with the agent label."""
+        graph = create_react_agent(FakeChatModel(model_name="fake-metrics"), [lookup_contact])
+
+        @agent_call("Test_Agent")
+        def call_llm(message):
+            return graph.invoke({"messages": [("user", message)]})
+
+        with metric_labels(user="u-agent"):
+            call_llm("What is Bob's number?")
+
+        self.assertEqual(AGENT_CALL_SECONDS.count(agent="Test_Agent", user="u-agent", outcome="ok"), 1)
+        self.assertEqual(
+            TOOL_CALL_SECONDS.count(agent="Test_Agent", tool="lookup_contact", user="u-agent", outcome="ok"), 1
+        )
+        self.assertEqual(LLM_REQUEST_SECONDS.count(agent="Test_Agent", model="fake-metrics", outcome="ok"), 2)
+
+    def test_celery_tasks_are_timed(self):
+        """Celery task durations are recorded with their outcome."""
+        install_celery_metrics()
+        app = Celery("metrics_test")
+        app.conf.task_always_eager = True
+
+        @app.task(name="metrics_test.process")
+        def process(user_id, fail=False):
+            with observe("celery_stage"):
+                pass
+            return {"status": "error" if fail else "success"}
+
+        process.delay("u-celery")
+        process.delay("u-celery", fail=True)
+        self.assertEqual(CELERY_TASK_SECONDS.count(task="metrics_test.process", outcome="ok"), 1)
+        self.assertEqual(CELERY_TASK_SECONDS.count(task="metrics_test.process", outcome="error"), 1)
+        self.assertEqual(STAGE_SECONDS.count(stage="celery_stage", user="u-celery", outcome="ok"), 2)
+
+    def test_metrics_route(self):
+        """The Flask /metrics route serves the registry."""
+        app = Flask(__name__)
+        app.register_blueprint(metrics_blueprint)
+        with observe("route_stage"):
+            pass
+        response = app.test_client().get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('stage="route_stage"', response.get_data(as_text=True))
+        self.assertEqual(app.test_client().get("/metrics/traces").status_code, 404)
+        with patch.object(metrics, "METRICS_TRACES_ROUTE_ENABLED", True):
+            traces = app.test_client().get("/metrics/traces?limit=1").get_json()
+        self.assertEqual(len(traces["spans"]), 1)
+
+
+class MetricsDefaultsTest(unittest.TestCase):
+    """Test the privacy defaults of the metrics settings."""
+
+    def test_user_label_is_dropped(self):
+        """Without METRICS_USER_LABEL, series and spans do not carry user ids."""
+        self.assertFalse(metrics.METRICS_USER_LABEL)
+        with metric_labels(user="u-private"):
+            with observe("private_stage"):
+                pass
+        self.assertEqual(STAGE_SECONDS.count(stage="private_stage", user="", outcome="ok"), 1)
+        self.assertEqual(recent_spans(1)[0]["attributes"]["user"], "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.common import message_insights
+from app.common.micro_batcher import MicroBatcher
+from app.common.message_insights import (
+    IndexedMessageInsights, MessageInsights, MessageInsightsBatch, MessageInsightsExtractor
+)
+
+
+def insights(index=None, summary="s"):
+    data = dict(identifiers=[], spam_score=0, urgency_score=0, importance_score=0,
+                category="work", summary=summary, reason="r")
+    if index is None:
+        return MessageInsights(**data)
+    return IndexedMessageInsights(index=index, **data)
+
+
+class MicroBatcherTest(unittest.TestCase):
+    """Test grouping concurrent calls into batches."""
+
+    def test_concurrent_items_share_a_batch(self):
+        """Items submitted together are processed in one call, results fan back out."""
+        batches = []
+
+        def process(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait=0.5)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(batcher, [1, 2, 3, 4]))
+
+        self.assertEqual(results, [2, 4, 6, 8])
+        self.assertEqual(len(batches), 1)
+
+    def test_latency_cap(self):
+        """A lone item is sent after max_wait instead of waiting for a full batch."""
+        batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait=0.05)
+        start = time.monotonic()
+        self.assertEqual(batcher("x", timeout=2), "x")
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_errors_reach_the_caller(self):
+        """A failing lone item raises in its caller."""
+        batcher = MicroBatcher(MagicMock(side_effect=RuntimeError("rate limited")), max_wait=0.01)
+        with self.assertRaises(RuntimeError):
+            batcher("x", timeout=2)
+
+    def test_failed_batch_falls_back_to_single_items(self):
+        """A failing batch is retried per item, so only the bad item raises."""
+        def process(items):
+            if "bad" in items:
+                raise ValueError("unparseable response")
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher(process, max_batch_size=3, max_wait=0.5)
+        futures = [batcher.submit(item) for item in ["a", "bad", "c"]]
+
+        self.assertEqual(futures[0].result(timeout=2), "A")
+        self.assertEqual(futures[2].result(timeout=2), "C")
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout=2)
+
+    def test_fallback_uses_process_item(self):
+        """The single-item fallback calls process_item when given."""
+        process_item = MagicMock(side_effect=lambda item: item * 10)
+        batcher = MicroBatcher(
+            MagicMock(side_effect=RuntimeError("batch failed")), max_batch_size=2, max_wait=0.5,
+            process_item=process_item
+        )
+        futures = [batcher.submit(1), batcher.submit(2)]
+
+        self.assertEqual([f.result(timeout=2) for f in futures], [10, 20])
+        self.assertEqual(process_item.call_count, 2)
+
+
+class ExtractManyTest(unittest.TestCase):
+    """Test the multi-message fused request."""
+
+    def test_results_are_matched_by_index(self):
+        """Results are returned in message order; missing ones are retried alone."""
+        extractor = MessageInsightsExtractor.__new__(MessageInsightsExtractor)
+        extractor.batch_llm = MagicMock()
+        extractor.batch_llm.invoke.return_value = MessageInsightsBatch(
+            results=[insights(2, "third"), insights(0, "first")]
+        )
+        extractor.llm = MagicMock()
+        extractor.llm.invoke.return_value = insights(summary="second")
+
+        results = extractor.extract_many([("Slack", "a"), ("Slack", "b"), ("email", "c")])
+
+        self.assertEqual([r.summary for r in results], ["first", "second", "third"])
+        extractor.llm.invoke.assert_called_once()
+
+
+class PreforkBypassTest(unittest.TestCase):
+    """Test that prefork worker processes do not wait on a micro-batcher."""
+
+    @patch.object(message_insights, "MessageInsightsExtractor")
+    @patch.object(message_insights, "LLM_MICRO_BATCHING", True)
+    def test_prefork_child_calls_directly(self, mock_extractor):
+        """In a prefork child the fused call is made directly, without a batcher."""
+        mock_extractor.return_value.extract.return_value = insights()
+        with patch.object(message_insights, "_prefork_child", False), \
+                patch.dict(message_insights._extractors, clear=True), \
+                patch.dict(message_insights._batchers, clear=True):
+            message_insights._on_prefork_child_start()
+            self.assertTrue(message_insights._prefork_child)
+            result = message_insights.extract_message_insights("Slack", "hi", "openai", "m")
+            self.assertEqual(message_insights._batchers, {})
+        self.assertEqual(result.summary, "s")
+        mock_extractor.return_value.extract.assert_called_once_with("Slack", "hi")
+
+
+if __name__ == '__main__':
+    unittest.main()
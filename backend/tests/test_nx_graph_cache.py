@@ -0,0 +1,236 @@
+import unittest
+import os
+import sys
+import threading
+from unittest.mock import MagicMock, patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import networkx as nx
+
+from app.common import nx_graph_cache
+from app.common.arangodb import ArangoNetworkxQAChain
+from app.common.nx_graph_cache import NetworkXGraphCache
+
+
+class FakeDatabase:
+    """Minimal in-memory stand-in for the parts of StandardDatabase the cache uses."""
+
+    def __init__(self, collections):
+        self.name = "common_db"
+        self.collections = collections
+        self.revisions = {name: "1" for name in collections}
+        self.aql = MagicMock()
+        self.aql.execute.side_effect = self._execute
+        self.get_many = MagicMock(side_effect=lambda name, keys: [self._docs(name)[key] for key in keys])
+
+    def _execute(self, query, bind_vars, **kwargs):
+        docs = self.collections[bind_vars["@collection"]]
+        if "doc._from" in query:
+            return [[doc["_key"], [doc["_rev"], doc["_from"], doc["_to"]]] for doc in docs]
+        return [[doc["_key"], doc["_rev"]] for doc in docs]
+
+    def _docs(self, name):
+        return {doc["_key"]: doc for doc in self.collections[name]}
+
+    def collection(self, name):
+        collection = MagicMock()
+        collection.revision.return_value = self.revisions[name]
+        collection.get_many.side_effect = lambda keys: self.get_many(name, keys)
+        collection.get.side_effect = lambda key: self._docs(name).get(key)
+        return collection
+
+
+def build_graph(collections):
+    G = nx.DiGraph()
+    for doc in collections["restaurants"] + collections["dishes"]:
+        G.add_node(doc["_id"], **doc)
+    for doc in collections["serves"]:
+        G.add_edge(doc["_from"], doc["_to"], **doc)
+    return G
+
+
+class NetworkXGraphCacheTest(unittest.TestCase):
+    """Test that the NetworkX graph is refreshed from deltas instead of reloaded."""
+
+    def setUp(self):
+        """Mirror a small restaurant graph."""
+        self.collections = {
+            "restaurants": [{"_id": "restaurants/r1", "_key": "r1", "_rev": "a", "name": "Spice"}],
+            "dishes": [
+                {"_id": "dishes/d1", "_key": "d1", "_rev": "a", "name": "Biryani"},
+                {"_id": "dishes/d2", "_key": "d2", "_rev": "a", "name": "Dosa"},
+            ],
+            "serves": [{"_id": "serves/e1", "_key": "e1", "_rev": "a", "_from": "restaurants/r1", "_to": "dishes/d1"}],
+        }
+        self.db = FakeDatabase(self.collections)
+        arango_graph = MagicMock()
+        arango_graph.name = "restaurants"
+        arango_graph.vertex_collections.return_value = ["restaurants", "dishes"]
+        arango_graph.edge_definitions.return_value = [{"edge_collection": "serves"}]
+
+        with patch("app.common.nx_graph_cache.load_arangodb_graph_to_networkx",
+                   return_value=build_graph(self.collections)) as self.mock_load:
+            self.cache = NetworkXGraphCache(self.db, arango_graph)
+        self.db.aql.execute.reset_mock()
+
+    def test_unchanged_collections_are_not_diffed(self):
+        """Without revision changes nothing beyond the revision check is requested."""
+        stats = self.cache.refresh(force=True)
+        self.assertEqual(sum(stats.values()), 0)
+        self.db.aql.execute.assert_not_called()
+
+    def test_deltas_are_applied(self):
+        """Added, updated and removed documents are reflected without a reload."""
+        previous_graph = self.cache.graph
+        self.collections["dishes"] = [
+            {"_id": "dishes/d1", "_key": "d1", "_rev": "b", "name": "Hyderabadi Biryani"},
+            {"_id": "dishes/d3", "_key": "d3", "_rev": "a", "name": "Idli"},
+        ]
+        self.collections["serves"].append(
+            {"_id": "serves/e2", "_key": "e2", "_rev": "a", "_from": "restaurants/r1", "_to": "dishes/d3"}
+        )
+        self.db.revisions["dishes"] = "2"
+        self.db.revisions["serves"] = "2"
+
+        stats = self.cache.refresh(force=True)
+
+        G = self.cache.graph
+        self.assertEqual(stats["vertices_upserted"], 2)
+        self.assertEqual(stats["vertices_removed"], 1)
+        self.assertEqual(stats["edges_upserted"], 1)
+        self.assertEqual(G.nodes["dishes/d1"]["name"], "Hyderabadi Biryani")
+        self.assertFalse(G.has_node("dishes/d2"))
+        self.assertTrue(G.has_edge("restaurants/r1", "dishes/d3"))
+        self.assertTrue(G.has_edge("restaurants/r1", "dishes/d1"))
+        # Readers of the previous snapshot are not affected
+        self.assertTrue(previous_graph.has_node("dishes/d2"))
+        self.assertFalse(previous_graph.has_edge("restaurants/r1", "dishes/d3"))
+        self.assertEqual(previous_graph.nodes["dishes/d1"]["name"], "Biryani")
+        self.mock_load.assert_called_once()
+
+    def test_removed_edge(self):
+        """An edge document that disappears removes its NetworkX edge."""
+        self.collections["serves"] = []
+        self.db.revisions["serves"] = "2"
+
+        stats = self.cache.refresh(force=True)
+
+        self.assertEqual(stats["edges_removed"], 1)
+        self.assertFalse(self.cache.graph.has_edge("restaurants/r1", "dishes/d1"))
+
+    def test_parallel_edge_removal_keeps_the_other_edge(self):
+        """Removing one of two edge documents between the same vertices keeps the DiGraph edge."""
+        self.collections["serves"].append(
+            {"_id": "serves/e2", "_key": "e2", "_rev": "a", "_from": "restaurants/r1", "_to": "dishes/d1", "price": 250}
+        )
+        self.db.revisions["serves"] = "2"
+        self.cache.refresh(force=True)
+        self.assertEqual(self.cache.graph.edges["restaurants/r1", "dishes/d1"]["_id"], "serves/e2")
+
+        del self.collections["serves"][1]
+        self.db.revisions["serves"] = "3"
+        self.cache.refresh(force=True)
+
+        self.assertEqual(self.cache.graph.edges["restaurants/r1", "dishes/d1"]["_id"], "serves/e1")
+
+        self.collections["serves"] = []
+        self.db.revisions["serves"] = "4"
+        self.cache.refresh(force=True)
+        self.assertFalse(self.cache.graph.has_edge("restaurants/r1", "dishes/d1"))
+
+    def test_removed_vertex_forgets_its_edges(self):
+        """Edges removed with their vertex are not tracked any more."""
+        self.collections["dishes"] = self.collections["dishes"][1:]
+        self.db.revisions["dishes"] = "2"
+        self.cache.refresh(force=True)
+        self.assertNotIn(("restaurants/r1", "dishes/d1"), self.cache._pair_edges)
+
+        # The dangling edge document is deleted afterwards
+        self.collections["serves"] = []
+        self.db.revisions["serves"] = "2"
+        stats = self.cache.refresh(force=True)
+        self.assertEqual(stats["edges_removed"], 0)
+
+    def test_failed_refresh_is_retried(self):
+        """Changes read by a refresh that failed are applied by the next one."""
+        self.collections["dishes"][0] = {"_id": "dishes/d1", "_key": "d1", "_rev": "b", "name": "Hyderabadi Biryani"}
+        self.db.revisions["dishes"] = "2"
+        self.db.get_many.side_effect = ConnectionError("database unavailable")
+        with self.assertRaises(ConnectionError):
+            self.cache.refresh(force=True)
+        self.assertEqual(self.cache.graph.nodes["dishes/d1"]["name"], "Biryani")
+
+        self.db.get_many.side_effect = lambda name, keys: [self.db._docs(name)[key] for key in keys]
+        stats = self.cache.refresh(force=True)
+        self.assertEqual(stats["vertices_upserted"], 1)
+        self.assertEqual(self.cache.graph.nodes["dishes/d1"]["name"], "Hyderabadi Biryani")
+
+    def test_generated_code_cannot_change_the_cache(self):
+        """Mutating snippets raise and leave the shared graph and its older versions unchanged."""
+        old_graph = self.cache.graph
+        self.collections["dishes"][0] = dict(self.collections["dishes"][0], _rev="b", name="Veg Biryani")
+        self.db.revisions["dishes"] = "2"
+        self.cache.refresh(force=True)
+        chain = ArangoNetworkxQAChain.model_construct(db=self.db, graph=MagicMock(), use_sandbox=False)
+        snippets = [
+            "G_adb.remove_node('dishes/d2')",
+            "G_adb.add_edge('dishes/d1', 'dishes/d2')",
+            "G_adb.nodes['restaurants/r1']['name'] = 'Changed'",
+            "G_adb.edges['restaurants/r1', 'dishes/d1']['weight'] = 2",
+        ]
+        with patch("app.common.arangodb.get_networkx_graph", return_value=self.cache.graph):
+            for snippet in snippets:
+                with self.assertRaises((nx.NetworkXError, TypeError), msg=snippet):
+                    chain._execute_nx_code(snippet)
+            result = chain._execute_nx_code("FINAL_RESULT = G_adb.nodes['dishes/d1']['name']")
+
+        self.assertEqual(result["FINAL_RESULT"], "Veg Biryani")
+        for graph in (old_graph, self.cache.graph):
+            self.assertEqual(graph.number_of_nodes(), 3)
+            self.assertEqual(graph.nodes["restaurants/r1"]["name"], "Spice")
+            self.assertNotIn("weight", graph.edges["restaurants/r1", "dishes/d1"])
+        self.assertEqual(old_graph.nodes["dishes/d1"]["name"], "Biryani")
+
+    def test_edge_revisions_are_read_before_loading(self):
+        """A write made during the load is recorded as newer than the loaded graph."""
+        def load(db, arango_graph):
+            self.collections["serves"][0] = dict(self.collections["serves"][0], _rev="b", weight=3)
+            return build_graph(self.collections)
+
+        with patch("app.common.nx_graph_cache.load_arangodb_graph_to_networkx", side_effect=load):
+            cache = NetworkXGraphCache(self.db, self.cache.arango_graph)
+        self.assertEqual(cache._document_revisions["serves"]["e1"][0], "a")
+
+
+class GetNetworkXGraphCacheTest(unittest.TestCase):
+    """Test the process-wide caches."""
+
+    def test_loading_one_graph_does_not_block_others(self):
+        """Graphs are loaded under their own lock, not the lock of every cache."""
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_cache(db, arango_graph):
+            if arango_graph.name == "slow":
+                loading.set()
+                release.wait(2)
+            return arango_graph.name
+
+        slow, fast = MagicMock(), MagicMock()
+        slow.name, fast.name = "slow", "fast"
+        db = MagicMock()
+        db.name = "lock_test_db"
+        with patch.object(nx_graph_cache, "NetworkXGraphCache", side_effect=slow_cache), \
+                patch.dict(nx_graph_cache._caches), patch.dict(nx_graph_cache._load_locks):
+            thread = threading.Thread(target=nx_graph_cache.get_networkx_graph_cache, args=(db, slow))
+            thread.start()
+            self.assertTrue(loading.wait(2))
+            self.assertEqual(nx_graph_cache.get_networkx_graph_cache(db, fast), "fast")
+            release.set()
+            thread.join()
+            self.assertEqual(nx_graph_cache.get_networkx_graph_cache(db, slow), "slow")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import networkx as nx
+
+from app.common import nx_sandbox
+from app.common.graph_snapshot import GraphSnapshot
+from app.common.nx_sandbox import NetworkXSandbox, SandboxClosed, SandboxError, serialize_result
+
+
+class NetworkXSandboxTest(unittest.TestCase):
+    """Test running generated code in worker processes with limits."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Save a small graph snapshot and start one worker."""
+        cls.temp_dir = tempfile.mkdtemp()
+        G = nx.DiGraph()
+        G.add_node("restaurants/r1", name="Spice")
+        G.add_node("dishes/d1", name="Biryani", price=250)
+        G.add_edge("restaurants/r1", "dishes/d1")
+        GraphSnapshot.from_networkx(G).save(cls.temp_dir)
+        cls.sandbox = NetworkXSandbox(cls.temp_dir, workers=1, timeout=5, max_result_bytes=1000)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the workers and remove the snapshot."""
+        cls.sandbox.close()
+        shutil.rmtree(cls.temp_dir)
+
+    def test_final_result_is_returned(self):
+        """FINAL_RESULT comes back through a compact JSON round trip."""
+        result = self.sandbox.run(
+            "FINAL_RESULT = {'degree': dict(G_adb.degree()), 'path': nx.shortest_path(G_adb, 'restaurants/r1', 'dishes/d1')}"
+        )
+        self.assertEqual(result["degree"], {"dishes/d1": 1, "restaurants/r1": 1})
+        self.assertEqual(result["path"], ["restaurants/r1", "dishes/d1"])
+
+    def test_errors_are_reported(self):
+        """Exceptions, a missing FINAL_RESULT and oversized results become SandboxError."""
+        with self.assertRaisesRegex(SandboxError, "ZeroDivisionError"):
+            self.sandbox.run("FINAL_RESULT = 1 / 0")
+        with self.assertRaisesRegex(SandboxError, "FINAL_RESULT"):
+            self.sandbox.run("x = 1")
+        with self.assertRaisesRegex(SandboxError, "limit"):
+            self.sandbox.run("FINAL_RESULT = 'x' * 5000")
+
+    def test_timeout_replaces_worker(self):
+        """A run over the time limit is killed and the next run still works."""
+        with self.assertRaisesRegex(SandboxError, "did not finish"):
+            self.sandbox.run("while True: pass", timeout=0.5)
+        self.assertEqual(self.sandbox.run("FINAL_RESULT = G_adb.number_of_nodes()"), 2)
+
+    def test_tuple_keys_are_serialized(self):
+        """Edge-keyed results such as edge betweenness serialize with "a|b" keys."""
+        result = self.sandbox.run("FINAL_RESULT = {'nested': nx.edge_betweenness_centrality(G_adb)}")
+        self.assertEqual(list(result["nested"]), ["restaurants/r1|dishes/d1"])
+        self.assertEqual(serialize_result({1: [{("a", 2): None}]}, 100), '{"1":[{"a|2":null}]}')
+
+    def test_snapshot_keeps_every_attribute(self):
+        """Workers see all attributes of the documents, not a whitelist."""
+        self.assertEqual(self.sandbox.run("FINAL_RESULT = G_adb.nodes['dishes/d1']"), {"name": "Biryani", "price": 250})
+
+    def test_closed_sandbox_rejects_runs(self):
+        """Runs on a closed sandbox fail fast instead of waiting for a worker."""
+        sandbox = NetworkXSandbox(self.temp_dir, workers=1, timeout=5)
+        sandbox.close()
+        for _ in range(2):
+            with self.assertRaises(SandboxClosed):
+                sandbox.run("FINAL_RESULT = 1")
+
+
+class GetNetworkXSandboxTest(unittest.TestCase):
+    """Test that stale snapshots are swapped off the request thread."""
+
+    def setUp(self):
+        nx_sandbox._sandboxes.clear()
+        self.db = MagicMock()
+        self.db.name = "common_db"
+        self.arango_graph = MagicMock()
+        self.arango_graph.name = "restaurants"
+
+    def test_stale_sandbox_is_swapped_in_the_background(self):
+        """Requests keep the old sandbox while a new one starts on the new version."""
+        started = threading.Event()
+        release = threading.Event()
+        versions = iter(["v1", "v2"])
+
+        def current_snapshot(db, arango_graph):
+            version = next(versions)
+            if version == "v2":
+                started.set()
+                release.wait(5)
+            return version
+
+        def fake_sandbox(path):
+            sandbox = MagicMock()
+            sandbox.path = path
+            return sandbox
+
+        with patch.object(nx_sandbox, "_current_snapshot", side_effect=current_snapshot), \
+                patch.object(nx_sandbox, "NetworkXSandbox", side_effect=fake_sandbox), \
+                patch.object(nx_sandbox, "NX_SANDBOX_SNAPSHOT_TTL", 0):
+            first = nx_sandbox.get_nx_sandbox(self.db, self.arango_graph)
+            self.assertEqual(first.path, "v1")
+
+            # The rebuild blocks in the background, the request does not
+            self.assertIs(nx_sandbox.get_nx_sandbox(self.db, self.arango_graph), first)
+            self.assertTrue(started.wait(5))
+            self.assertIs(nx_sandbox.get_nx_sandbox(self.db, self.arango_graph), first)
+            release.set()
+
+            for _ in range(100):
+                if not nx_sandbox._refreshing:
+                    break
+                time.sleep(0.05)
+            second = nx_sandbox._sandboxes[("common_db", "restaurants")]
+            self.assertEqual(second.path, "v2")
+            first.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
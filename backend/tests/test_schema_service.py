@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Adjust the path to import from parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_community.graphs.arangodb_graph import ArangoGraph
+
+from app.common.schema_service import SchemaService
+
+
+def collection_entry(name, col_type, properties):
+    return {
+        "collection_name": name,
+        "collection_type": col_type,
+        f"{col_type}_properties": [{"name": p, "type": "str"} for p in properties],
+        f"example_{col_type}": {p: "" for p in properties},
+    }
+
+
+class SchemaServiceTest(unittest.TestCase):
+    """Test schema caching, incremental refresh and per-question trimming."""
+
+    def setUp(self):
+        """Build a graph wrapper around a mocked database."""
+        self.graph_schema = [{
+            "graph_name": "restaurants",
+            "edge_definitions": [{
+                "edge_collection": "restaurant__dish",
+                "from_vertex_collections": ["restaurants"],
+                "to_vertex_collections": ["dishes"],
+            }],
+        }]
+        schema = {
+            "Graph Schema": self.graph_schema,
+            "Collection Schema": [
+                collection_entry("restaurants", "document", ["name", "city"]),
+                collection_entry("dishes", "document", ["name", "cuisine"]),
+                collection_entry("restaurant__dish", "edge", ["_from", "_to"]),
+                collection_entry("contacts", "document", ["name", "email"]),
+            ],
+        }
+        self.db = MagicMock()
+        self.db.collections.return_value = [
+            {"name": name, "type": col_type, "system": False}
+            for name, col_type in [
+                ("restaurants", "document"), ("dishes", "document"),
+                ("restaurant__dish", "edge"), ("contacts", "document"),
+            ]
+        ]
+        self.db.collection.return_value.count.return_value = 5
+        self.db.graphs.return_value = [
+            {"name": "restaurants", "edge_definitions": self.graph_schema[0]["edge_definitions"]}
+        ]
+        self.graph = MagicMock(spec=ArangoGraph)
+        self.graph.db = self.db
+        self.graph.schema = schema
+        self.service = SchemaService(self.graph)
+
+    def test_refresh_is_throttled(self):
+        """No database calls are made before the refresh interval passes."""
+        self.assertFalse(self.service.refresh())
+        self.db.collections.assert_not_called()
+
+    def test_refresh_only_samples_new_collections(self):
+        """An unchanged database keeps its fingerprint; a new collection is sampled alone."""
+        fingerprint = self.service.fingerprint
+        self.assertFalse(self.service.refresh(force=True))
+        self.assertEqual(self.service.fingerprint, fingerprint)
+        self.db.aql.execute.assert_not_called()
+
+        self.db.collections.return_value.append({"name": "orders", "type": "document", "system": False})
+        self.db.aql.execute.return_value = [{"dish": "biryani"}]
+        self.assertTrue(self.service.refresh(force=True))
+
+        self.db.aql.execute.assert_called_once()
+        self.assertNotEqual(self.service.fingerprint, fingerprint)
+        self.assertIn("orders", self.service.rendered)
+        self.graph.set_schema.assert_called_once()
+
+    def test_subset_keeps_related_collections(self):
+        """The trimmed schema follows edges from matched collections."""
+        subset = self.service.subset("Which restaurants in Bangalore serve biryani?")
+        self.assertIn("'restaurants'", subset)
+        self.assertIn("'restaurant__dish'", subset)
+        self.assertIn("'dishes'", subset)
+        self.assertNotIn("'contacts'", subset)
+
+        self.assertEqual(self.service.subset("hello there"), self.service.rendered)
+
+
+if __name__ == '__main__':
+    unittest.main()